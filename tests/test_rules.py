@@ -10,6 +10,10 @@ import os
 import unittest
 import yaml
 import re
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
 from attackcti import attack_client
 from colorama import init
 from colorama import Fore
@@ -40,7 +44,7 @@ class TestRules(unittest.TestCase):
         data = []
 
         with open(file_path) as f:
-            yaml_parts = yaml.safe_load_all(f)
+            yaml_parts = yaml.load_all(f, Loader=YAMLLoader)
             for part in yaml_parts:
                 data.append(part)
 
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Benchmark: throughput and memory of the streaming aggregation evaluator with many group keys
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.aggregation import AggregationEvaluator, Window
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.rule import SigmaParser
+
+conditions = [
+        "selection | count() by SourceIp > 50",
+        "selection | count(DestinationPort) by SourceIp > 20",
+        "selection | avg(SentBytes) by SourceIp > 1000000",
+        "selection | max(SentBytes) by DestinationPort > 10000000",
+        ]
+
+def synthetic_connections(count, groups, rate, seed=0):
+    """
+    Network connection events from groups source addresses in turn, 1% from 20 scanning addresses, rate events per
+    second with up to 1s jitter
+    """
+    rnd = random.Random(seed)
+    events = list()
+    for i in range(count):
+        source = i % groups if rnd.random() >= 0.01 else groups + rnd.randrange(20)
+        events.append({ "timestamp": i / rate + rnd.random(), "EventID": 3, "SourceIp": "10.%d.%d.%d" % (source >> 16, (source >> 8) & 255, source & 255),
+            "DestinationPort": rnd.choice([ 22, 80, 443, 445, 3389 ]) if rnd.random() < 0.99 else rnd.randrange(1024, 65536), "SentBytes": rnd.randrange(100000) })
+    return events
+
+def evaluator(timeframe, lateness):
+    config = SigmaConfiguration()
+    evaluator = AggregationEvaluator(config, lateness=lateness)
+    for number, condition in enumerate(conditions):
+        evaluator.add(SigmaParser({ "title": condition, "logsource": { "product": "windows" },
+            "detection": { "selection": { "EventID": 3 }, "condition": condition, "timeframe": timeframe } }, config), number)
+    return evaluator
+
+def stateSize(value):
+    """Bytes of the group state of an aggregation"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (dict, list, set)):
+        size += sum(stateSize(item) for item in (value.items() if isinstance(value, dict) else value))
+    elif isinstance(value, tuple):
+        size = sum(stateSize(item) for item in value)
+    elif isinstance(value, Window):
+        size += sum(stateSize(getattr(value, name)) for name in Window.__slots__)
+    return size
+
+def run(events, timeframe, lateness):
+    """Events per second, alerts, number of groups and bytes of group states at the end"""
+    aggregations = evaluator(timeframe, lateness)
+    start = time.perf_counter()
+    alerts = sum(len(aggregations.process(event)) for event in events)
+    duration = time.perf_counter() - start
+    memory = sum(stateSize(aggregation.groups) for aggregation in aggregations.aggregations)
+    return len(events) / duration, alerts, aggregations.groups(), memory, aggregations.dropped
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure events per second and memory of the aggregation evaluator with four aggregations over events of many group keys.")
+    argparser.add_argument("--events", "-e", type=int, default=1000000, help="Number of synthetic events (default: 1000000)")
+    argparser.add_argument("--groups", "-g", type=int, default=1000000, help="Number of distinct source addresses (default: 1000000)")
+    argparser.add_argument("--rate", "-r", type=int, default=2000, help="Events per second of event time (default: 2000)")
+    argparser.add_argument("--lateness", "-l", type=float, default=1, help="Allowed lateness in seconds (default: 1)")
+    args = argparser.parse_args()
+
+    events = synthetic_connections(args.events, args.groups, args.rate)
+    for timeframe in ("24h", "1m"):
+        rate, alerts, groups, memory, dropped = run(events, timeframe, args.lateness)
+        print("Timeframe {}: {:.0f} events/s, {} alerts, {} groups kept, {:.0f}MB group state ({:.0f} bytes/group), {} late events dropped".format(
+            timeframe, rate, alerts, groups, memory / 1e6, memory / max(groups, 1), dropped))
+
+if __name__ == "__main__":
+    main()
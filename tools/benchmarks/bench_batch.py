@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Benchmark: evaluation of rules over columnar batches of synthetic Sysmon events with NumPy and row-wise matching
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.batch import np, BatchRuleSet, rowsToColumns
+from sigma.backends.ruleset import RuleSet
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.configuration import SigmaConfigurationChain
+from sigma.parser.rule import SigmaParser
+from bench_python import synthetic_events
+from bench_ruleset import corpus_rules
+
+configdir = str(Path(__file__).parent.parent / "config")
+
+def load(rules, configs):
+    """Batch rule set and row-wise rule set of rules, each with own configurations"""
+    scm = SigmaConfigurationManager([ configdir ])
+    batchconfig = SigmaConfigurationChain([ scm.get(config) for config in configs ])
+    batchruleset = BatchRuleSet(batchconfig)
+    rulesetconfig = SigmaConfigurationChain([ SigmaConfigurationManager([ configdir ]).get(config) for config in configs ])
+    ruleset = RuleSet(rulesetconfig)
+    for number, rule in enumerate(rules):
+        batchruleset.add(SigmaParser(rule, batchconfig), number)
+        ruleset.add(SigmaParser(rule, rulesetconfig), number)
+    return batchruleset, ruleset
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure events per second of batch evaluation of all rules over columns of synthetic events and of row-wise matching.")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: sysmon)")
+    argparser.add_argument("--events", "-e", type=int, default=1000000, help="Number of synthetic events (default: 1000000)")
+    argparser.add_argument("--batch-size", "-b", type=int, default=100000, help="Events per batch (default: 100000)")
+    argparser.add_argument("--sample", "-s", type=int, default=20000, help="Events matched row-wise, the rate is extrapolated (default: 20000)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+    if np is None:
+        print("NumPy is not installed, skipping batch benchmark")
+        return
+
+    batchruleset, ruleset = load(corpus_rules(args.directory), args.config or [ "sysmon" ])
+    events = synthetic_events(args.events)
+
+    start = time.perf_counter()
+    batches = [ rowsToColumns(events[offset:offset + args.batch_size]) for offset in range(0, len(events), args.batch_size) ]
+    columntime = time.perf_counter() - start
+    start = time.perf_counter()
+    counts = np.zeros(len(batchruleset), dtype=np.int64)
+    samplemasks = None
+    for batch in batches:
+        masks = batchruleset.match(batch)
+        counts += [ np.count_nonzero(mask) for mask in masks.values() ]
+        if samplemasks is None:
+            samplemasks = masks
+    batchtime = time.perf_counter() - start
+
+    sample = events[:min(args.sample, args.batch_size)]
+    start = time.perf_counter()
+    results = [ ruleset.match(event) for event in sample ]
+    rowtime = time.perf_counter() - start
+    if results != [ [ key for key, mask in samplemasks.items() if mask[row] ] for row in range(len(sample)) ]:
+        print("Warning: results of batch evaluation and row-wise matching differ")
+
+    print("{} rules, {} events in batches of {}: columns built in {:.1f}s ({:.0f} events/s)".format(
+        len(batchruleset), len(events), args.batch_size, columntime, len(events) / columntime))
+    print("Batch evaluation: {:.1f}s, {:.0f} events/s, {} matches".format(batchtime, len(events) / batchtime, counts.sum()))
+    print("Row-wise rule set: {:.0f} events/s ({} events), speedup {:.1f}x".format(
+        len(sample) / rowtime, len(sample), len(events) / batchtime / (len(sample) / rowtime)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Benchmark: case insensitive regular expressions of Elasticsearch backends
+
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.backends.elasticsearch import ElasticsearchWildcardHandlingMixin
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.parser.collection import SigmaCollectionParser
+
+def legacyMakeCaseInSensitiveValue(self, value):
+    """Previous implementation: multiple substitutions and validation for each value"""
+    if value and not value == 'null' and not re.match(r'^/.*/$', value) and (re.search('[a-zA-Z]', value) and not re.match(self.uuid_regex, value) or self.containsWildcard(value)):
+        value = re.sub( r"[A-Za-z]", lambda x: "[" + x.group( 0 ).upper() + x.group( 0 ).lower() + "]", value )
+        value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))\.", r"\g<1>\.", value )
+        value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))\*", r"\g<1>.*", value )
+        value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))([@?&~<>])", r"\g<1>\\\g<4>", value )
+        try:
+            re.compile(value)
+            return {'is_regex': True, 'value': value}
+        except re.error:
+            raise TypeError( "Regular expression validation error for: '%s')" %str(value) )
+    else:
+        return { 'is_regex': False, 'value': value }
+
+def measure(backend, parsers, repeat):
+    best = None
+    results = None
+    for i in range(repeat):
+        ElasticsearchWildcardHandlingMixin.caseInsensitiveRegex.cache_clear()
+        start = time.perf_counter()
+        output = list()
+        for parser in parsers:
+            try:
+                output.append(backend.generate(parser))
+            except Exception as e:
+                output.append(type(e))
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+        results = output
+    return best, results
+
+def regexStatistics(results):
+    """Number and total length of regular expressions in query strings"""
+    regexes = [ regex for result in results if isinstance(result, str) for regex in re.findall(r"(?<!\\)/((?:[^/\\]|\\.)*)/", result) ]
+    return len(regexes), sum(map(len, regexes))
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure conversion of all Sigma rules below a directory with case_insensitive_whitelist=*.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: winlogbeat)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    scm = SigmaConfigurationManager()
+    config = SigmaConfigurationChain()
+    for name in args.config or [ "winlogbeat" ]:
+        config.append(scm.get(name))
+    backend = getBackend(args.target)(config, { "case_insensitive_whitelist": "*" })
+    mergingBackend = getBackend(args.target)(config, { "case_insensitive_whitelist": "*", "case_insensitive_merge_lists": "true" })
+
+    parsers = list()
+    for path in sorted(Path(args.directory).glob("**/*.yml")):
+        try:
+            parsers.extend(SigmaCollectionParser(path.read_text(encoding="utf-8"), config).parsers)
+        except Exception:
+            pass
+
+    current, results = measure(backend, parsers, args.repeat)
+    merging, mergedresults = measure(mergingBackend, parsers, args.repeat)
+    with patch.object(ElasticsearchWildcardHandlingMixin, "makeCaseInSensitiveValue", legacyMakeCaseInSensitiveValue):
+        legacy, legacyresults = measure(backend, parsers, args.repeat)
+    if results != legacyresults:
+        print("Warning: results differ from previous implementation")
+    print("{} rules: {:.3f}s (previous: {:.3f}s, speedup {:.1f}x), with merged lists: {:.3f}s".format(len(parsers), current, legacy, legacy / current, merging))
+    if args.target != "es-dsl":
+        print("Regular expressions: {} with {} characters, with merged lists: {} with {} characters".format(*regexStatistics(results), *regexStatistics(mergedresults)))
+
+if __name__ == "__main__":
+    main()
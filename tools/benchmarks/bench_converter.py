@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Benchmark: conversion of single rules by a shared converter and with setup per call
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.converter import Converter
+
+configdir = str(Path(__file__).parent.parent / "config")
+
+def convert_with_setup(target, configs, content):
+    """Convert with configurations and backend set up for each call, like code that reimplements sigmac"""
+    return Converter(target, configs, scm=SigmaConfigurationManager([ configdir ])).convert(content)
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure conversion of single Sigma rules by a converter shared by threads and with setup of configurations and backend per call.")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: winlogbeat)")
+    argparser.add_argument("--threads", "-n", type=int, default=4, help="Number of threads sharing the converter (default: 4)")
+    argparser.add_argument("--setup-calls", "-s", type=int, default=100, help="Number of conversions with setup per call (default: 100)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+    configs = args.config or [ "winlogbeat" ]
+
+    contents = [ path.read_text(encoding="utf-8") for path in sorted(Path(args.directory).glob("**/*.yml")) ]
+
+    start = time.perf_counter()
+    withsetup = [ convert_with_setup(args.target, configs, content) for content in contents[:args.setup_calls] ]
+    setuptime = (time.perf_counter() - start) / len(withsetup)
+
+    start = time.perf_counter()
+    converter = Converter(args.target, configs, scm=SigmaConfigurationManager([ configdir ]))
+    buildtime = time.perf_counter() - start
+    start = time.perf_counter()
+    serial = [ converter.convert(content) for content in contents ]
+    serialtime = (time.perf_counter() - start) / len(contents)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        concurrent = list(executor.map(converter.convert, contents))
+    concurrenttime = (time.perf_counter() - start) / len(contents)
+
+    if withsetup != serial[:len(withsetup)] or concurrent != serial:
+        print("Warning: results of shared converter and setup per call differ")
+    print("{} rules for {}: setup per call {:.2f}ms/rule, shared converter {:.2f}ms/rule (built in {:.0f}ms, speedup {:.0f}x), {} threads {:.2f}ms/rule".format(
+        len(contents), args.target, setuptime * 1000, serialtime * 1000, buildtime * 1000, setuptime / serialtime, args.threads, concurrenttime * 1000))
+
+if __name__ == "__main__":
+    main()
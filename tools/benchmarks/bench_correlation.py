@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Benchmark: throughput and state of the near correlation over interleaved event streams of many entities
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.correlation import Correlator
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.rule import SigmaParser
+from bench_aggregation import stateSize
+
+commands = [ "whoami /all", "net user /domain", "net group \"domain admins\" /domain", "net localgroup administrators", "ipconfig /all", "notepad.exe report.txt" ]
+detection = {
+        "recon": { "CommandLine|contains": "whoami" },
+        "user": { "CommandLine|contains": "net user" },
+        "group": { "CommandLine|contains": "net group" },
+        "admin": { "CommandLine|contains": "administrators" },
+        "timeframe": "1m",
+        }
+
+def synthetic_streams(entities, rate, span, seed=0):
+    """Streams of one to five commands of each entity within span seconds, entities start with rate per second"""
+    rnd = random.Random(seed)
+    events = list()
+    for entity in range(entities):
+        start = entity / rate
+        events += [ (start + rnd.random() * span, entity, rnd.randrange(len(commands))) for i in range(rnd.randrange(1, 6)) ]
+    events.sort()
+    return events
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure events per second and kept state of the near correlation over interleaved command streams of many hosts.")
+    argparser.add_argument("--entities", "-n", type=int, default=1000000, help="Number of hosts (default: 1000000)")
+    argparser.add_argument("--rate", "-r", type=int, default=2000, help="Hosts starting a command stream per second (default: 2000)")
+    argparser.add_argument("--span", "-s", type=float, default=90, help="Seconds of the command stream of a host (default: 90)")
+    args = argparser.parse_args()
+
+    config = SigmaConfiguration()
+    correlator = Correlator(config, entityfield="ComputerName")
+    correlator.add(SigmaParser({ "title": "Discovery", "logsource": { "product": "windows" },
+        "detection": dict(detection, condition="recon | near user and group and not admin") }, config))
+    streams = synthetic_streams(args.entities, args.rate, args.span)
+
+    alerts = 0
+    maxgroups = 0
+    start = time.perf_counter()
+    for number, (timestamp, entity, commandline) in enumerate(streams):
+        alerts += len(correlator.process({ "timestamp": timestamp, "EventID": 1, "ComputerName": "host%d" % entity, "CommandLine": commands[commandline] }))
+        if number % 10000 == 0:
+            maxgroups = max(maxgroups, correlator.groups())
+    duration = time.perf_counter() - start
+    correlation = correlator.aggregations[0]
+    print("{} events of {} hosts: {:.0f} events/s, {} alerts".format(len(streams), args.entities, len(streams) / duration, alerts))
+    print("Hosts kept: at most {}, {} at the end with {:.1f}MB state, {} expired".format(
+        maxgroups, correlator.groups(), (stateSize(correlation.groups) + stateSize(correlation.buckets)) / 1e6, correlation.expired))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Benchmark: field name decisions of Elasticsearch backends
+
+import sys
+import time
+import argparse
+from fnmatch import fnmatch
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.backends.elasticsearch import ElasticsearchWildcardHandlingMixin
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.modifiers.type import SigmaRegularExpressionModifier
+from sigma.tools import loadYAML
+
+def legacyFieldNameMapping(self, fieldname, value, *agg_option):
+    """Previous implementation: match all patterns of all options with fnmatch for each map item"""
+    force_keyword_whitelist = False
+    force_keyword_blacklist = False
+    force_keyword_type = False
+    keyword_subfield_name = self.keyword_field
+    analyzed_subfield_name = self.analyzed_sub_field_name
+    if keyword_subfield_name == '':
+        force_keyword_type = True
+    elif len(self.keyword_base_fields) != 0 and any ([ fnmatch(fieldname, pattern) for pattern in self.keyword_base_fields ]):
+        keyword_subfield_name = ''
+    else:
+        keyword_subfield_name = '.%s'%keyword_subfield_name
+    if analyzed_subfield_name != '':
+        analyzed_subfield_name = '.%s'%analyzed_subfield_name
+    if agg_option:
+        force_keyword_type = True
+    if len(self.analyzed_sub_fields) != 0 and not any ([ fnmatch(fieldname, pattern) for pattern in self.analyzed_sub_fields ]):
+        force_keyword_type = True
+    if len(self.keyword_blacklist) != 0 and any ([ fnmatch(fieldname, pattern.strip()) for pattern in self.keyword_blacklist ]):
+        force_keyword_blacklist = True
+    elif len(self.keyword_whitelist) != 0 and any ([ fnmatch(fieldname, pattern.strip()) for pattern in self.keyword_whitelist ]):
+        force_keyword_whitelist = True
+    if not (len( self.case_insensitive_blacklist ) != 0 and any([ fnmatch( fieldname, pattern ) for pattern in self.case_insensitive_blacklist ])) and len( self.case_insensitive_whitelist ) != 0 and any([ fnmatch( fieldname, pattern ) for pattern in self.case_insensitive_whitelist ]):
+        self.CaseInSensitiveField = True
+    else:
+        self.CaseInSensitiveField = False
+    if force_keyword_blacklist:
+        self.matchKeyword = False
+        self.CaseInSensitiveField = False
+    elif force_keyword_whitelist:
+        self.matchKeyword = True
+        self.CaseInSensitiveField = False
+    elif force_keyword_type:
+        self.matchKeyword = True
+    elif self.CaseInSensitiveField:
+        self.matchKeyword = True
+    elif self.wildcard_use_keyword and ( (type(value) == list and any(map(self.containsWildcard, value))) or self.containsWildcard(value) ):
+        self.matchKeyword = True
+    elif isinstance(value, SigmaRegularExpressionModifier):
+        self.matchKeyword = True
+    else:
+        self.matchKeyword = False
+    if self.matchKeyword:
+        return '%s%s'%(fieldname, keyword_subfield_name)
+    else:
+        return '%s%s'%(fieldname, analyzed_subfield_name)
+
+def configFieldNames():
+    """Target field names of all configurations as long list of field names like used for ECS"""
+    fieldnames = set()
+    for path in (Path(__file__).parent.parent / "config").glob("*.yml"):
+        for target in (loadYAML(path.read_text(encoding="utf-8")) or {}).get("fieldmappings", {}).values():
+            if isinstance(target, str):
+                fieldnames.add(target)
+            elif isinstance(target, list):
+                fieldnames.update(t for t in target if isinstance(t, str))
+    return sorted(fieldnames)
+
+def measure(backend, parsers, repeat):
+    best = None
+    results = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        output = list()
+        for parser in parsers:
+            try:
+                output.append(backend.generate(parser))
+            except Exception as e:
+                output.append(type(e))
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+        results = output
+    return best, results
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure conversion of all Sigma rules below a directory with case_insensitive_whitelist=* and long field name pattern options.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: winlogbeat)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    scm = SigmaConfigurationManager()
+    config = SigmaConfigurationChain()
+    for name in args.config or [ "winlogbeat" ]:
+        config.append(scm.get(name))
+    fieldnames = configFieldNames()
+    options = {
+            "case_insensitive_whitelist": "*",
+            "case_insensitive_blacklist": ",".join(name for name in fieldnames if "hash" in name.lower()) + ",*.hash.*",
+            "keyword_base_fields": ",".join(fieldnames[::2]) + ",*.keyword",
+            "keyword_whitelist": ",".join(name + "*" for name in fieldnames[1::4]),
+            }
+    patterns = sum(value.count(",") + 1 for value in options.values())
+    backend = getBackend(args.target)(config, options)
+
+    parsers = list()
+    for path in sorted(Path(args.directory).glob("**/*.yml")):
+        try:
+            parsers.extend(SigmaCollectionParser(path.read_text(encoding="utf-8"), config).parsers)
+        except Exception:
+            pass
+
+    current, results = measure(backend, parsers, args.repeat)
+    with patch.object(ElasticsearchWildcardHandlingMixin, "fieldNameMapping", legacyFieldNameMapping):
+        legacy, legacyresults = measure(backend, parsers, args.repeat)
+    if results != legacyresults:
+        print("Warning: results differ from previous implementation")
+    print("{} rules with {} field name patterns: {:.3f}s (previous: {:.3f}s, speedup {:.1f}x)".format(
+        len(parsers), patterns, current, legacy, legacy / current))
+
+if __name__ == "__main__":
+    main()
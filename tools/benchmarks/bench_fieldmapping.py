@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Benchmark: field mapping lookups of configuration chains
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.config.mapping import FieldMapping, FieldMappingChain
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.tools import loadAllYAML
+
+def legacyGetFieldmapping(self, fieldname):
+    """Previous implementation: build field mapping chain for each lookup"""
+    if self:
+        fieldmappings = FieldMappingChain(fieldname)
+        for config in self:
+            fieldmappings.append(config)
+        return fieldmappings
+    else:
+        return FieldMapping(fieldname)
+
+def fieldnames(contents):
+    """Field names of detections in the order of their appearance"""
+    result = list()
+    for content in contents:
+        try:
+            for rule in loadAllYAML(content):
+                for definition in (rule or {}).get("detection", {}).values():
+                    for item in (definition if isinstance(definition, list) else [ definition ]):
+                        if isinstance(item, dict):
+                            result.extend(key.split("|")[0] for key in item)
+        except Exception:
+            pass
+    return result
+
+def measureLookups(config, names, repeat):
+    best = None
+    for i in range(repeat):
+        config.fieldmapping_resolver = None
+        start = time.perf_counter()
+        for name in names:
+            try:
+                config.get_fieldmapping(name)
+            except Exception:
+                pass
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+def measureParsing(config, contents, repeat):
+    best = None
+    for i in range(repeat):
+        config.fieldmapping_resolver = None
+        start = time.perf_counter()
+        for content in contents:
+            try:
+                SigmaCollectionParser(content, config)
+            except Exception:
+                pass
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure field mapping lookups with a chain of configurations for all Sigma rules below a directory.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: sysmon, windows-audit, winlogbeat-modules-enabled)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    scm = SigmaConfigurationManager()
+    config = SigmaConfigurationChain()
+    for name in args.config or [ "sysmon", "windows-audit", "winlogbeat-modules-enabled" ]:
+        config.append(scm.get(name))
+    getBackend(args.target)(config)
+
+    contents = [ path.read_text(encoding="utf-8") for path in sorted(Path(args.directory).glob("**/*.yml")) ]
+    names = fieldnames(contents)
+
+    lookups = measureLookups(config, names, args.repeat)
+    parsing = measureParsing(config, contents, args.repeat)
+    with patch.object(SigmaConfigurationChain, "get_fieldmapping", legacyGetFieldmapping):
+        legacyLookups = measureLookups(config, names, args.repeat)
+        legacyParsing = measureParsing(config, contents, args.repeat)
+    print("{} field name lookups: {:.4f}s (previous: {:.4f}s, speedup {:.1f}x)".format(len(names), lookups, legacyLookups, legacyLookups / lookups))
+    print("Parsing of {} files: {:.3f}s (previous: {:.3f}s, speedup {:.1f}x)".format(len(contents), parsing, legacyParsing, legacyParsing / parsing))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Benchmark: query generation from parsed Sigma rules
+
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import sigma
+from sigma.backends.base import BaseBackend
+from sigma.backends.discovery import getBackend
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.modifiers.base import SigmaTypeModifier
+
+def legacyApplyOverrides(self, query):
+    """Previous implementation: read overrides from configuration and apply them to each generated node"""
+    try:
+        if 'overrides' in self.sigmaconfig.config and isinstance(query, str):
+            for expression in self.sigmaconfig.config['overrides']:
+                if 'regexes' in expression:
+                    for x in expression['regexes']:
+                        sub = expression['field']
+                        value = expression['value']
+                        query = re.sub(x, self.mapExpression % (sub, value), query)
+                if 'literals' in expression:
+                    for x in expression['literals']:
+                        sub = expression['field']
+                        value = expression['value']
+                        query = query.replace(x, self.mapExpression % (sub, value))
+    except Exception:
+        pass
+    return query
+
+def legacyGenerateNode(self, node):
+    """Previous implementation: dispatch by chain of type comparisons"""
+    if type(node) == sigma.parser.condition.ConditionAND:
+        return self.applyOverrides(self.generateANDNode(node))
+    elif type(node) == sigma.parser.condition.ConditionOR:
+        return self.applyOverrides(self.generateORNode(node))
+    elif type(node) == sigma.parser.condition.ConditionNOT:
+        return self.applyOverrides(self.generateNOTNode(node))
+    elif type(node) == sigma.parser.condition.ConditionNULLValue:
+        return self.applyOverrides(self.generateNULLValueNode(node))
+    elif type(node) == sigma.parser.condition.ConditionNotNULLValue:
+        return self.applyOverrides(self.generateNotNULLValueNode(node))
+    elif type(node) == sigma.parser.condition.NodeSubexpression:
+        return self.applyOverrides(self.generateSubexpressionNode(node))
+    elif type(node) == tuple:
+        return self.applyOverrides(self.generateMapItemNode(node))
+    elif type(node) in (str, int):
+        return self.applyOverrides(self.generateValueNode(node))
+    elif type(node) == list:
+        return self.applyOverrides(self.generateListNode(node))
+    elif isinstance(node, SigmaTypeModifier):
+        return self.applyOverrides(self.generateTypedValueNode(node))
+    else:
+        raise TypeError("Node type %s was not expected in Sigma parse tree" % (str(type(node))))
+
+def measure(backend, parsers, repeat):
+    best = None
+    results = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        output = list()
+        for parser in parsers:
+            try:
+                output.append(backend.generate(parser))
+            except Exception as e:
+                output.append(type(e))
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+        results = output
+    return best, results
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure query generation from all Sigma rules below a directory.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: ecs-cloudtrail, which contains overrides)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    scm = SigmaConfigurationManager()
+    config = SigmaConfigurationChain()
+    for name in args.config or [ "ecs-cloudtrail" ]:
+        config.append(scm.get(name))
+    backend = getBackend(args.target)(config)
+
+    parsers = list()
+    for path in sorted(Path(args.directory).glob("**/*.yml")):
+        try:
+            parsers.extend(SigmaCollectionParser(path.read_text(encoding="utf-8"), config).parsers)
+        except Exception:
+            pass
+
+    current, results = measure(backend, parsers, args.repeat)
+    with patch.object(BaseBackend, "generateNode", legacyGenerateNode), patch.object(BaseBackend, "applyOverrides", legacyApplyOverrides):
+        legacy, legacyresults = measure(backend, parsers, args.repeat)
+    if results != legacyresults:
+        print("Warning: results differ from previous implementation")
+    print("{} rules: {:.3f}s (previous: {:.3f}s, speedup {:.1f}x)".format(len(parsers), current, legacy, legacy / current))
+
+if __name__ == "__main__":
+    main()
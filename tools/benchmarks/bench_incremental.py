@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Benchmark: incremental conversion after changes of a few Sigma rules
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.manifest import SigmaConversionManifest
+from sigma.sigmac import convert_input_targets, convert_incremental
+
+def convert(contents, target, config, statedir=None):
+    """Convert contents like sigmac, incrementally if a state directory is given. Returns results and finalized output."""
+    sigmaconfigs = SigmaConfigurationChain([ SigmaConfigurationManager().get(config) ])
+    backend_class = getBackend(target)
+    manifests = None
+    if statedir is not None:
+        manifests = [ SigmaConversionManifest(statedir, target, SigmaConversionManifest.fingerprint_of(backend_class, sigmaconfigs, {})) ]
+    targets = [ (sigmaconfigs, backend_class(sigmaconfigs, {})) ]
+    output = list()
+    states = list()
+    for path, content in contents:
+        if manifests is None:
+            output.extend(convert_input_targets(path, content, targets, [ [ 0 ] ], None)[0][0])
+        else:
+            results, state, error = convert_incremental(path, content, targets, [ [ 0 ] ], manifests, None)[0]
+            output.extend(results)
+            states.append(state)
+    for state in states:
+        targets[0][1].mergeState(state)
+    output.append("".join(targets[0][1].iterFinalize()))
+    if manifests is not None:
+        manifests[0].store()
+    return output
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure incremental conversion of all Sigma rules below a directory after changing some of them.")
+    argparser.add_argument("--target", "-t", action="append", help="Backends (default: es-qs and kibana)")
+    argparser.add_argument("--config", "-c", default="winlogbeat", help="Configuration (default: winlogbeat)")
+    argparser.add_argument("--changed", "-n", type=int, default=3, help="Number of changed files (default: 3)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    contents = [ (path, path.read_text(encoding="utf-8")) for path in sorted(Path(args.directory).glob("**/*.yml")) ]
+    changed = list(contents)
+    step = max(len(contents) // max(args.changed, 1), 1)
+    for i in range(0, min(args.changed * step, len(contents)), step):
+        path, content = changed[i]
+        changed[i] = (path, content + "\n# changed\n")
+
+    for target in args.target or [ "es-qs", "kibana" ]:
+        with tempfile.TemporaryDirectory() as statedir:
+            start = time.perf_counter()
+            initial = convert(contents, target, args.config, statedir)
+            initialtime = time.perf_counter() - start
+            start = time.perf_counter()
+            incremental = convert(changed, target, args.config, statedir)
+            incrementaltime = time.perf_counter() - start
+            statesize = sum(path.stat().st_size for path in Path(statedir).iterdir())
+        start = time.perf_counter()
+        full = convert(changed, target, args.config)
+        fulltime = time.perf_counter() - start
+        if incremental != full:
+            print("Warning: results of incremental and full conversion differ")
+        print("{:<8}: {} changed of {} files: {:.3f}s (full conversion: {:.2f}s, speedup {:.0f}x), initial run {:.2f}s, state {:.1f} MiB".format(
+            target, args.changed, len(contents), incrementaltime, fulltime, fulltime / incrementaltime, initialtime, statesize / 2**20))
+
+if __name__ == "__main__":
+    main()
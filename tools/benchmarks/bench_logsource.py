@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Benchmark: log source lookups of configurations
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.configuration import SigmaConfiguration, SigmaConfigurationChain, SigmaLogsourceConfiguration
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.condition import ConditionAND, ConditionOR
+from sigma.parser.rule import SigmaParser
+
+def legacyChainGetLogsource(self, category, product, service):
+    """Previous implementation: match each log source definition of each configuration"""
+    matching = list()
+    for config in self:
+        for logsource in config.logsources:
+            if logsource.matches(category, product, service):
+                matching.append(logsource)
+                if logsource.rewrite is not None:
+                    category, product, service = logsource.rewrite
+    return SigmaLogsourceConfiguration(matching, self.defaultindex)
+
+def legacyGetLogsource(self, category, product, service):
+    matching = [logsource for logsource in self.logsources if logsource.matches(category, product, service)]
+    return SigmaLogsourceConfiguration(matching, self.defaultindex)
+
+def legacyGetLogsourceCondition(self):
+    """Previous implementation: build log source condition on each call"""
+    logsource = self.get_logsource()
+    if logsource is None:
+        return None
+    cond = ConditionAND()
+    if self.config.get_logsourcemerging() == 'or':
+        cond.add(self.build_conditions(ConditionOR,  logsource.conditions))
+    else:
+        cond.add(self.build_conditions(ConditionAND, logsource.conditions))
+    index_field = self.config.get_indexfield()
+    indices = logsource.index
+    if len(indices) > 0 and index_field is not None:
+        if len(indices) > 1:
+            index_cond = ConditionOR()
+            for index in indices:
+                index_cond.add((index_field, index))
+            cond.add(index_cond)
+        else:
+            cond.add((index_field, indices[0]))
+    return cond
+
+def measure(parsers, lookups, repeat):
+    """Log source and log source condition lookups like in parsing of conditions and generation of queries"""
+    best = None
+    for i in range(repeat):
+        for parser in parsers:
+            parser.logsource_condition = None
+        start = time.perf_counter()
+        for parser in parsers:
+            for j in range(lookups):
+                try:
+                    parser.get_logsource()
+                    parser.get_logsource_condition()
+                except Exception:
+                    pass
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure log source lookups with a chain of configurations for all Sigma rules below a directory.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--lookups", "-l", type=int, default=3, help="Lookups per rule (default: 3)")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: sysmon, ecs-zeek-corelight)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    scm = SigmaConfigurationManager()
+    config = SigmaConfigurationChain()
+    for name in args.config or [ "sysmon", "ecs-zeek-corelight" ]:
+        config.append(scm.get(name))
+    getBackend(args.target)(config)
+
+    parsers = list()
+    for path in sorted(Path(args.directory).glob("**/*.yml")):
+        try:
+            parsers.extend(SigmaCollectionParser(path.read_text(encoding="utf-8"), config).parsers)
+        except Exception:
+            pass
+
+    current = measure(parsers, args.lookups, args.repeat)
+    with patch.object(SigmaConfigurationChain, "get_logsource", legacyChainGetLogsource), \
+            patch.object(SigmaConfiguration, "get_logsource", legacyGetLogsource), \
+            patch.object(SigmaParser, "get_logsource_condition", legacyGetLogsourceCondition):
+        legacy = measure(parsers, args.lookups, args.repeat)
+    print("{} rules with {} configurations and {} log source definitions: {:.4f}s (previous: {:.4f}s, speedup {:.1f}x)".format(
+        len(parsers), len(config), sum(len(conf.logsources) for conf in config), current, legacy, legacy / current))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# Benchmark: memory footprint of parsed Sigma rules
+
+import gc
+import sys
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.condition import ParseTreeNode
+
+chains = (
+        ("es-qs", [ "winlogbeat" ]),
+        ("es-qs", [ "winlogbeat-modules-enabled" ]),
+        ("splunk", [ "sysmon", "splunk-windows" ]),
+        ("qradar", [ "qradar" ]),
+        )
+
+def countNodes(tree):
+    count = 0
+    stack = [ tree ]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ParseTreeNode):
+            count += 1
+            if isinstance(node.items, (list, tuple)):
+                stack.extend(node.items)
+            else:
+                stack.append(node.items)
+    return count
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure memory retained by parse trees of all Sigma rules below a directory parsed with multiple configuration chains.")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    contents = [ path.read_text(encoding="utf-8") for path in sorted(Path(args.directory).glob("**/*.yml")) ]
+    scm = SigmaConfigurationManager()
+    configs = list()
+    for target, names in chains:
+        config = SigmaConfigurationChain()
+        for name in names:
+            config.append(scm.get(name))
+        getBackend(target)(config)
+        configs.append(config)
+
+    gc.collect()
+    tracemalloc.start()
+    trees = list()
+    for config in configs:
+        for content in contents:
+            try:
+                parsers = SigmaCollectionParser(content, config).parsers
+            except Exception:
+                continue
+            trees.extend(condparsed.parsedSearch for parser in parsers for condparsed in parser.condparsed)
+            del parsers
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = sum(countNodes(tree) for tree in trees)
+    print("{} files with {} configuration chains: {} parse trees with {} nodes".format(len(contents), len(configs), len(trees), nodes))
+    print("Retained by parse trees: {:.1f} MiB ({:.0f} bytes per tree)".format(size / 2**20, size / len(trees)))
+
+if __name__ == "__main__":
+    main()
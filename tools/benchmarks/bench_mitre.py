@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Benchmark: MITRE ATT&CK lookups of rule backends
+
+import sys
+import time
+import json
+import argparse
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.elasticsearch import ElasticSearchRuleBackend
+from sigma.backends.mitre import AttackCatalog, default_path
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.tools import loadAllYAML
+
+def legacyInit(self, *args, **kwargs):
+    """Previous implementation: load ATT&CK files for each backend instance"""
+    super(ElasticSearchRuleBackend, self).__init__(*args, **kwargs)
+    self.uuid_black_list = []
+    self.tactics = AttackCatalog.load_file(default_path, "tactics")
+    self.techniques = AttackCatalog.load_file(default_path, "techniques")
+    self.rule_type = "query"
+    self.rule_threshold = {}
+
+def legacyFindTactics(self, key_name=None, key_id=None):
+    """Previous implementation: scan tactic list"""
+    for tactic in self.tactics:
+        if key_name and key_name == tactic.get("tactic", ""):
+            return tactic
+        if key_id and key_id == tactic.get("external_id", ""):
+            return tactic
+
+def legacyFindTechnique(self, key_id=None):
+    """Previous implementation: scan technique list"""
+    for technique in self.techniques:
+        if key_id and key_id == technique.get("technique_id", ""):
+            return technique
+
+def measure(config, rules, backends, repeat):
+    """Create backends and rule descriptions of all rules distributed over the backends like multiple sigmac runs"""
+    best = None
+    results = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        output = list()
+        for j in range(backends):
+            backend = ElasticSearchRuleBackend(config)
+            for rule in rules[j::backends]:
+                output.append(json.loads(backend.create_rule(dict(rule, translation=""), [ "winlogbeat-*" ]))["threat"])
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+        results = output
+    return best, results
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure ATT&CK lookups of es-rule for the tags of all Sigma rules below a directory.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--backends", "-b", type=int, default=10, help="Number of backend instances the rules are distributed to (default: 10)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    config = SigmaConfigurationChain([ SigmaConfigurationManager().get("winlogbeat") ])
+    rules = list()
+    for path in sorted(Path(args.directory).glob("**/*.yml")):
+        try:
+            rules.extend(rule for rule in loadAllYAML(path.read_text(encoding="utf-8")) if rule and "tags" in rule)
+        except Exception:
+            pass
+
+    current, results = measure(config, rules, args.backends, args.repeat)
+    with patch.object(ElasticSearchRuleBackend, "__init__", legacyInit), \
+            patch.object(ElasticSearchRuleBackend, "find_tactics", legacyFindTactics), \
+            patch.object(ElasticSearchRuleBackend, "find_technique", legacyFindTechnique):
+        legacy, legacyresults = measure(config, rules, args.backends, args.repeat)
+    if json.dumps(results) != json.dumps(legacyresults):
+        print("Warning: results differ from previous implementation")
+    print("{} tags of {} rules with {} backend instances: {:.3f}s (previous: {:.3f}s, speedup {:.1f}x)".format(
+        sum(len(rule["tags"]) for rule in rules), len(rules), args.backends, current, legacy, legacy / current))
+
+if __name__ == "__main__":
+    main()
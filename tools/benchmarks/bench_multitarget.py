@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Benchmark: conversion of Sigma rules for multiple targets in one run
+
+import io
+import sys
+import copy
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.sigmac import convert_input, convert_input_targets
+
+default_targets = [ "es-qs:winlogbeat", "kibana:winlogbeat", "xpack-watcher:winlogbeat", "splunk:sysmon,splunk-windows", "splunkxml:sysmon,splunk-windows", "sqlite:sysmon" ]
+
+def instantiate(scm, targets):
+    """Create backends with own copies of the configurations like sigmac"""
+    instances = list()
+    groups = dict()
+    for i, (target, configs) in enumerate(targets):
+        sigmaconfigs = SigmaConfigurationChain([ copy.deepcopy(scm.get(config)) for config in configs ])
+        backend_class = getBackend(target)
+        instances.append((sigmaconfigs, backend_class(sigmaconfigs, {})))
+        groups.setdefault((tuple(configs), backend_class.index_field), []).append(i)
+    return instances, list(groups.values())
+
+def measure(scm, targets, contents, combined):
+    """Convert all contents for all targets, either target by target like separate sigmac runs or combined"""
+    instances, groups = instantiate(scm, targets)
+    results = [ list() for target in targets ]
+    start = time.perf_counter()
+    if combined:
+        for path, content in contents:
+            for targetresults, (outcome, error) in zip(results, convert_input_targets(path, io.StringIO(content), instances, groups, None)):
+                targetresults.extend(outcome)
+    else:
+        for targetresults, (sigmaconfigs, backend) in zip(results, instances):
+            for path, content in contents:
+                targetresults.extend(convert_input(path, io.StringIO(content), sigmaconfigs, None, backend)[0])
+    return time.perf_counter() - start, results
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure conversion of all Sigma rules below a directory for multiple targets in one run and target by target.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--target", "-t", action="append", help="Target as backend:config,... (default: {})".format(" ".join(default_targets)))
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    targets = list()
+    for target in args.target or default_targets:
+        backend, configs = target.split(":", 1)
+        targets.append((backend, configs.split(",")))
+    contents = [ (path, path.read_text(encoding="utf-8")) for path in sorted(Path(args.directory).glob("**/*.yml")) ]
+
+    scm = SigmaConfigurationManager()
+    measurements = dict()
+    for combined in (True, False):
+        best = None
+        for i in range(args.repeat):
+            duration, results = measure(scm, targets, contents, combined)
+            best = duration if best is None else min(best, duration)
+        measurements[combined] = (best, results)
+    combined, separate = measurements[True], measurements[False]
+    if combined[1] != separate[1]:
+        print("Warning: results of combined and separate conversion differ")
+    print("{} files for {} targets with {} configuration chains: {:.2f}s (separate: {:.2f}s, speedup {:.1f}x)".format(
+        len(contents), len(targets), len(instantiate(scm, targets)[1]), combined[0], separate[0], separate[0] / combined[0]))
+
+if __name__ == "__main__":
+    main()
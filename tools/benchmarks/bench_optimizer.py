@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# Benchmark: optimization of condition parse trees
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.parser.condition import SigmaConditionOptimizer, ConditionAND, ConditionOR, ConditionNOT, ConditionNULLValue, ConditionNotNULLValue, NodeSubexpression
+
+class LegacyConditionOptimizer:
+    """Previous implementation: optimize from the root until the tree doesn't change anymore"""
+    def _stripSubexpressionNode(self, node):
+        if type(node) == NodeSubexpression:
+            return self._stripSubexpressionNode(node.items)
+        if hasattr(node, 'items') and type(node) is not ConditionNOT:
+            node.items = list(map(self._stripSubexpressionNode, node.items))
+        return node
+
+    def _unstripSubexpressionNode(self, node):
+        if type(node) in (ConditionAND, ConditionOR):
+            newnode = NodeSubexpression(node)
+            node.items = list(map(self._unstripSubexpressionNode, node.items))
+            return newnode
+        return node
+
+    def _ordered_uniq(self, l):
+        seen = set()
+        uniq = []
+        for x in l:
+            if type(x) == tuple and type(x[1]) == list:
+                x = (x[0], tuple(x[1]))
+            if x not in seen and not seen.add(x):
+                uniq.append(x)
+        out = []
+        for x in uniq:
+            if type(x) == tuple and type(x[1]) == tuple:
+                out.append((x[0], list(x[1])))
+            else:
+                out.append(x)
+        return out
+
+    def _optimizeNode(self, node, changes=False):
+        if type(node) in (ConditionOR, ConditionAND):
+            if len(node.items) == 0:
+                return None, True
+            if None in node.items:
+                node.items = [item for item in node.items if item != None]
+                return self._optimizeNode(node, changes=True)
+            if len(node.items) == 1:
+                return self._optimizeNode(node.items[0], changes=True)
+            uniq_items = self._ordered_uniq(node.items)
+            if len(uniq_items) < len(node.items):
+                node.items = uniq_items
+                return self._optimizeNode(node, changes=True)
+            if any(type(child) == type(node) for child in node.items) and \
+               all(type(child) in (type(node), tuple) for child in node.items):
+                newitems = []
+                for child in node.items:
+                    if hasattr(child, 'items'):
+                        newitems.extend(child.items)
+                    else:
+                        newitems.append(child)
+                node.items = newitems
+                return self._optimizeNode(node, changes=True)
+            othertype = ConditionAND if type(node) == ConditionOR else ConditionOR
+            if all(type(child) == othertype for child in node.items):
+                promoted = []
+                for cand in node.items[0]:
+                    if all(cand in child for child in node.items[1:]):
+                        promoted.append(cand)
+                if len(promoted) > 0:
+                    for child in node.items:
+                        for cand in promoted:
+                            if cand in child.items:
+                                child.items.remove(cand)
+                    newnode = othertype()
+                    newnode.items = promoted
+                    newnode.add(node)
+                    return self._optimizeNode(newnode, changes=True)
+        elif type(node) == ConditionNOT:
+            if type(node.items[0]) == ConditionNOT:
+                return self._optimizeNode(node.items[0].items[0], changes=True)
+            if type(node.items[0]) == ConditionNULLValue:
+                return self._optimizeNode(ConditionNotNULLValue(val=node.items[0].items[0]), changes=True)
+            if type(node.items[0]) == ConditionNotNULLValue:
+                return self._optimizeNode(ConditionNULLValue(val=node.items[0].items[0]), changes=True)
+        else:
+            return node, changes
+
+        itemresults = [self._optimizeNode(item, changes) for item in node.items]
+        node.items = [res[0] for res in itemresults]
+        if any(res[1] for res in itemresults):
+            changes = True
+        return node, changes
+
+    def optimizeTree(self, tree):
+        tree = self._stripSubexpressionNode(tree)
+        changes = True
+        while changes:
+            tree, changes = self._optimizeNode(tree)
+        return self._unstripSubexpressionNode(tree)
+
+def node(nodetype, items):
+    result = nodetype()
+    result.items = list(items)
+    return NodeSubexpression(result)
+
+def alternativesTree(leaves, rand):
+    """OR of selections with a common EventID, like rules with many alternative detections"""
+    selections = list()
+    while sum(len(selection) for selection in selections) < leaves:
+        selections.append([ ("EventID", 1) ] + [ ("Field%d" % rand.randrange(20), "value%d" % rand.randrange(leaves)) for i in range(4) ])
+    return node(ConditionOR, [ node(ConditionAND, selection) for selection in selections ])
+
+def mapItemsTree(leaves, rand):
+    """OR of map items with list values and duplicates, like long lists of indicators"""
+    return node(ConditionAND, [
+        ("EventID", 1),
+        node(ConditionOR, [ ("Image", [ "*\\image%d.exe" % rand.randrange(leaves // 2) ]) for i in range(leaves - 1) ]),
+        ])
+
+def nestedTree(leaves, rand):
+    """Balanced tree of alternating AND and OR nodes with repeated subtrees"""
+    def build(size, nodetype):
+        if size <= 4:
+            return node(nodetype, [ ("Field%d" % rand.randrange(8), "value%d" % rand.randrange(8)) for i in range(size) ])
+        othertype = ConditionOR if nodetype == ConditionAND else ConditionAND
+        return node(nodetype, [ build(size // 4, othertype) for i in range(4) ])
+    return build(leaves, ConditionOR)
+
+def chainTree(leaves, rand):
+    """Left-nested chain like parsed from conditions like 'selection1 or selection2 or ...'"""
+    tree = node(ConditionAND, [ ("Image", [ "*\\image0.exe" ]) ])
+    for i in range(1, leaves):
+        tree = node(ConditionOR, [ tree, node(ConditionAND, [ ("Image", [ "*\\image%d.exe" % rand.randrange(leaves) ]) ]) ])
+    return tree
+
+def measure(optimizer, generator, leaves, repeat):
+    best = None
+    for i in range(repeat):
+        tree = generator(leaves, random.Random(i))
+        start = time.perf_counter()
+        try:
+            optimizer().optimizeTree(tree)
+        except RecursionError:
+            return None
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure optimization of condition parse trees.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("--leaves", "-l", type=int, default=5000, help="Number of leaves of generated trees")
+    args = argparser.parse_args()
+
+    for description, generator in (
+            ("alternative selections", alternativesTree),
+            ("map items with duplicates", mapItemsTree),
+            ("nested AND/OR", nestedTree),
+            ("chain of selections", chainTree),
+            ):
+        legacy = measure(LegacyConditionOptimizer, generator, args.leaves, args.repeat)
+        current = measure(SigmaConditionOptimizer, generator, args.leaves, args.repeat)
+        if legacy is None:
+            print("{} with {} leaves: {:.4f}s (previous: recursion limit exceeded)".format(description, args.leaves, current))
+        else:
+            print("{} with {} leaves: {:.4f}s (previous: {:.4f}s, speedup {:.1f}x)".format(description, args.leaves, current, legacy, legacy / current))
+
+if __name__ == "__main__":
+    main()
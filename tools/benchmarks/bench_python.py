@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# Benchmark: matching of synthetic Sysmon events by matchers of the python backend
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.python import PythonBackend
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.configuration import SigmaConfigurationChain
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.exceptions import SigmaParseError
+
+configdir = str(Path(__file__).parent.parent / "config")
+
+images = [ "C:\\Windows\\System32\\cmd.exe", "C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe", "C:\\Windows\\explorer.exe",
+        "C:\\Windows\\System32\\svchost.exe", "C:\\Program Files\\Mozilla Firefox\\firefox.exe", "C:\\Windows\\System32\\rundll32.exe",
+        "C:\\Windows\\System32\\wbem\\WmiPrvSE.exe", "C:\\Users\\alice\\AppData\\Local\\Temp\\setup.exe", "C:\\Windows\\System32\\schtasks.exe" ]
+arguments = [ "", " /c whoami", " -NoProfile -ExecutionPolicy Bypass -File C:\\Scripts\\backup.ps1", " /S /D /c \"echo 1\"", " --type=renderer --lang=en-US",
+        " -k netsvcs -p -s Schedule", " /create /tn Update /tr C:\\Temp\\u.exe /sc daily", " C:\\Windows\\System32\\shell32.dll,Control_RunDLL" ]
+users = [ "CORP\\alice", "CORP\\bob", "NT AUTHORITY\\SYSTEM", "NT AUTHORITY\\NETWORK SERVICE" ]
+files = [ "C:\\Users\\alice\\Documents\\report.docx", "C:\\Windows\\Temp\\x.tmp", "C:\\Users\\bob\\AppData\\Roaming\\Microsoft\\Windows\\Start Menu\\Programs\\Startup\\a.lnk",
+        "C:\\ProgramData\\update.dll", "C:\\Windows\\System32\\drivers\\etc\\hosts" ]
+keys = [ "HKLM\\SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Run\\Updater", "HKU\\S-1-5-21-1\\Software\\Classes\\ms-settings\\shell\\open\\command",
+        "HKLM\\System\\CurrentControlSet\\Services\\Spooler\\ImagePath", "HKLM\\SOFTWARE\\Policies\\Microsoft\\Windows Defender\\DisableAntiSpyware" ]
+domains = [ "www.example.com", "update.microsoft.com", "raw.githubusercontent.com", "a1b2c3d4.ngrok.io", "login.live.com" ]
+
+def synthetic_events(count, seed=0):
+    """Generate Sysmon-shaped events: process creations, network connections, image loads, file creations, registry and DNS events"""
+    rnd = random.Random(seed)
+    events = list()
+    for i in range(count):
+        image = rnd.choice(images)
+        event = { "EventID": rnd.choice([ 1, 1, 1, 3, 7, 11, 13, 22 ]), "Image": image, "ProcessId": rnd.randrange(100, 10000),
+                "User": rnd.choice(users), "Computer": "ws%03d.corp.local" % rnd.randrange(200), "UtcTime": "2019-10-%02d 12:00:00.000" % rnd.randrange(1, 31) }
+        if event["EventID"] == 1:
+            parent = rnd.choice(images)
+            event.update({ "CommandLine": "\"%s\"%s" % (image, rnd.choice(arguments)), "ParentImage": parent, "ParentCommandLine": parent,
+                "CurrentDirectory": "C:\\Windows\\system32\\", "IntegrityLevel": rnd.choice([ "Medium", "High", "System" ]),
+                "Hashes": "SHA1=%040x,MD5=%032x" % (rnd.getrandbits(160), rnd.getrandbits(128)), "OriginalFileName": image.rsplit("\\", 1)[1].upper() })
+        elif event["EventID"] == 3:
+            event.update({ "DestinationIp": "10.%d.%d.%d" % (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)),
+                "DestinationPort": rnd.choice([ 80, 443, 445, 3389, 4444 ]), "DestinationHostname": rnd.choice(domains), "Initiated": "true" })
+        elif event["EventID"] == 7:
+            event.update({ "ImageLoaded": rnd.choice([ "C:\\Windows\\System32\\ntdll.dll", "C:\\Windows\\System32\\wbem\\wbemcomn.dll", "C:\\ProgramData\\update.dll" ]),
+                "Signed": rnd.choice([ "true", "false" ]) })
+        elif event["EventID"] == 11:
+            event["TargetFilename"] = rnd.choice(files)
+        elif event["EventID"] == 13:
+            event.update({ "EventType": "SetValue", "TargetObject": rnd.choice(keys), "Details": rnd.choice([ "DWORD (0x00000001)", "C:\\Temp\\u.exe" ]) })
+        else:
+            event.update({ "QueryName": rnd.choice(domains), "QueryStatus": "0" })
+        events.append(event)
+    return events
+
+def load_matchers(directory, configs):
+    """Compile matchers of all rules without aggregations, returns list of (title, matcher) and the compile time"""
+    scm = SigmaConfigurationManager([ configdir ])
+    sigmaconfig = SigmaConfigurationChain([ scm.get(config) for config in configs ])
+    backend = PythonBackend(sigmaconfig)
+    matchers = list()
+    duration = 0
+    for path in sorted(Path(directory).glob("**/*.yml")):
+        try:
+            parsers = SigmaCollectionParser(path.read_text(encoding="utf-8"), sigmaconfig).parsers
+        except SigmaParseError:
+            continue
+        for parser in parsers:
+            start = time.perf_counter()
+            try:
+                matcher = backend.generateMatcher(parser)
+            except NotImplementedError:
+                continue
+            duration += time.perf_counter() - start
+            matchers.append((parser.parsedyaml.get("title"), matcher))
+    return matchers, duration
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure events per second of python backend matchers on synthetic Sysmon events, per rule and for all rules.")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: sysmon)")
+    argparser.add_argument("--events", "-e", type=int, default=10000, help="Number of synthetic events (default: 10000)")
+    argparser.add_argument("--slowest", "-s", type=int, default=5, help="Number of slowest rules that are listed (default: 5)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    matchers, compiletime = load_matchers(args.directory, args.config or [ "sysmon" ])
+    events = synthetic_events(args.events)
+
+    rates = list()
+    for title, match in matchers:
+        start = time.perf_counter()
+        for event in events:
+            match(event)
+        rates.append((len(events) / (time.perf_counter() - start), title))
+
+    start = time.perf_counter()
+    matches = 0
+    for event in events:
+        for title, match in matchers:
+            if match(event):
+                matches += 1
+    corpustime = time.perf_counter() - start
+
+    print("{} rules compiled in {:.0f}ms ({:.2f}ms/rule)".format(len(matchers), compiletime * 1000, compiletime * 1000 / len(matchers)))
+    print("Per rule: median {:.0f} events/s, min {:.0f} events/s, max {:.0f} events/s".format(
+        statistics.median(rate for rate, title in rates), min(rates)[0], max(rates)[0]))
+    print("All rules: {:.0f} events/s ({:.2f}µs/event/rule), {} matches in {} events".format(
+        len(events) / corpustime, corpustime * 1e6 / len(events) / len(matchers), matches, len(events)))
+    for rate, title in sorted(rates)[:args.slowest]:
+        print("  {:.0f} events/s: {}".format(rate, title))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Benchmark: matching of synthetic Sysmon events by a rule set with shared predicates and by one matcher per rule
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.python import PythonBackend
+from sigma.backends.ruleset import RuleSet
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.configuration import SigmaConfigurationChain
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.exceptions import SigmaParseError
+from sigma.parser.rule import SigmaParser
+from bench_python import synthetic_events
+
+configdir = str(Path(__file__).parent.parent / "config")
+words = [ "update", "svc", "temp", "backup", "agent", "helper", "loader", "sync", "host", "task", "invoke", "dump", "shell", "remote", "cache" ]
+
+def corpus_rules(directory):
+    """Rule YAMLs of directory without aggregations"""
+    rules = list()
+    for path in sorted(Path(directory).glob("**/*.yml")):
+        try:
+            parsers = SigmaCollectionParser(path.read_text(encoding="utf-8")).parsers
+        except SigmaParseError:
+            continue
+        rules += [ parser.parsedyaml for parser in parsers if not any(parsed.parsedAgg for parsed in parser.condparsed) ]
+    return rules
+
+def synthetic_rule(rnd, number):
+    """Process creation rule shaped like the rules of the corpus with literals that rarely match"""
+    selection = { "Image|endswith": [ "\\%s%d.exe" % (rnd.choice(words), rnd.randrange(number + 1)) for i in range(rnd.randrange(1, 4)) ] }
+    if rnd.random() < 0.7:
+        selection["CommandLine|contains"] = [ " -%s%d" % (rnd.choice(words), number) for i in range(rnd.randrange(1, 4)) ]
+    detection = { "selection": selection, "condition": "selection" }
+    if rnd.random() < 0.3:
+        detection["filter"] = { "ParentImage|startswith": "C:\\Program Files\\%s\\" % rnd.choice(words) }
+        detection["condition"] = "selection and not filter"
+    return { "title": "Synthetic rule %d" % number, "id": "synthetic-%d" % number, "logsource": { "category": "process_creation", "product": "windows" }, "detection": detection }
+
+def load(rules, configs):
+    """Rule set and per-rule matchers of rules, each with own configurations"""
+    scm = SigmaConfigurationManager([ configdir ])
+    rulesetconfig = SigmaConfigurationChain([ scm.get(config) for config in configs ])
+    ruleset = RuleSet(rulesetconfig)
+    matcherconfig = SigmaConfigurationChain([ SigmaConfigurationManager([ configdir ]).get(config) for config in configs ])
+    backend = PythonBackend(matcherconfig)
+    start = time.perf_counter()
+    for number, rule in enumerate(rules):
+        ruleset.add(SigmaParser(rule, rulesetconfig), number)
+    buildtime = time.perf_counter() - start
+    matchers = [ (number, backend.generateMatcher(SigmaParser(rule, matcherconfig))) for number, rule in enumerate(rules) ]
+    return ruleset, matchers, buildtime
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure events per second of a rule set with shared predicates and of one matcher per rule for growing numbers of rules.")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: sysmon)")
+    argparser.add_argument("--events", "-e", type=int, default=2000, help="Number of synthetic events (default: 2000)")
+    argparser.add_argument("--rules", "-r", type=int, action="append", help="Numbers of rules, filled up with synthetic rules (default: 100, 1000, 10000)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    corpus = corpus_rules(args.directory)
+    events = synthetic_events(args.events)
+    rnd = random.Random(0)
+    for count in args.rules or [ 100, 1000, 10000 ]:
+        rules = corpus[:count] + [ synthetic_rule(rnd, number) for number in range(count - len(corpus)) ]
+        ruleset, matchers, buildtime = load(rules, args.config or [ "sysmon" ])
+
+        start = time.perf_counter()
+        results = [ ruleset.match(event) for event in events ]
+        rulesettime = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = [ [ number for number, match in matchers if match(event) ] for event in events ]
+        matchertime = time.perf_counter() - start
+
+        if results != expected:
+            print("Warning: results of rule set and per-rule matchers differ")
+        print("{:5d} rules: rule set {:.0f} events/s (built in {:.0f}ms), per-rule matchers {:.0f} events/s, speedup {:.1f}x, {} matches".format(
+            len(rules), len(events) / rulesettime, buildtime * 1000, len(events) / matchertime, matchertime / rulesettime, sum(len(result) for result in results)))
+
+if __name__ == "__main__":
+    main()
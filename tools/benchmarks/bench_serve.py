@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Benchmark: load test of the sigmac conversion server against one sigmac process per rule
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+tools = Path(__file__).parent.parent
+env = dict(os.environ, PYTHONPATH=str(tools))
+
+def sigmac_output(response):
+    """Output of sigmac for the response of a conversion"""
+    output = "".join(result + "\n" for result in response["results"])
+    if response["finalized"] is not None:
+        output += response["finalized"] + "\n"
+    return output
+
+def serve():
+    """Start conversion server on a free port, returns the process and the address"""
+    server = subprocess.Popen([ sys.executable, str(tools / "sigmac"), "--serve", "127.0.0.1:0" ], env=env, stderr=subprocess.PIPE, universal_newlines=True)
+    host, port = server.stderr.readline().split()[-1].rsplit(":", 1)
+    return server, (host, int(port))
+
+def measure_server(address, requests, clients):
+    """Post requests from concurrent clients, each with an own connection. Returns duration and outputs."""
+    local = threading.local()
+
+    def post(request):
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection(*address)
+        local.connection.request("POST", "/convert", json.dumps(request).encode("utf-8"), { "Content-Type": "application/json" })
+        response = local.connection.getresponse()
+        body = json.loads(response.read().decode("utf-8"))
+        return sigmac_output(body) if response.status == 200 else None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        outputs = list(executor.map(post, requests))
+    return time.perf_counter() - start, outputs
+
+def measure_processes(paths, target, configs, clients):
+    """Convert each rule with an own sigmac process, concurrently like the clients. Returns duration and outputs."""
+    args = [ sys.executable, str(tools / "sigmac"), "--no-cache", "-t", target ]
+    for config in configs:
+        args += [ "-c", config ]
+
+    def convert(path):
+        process = subprocess.run(args + [ str(path) ], env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        return process.stdout if process.returncode == 0 else None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        outputs = list(executor.map(convert, paths))
+    return time.perf_counter() - start, outputs
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure requests per second of the sigmac conversion server with concurrent clients and of one sigmac process per rule.")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: winlogbeat)")
+    argparser.add_argument("--clients", "-n", type=int, default=4, help="Number of concurrent clients (default: 4)")
+    argparser.add_argument("--requests", "-r", type=int, default=2000, help="Number of requests posted to the server (default: 2000)")
+    argparser.add_argument("--processes", "-p", type=int, default=40, help="Number of rules converted by own sigmac processes (default: 40)")
+    argparser.add_argument("directory", nargs="?", default=str(tools.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+    configs = args.config or [ "winlogbeat" ]
+
+    paths = sorted(Path(args.directory).glob("**/*.yml"))
+    contents = [ path.read_text(encoding="utf-8") for path in paths ]
+    requests = [ { "rule": contents[i % len(contents)], "target": args.target, "config": configs, "name": str(paths[i % len(paths)]) } for i in range(args.requests) ]
+
+    server, address = serve()
+    try:
+        measure_server(address, requests[:args.clients * 10], args.clients)       # warm up
+        serverduration, serveroutputs = measure_server(address, requests, args.clients)
+    finally:
+        server.terminate()
+        server.wait()
+    processduration, processoutputs = measure_processes(paths[:args.processes], args.target, configs, args.clients)
+
+    if serveroutputs[:args.processes] != processoutputs:
+        print("Warning: results of server and sigmac processes differ")
+    serverrate = len(requests) / serverduration
+    processrate = len(processoutputs) / processduration
+    print("{} with {} clients: server {:.0f} requests/s, sigmac process per rule {:.1f} requests/s (speedup {:.0f}x)".format(
+        args.target, args.clients, serverrate, processrate, serverrate / processrate))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# Benchmark: lazy conversion of a Sigma file containing many rules
+
+import re
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.backends.discovery import getBackend
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.parser.cache import SigmaParseCache
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.tools import loadAllYAML
+
+def bundle(directory, config, target):
+    """Sigma files below directory that can be converted as one file, global parts are reset after each file"""
+    backend = getBackend(target)(config)
+    contents = list()
+    for path in sorted(Path(directory).glob("**/*.yml")):
+        content = path.read_text(encoding="utf-8")
+        try:
+            list(SigmaCollectionParser(content, config).generate(backend))
+            if None not in loadAllYAML(content):        # empty documents would become rules in the bundle
+                contents.append(re.sub(r"^\s*---[^\n]*\n", "", content))    # starting document marker would add an empty document
+        except Exception:
+            pass
+    return "\n---\naction: reset\n---\n".join(contents)
+
+def measure(content, config, target, cache, lazy, trace=False):
+    """Convert like sigmac, return time until first result, total time, peak of allocated memory if traced and results"""
+    backend = getBackend(target)(config)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    results = list()
+    for result in SigmaCollectionParser(content, config, None, cache, lazy).generate(backend):
+        if first is None:
+            first = time.perf_counter() - start
+        results.append(result)
+    total = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return first, total, peak, results
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure conversion of all Sigma rules below a directory bundled into one file with lazy and eager parsing.")
+    argparser.add_argument("--target", "-t", default="es-qs", help="Backend (default: es-qs)")
+    argparser.add_argument("--config", "-c", action="append", help="Configurations (default: winlogbeat)")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    scm = SigmaConfigurationManager()
+    config = SigmaConfigurationChain()
+    for name in args.config or [ "winlogbeat" ]:
+        config.append(scm.get(name))
+    content = bundle(args.directory, config, args.target)
+
+    with tempfile.TemporaryDirectory() as cachedir:
+        cache = SigmaParseCache(cachedir)
+        def store():
+            cache.clear()
+            SigmaCollectionParser(content, config, None, cache)
+        scenarios = (
+                ("without cache", None, lambda: None),
+                ("storing in cache", cache, cache.clear),
+                ("loading from cache", cache, store),
+                )
+        for description, usedcache, setup in scenarios:
+            measurements = dict()
+            for lazyparsing in (True, False):
+                setup()
+                first, total, peak, results = measure(content, config, args.target, usedcache, lazyparsing)
+                setup()
+                peak = measure(content, config, args.target, usedcache, lazyparsing, True)[2]   # tracing slows down conversion
+                measurements[lazyparsing] = (first, total, peak, results)
+            lazy, eager = measurements[True], measurements[False]
+            if lazy[3] != eager[3]:
+                print("Warning: results of lazy and eager parsing differ")
+            print("{:<20}: first result after {:.3f}s (eager: {:.3f}s), total {:.2f}s (eager: {:.2f}s), peak memory {:.1f} MiB (eager: {:.1f} MiB)".format(
+                description, lazy[0], eager[0], lazy[1], eager[1], lazy[2] / 2**20, eager[2] / 2**20))
+        print("{} results of one file with {} rules".format(len(lazy[3]), content.count("\ntitle:") + content.startswith("title:")))
+
+if __name__ == "__main__":
+    main()
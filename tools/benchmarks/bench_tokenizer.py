@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Benchmark: tokenization of Sigma conditions
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.tools import loadAllYAML
+from sigma.parser.condition import SigmaConditionTokenizer, SigmaConditionToken
+from sigma.parser.exceptions import SigmaParseError
+
+def legacyTokenize(condition):
+    """Previous implementation: try each token regular expression at the start of the remaining condition"""
+    tokens = list()
+    pos = 1
+    while len(condition) > 0:
+        for tokendef in SigmaConditionTokenizer.tokendefs:
+            match = tokendef[1].match(condition)
+            if match:
+                if tokendef[0] != None:
+                    tokens.append(SigmaConditionToken(tokendef, match, pos + match.start()))
+                pos += match.end()
+                condition = condition[match.end():]
+                break
+        else:
+            raise SigmaParseError("Unexpected token in condition at position %s" % condition)
+    return tokens
+
+def ruleConditions(directory):
+    conditions = list()
+    for path in sorted(Path(directory).glob("**/*.yml")):
+        for yamldoc in loadAllYAML(path.read_text(encoding="utf-8")):
+            try:
+                condition = yamldoc["detection"]["condition"]
+            except (KeyError, TypeError):
+                continue
+            if type(condition) == str:
+                conditions.append(condition)
+            elif type(condition) == list:
+                conditions.extend(condition)
+    return conditions
+
+def generatedCondition(tokens):
+    """Condition like in machine-generated rules: 1 of selection* and not (filter1 or filter2 or ...)"""
+    filters = " or ".join("filter%d" % i for i in range((tokens - 8) // 2))
+    return "1 of selection* and not ( %s ) | count(User) by ComputerName > 10" % filters
+
+def measure(tokenize, conditions, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for condition in conditions:
+            tokenize(condition)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure tokenization of Sigma conditions.")
+    argparser.add_argument("--repeat", "-n", type=int, default=5, help="Number of measurements, the best is reported")
+    argparser.add_argument("--tokens", "-t", type=int, default=10000, help="Number of tokens of generated condition")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with Sigma rules (default: rules/)")
+    args = argparser.parse_args()
+
+    benchmarks = (
+            ("{} rule conditions".format(len(ruleConditions(args.directory))), ruleConditions(args.directory)),
+            ("generated condition with {} tokens".format(len(SigmaConditionTokenizer(generatedCondition(args.tokens)))), [ generatedCondition(args.tokens) ]),
+            )
+    for description, conditions in benchmarks:
+        legacy = measure(legacyTokenize, conditions, args.repeat)
+        current = measure(SigmaConditionTokenizer, conditions, args.repeat)
+        print("{}: {:.4f}s (previous: {:.4f}s, speedup {:.1f}x)".format(description, current, legacy, legacy / current))
+
+if __name__ == "__main__":
+    main()
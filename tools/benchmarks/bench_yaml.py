@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# Benchmark: loading of Sigma rule corpus with libyaml and pure Python YAML loader
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from sigma.tools import loadAllYAML, YAMLLoader, PureYAMLLoader
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measure load time of all YAML files below a directory.")
+    argparser.add_argument("--repeat", "-n", type=int, default=3, help="Number of measurements, the best is reported")
+    argparser.add_argument("directory", nargs="?", default=str(Path(__file__).parent.parent.parent / "rules"), help="Directory with YAML files (default: rules/)")
+    args = argparser.parse_args()
+
+    contents = [ path.read_text(encoding="utf-8") for path in sorted(Path(args.directory).glob("**/*.yml")) ]
+    print("{} files, {} bytes".format(len(contents), sum(len(content) for content in contents)))
+    results = dict()
+    for loader in (PureYAMLLoader, YAMLLoader):
+        best = None
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            for content in contents:
+                list(loadAllYAML(content, loader))
+            duration = time.perf_counter() - start
+            best = duration if best is None else min(best, duration)
+        results[loader] = best
+        print("{:>15}: {:.3f}s".format(loader.__name__, best))
+    print("Speedup: {:.1f}x".format(results[PureYAMLLoader] / results[YAMLLoader]))
+
+if __name__ == "__main__":
+    main()
@@ -47,6 +47,7 @@ setup(
     install_requires=['PyYAML', 'pymisp', 'progressbar2'],
     extras_require={
         'test': ['coverage', 'yamllint'],
+        'batch': ['numpy'],
     },
     data_files=[
         ('etc/sigma', [ str(p) for p in Path('config/').glob('*.yml') ]),
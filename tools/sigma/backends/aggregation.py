@@ -0,0 +1,370 @@
+# Streaming evaluation of aggregations of Sigma rules over sliding windows
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import operator
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from .python import PythonBackend, rawFieldValue
+from sigma.parser.condition import SigmaAggregationParser
+from sigma.parser.exceptions import SigmaParseError
+
+AggregationAlert = namedtuple("AggregationAlert", ("key", "group", "value", "timestamp"))
+
+timeframeUnits = { "s": 1, "m": 60, "h": 3600, "d": 86400, "M": 30 * 86400 }
+
+def parseTimeframe(timeframe):
+    """Seconds of a timeframe like 30s, 5m, 1h, 7d or 1M (30 days)"""
+    try:
+        seconds = int(timeframe[:-1]) * timeframeUnits[timeframe[-1:]]
+    except (KeyError, ValueError, TypeError) as e:
+        raise SigmaParseError("Invalid timeframe '%s'" % timeframe) from e
+    if seconds <= 0:
+        raise SigmaParseError("Invalid timeframe '%s'" % timeframe)
+    return seconds
+
+def eventTime(value):
+    """Timestamp in seconds of a number or datetime, None for other values"""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return value.timestamp()
+    except AttributeError:
+        return None
+
+comparisons = {
+        "==": operator.eq,
+        "<":  operator.lt,
+        "<=": operator.le,
+        ">":  operator.gt,
+        ">=": operator.ge,
+        }
+
+class Window:
+    """Kept events of a group of an aggregation and the aggregation state of the window of the newest event"""
+    __slots__ = ("fired", "times", "values", "outside", "state")
+
+    def __init__(self):
+        self.fired = False      # aggregation condition holds for the window of the newest event
+        self.times = list()     # timestamps of the kept events in ascending order
+        self.values = list()    # aggregated values of the kept events
+        self.outside = 0        # number of kept events before the window of the newest event
+        self.state = None       # aggregation state of the window of the newest event
+
+class Aggregation:
+    """
+    Sliding window aggregation of the events that match the search of one condition of a rule, grouped by the value of
+    the group field. The window of an event with timestamp ts contains the events of its group with timestamps in
+    (ts - timeframe, ts]. Each group keeps the timestamps and values of its events that can be part of the window of an
+    event at or after the earliest accepted timestamp, ordered by timestamp, and the aggregation state of the window of
+    its newest event, which is updated as events enter and leave this window. Expired events are removed once they are
+    half of the kept events of a group. Distinct values are counted exactly.
+
+    Without timeframe all events of a group are aggregated in one window and only its aggregation state is kept.
+    """
+    def __init__(self, key, match, parsedAgg, timeframe, maxgroups=None):
+        self.key = key
+        self.match = match
+        self.aggfunc = parsedAgg.aggfunc
+        self.aggfield = parsedAgg.aggfield
+        self.groupfield = parsedAgg.groupfield
+        self.compare = comparisons[parsedAgg.cond_op]
+        try:
+            self.threshold = float(parsedAgg.condition)
+        except ValueError as e:
+            raise SigmaParseError("Aggregation condition '%s' is not a number" % parsedAgg.condition) from e
+        if self.aggfunc != SigmaAggregationParser.AGGFUNC_COUNT and self.aggfield is None:
+            raise SigmaParseError("Aggregation function %s requires a field" % parsedAgg.aggfunc_notrans)
+        self.distinct = self.aggfunc == SigmaAggregationParser.AGGFUNC_COUNT and self.aggfield is not None
+        self.timeframe = timeframe
+        self.maxgroups = maxgroups
+        self.groups = OrderedDict()     # group value -> Window, least recently updated first
+        self.expired = 0
+        self.evicted = 0
+
+    def value(self, event):
+        """Aggregated value of event, None if the event is not aggregated"""
+        if self.aggfield is None:
+            return 1
+        value = rawFieldValue(event, self.aggfield)
+        if value is None or self.distinct:
+            return value
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    def combine(self, state, value):
+        """State with value added, state is None for an empty window"""
+        if self.distinct:               # value -> number of events with value
+            if state is None:
+                return { value: 1 }
+            state[value] = state.get(value, 0) + 1
+            return state
+        elif state is None:
+            return [ 1, value ] if self.aggfunc == SigmaAggregationParser.AGGFUNC_AVG else value
+        elif self.aggfunc in (SigmaAggregationParser.AGGFUNC_COUNT, SigmaAggregationParser.AGGFUNC_SUM):
+            return state + value
+        elif self.aggfunc == SigmaAggregationParser.AGGFUNC_MIN:
+            return min(state, value)
+        elif self.aggfunc == SigmaAggregationParser.AGGFUNC_MAX:
+            return max(state, value)
+        else:                           # avg: count and sum
+            state[0] += 1
+            state[1] += value
+            return state
+
+    def remove(self, state, value):
+        """State with value removed, None if it must be aggregated again from the remaining values"""
+        if self.distinct:
+            if state[value] == 1:
+                del state[value]
+            else:
+                state[value] -= 1
+            return state
+        elif self.aggfunc in (SigmaAggregationParser.AGGFUNC_COUNT, SigmaAggregationParser.AGGFUNC_SUM):
+            return state - value
+        elif self.aggfunc in (SigmaAggregationParser.AGGFUNC_MIN, SigmaAggregationParser.AGGFUNC_MAX):
+            return None if value == state else state
+        else:
+            state[0] -= 1
+            state[1] -= value
+            return state
+
+    def aggregate(self, values):
+        state = None
+        for value in values:
+            state = self.combine(state, value)
+        return state
+
+    def result(self, state):
+        """Aggregated value of the state of a window"""
+        if self.distinct:
+            return len(state)
+        elif self.aggfunc == SigmaAggregationParser.AGGFUNC_AVG:
+            return state[1] / state[0]
+        else:
+            return state
+
+    def update(self, event, timestamp, earliest):
+        """
+        Add matching event to its group and return an alert if the aggregation condition of a window that contains the
+        event becomes true for the group. These are the window of the event and for late events also the windows of the
+        following events of the group within the timeframe. Events that can't be part of the window of an event at or
+        after the earliest accepted timestamp are removed.
+        """
+        if not self.match(event):
+            return None
+        value = self.value(event)
+        if value is None:
+            return None
+        group = rawFieldValue(event, self.groupfield) if self.groupfield is not None else None
+        window = self.groups.get(group)
+        if window is None:
+            window = self.groups[group] = Window()
+            if self.maxgroups is not None and len(self.groups) > self.maxgroups:
+                self.groups.popitem(last=False)
+                self.evicted += 1
+
+        index = None                    # position of a late event
+        if self.timeframe is None:
+            self.groups.move_to_end(group)
+            window.state = self.combine(window.state, value)
+        else:
+            times, values = window.times, window.values
+            if not times or timestamp >= times[-1]:
+                self.groups.move_to_end(group)
+                times.append(timestamp)
+                values.append(value)
+                window.state = self.combine(window.state, value)
+                start = timestamp - self.timeframe
+                while times[window.outside] <= start:
+                    if window.state is not None:
+                        window.state = self.remove(window.state, values[window.outside])
+                    window.outside += 1
+                if window.state is None:
+                    window.state = self.aggregate(values[window.outside:])
+            else:
+                index = bisect_right(times, timestamp)
+                times.insert(index, timestamp)
+                values.insert(index, value)
+                if timestamp > times[-1] - self.timeframe:
+                    window.state = self.combine(window.state, value)
+                else:
+                    window.outside += 1
+                alert = None
+                if not window.fired and self.mayFire(value):
+                    alert = self.lateAlert(window, group, index, timestamp)
+                window.fired = alert is not None or self.compare(self.result(window.state), self.threshold)
+            expired = bisect_right(times, earliest - self.timeframe, 0, window.outside)
+            if 2 * expired >= len(times):                       # amortized removal of expired events
+                del times[:expired]
+                del values[:expired]
+                window.outside -= expired
+            if index is not None:
+                return alert
+
+        result = self.result(window.state)
+        fired = self.compare(result, self.threshold)
+        alert = AggregationAlert(self.key, group, result, timestamp) if fired and not window.fired else None
+        window.fired = fired            # the flag is the state of the window of the newest event
+        return alert
+
+    def mayFire(self, value):
+        """False if the aggregation condition of no window can become true by adding value"""
+        if self.aggfunc in (SigmaAggregationParser.AGGFUNC_MIN, SigmaAggregationParser.AGGFUNC_MAX):
+            return self.compare(value, self.threshold)      # the result only changes to value
+        elif self.aggfunc == SigmaAggregationParser.AGGFUNC_AVG:
+            return True
+        elif self.aggfunc == SigmaAggregationParser.AGGFUNC_SUM and value < 0:
+            return self.compare in (operator.lt, operator.le, operator.eq)
+        elif self.aggfunc == SigmaAggregationParser.AGGFUNC_SUM and value == 0:
+            return False
+        else:                           # counts and sums that don't decrease
+            return self.compare in (operator.gt, operator.ge, operator.eq)
+
+    def copy(self, state):
+        if isinstance(state, dict):
+            return dict(state)
+        elif isinstance(state, list):
+            return list(state)
+        else:
+            return state
+
+    def without(self, state, value, others):
+        """Result of the window with state without one event with value, others yields the values of the other events"""
+        if self.distinct:
+            return len(state) - (state[value] == 1)
+        elif self.aggfunc in (SigmaAggregationParser.AGGFUNC_COUNT, SigmaAggregationParser.AGGFUNC_SUM):
+            return state - value
+        elif self.aggfunc == SigmaAggregationParser.AGGFUNC_AVG:
+            return (state[1] - value) / (state[0] - 1)
+        elif value != state:
+            return state
+        else:
+            return self.result(self.aggregate(others))
+
+    def lateAlert(self, window, group, index, timestamp):
+        """
+        Alert for the late event at index if the aggregation condition of a window that contains it became true by it.
+        The windows of the event and the following events within the timeframe are evaluated from the latest one
+        backwards, each is derived from the following one by removal of its newest events and addition of the events
+        that entered the timeframe. The alert carries the result of the earliest of these windows.
+        """
+        times, values = window.times, window.values
+        value = values[index]
+        hi = bisect_left(times, timestamp + self.timeframe)     # window of the events before hi
+        lo = bisect_right(times, times[hi - 1] - self.timeframe)
+        if hi == len(times):
+            state = self.copy(window.state)
+        else:
+            state = self.aggregate(values[lo:hi])
+        alert = None
+        while True:
+            result = self.result(state)
+            if self.compare(result, self.threshold) and (hi - lo == 1 or not self.compare(self.without(state, value,
+                    (values[i] for i in range(lo, hi) if i != index)), self.threshold)):
+                alert = AggregationAlert(self.key, group, result, timestamp)
+            if hi - 1 == index:
+                return alert
+            end = bisect_left(times, times[hi - 1])             # events before end are in the previous window
+            start = bisect_right(times, times[end - 1] - self.timeframe)
+            if end <= lo:
+                state = None
+            else:
+                for i in range(end, hi):
+                    if state is not None:
+                        state = self.remove(state, values[i])
+            if state is None:
+                state = self.aggregate(values[start:end])
+            else:
+                for i in range(start, lo):
+                    state = self.combine(state, values[i])
+            lo, hi = start, end
+
+    def expire(self, earliest):
+        """Remove groups without events that are part of windows of events at or after the earliest accepted timestamp"""
+        if self.timeframe is None:
+            return
+        oldest = earliest - self.timeframe
+        while self.groups:
+            group, window = next(iter(self.groups.items()))
+            if window.times[-1] > oldest:
+                break
+            del self.groups[group]
+            self.expired += 1
+
+class AggregationEvaluator:
+    """
+    Evaluates the aggregations of Sigma rules over a stream of events with timestamps. Each condition with aggregation
+    keeps sliding windows of its groups (see Aggregation), an alert is emitted when the aggregation condition becomes true
+    for a group. Events may arrive out of order by up to lateness seconds behind the latest timestamp, later events
+    are dropped. Groups are expired when all their events left the timeframe and lateness, maxgroups limits the number of
+    groups of each aggregation by eviction of least recently updated groups.
+    """
+    def __init__(self, sigmaconfig, backend_options=dict(), timefield="timestamp", lateness=0, maxgroups=None):
+        self.backend = PythonBackend(sigmaconfig, backend_options)
+        self.timefield = timefield
+        self.lateness = lateness
+        self.options = { "maxgroups": maxgroups }
+        self.aggregations = list()
+        self.watermark = None
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.aggregations)
+
+    def add(self, sigmaparser, key=None):
+        """
+        Add conditions of parsed rule, alerts of the rule carry key (default: id of the rule or its title). Raises
+        NotImplementedError for conditions without aggregation or with near aggregations.
+        """
+        if key is None:
+            key = sigmaparser.parsedyaml.get("id", sigmaparser.parsedyaml.get("title"))
+        timeframe = sigmaparser.parsedyaml["detection"].get("timeframe")
+        if timeframe is not None:
+            timeframe = parseTimeframe(timeframe)
+        self.aggregations += [ self.aggregation(sigmaparser, parsed, key, timeframe) for parsed in sigmaparser.condparsed ]
+
+    def aggregation(self, sigmaparser, parsed, key, timeframe):
+        """Aggregation of a parsed condition of the rule"""
+        if parsed.parsedAgg is None:
+            raise NotImplementedError("Conditions without aggregation are matched by the python backend")
+        if parsed.parsedAgg.aggfunc == SigmaAggregationParser.AGGFUNC_NEAR:
+            raise NotImplementedError("The near aggregation is evaluated by the Correlator of sigma.backends.correlation")
+        return Aggregation(key, self.backend.generateNodeMatcher(parsed.parsedSearch), parsed.parsedAgg, timeframe, **self.options)
+
+    def process(self, event, timestamp=None):
+        """Add event with timestamp (default: value of the time field) and return list of alerts"""
+        if timestamp is None:
+            timestamp = eventTime(event.get(self.timefield))
+            if timestamp is None:
+                raise ValueError("Event without timestamp in field '%s'" % self.timefield)
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+            for aggregation in self.aggregations:
+                aggregation.expire(timestamp - self.lateness)
+        elif timestamp < self.watermark - self.lateness:
+            self.dropped += 1
+            return []
+        alerts = list()
+        for aggregation in self.aggregations:
+            alert = aggregation.update(event, timestamp, self.watermark - self.lateness)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+
+    def groups(self):
+        """Number of groups kept by all aggregations"""
+        return sum(len(aggregation.groups) for aggregation in self.aggregations)
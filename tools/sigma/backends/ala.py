@@ -32,11 +32,13 @@ from sigma.parser.modifiers.base import SigmaTypeModifier
 from sigma.parser.modifiers.transform import SigmaContainsModifier, SigmaStartswithModifier, SigmaEndswithModifier
 from .data import sysmon_schema
 from .exceptions import NotSupportedError
+from .mitre import get_attack_catalog
 
 class AzureLogAnalyticsBackend(SingleTextQueryBackend):
     """Converts Sigma rule into Azure Log Analytics Queries."""
     identifier = "ala"
     active = True
+    independent_rules = False   # the table of a rule is kept for following rules
     options = SingleTextQueryBackend.options + (
         ("sysmon", False, "Generate Sysmon event queries for generic rules", None),
         (
@@ -352,29 +354,11 @@ class AzureAPIBackend(AzureLogAnalyticsBackend):
     def __init__(self, *args, **kwargs):
         """Initialize field mappings"""
         super().__init__(*args, **kwargs)
-        self.techniques = self._load_mitre_file("techniques")
+        self.mitre = get_attack_catalog()
+        self.techniques = self.mitre.techniques
 
     def find_technique(self, key_ids):
-        for key_id in set(key_ids):
-            if not key_id:
-                continue
-            for technique in self.techniques:
-                if key_id == technique.get("technique_id", ""):
-                    yield technique
-
-    def _load_mitre_file(self, mitre_type):
-        try:
-            backend_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config", "mitre"))
-            path = os.path.join(backend_dir, "{}.json".format(mitre_type))
-            with open(path) as config_file:
-                config = json.load(config_file)
-                return config
-        except (IOError, OSError) as e:
-            print("Failed to open {} configuration file '%s': %s".format(path, str(e)), file=sys.stderr)
-            return []
-        except json.JSONDecodeError as e:
-            print("Failed to parse {} configuration file '%s' as valid YAML: %s" % (path, str(e)), file=sys.stderr)
-            return []
+        return self.mitre.find_techniques(key_ids)
 
     def skip_tactics_or_techniques(self, src_technics, src_tactics):
         tactics = set()
@@ -22,7 +22,9 @@ import re
 
 from sigma.backends.exceptions import NotSupportedError
 from .mixins import RulenameCommentMixin, QuoteCharMixin
+from sigma.parser.condition import ConditionAND, ConditionOR, ConditionNOT, ConditionNULLValue, ConditionNotNULLValue, NodeSubexpression
 from sigma.parser.modifiers.base import SigmaTypeModifier
+from sigma.tools import loadYAML
 
 class BackendOptions(dict):
     """
@@ -73,7 +75,7 @@ class BackendOptions(dict):
 
         try:
             with open(path, 'r') as config_file:
-                backend_config = yaml.safe_load(config_file.read())
+                backend_config = loadYAML(config_file.read())
                 self.update(backend_config)
         except (IOError, OSError) as e:
             print("Failed to open backend configuration file '%s': %s" % (path, str(e)), file=sys.stderr)
@@ -91,8 +93,25 @@ class BaseBackend:
     file_list = None
     options = tuple()     # a list of tuples with following elements: option name, default value, help text, target attribute name (option name if None)
     config_required = True
+    independent_rules = True    # results don't depend on previously converted rules (parallel and incremental conversion)
     default_config = None
     mapExpression = ""
+    # Node type -> name of the method that generates it. Subclasses may extend this with own node types, subclasses of
+    # SigmaTypeModifier are generated by generateTypedValueNode.
+    nodeGenerators = {
+            ConditionAND: "generateANDNode",
+            ConditionOR: "generateORNode",
+            ConditionNOT: "generateNOTNode",
+            ConditionNULLValue: "generateNULLValueNode",
+            ConditionNotNULLValue: "generateNotNULLValueNode",
+            NodeSubexpression: "generateSubexpressionNode",
+            tuple: "generateMapItemNode",
+            str: "generateValueNode",
+            int: "generateValueNode",
+            list: "generateListNode",
+            }
+    overrides = ()              # compiled overrides from configuration, see compileOverrides()
+    overrideMatchers = ()
 
     def __init__(self, sigmaconfig, backend_options=dict()):
         """
@@ -105,6 +124,7 @@ class BaseBackend:
         self.backend_options = backend_options
         self.sigmaconfig = sigmaconfig
         self.sigmaconfig.set_backend(self)
+        self.compileOverrides()
 
         # Parse options
         for option, default_value, _, target in self.options:
@@ -138,48 +158,69 @@ class BaseBackend:
         #result = self.applyOverrides(result)
         return result
 
+    def compileOverrides(self):
+        """
+        Compile the overrides of the configuration into self.overrides, a list of (compiled regular expression or
+        literal string, field, value) tuples in the order of application, and self.overrideMatchers, search functions
+        that find the places where they apply. Overrides up to the first invalid one are used.
+        """
+        overrides = list()
+        try:
+            for expression in self.sigmaconfig.config['overrides']:
+                if 'regexes' in expression:
+                    for x in expression['regexes']:
+                        overrides.append((re.compile(x), expression['field'], expression['value']))
+                if 'literals' in expression:
+                    for x in expression['literals']:
+                        if not isinstance(x, str):
+                            raise TypeError("Literal override must be a string")
+                        overrides.append((x, expression['field'], expression['value']))
+        except Exception:
+            pass
+        self.overrides = overrides
+        self.overrideMatchers = tuple(re.compile(re.escape(x)).search if type(x) == str else x.search for x, sub, value in overrides)
+
     def applyOverrides(self, query):
+        """
+        Apply overrides of the configuration to a generated query. Most queries aren't matched by any override, this is
+        checked first without building replacements or copying the query. Overrides are regular expressions over
+        generated queries that may span multiple fields, so they can't be resolved per field when a rule is parsed and
+        are applied to the query of each node like before.
+        """
+        if not isinstance(query, str):
+            return query
+        for search in self.overrideMatchers:
+            if search(query):
+                break
+        else:
+            return query
+
         try:
-            if 'overrides' in self.sigmaconfig.config and isinstance(query, str):
-                for expression in self.sigmaconfig.config['overrides']:
-                    if 'regexes' in expression:
-                        for x in expression['regexes']:
-                            sub = expression['field']
-                            value = expression['value']
-                            query = re.sub(x, self.mapExpression % (sub, value), query)
-                    if 'literals' in expression:
-                        for x in expression['literals']:
-                            sub = expression['field']
-                            value = expression['value']
-                            query = query.replace(x, self.mapExpression % (sub, value))
+            for x, sub, value in self.overrides:
+                if type(x) == str:
+                    query = query.replace(x, self.mapExpression % (sub, value))
+                else:
+                    query = x.sub(self.mapExpression % (sub, value), query)
         except Exception:
             pass
         return query
 
     def generateNode(self, node):
-        if type(node) == sigma.parser.condition.ConditionAND:
-            return self.applyOverrides(self.generateANDNode(node))
-        elif type(node) == sigma.parser.condition.ConditionOR:
-            return self.applyOverrides(self.generateORNode(node))
-        elif type(node) == sigma.parser.condition.ConditionNOT:
-            return self.applyOverrides(self.generateNOTNode(node))
-        elif type(node) == sigma.parser.condition.ConditionNULLValue:
-            return self.applyOverrides(self.generateNULLValueNode(node))
-        elif type(node) == sigma.parser.condition.ConditionNotNULLValue:
-            return self.applyOverrides(self.generateNotNULLValueNode(node))
-        elif type(node) == sigma.parser.condition.NodeSubexpression:
-            return self.applyOverrides(self.generateSubexpressionNode(node))
-        elif type(node) == tuple:
-            return self.applyOverrides(self.generateMapItemNode(node))
-        elif type(node) in (str, int):
-            return self.applyOverrides(self.generateValueNode(node))
-        elif type(node) == list:
-            return self.applyOverrides(self.generateListNode(node))
-        elif isinstance(node, SigmaTypeModifier):
-            return self.applyOverrides(self.generateTypedValueNode(node))
-        else:
+        try:
+            generator = self.nodeGenerators[type(node)]
+        except KeyError:
+            if isinstance(node, SigmaTypeModifier):
+                generator = "generateTypedValueNode"
+            else:
+                generator = None
+        if generator is None:
             raise TypeError("Node type %s was not expected in Sigma parse tree" % (str(type(node))))
 
+        result = getattr(self, generator)(node)
+        if self.overrides:
+            return self.applyOverrides(result)
+        return result
+
     def generateANDNode(self, node):
         raise NotImplementedError("Node type not implemented for this backend")
 
@@ -226,6 +267,31 @@ class BaseBackend:
         """
         pass
 
+    def iterFinalize(self):
+        """
+        Yield the output of finalize() in parts that are written one after another, e.g. one part per rule, instead of
+        building the whole output in one string. The default implementation yields the result of finalize() if there is
+        one. Backends that override this method implement finalize() by joining the parts, subclasses that override
+        one of both methods must override the other one too.
+        """
+        result = self.finalize()
+        if result:
+            yield result
+
+    def extractState(self):
+        """
+        Return the state accumulated by generate() for the output of finalize() and reset it. This is used by parallel
+        conversion: each worker process holds an own backend instance and the extracted states are merged in input
+        order into one backend instance with mergeState(), whose finalize() then generates the output. Backends that
+        implement finalize() must implement both methods for support of parallel conversion.
+        """
+        return None
+
+    def mergeState(self, state):
+        """Merge a state returned by extractState() of another instance of this backend class into this backend."""
+        if state is not None:
+            raise NotImplementedError("Backend doesn't support merging of conversion states")
+
 class SingleTextQueryBackend(RulenameCommentMixin, BaseBackend, QuoteCharMixin):
     """Base class for backends that generate one text-based expression from a Sigma rule"""
     identifier = "base-textquery"
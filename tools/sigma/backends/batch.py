@@ -0,0 +1,273 @@
+# Evaluation of Sigma rules over columnar batches of events with NumPy
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+from .python import PythonBackend, eventValues
+
+# NumPy is only required for batch evaluation
+try:
+    import numpy as np
+except ImportError:     # pragma: no cover
+    np = None
+
+def rowsToColumns(events, fields=None):
+    """
+    Convert events given as mappings into columns of a batch. Values of nested mappings are stored in columns with
+    dotted names, missing values are None. Other values like lists are stored as they are.
+    """
+    columns = dict()
+    for row, event in enumerate(events):
+        for field, value in flattenEvent(event):
+            if fields is not None and field not in fields:
+                continue
+            try:
+                column = columns[field]
+            except KeyError:
+                column = columns[field] = [ None ] * row
+            column.append(value)
+        for column in columns.values():
+            if len(column) <= row:
+                column.append(None)
+    return { field: objectArray(column) for field, column in columns.items() }
+
+def objectArray(values):
+    """One-dimensional object array of values, NumPy would turn lists of the same length into further dimensions"""
+    array = np.empty(len(values), dtype=object)
+    try:
+        array[:] = values
+    except ValueError:  # older NumPy versions try to broadcast lists
+        for row, value in enumerate(values):
+            array[row] = value
+    return array
+
+def hashableColumn(column, originals):
+    """
+    Column with unhashable values like lists replaced by their strings, which are compared like by the python backend.
+    The first value of each of these strings is stored in originals.
+    """
+    result = list()
+    for value in column:
+        try:
+            hash(value)
+        except TypeError:
+            key = str(value)
+            originals.setdefault(key, value)
+            value = key
+        result.append(value)
+    return result
+
+def flattenEvent(event, prefix=""):
+    for field, value in event.items():
+        if isinstance(value, dict):
+            yield from flattenEvent(value, prefix + field + ".")
+        else:
+            yield prefix + field, value
+
+class ColumnBatch:
+    """
+    Batch of events given as columns: a mapping from field names to sequences of values of the same length, like
+    NumPy object or string arrays. None (and NaN in float arrays) are missing values, fields without column are missing
+    in all events.
+    Columns are dictionary encoded once, the checks of rules are computed over the distinct values of a column with
+    vectorized operations and expanded to masks over the events. Masks of identical checks are shared by all rules.
+    Values that aren't strings are checked as their strings like by the python backend, keywords are searched in the
+    items of lists and tuples.
+    """
+    def __init__(self, columns):
+        self.columns = columns
+        sizes = { len(column) for column in columns.values() }
+        if len(sizes) > 1:
+            raise ValueError("Columns of a batch must have the same length")
+        self.size = sizes.pop() if sizes else 0
+        self.encoded = dict()       # field -> (codes, lowercase distinct values, raw distinct values, validity of distinct values, keyword texts)
+        self.masks = dict()
+
+    def encode(self, field):
+        """Dictionary encoding of the column of field"""
+        try:
+            return self.encoded[field]
+        except KeyError:
+            pass
+        column = self.columns.get(field)
+        originals = dict()
+        if column is None:
+            values = [ None ]
+            codes = np.zeros(self.size, dtype=np.intp)
+        elif isinstance(column, np.ndarray) and column.dtype.kind == "U":
+            values, codes = np.unique(column, return_inverse=True)
+            values = list(values)
+        else:
+            if isinstance(column, np.ndarray) and column.dtype.kind == "f":
+                column = np.where(np.isnan(column), None, column.astype(object))
+            try:
+                index = dict.fromkeys(column)
+            except TypeError:
+                column = hashableColumn(column, originals)
+                index = dict.fromkeys(column)
+            values = list(index)
+            for code, value in enumerate(values):
+                index[value] = code
+            codes = np.fromiter(map(index.__getitem__, column), dtype=np.intp, count=self.size)
+        valid = np.array([ value is not None for value in values ], dtype=bool)
+        raw = np.array([ str(value) if ok else "" for value, ok in zip(values, valid) ], dtype=str)
+        lower = np.char.lower(raw)
+        values = [ originals.get(value, value) for value in values ] if originals else values
+        if any(isinstance(value, (list, tuple)) for value in values):
+            text = np.array([ "\0".join(eventValues(value)) if isinstance(value, (list, tuple)) else string for value, string in zip(values, lower) ], dtype=str)
+        else:
+            text = lower
+        encoded = self.encoded[field] = (codes, lower, raw, valid, text)
+        return encoded
+
+    def mask(self, key, field, check, keyword=False):
+        """
+        Mask of events for which check(lowercase values, raw values) over the distinct values of field is true. Keyword
+        checks get the lowercase items of lists joined by NUL characters instead, like searched by the python backend.
+        """
+        try:
+            return self.masks[key]
+        except KeyError:
+            codes, lower, raw, valid, text = self.encode(field)
+            mask = self.masks[key] = (check(text if keyword else lower, raw) & valid)[codes]
+            return mask
+
+    def none(self):
+        return np.zeros(self.size, dtype=bool)
+
+    def valid(self, field):
+        return self.mask(("valid", field), field, lambda lower, raw: True)
+
+    def exact(self, field, values):
+        return self.mask(("exact", field, values), field, lambda lower, raw: np.isin(lower, list(values)))
+
+    def startsWith(self, field, prefixes):
+        return self.mask(("startsWith", field, prefixes), field, lambda lower, raw: anyOf(np.char.startswith(lower, prefix) for prefix in prefixes))
+
+    def endsWith(self, field, suffixes):
+        return self.mask(("endsWith", field, suffixes), field, lambda lower, raw: anyOf(np.char.endswith(lower, suffix) for suffix in suffixes))
+
+    def contains(self, field, substrings):
+        return self.mask(("contains", field, substrings), field, lambda lower, raw: anyOf(np.char.find(lower, substring) >= 0 for substring in substrings))
+
+    def fullMatch(self, field, pattern):
+        return self.mask(("fullMatch", field, pattern), field, lambda lower, raw: np.array([ pattern.fullmatch(value) is not None for value in lower ], dtype=bool))
+
+    def search(self, field, pattern):
+        return self.mask(("search", field, pattern), field, lambda lower, raw: np.array([ pattern.search(value) is not None for value in raw ], dtype=bool))
+
+    def keywords(self, substrings, pattern):
+        """Keywords don't span values, so they are searched in each column"""
+        if "" in substrings:
+            return ~self.none()
+        mask = self.none()
+        for field in self.columns:
+            if substrings:
+                mask |= self.mask(("keywordContains", field, substrings), field, lambda lower, raw: anyOf(np.char.find(lower, substring) >= 0 for substring in substrings), True)
+            if pattern is not None:
+                mask |= self.mask(("keyword", field, pattern), field, lambda lower, raw: np.array([ pattern.search(value) is not None for value in lower ], dtype=bool), True)
+        return mask
+
+def anyOf(masks):
+    result = False
+    for mask in masks:
+        result = result | mask
+    return result
+
+class BatchBackend(PythonBackend):
+    """
+    Generates the conditions of rules as expressions over masks of a ColumnBatch: checks of values are methods of the
+    batch and AND, OR and NOT are combinations of the masks.
+    """
+    identifier = "python-batch"
+    active = False
+
+    def generateFunction(self, sigmaparser, funcname):
+        self.constants = dict()
+        expression = self.combineOr([ self.generateQuery(parsed) for parsed in sigmaparser.condparsed ])
+        arguments = [ "batch" ] + [ "%s=%s" % (name, constant) for constant, name in self.constants.items() ]
+        return "def %s(%s):\n    return %s\n" % (funcname, ", ".join(arguments), expression)
+
+    def generateValueCheck(self, fieldname, values):
+        kinds = self.classifyValues(values)
+        if kinds["exists"]:
+            return "batch.valid(%r)" % fieldname
+        checks = list()
+        if kinds["exact"]:
+            checks.append("batch.exact(%r, %s)" % (fieldname, self.constant(repr(tuple(sorted(set(kinds["exact"])))))))
+        for kind, method in (("prefix", "startsWith"), ("suffix", "endsWith"), ("contains", "contains")):
+            if kinds[kind]:
+                checks.append("batch.%s(%r, %s)" % (method, fieldname, self.constant(repr(tuple(kinds[kind])))))
+        if kinds["pattern"]:
+            checks.append("batch.fullMatch(%r, %s)" % (fieldname, self.compilePattern(kinds["pattern"], ", re.S")))
+        return self.combineOr(checks)
+
+    def generateKeywordCheck(self, values):
+        substrings, patterns = self.splitKeywords(values)
+        return "batch.keywords(%s, %s)" % (self.constant(repr(tuple(substrings))), self.compilePattern(patterns, ", re.S") if patterns else None)
+
+    def generateTypedCheck(self, fieldname, value):
+        return "batch.search(%r, %s)" % (fieldname, self.compilePattern([ self.regularExpression(value) ]))
+
+    def generateNullCheck(self, fieldname, null):
+        return self.negate("batch.valid(%r)" % fieldname) if null else "batch.valid(%r)" % fieldname
+
+    def combineAnd(self, checks):
+        return checks[0] if len(checks) == 1 else "(%s)" % " & ".join(checks)
+
+    def combineOr(self, checks):
+        if not checks:
+            return "batch.none()"
+        return checks[0] if len(checks) == 1 else "(%s)" % " | ".join(checks)
+
+    def negate(self, check):
+        return "(~%s)" % check
+
+class BatchRuleSet:
+    """
+    Evaluates Sigma rules over columnar batches of events (see ColumnBatch) with NumPy. The configuration is used by
+    the backend of the rule set, rules must be parsed with it after the rule set was created.
+    """
+    def __init__(self, sigmaconfig, backend_options=dict()):
+        if np is None:
+            raise ImportError("NumPy is required for batch evaluation of Sigma rules")
+        self.backend = BatchBackend(sigmaconfig, backend_options)
+        self.keys = list()
+        self.matchers = list()
+
+    def __len__(self):
+        return len(self.matchers)
+
+    def add(self, sigmaparser, key=None):
+        """
+        Add parsed rule, match() returns its mask with key (default: id of the rule or its title). Raises
+        NotImplementedError for rules the python backend doesn't support, e.g. with aggregations.
+        """
+        namespace = { "re": re }
+        exec(self.backend.generateFunction(sigmaparser, "match"), namespace)
+        self.matchers.append(namespace["match"])
+        self.keys.append(key if key is not None else sigmaparser.parsedyaml.get("id", sigmaparser.parsedyaml.get("title")))
+        return len(self.matchers) - 1
+
+    def match(self, columns):
+        """
+        Return dict from rule keys to boolean arrays of events that match the rule, columns may be a ColumnBatch. The
+        masks of rules with the same key, like the documents of a rule collection with one id, are combined.
+        """
+        batch = columns if isinstance(columns, ColumnBatch) else ColumnBatch(columns)
+        masks = dict()
+        for key, match in zip(self.keys, self.matchers):
+            mask = match(batch)
+            masks[key] = masks[key] | mask if key in masks else mask
+        return masks
@@ -21,6 +21,7 @@ class ChronicleBackend(SingleTextQueryBackend):
     """Converts Sigma rule into Google Chronicle YARA-L. Contributed by SOC Prime. https://socprime.com"""
     identifier = "chronicle"
     active = True
+    independent_rules = False   # rule names are made unique across all converted rules
     andToken = " and "
     #\\\
     reEscape = re.compile('([\"]|(\\\\))')
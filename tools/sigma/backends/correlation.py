@@ -0,0 +1,172 @@
+# Streaming temporal correlation of the near aggregation of Sigma rules
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import namedtuple
+from .aggregation import AggregationEvaluator, parseTimeframe
+from .python import rawFieldValue
+from sigma.parser.condition import SigmaAggregationParser
+from sigma.parser.exceptions import SigmaParseError
+
+CorrelationAlert = namedtuple("CorrelationAlert", ("key", "entity", "timestamp"))
+
+class Correlation:
+    """
+    Correlation of a condition with near aggregation like 'selection | near a and b and not c'. For each entity (value of
+    the entity field) the timestamps of events that matched the search of the condition and each included and excluded
+    search identifier are kept per matcher in time buckets of the timeframe divided by buckets, each bucket as its
+    earliest and latest timestamp in a list [earliest, latest, earliest, latest, ...] ordered by bucket. A window of the
+    timeframe contains a timestamp of a matcher exactly if it contains one of these, because buckets are shorter than the
+    timeframe. Windows end at or after the earliest accepted timestamp, so of the timestamps before it only the latest is
+    kept. A correlation is complete when the search and all included identifiers matched within the timeframe and no
+    excluded identifier matched in the timeframe before the latest of these events. Each event checks the windows that
+    end with it and, if it is late, with the following timestamps of the search and included identifiers. Complete
+    correlations are emitted once, the timestamps of the search and included identifiers are then cleared.
+
+    Entities are registered in the time buckets at each update, buckets that left the timeframe are expired with all
+    entities that weren't updated since then.
+    """
+    def __init__(self, key, matchers, required, timeframe, entityfield=None, buckets=10):
+        self.key = key
+        self.matchers = matchers        # search of condition, included identifiers, excluded identifiers
+        self.required = required        # number of matchers that must match: search and included identifiers
+        self.timeframe = timeframe
+        self.entityfield = entityfield
+        self.width = timeframe / buckets
+        self.groups = dict()            # entity -> bucketed timestamps of matches of each matcher
+        self.buckets = dict()           # bucket -> set of entities updated in bucket
+        self.horizon = None             # buckets before the horizon are expired
+        self.expired = 0
+
+    def insert(self, times, timestamp, bucket):
+        """Add timestamp in bucket to the bucketed timestamps of a matcher"""
+        i = len(times) - 2
+        while i >= 0 and int(times[i] // self.width) > bucket:
+            i -= 2
+        if i >= 0 and int(times[i] // self.width) == bucket:
+            times[i] = min(times[i], timestamp)
+            times[i + 1] = max(times[i + 1], timestamp)
+        else:
+            times[i + 2:i + 2] = [ timestamp, timestamp ]
+
+    def excluded(self, groups, latest):
+        """Returns if an excluded identifier matched in the window that ends with latest"""
+        start = latest - self.timeframe
+        for times in groups[self.required:]:
+            if times is not None:
+                for time in times:
+                    if start <= time <= latest:
+                        return True
+        return False
+
+    def complete(self, groups, latest):
+        """Returns if the correlation is complete in the window that ends with latest"""
+        start = latest - self.timeframe
+        for times in groups[:self.required]:
+            for time in times:
+                if start <= time <= latest:
+                    break
+            else:
+                return False
+        return not self.excluded(groups, latest)
+
+    def update(self, event, timestamp, earliest):
+        """Register event and return an alert if it completes the correlation of its entity"""
+        matched = [ i for i, match in enumerate(self.matchers) if match(event) ]
+        if not matched:
+            return None
+        entity = rawFieldValue(event, self.entityfield) if self.entityfield is not None else None
+        groups = self.groups.get(entity)
+        if groups is None:
+            groups = self.groups[entity] = [ None ] * len(self.matchers)
+        bucket = int(timestamp // self.width)
+        start = bucket * self.width
+        oldest = earliest - self.timeframe
+        for i in matched:
+            times = groups[i]
+            if times is None:
+                groups[i] = [ timestamp, timestamp ]
+                continue
+            if times[-1] <= timestamp and times[-2] >= start:        # in order and in the bucket of the newest times
+                times[-1] = timestamp
+            else:
+                self.insert(times, timestamp, bucket)
+                while len(times) > 2 and (times[1] < oldest or times[3] <= earliest):
+                    del times[0:2]
+        try:
+            self.buckets[bucket].add(entity)
+        except KeyError:
+            self.buckets[bucket] = { entity }
+
+        if matched[0] >= self.required:        # only excluded identifiers matched
+            return None
+        required = groups[:self.required]
+        if None in required:
+            return None
+        latest = max(times[-1] for times in required)
+        if latest <= timestamp:             # the window that ends with the event contains the newest matches
+            latest = timestamp
+            if min(times[-1] for times in required) < latest - self.timeframe:
+                return None
+            for times in groups[self.required:]:
+                if times is not None and times[-1] >= latest - self.timeframe and self.excluded(groups, latest):
+                    return None
+        else:                               # late event
+            for latest in sorted({ timestamp }.union(time for times in required for time in times if timestamp < time <= timestamp + self.timeframe)):
+                if self.complete(groups, latest):
+                    break
+            else:
+                return None
+        groups[:self.required] = [ None ] * self.required
+        if groups.count(None) == len(groups):
+            del self.groups[entity]
+        return CorrelationAlert(self.key, entity, latest)
+
+    def expire(self, earliest):
+        """Remove buckets and entities that can't be within the timeframe of events at or after the earliest accepted timestamp"""
+        oldest = earliest - self.timeframe
+        horizon = int(oldest // self.width)
+        if horizon == self.horizon:
+            return
+        self.horizon = horizon
+        for bucket in [ bucket for bucket in self.buckets if bucket < horizon ]:
+            for entity in self.buckets.pop(bucket):
+                groups = self.groups.get(entity)
+                if groups is not None and max(times[-1] for times in groups if times is not None) < oldest:     # entities without times are removed at alert
+                    del self.groups[entity]
+                    self.expired += 1
+
+class Correlator(AggregationEvaluator):
+    """
+    Evaluates rules with near aggregations over a stream of events with timestamps and correlates events of the same
+    entity, the value of entityfield (all events belong to one entity if not given). Near aggregations of rules without
+    timeframe use the given default timeframe like '30m', timeframes of near aggregations are divided into buckets time
+    buckets. Other aggregations are evaluated like by the AggregationEvaluator.
+    """
+    def __init__(self, sigmaconfig, backend_options=dict(), entityfield=None, timeframe=None, buckets=10, **options):
+        super().__init__(sigmaconfig, backend_options, **options)
+        self.entityfield = entityfield
+        self.buckets = buckets
+        self.timeframe = parseTimeframe(timeframe) if timeframe is not None else None
+
+    def aggregation(self, sigmaparser, parsed, key, timeframe):
+        if parsed.parsedAgg is None or parsed.parsedAgg.aggfunc != SigmaAggregationParser.AGGFUNC_NEAR:
+            return super().aggregation(sigmaparser, parsed, key, timeframe)
+        if timeframe is None:
+            timeframe = self.timeframe
+            if timeframe is None:
+                raise SigmaParseError("The near aggregation requires a timeframe")
+        searches = [ parsed.parsedSearch ] + [ parsed.completeSearch(sigmaparser.parse_definition_byname(name)) for name in parsed.parsedAgg.include + parsed.parsedAgg.exclude ]
+        return Correlation(key, [ self.backend.generateNodeMatcher(search) for search in searches ], 1 + len(parsed.parsedAgg.include),
+                timeframe, self.entityfield, self.buckets)
@@ -14,24 +14,100 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import sys
-import json
-import re
-import os
-import sigma.backends
-from .base import BaseBackend
-from sigma.tools import getAllSubclasses, getClassDict
+import importlib
+from sigma.tools import getClassDict
+
+# Backends contained in sigma.backends: identifier -> module:class. Modules are only imported if a backend is
+# requested. This registry must be updated if a backend is added, renamed or removed, tests/test_discovery.py
+# verifies it against the backend classes contained in the package.
+builtinBackends = {
+        "ala": "sigma.backends.ala:AzureLogAnalyticsBackend",
+        "ala-rule": "sigma.backends.ala:AzureAPIBackend",
+        "arcsight": "sigma.backends.arcsight:ArcSightBackend",
+        "arcsight-esm": "sigma.backends.arcsight:ArcSightESMBackend",
+        "bdiamond": "sigma.backends.blackdiamond:BlackDiamondBackend",
+        "carbonblack": "sigma.backends.carbonblack:CarbonBlackQueryBackend",
+        "chronicle": "sigma.backends.chronicle:ChronicleBackend",
+        "crowdstrike": "sigma.backends.splunk:CrowdStrikeBackend",
+        "csharp": "sigma.backends.csharp:CSharpBackend",
+        "ee-outliers": "sigma.backends.ee-outliers:OutliersBackend",
+        "elastalert": "sigma.backends.elasticsearch:ElastalertBackendQs",
+        "elastalert-dsl": "sigma.backends.elasticsearch:ElastalertBackendDsl",
+        "es-dsl": "sigma.backends.elasticsearch:ElasticsearchDSLBackend",
+        "es-qs": "sigma.backends.elasticsearch:ElasticsearchQuerystringBackend",
+        "es-rule": "sigma.backends.elasticsearch:ElasticSearchRuleBackend",
+        "fieldlist": "sigma.backends.tools:FieldnameListBackend",
+        "fireeye-helix": "sigma.backends.fireeye-helix:FireEyeHelixBackend",
+        "graylog": "sigma.backends.graylog:GraylogQuerystringBackend",
+        "grep": "sigma.backends.misc:GrepBackend",
+        "humio": "sigma.backends.humio:HumioBackend",
+        "kibana": "sigma.backends.elasticsearch:KibanaBackend",
+        "kibana-ndjson": "sigma.backends.elasticsearch:KibanaNdjsonBackend",
+        "limacharlie": "sigma.backends.limacharlie:LimaCharlieBackend",
+        "logiq": "sigma.backends.logiq:LogiqBackend",
+        "logpoint": "sigma.backends.logpoint:LogPointBackend",
+        "mdatp": "sigma.backends.mdatp:WindowsDefenderATPBackend",
+        "netwitness": "sigma.backends.netwitness:NetWitnessBackend",
+        "netwitness-epl": "sigma.backends.netwitness-epl:NetWitnessEplBackend",
+        "powershell": "sigma.backends.powershell:PowerShellBackend",
+        "python": "sigma.backends.python:PythonBackend",
+        "qradar": "sigma.backends.qradar:QRadarBackend",
+        "qualys": "sigma.backends.qualys:QualysBackend",
+        "splunk": "sigma.backends.splunk:SplunkBackend",
+        "splunkxml": "sigma.backends.splunk:SplunkXMLBackend",
+        "sql": "sigma.backends.sql:SQLBackend",
+        "sqlite": "sigma.backends.sqlite:SQLiteBackend",
+        "stix": "sigma.backends.stix:STIXBackend",
+        "sumologic": "sigma.backends.sumologic:SumoLogicBackend",
+        "sumologic-cse": "sigma.backends.sumologic:SumoLogicCSE",
+        "sumologic-cse-rule": "sigma.backends.sumologic:SumoLogicCSERule",
+        "sysmon": "sigma.backends.sysmon:SysmonConfigBackend",
+        "uberagent": "sigma.backends.uberagent:uberAgentBackend",
+        "xpack-watcher": "sigma.backends.elasticsearch:XPackWatcherBackend",
+        }
+
+# Backends of other packages are registered as entry points in this group, e.g. in setup.py:
+# entry_points={ "sigma.backends": [ "identifier = package.module:BackendClass" ] }
+entryPointGroup = "sigma.backends"
+pluginBackends = None
+
+def getPluginBackends():
+    """Return dict identifier -> module:class of backends registered by installed packages as entry points"""
+    global pluginBackends
+    if pluginBackends is None:
+        pluginBackends = dict()
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:     # pragma: no cover - Python < 3.8
+            return pluginBackends
+        entrypoints = entry_points()
+        if hasattr(entrypoints, "select"):
+            entrypoints = entrypoints.select(group=entryPointGroup)
+        else:                   # pragma: no cover - Python < 3.10
+            entrypoints = entrypoints.get(entryPointGroup, [])
+        for entrypoint in entrypoints:
+            pluginBackends[entrypoint.name] = entrypoint.value
+    return pluginBackends
+
+def getBackendIdentifiers():
+    """Return sorted list of backend identifiers without importing backends"""
+    return sorted(set(builtinBackends) | set(getPluginBackends()))
 
 def getBackendList():
     """Return list of backend classes"""
-    path = os.path.dirname(__file__)
-    return getAllSubclasses(path, "backends", BaseBackend)
+    return [ getBackend(name) for name in getBackendIdentifiers() ]
 
 def getBackendDict():
     return getClassDict(getBackendList())
 
 def getBackend(name):
+    """Import and return backend class. Built-in backends can't be overridden by plugins."""
     try:
-        return getBackendDict()[name]
-    except KeyError as e:
-        raise LookupError("Backend not found") from e
+        spec = builtinBackends[name]
+    except KeyError:
+        try:
+            spec = getPluginBackends()[name]
+        except KeyError as e:
+            raise LookupError("Backend not found") from e
+    module, cls = spec.split(":")
+    return getattr(importlib.import_module(module), cls)
@@ -26,6 +26,7 @@ class OutliersBackend(ElasticsearchDSLBackend, MultiRuleOutputMixin):
     """ee-outliers backend"""
     identifier = 'ee-outliers'
     active = True
+    independent_rules = False   # queries of failed rules are kept for following rules
 
     def generate(self, sigmaparser):
         super().generate(sigmaparser)
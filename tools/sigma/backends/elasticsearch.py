@@ -16,11 +16,11 @@
 
 import json
 import re
-from fnmatch import fnmatch
+import fnmatch
 import sys
 import os
+from functools import lru_cache
 from random import randrange
-from distutils.util import strtobool
 from uuid import uuid4
 
 import sigma
@@ -29,9 +29,11 @@ from sigma.parser.modifiers.type import SigmaRegularExpressionModifier, SigmaTyp
 from sigma.parser.condition import ConditionOR, ConditionAND, NodeSubexpression, SigmaAggregationParser
 
 from sigma.config.mapping import ConditionalFieldMapping
+from sigma.tools import strtobool
 from .base import BaseBackend, SingleTextQueryBackend
 from .mixins import RulenameCommentMixin, MultiRuleOutputMixin
 from .exceptions import NotSupportedError
+from .mitre import get_attack_catalog
 
 class DeepFieldMappingMixin(object):
     def fieldNameMapping(self, fieldname, value):
@@ -68,14 +70,29 @@ class ElasticsearchWildcardHandlingMixin(object):
             ("case_insensitive_whitelist", None, "Fields to make the values case insensitive regex. Automatically sets the field as a keyword. Valid options are: list of fields, single field. Also, wildcards * and ? allowed.", None),
             ("case_insensitive_blacklist", None, "Fields to exclude from being made into case insensitive regex. Valid options are: list of fields, single field. Also, wildcards * and ? allowed.", None),
             ("wildcard_use_keyword", "true", "Use analyzed field or wildcard field if the query uses a wildcard value (ie: '*mall_wear.exe'). Set this to 'False' to use analyzed field or wildcard field. Valid options are: true/false", None),
+            ("case_insensitive_merge_lists", "false", "Merge the case insensitive regular expressions of a list of values into one regular expression with common prefixes factored out. Valid options are: true/false", None),
             )
     reContainsWildcard = re.compile("(?:(?<!\\\\)|\\\\\\\\)[*?]").search
+    reSlashedValue = re.compile(r'^/.*/$').match
+    reContainsLetter = re.compile('[a-zA-Z]').search
+    reBackslashes = re.compile(r"(\\+)")
+    # Characters of case insensitive regular expressions outside of backslash escapes: letters are matched in both cases,
+    # '.' and the Elastic regular expression operators are escaped and '*' is turned into a wildcard.
+    caseInsensitiveChars = str.maketrans({
+        **{ c: "[%s%s]" % (c.upper(), c.lower()) for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz" },
+        ".": "\\.",
+        "*": ".*",
+        **{ c: "\\" + c for c in "@?&~<>" },
+        })
+    caseInsensitiveEscapedChars = str.maketrans({ c: "[%s%s]" % (c.upper(), c.lower()) for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz" })
+    # Tokens of regular expressions that can be merged: escaped characters, case insensitive letters, wildcards, any
+    # character and characters without special meaning in Elastic regular expressions.
+    reRegexToken = re.compile(r'\\[^A-Za-z0-9]|\[[A-Za-z]{2}\]|\.\*?|[^?+*|{}\[\]()"\\#@&<>~]', re.DOTALL)
     uuid_regex = re.compile( "[0-9a-fA-F]{8}(\\\)?-[0-9a-fA-F]{4}(\\\)?-[0-9a-fA-F]{4}(\\\)?-[0-9a-fA-F]{4}(\\\)?-[0-9a-fA-F]{12}", re.IGNORECASE )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.matchKeyword = True
-        self.CaseInSensitiveField = False
+        self.resetFieldState()
         self.keyword_field = self.keyword_field.strip().strip('.') # Prevent mistake if user added a '.' or field has spaces
         self.analyzed_sub_field_name = self.analyzed_sub_field_name.strip().strip('.') # Prevent mistake if user added a '.' or field has spaces
         try:
@@ -106,6 +123,60 @@ class ElasticsearchWildcardHandlingMixin(object):
             self.wildcard_use_keyword = strtobool(self.wildcard_use_keyword.lower().strip())
         except AttributeError:
             self.wildcard_use_keyword = False
+        try:
+            self.case_insensitive_merge_lists = strtobool(self.case_insensitive_merge_lists.lower().strip())
+        except AttributeError:
+            self.case_insensitive_merge_lists = False
+        self.compileFieldPatterns()
+
+    def resetFieldState(self):
+        """State of field handling before the first field of a rule is mapped, conversions must not depend on previous rules"""
+        self.matchKeyword = True
+        self.CaseInSensitiveField = False
+
+    def generate(self, sigmaparser):
+        self.resetFieldState()
+        return super().generate(sigmaparser)
+
+    @staticmethod
+    def fieldPatternMatcher(patterns):
+        """
+        Compile field name patterns with wildcards (fnmatch syntax) into a function that returns if a field name matches
+        any of them. Literal field names are looked up in a set, the other patterns are combined into one regular
+        expression.
+        """
+        literals = set()
+        wildcards = list()
+        for pattern in patterns:
+            pattern = os.path.normcase(pattern)
+            if any(c in pattern for c in "*?["):
+                wildcards.append(fnmatch.translate(pattern))
+            else:
+                literals.add(pattern)
+
+        if not wildcards:
+            if not literals:
+                return lambda fieldname: False
+            return lambda fieldname: os.path.normcase(fieldname) in literals
+        try:
+            match = re.compile("|".join(wildcards)).match
+        except re.error:       # group names of translated patterns collide in some Python versions
+            matches = [ re.compile(wildcard).match for wildcard in wildcards ]
+            match = lambda fieldname: any(m(fieldname) for m in matches)
+        def matcher(fieldname):
+            fieldname = os.path.normcase(fieldname)
+            return fieldname in literals or bool(match(fieldname))
+        return matcher
+
+    def compileFieldPatterns(self):
+        """Compile field name pattern options. Must be called again if these options are changed after initialization."""
+        self.keywordBaseFieldMatcher = self.fieldPatternMatcher(self.keyword_base_fields)
+        self.analyzedSubFieldMatcher = self.fieldPatternMatcher(self.analyzed_sub_fields)
+        self.keywordWhitelistMatcher = self.fieldPatternMatcher([ pattern.strip() for pattern in self.keyword_whitelist ])
+        self.keywordBlacklistMatcher = self.fieldPatternMatcher([ pattern.strip() for pattern in self.keyword_blacklist ])
+        self.caseInsensitiveWhitelistMatcher = self.fieldPatternMatcher(self.case_insensitive_whitelist)
+        self.caseInsensitiveBlacklistMatcher = self.fieldPatternMatcher(self.case_insensitive_blacklist)
+        self.fieldDecisions = dict()        # field name -> decisions of fieldNameMapping that don't depend on value
 
     def containsWildcard(self, value):
         """Determine if value contains wildcard."""
@@ -146,45 +217,16 @@ class ElasticsearchWildcardHandlingMixin(object):
         Further, determine if values contain wildcards. Additionally, determine if case insensitive regex should be used. Finally,
         if field value should be quoted based on the field name decision and store it in object property.
         """
-        force_keyword_whitelist = False # override everything AND set keyword and turn off case insensitivity
-        force_keyword_blacklist = False # override everything AND set analyzed field and turn off case insensitivity
-        force_keyword_type = False # make keyword
-        keyword_subfield_name = self.keyword_field
-        analyzed_subfield_name = self.analyzed_sub_field_name
-
-        # Set naming for keyword fields
-        if keyword_subfield_name == '':
-            force_keyword_type = True
-        elif len(self.keyword_base_fields) != 0 and any ([ fnmatch(fieldname, pattern) for pattern in self.keyword_base_fields ]):
-            keyword_subfield_name = ''
-        else:
-            keyword_subfield_name = '.%s'%keyword_subfield_name
-
-        # Set naming for analyzed fields
-        if analyzed_subfield_name != '':
-            analyzed_subfield_name = '.%s'%analyzed_subfield_name
+        try:
+            keyword_subfield_name, analyzed_subfield_name, force_keyword_type, force_keyword_blacklist, force_keyword_whitelist, self.CaseInSensitiveField = self.fieldDecisions[fieldname]
+        except KeyError:
+            decisions = self.fieldDecisions[fieldname] = self.decideFieldName(fieldname)
+            keyword_subfield_name, analyzed_subfield_name, force_keyword_type, force_keyword_blacklist, force_keyword_whitelist, self.CaseInSensitiveField = decisions
 
         # force keyword on agg_option used in Elasticsearch DSL query key
         if agg_option:
             force_keyword_type = True
 
-        # Only some analyzed subfield, so if not in this list then has to be keyword
-        if len(self.analyzed_sub_fields) != 0 and not any ([ fnmatch(fieldname, pattern) for pattern in self.analyzed_sub_fields ]):
-            force_keyword_type = True
-
-        # Keyword (force) exclude
-        if len(self.keyword_blacklist) != 0 and any ([ fnmatch(fieldname, pattern.strip()) for pattern in self.keyword_blacklist ]):
-            force_keyword_blacklist = True
-        # Keyword (force) include
-        elif len(self.keyword_whitelist) != 0 and any ([ fnmatch(fieldname, pattern.strip()) for pattern in self.keyword_whitelist ]):
-            force_keyword_whitelist = True
-
-        # Set case insensitive regex
-        if not (len( self.case_insensitive_blacklist ) != 0 and any([ fnmatch( fieldname, pattern ) for pattern in self.case_insensitive_blacklist ])) and len( self.case_insensitive_whitelist ) != 0 and any([ fnmatch( fieldname, pattern ) for pattern in self.case_insensitive_whitelist ]):
-            self.CaseInSensitiveField = True
-        else:
-            self.CaseInSensitiveField = False
-
         # Set type and value
         if force_keyword_blacklist:
             self.matchKeyword = False
@@ -209,34 +251,134 @@ class ElasticsearchWildcardHandlingMixin(object):
         else:
             return '%s%s'%(fieldname, analyzed_subfield_name)
 
+    def decideFieldName(self, fieldname):
+        """
+        Decisions of fieldNameMapping that only depend on the field name: keyword and analyzed sub-field names, if the
+        keyword field is forced by type, blacklist or whitelist and if values are matched case insensitive.
+        """
+        force_keyword_whitelist = False # override everything AND set keyword and turn off case insensitivity
+        force_keyword_blacklist = False # override everything AND set analyzed field and turn off case insensitivity
+        force_keyword_type = False # make keyword
+        keyword_subfield_name = self.keyword_field
+        analyzed_subfield_name = self.analyzed_sub_field_name
+
+        # Set naming for keyword fields
+        if keyword_subfield_name == '':
+            force_keyword_type = True
+        elif self.keywordBaseFieldMatcher(fieldname):
+            keyword_subfield_name = ''
+        else:
+            keyword_subfield_name = '.%s'%keyword_subfield_name
+
+        # Set naming for analyzed fields
+        if analyzed_subfield_name != '':
+            analyzed_subfield_name = '.%s'%analyzed_subfield_name
+
+        # Only some analyzed subfield, so if not in this list then has to be keyword
+        if len(self.analyzed_sub_fields) != 0 and not self.analyzedSubFieldMatcher(fieldname):
+            force_keyword_type = True
+
+        # Keyword (force) exclude
+        if self.keywordBlacklistMatcher(fieldname):
+            force_keyword_blacklist = True
+        # Keyword (force) include
+        elif self.keywordWhitelistMatcher(fieldname):
+            force_keyword_whitelist = True
+
+        # Set case insensitive regex
+        case_insensitive = not self.caseInsensitiveBlacklistMatcher(fieldname) and self.caseInsensitiveWhitelistMatcher(fieldname)
+        return (keyword_subfield_name, analyzed_subfield_name, force_keyword_type, force_keyword_blacklist, force_keyword_whitelist, case_insensitive)
+
     def makeCaseInSensitiveValue(self, value):
         """
         Returns dictionary of if should be a regex (`is_regex`) and if regex the query value ('value')
         Converts the query(value) into a case insensitive regular expression (regex). ie: 'http' would get converted to '[hH][tT][pP][pP]'
         Adds the beginning and ending '/' to make regex query if still determined that it should be a regex
         """
-        if value and not value == 'null' and not re.match(r'^/.*/$', value) and (re.search('[a-zA-Z]', value) and not re.match(self.uuid_regex, value) or self.containsWildcard(value)):  # re.search for alpha is fastest:
-            # Turn single ending '\\' into non escaped (ie: '\\*')
-            #value = re.sub( r"((?<!\\)(\\))\*$", "\g<1>\\*", value )
-            # Make upper/lower
-            value = re.sub( r"[A-Za-z]", lambda x: "[" + x.group( 0 ).upper() + x.group( 0 ).lower() + "]", value )
-            # Turn `.` into wildcard, only if odd number of '\'(because this would mean already escaped)
-            value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))\.", "\g<1>\.", value )
-            # Turn `*` into wildcard, only if odd number of '\'(because this would mean already escaped)
-            value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))\*", "\g<1>.*", value )
-            # Escape additional values that are treated as specific "operators" within Elastic. (ie: @, ?, &, <, >, and ~)
-            # reference: https://www.elastic.co/guide/en/elasticsearch/reference/current/regexp-syntax.html#regexp-optional-operators
-            value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))([@?&~<>])", "\g<1>\\\\\g<4>", value )
-            # Validate regex
-            try:
-                re.compile(value)
-                return {'is_regex': True, 'value': value}
-            # Regex failed
-            except re.error:
-                raise TypeError( "Regular expression validation error for: '%s')" %str(value) )
+        if value and not value == 'null' and not self.reSlashedValue(value) and (self.reContainsLetter(value) and not self.uuid_regex.match(value) or self.containsWildcard(value)):
+            return {'is_regex': True, 'value': self.caseInsensitiveRegex(value)}
         else:
             return { 'is_regex': False, 'value': value }
 
+    @classmethod
+    @lru_cache(maxsize=16384)
+    def caseInsensitiveRegex(cls, value):
+        """
+        Convert value into a case insensitive regular expression in one pass. Characters that are escaped by an odd
+        number of backslashes are kept as they are, except letters. The result only depends on the value and is cached
+        across rules.
+        """
+        parts = cls.reBackslashes.split(value)      # alternating: text, backslashes, text, ...
+        result = [ parts[0].translate(cls.caseInsensitiveChars) ]
+        for i in range(1, len(parts), 2):
+            backslashes, text = parts[i], parts[i + 1]
+            result.append(backslashes)
+            if len(backslashes) % 2 and text:       # first character is escaped
+                result.append(text[0].translate(cls.caseInsensitiveEscapedChars))
+                text = text[1:]
+            result.append(text.translate(cls.caseInsensitiveChars))
+        regex = "".join(result)
+
+        # Validate regex
+        try:
+            re.compile(regex)
+        except re.error:
+            raise TypeError( "Regular expression validation error for: '%s')" %str(regex) )
+        return regex
+
+    def mergeRegexes(self, regexes):
+        """
+        Merge regular expressions into one that matches if any of them matches by building a trie of their tokens, common
+        prefixes appear only once in the result. Returns None if a regular expression contains other constructs than
+        escaped characters, character classes of a letter in both cases, wildcards and plain characters.
+        """
+        trie = dict()
+        end = None      # key of end of regular expression in trie nodes
+        for regex in regexes:
+            tokens = self.reRegexToken.findall(regex)
+            if "".join(tokens) != regex:
+                return None
+            node = trie
+            for token in tokens:
+                node = node.setdefault(token, dict())
+            node[end] = None
+
+        def build(node):
+            """Build regular expression from trie node, recursion only happens at branches"""
+            parts = list()
+            while True:         # chains of single tokens are concatenated without recursion
+                if end in node or len(node) != 1:
+                    break
+                token, node = next(iter(node.items()))
+                parts.append(token)
+            alternatives = [ token + build(child) for token, child in node.items() if token is not end ]
+            if len(alternatives) == 1:
+                parts.append("(%s)?" % alternatives[0])
+            elif alternatives:
+                parts.append("(%s)%s" % ("|".join(alternatives), "?" if end in node else ""))
+            return "".join(parts)
+        try:
+            return build(trie)
+        except RecursionError:
+            return None
+
+    def mergeRegexValues(self, values, isRegex, getRegex, makeValue):
+        """
+        Replace values of a list that are mergeable regular expressions by one merged regular expression at the position
+        of the first one. isRegex decides if a value is a regular expression, getRegex extracts it from the value and
+        makeValue builds a value from a merged regular expression.
+        """
+        positions = [ i for i, value in enumerate(values) if isRegex(value) and not self.reRegexToken.sub("", getRegex(value)) ]
+        if len(positions) < 2:
+            return values
+        merged = self.mergeRegexes([ getRegex(values[i]) for i in positions ])
+        if merged is None:
+            return values
+        merged_positions = set(positions[1:])
+        result = [ value for i, value in enumerate(values) if i not in merged_positions ]
+        result[positions[0]] = makeValue(merged)
+        return result
+
 class ElasticsearchQuerystringBackend(DeepFieldMappingMixin, ElasticsearchWildcardHandlingMixin, SingleTextQueryBackend):
     """Converts Sigma rule into Elasticsearch query string. Only searches, no aggregations."""
     identifier = "es-qs"
@@ -273,6 +415,19 @@ class ElasticsearchQuerystringBackend(DeepFieldMappingMixin, ElasticsearchWildca
             else:
                 return "\"%s\"" % result
 
+    def generateListNode(self, node):
+        if not (self.case_insensitive_merge_lists and self.matchKeyword and self.CaseInSensitiveField):
+            return super().generateListNode(node)
+        if not set([type(value) for value in node]).issubset({str, int}):
+            raise TypeError("List values must be strings or numbers")
+        values = self.mergeRegexValues(
+                [ self.generateNode(value) for value in node ],
+                lambda value: len(value) >= 2 and value.startswith("/") and value.endswith("/"),
+                lambda value: value[1:-1],
+                lambda regex: "/%s/" % regex
+                )
+        return self.listExpression % (self.listSeparator.join(values))
+
     def generateNOTNode(self, node):
         expression = super().generateNode(node.item)
         if expression:
@@ -281,7 +436,7 @@ class ElasticsearchQuerystringBackend(DeepFieldMappingMixin, ElasticsearchWildca
     def generateSubexpressionNode(self, node):
         """Check for search not bound to a field and restrict search to keyword fields"""
         nodetype = type(node.items)
-        if nodetype in { ConditionAND, ConditionOR } and type(node.items.items) == list and { type(item) for item in node.items.items }.issubset({str, int}):
+        if nodetype in { ConditionAND, ConditionOR } and type(node.items.items) in (list, tuple) and { type(item) for item in node.items.items }.issubset({str, int}):
             newitems = list()
             for item in node.items:
                 newitem = item
@@ -320,6 +475,7 @@ class ElasticsearchDSLBackend(DeepFieldMappingMixin, RulenameCommentMixin, Elast
 
     def generate(self, sigmaparser):
         """Method is called for each sigma rule and receives the parsed rule (SigmaParser)"""
+        self.resetFieldState()
         self.title = sigmaparser.parsedyaml.setdefault("title", "")
         logsource = sigmaparser.get_logsource()
         if logsource is None:
@@ -329,10 +485,7 @@ class ElasticsearchDSLBackend(DeepFieldMappingMixin, RulenameCommentMixin, Elast
             if len(self.indices) == 0:
                 self.indices = None
 
-        try:
-            self.interval = sigmaparser.parsedyaml['detection']['timeframe']
-        except:
-            pass
+        self.interval = sigmaparser.parsedyaml['detection'].get('timeframe')
 
         for parsed in sigmaparser.condparsed:
             self.generateBefore(parsed)
@@ -422,6 +575,14 @@ class ElasticsearchDSLBackend(DeepFieldMappingMixin, RulenameCommentMixin, Elast
                     queryType = 'match_phrase'
                     value_cleaned = self.cleanValue(str(v))
                 res['bool']['should'].append({queryType: {key_mapped: value_cleaned}})
+            if self.case_insensitive_merge_lists:
+                for key_mapped in { key_mapped for query in res['bool']['should'] for key_mapped in query.get('regexp', ()) }:
+                    res['bool']['should'] = self.mergeRegexValues(
+                            res['bool']['should'],
+                            lambda query: key_mapped in query.get('regexp', ()),
+                            lambda query: query['regexp'][key_mapped],
+                            lambda regex: { 'regexp': { key_mapped: regex } }
+                            )
             return res
         elif value is None:
             key_mapped = self.fieldNameMapping(key, value)
@@ -577,6 +738,17 @@ class ElasticsearchDSLBackend(DeepFieldMappingMixin, RulenameCommentMixin, Elast
             else:
                 return json.dumps(self.queries, indent=2)
 
+    def extractState(self):
+        state = (self.queries, getattr(self, "indices", None))
+        self.queries = []
+        return state
+
+    def mergeState(self, state):
+        queries, indices = state
+        if queries:
+            self.queries.extend(queries)
+            self.indices = indices
+
 class KibanaBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin):
     """Converts Sigma rule into Kibana JSON Configuration files (searches only)."""
     identifier = "kibana"
@@ -594,6 +766,7 @@ class KibanaBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin):
         self.indexsearch = set()
 
     def generate(self, sigmaparser):
+        self.resetFieldState()
         description = sigmaparser.parsedyaml.setdefault("description", "")
 
         columns = list()
@@ -665,10 +838,7 @@ class KibanaBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin):
 
     def finalize(self):
         if self.output_type == "import":        # output format that can be imported via Kibana UI
-            for item in self.kibanaconf:    # JSONize kibanaSavedObjectMeta.searchSourceJSON
-                item['_source']['kibanaSavedObjectMeta']['searchSourceJSON'] = json.dumps(item['_source']['kibanaSavedObjectMeta']['searchSourceJSON'])
-            if self.kibanaconf:
-                return json.dumps(self.kibanaconf, indent=2)
+            return "".join(self.iterFinalize()) or None
         elif self.output_type == "curl":
             for item in self.indexsearch:
                 return item
@@ -688,6 +858,32 @@ class KibanaBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin):
         else:
             raise NotImplementedError("Output type '%s' not supported" % self.output_type)
 
+    def iterFinalize(self):
+        if self.output_type == "import":
+            separator = "[\n  "
+            for item in self.kibanaconf:    # JSON list like json.dumps(self.kibanaconf, indent=2), item by item
+                item['_source']['kibanaSavedObjectMeta']['searchSourceJSON'] = json.dumps(item['_source']['kibanaSavedObjectMeta']['searchSourceJSON'])
+                yield separator + json.dumps(item, indent=2).replace("\n", "\n  ")
+                separator = ",\n  "
+            if self.kibanaconf:
+                yield "\n]"
+        else:
+            yield from super().iterFinalize()
+
+    def extractState(self):
+        state = (self.kibanaconf, self.indexsearch)
+        self.kibanaconf = list()
+        self.indexsearch = set()
+        self.rulenames = set()
+        return state
+
+    def mergeState(self, state):
+        kibanaconf, indexsearch = state
+        for item in kibanaconf:
+            item['_id'] = self.addRuleName(item['_id'])
+            self.kibanaconf.append(item)
+        self.indexsearch.update(indexsearch)
+
     def index_variable_name(self, index):
         return "index_" + index.replace("-", "__").replace("*", "X")
 
@@ -736,6 +932,7 @@ class XPackWatcherBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin)
         self.url_prefix = self.watcher_urls[self.watcher_url]
 
     def generate(self, sigmaparser):
+        self.resetFieldState()
         # get the details if this alert occurs
         title = sigmaparser.parsedyaml.setdefault("title", "")
         description = sigmaparser.parsedyaml.setdefault("description", "")
@@ -994,17 +1191,28 @@ class XPackWatcherBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin)
                             }
 
     def finalize(self):
-        result = ""
+        return "".join(self.iterFinalize())
+
+    def iterFinalize(self):
         for rulename, rule in self.watcher_alert.items():
             if self.output_type == "plain":     # output request line + body
-                result += "PUT %s/watch/%s\n%s\n" % (self.url_prefix, rulename, json.dumps(rule, indent=2))
+                yield "PUT %s/watch/%s\n%s\n" % (self.url_prefix, rulename, json.dumps(rule, indent=2))
             elif self.output_type == "curl":      # output curl command line
-                result += "curl -s -XPUT -H 'Content-Type: application/json' --data-binary @- %s/%s/watch/%s <<EOF\n%s\nEOF\n" % (self.es, self.url_prefix, rulename, json.dumps(rule, indent=2))
+                yield "curl -s -XPUT -H 'Content-Type: application/json' --data-binary @- %s/%s/watch/%s <<EOF\n%s\nEOF\n" % (self.es, self.url_prefix, rulename, json.dumps(rule, indent=2))
             elif self.output_type == "json":    # output compressed watcher json, one per line
-                result += json.dumps(rule) + "\n"
+                yield json.dumps(rule) + "\n"
             else:
                 raise NotImplementedError("Output type '%s' not supported" % self.output_type)
-        return result
+
+    def extractState(self):
+        state = self.watcher_alert
+        self.watcher_alert = dict()
+        self.rulenames = set()
+        return state
+
+    def mergeState(self, state):
+        for rulename, rule in state.items():
+            self.watcher_alert[self.addRuleName(rulename)] = rule
 
 class ElastalertBackend(DeepFieldMappingMixin, MultiRuleOutputMixin):
     """Elastalert backend"""
@@ -1037,6 +1245,7 @@ class ElastalertBackend(DeepFieldMappingMixin, MultiRuleOutputMixin):
         self.fields = []
 
     def generate(self, sigmaparser):
+        self.resetFieldState()
         self.logsource = sigmaparser.parsedyaml.get("logsource", {})
         rulename = self.getRuleName(sigmaparser)
         title = sigmaparser.parsedyaml.setdefault("title", "")
@@ -1189,11 +1398,23 @@ class ElastalertBackend(DeepFieldMappingMixin, MultiRuleOutputMixin):
         }.get(level, 2)
 
     def finalize(self):
-        result = ""
+        return "".join(self.iterFinalize())
+
+    def iterFinalize(self):
         for rulename, rule in self.elastalert_alerts.items():
-            result += yaml.dump(rule, default_flow_style=False, width=10000)
-            result += '\n'
-        return result
+            yield yaml.dump(rule, default_flow_style=False, width=10000) + '\n'
+
+    def extractState(self):
+        state = self.elastalert_alerts
+        self.elastalert_alerts = dict()
+        self.rulenames = set()
+        return state
+
+    def mergeState(self, state):
+        for rulename, rule in state.items():
+            rulename = self.addRuleName(rulename)
+            rule['name'] = rulename
+            self.elastalert_alerts[rulename] = rule
 
 class ElastalertBackendDsl(ElastalertBackend, ElasticsearchDSLBackend):
     """Elastalert backend"""
@@ -1202,7 +1423,8 @@ class ElastalertBackendDsl(ElastalertBackend, ElasticsearchDSLBackend):
         super().__init__(*args, **kwargs)
 
     def generateQuery(self, parsed):
-        #Generate ES DSL Query
+        #Generate ES DSL Query, queries left by a failed conversion of a previous rule are discarded
+        self.queries = []
         super().generateBefore(parsed)
         super().generateQuery(parsed)
         super().generateAfter(parsed)
@@ -1222,29 +1444,17 @@ class ElasticSearchRuleBackend(ElasticsearchQuerystringBackend):
     """Elasticsearch detection rule backend"""
     identifier = "es-rule"
     active = True
-    uuid_black_list = []
+    independent_rules = False   # duplicate rule IDs of all converted rules get random IDs
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.tactics = self._load_mitre_file("tactics")
-        self.techniques = self._load_mitre_file("techniques")
+        self.uuid_black_list = []       # rule IDs used by this instance, duplicates get a random ID
+        self.mitre = get_attack_catalog()
+        self.tactics = self.mitre.tactics
+        self.techniques = self.mitre.techniques
         self.rule_type = "query"
         self.rule_threshold = {}
 
-    def _load_mitre_file(self, mitre_type):
-        try:
-            backend_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config", "mitre"))
-            path = os.path.join(backend_dir,"{}.json".format(mitre_type))
-            with open(path, 'r') as config_file:
-                config = json.load(config_file)
-                return config
-        except (IOError, OSError) as e:
-            print("Failed to open {} configuration file '%s': %s".format(path, str(e)), file=sys.stderr)
-            return []
-        except json.JSONDecodeError as e:
-            print("Failed to parse {} configuration file '%s' as valid YAML: %s" % (path, str(e)), file=sys.stderr)
-            return []
-
     def generate(self, sigmaparser):
         translation = super().generate(sigmaparser)
         if translation:
@@ -1294,16 +1504,10 @@ class ElasticSearchRuleBackend(ElasticsearchQuerystringBackend):
         return threat_list
 
     def find_tactics(self, key_name=None, key_id=None):
-        for tactic in self.tactics:
-            if key_name and key_name == tactic.get("tactic", ""):
-                return tactic
-            if key_id and key_id == tactic.get("external_id", ""):
-                return tactic
+        return self.mitre.find_tactic(name=key_name, external_id=key_id)
 
     def find_technique(self, key_id=None):
-        for technique in self.techniques:
-            if key_id and key_id == technique.get("technique_id", ""):
-                return technique
+        return self.mitre.find_technique(key_id)
 
     def map_risk_score(self, level):
         if level not in ["low","medium","high","critical"]:
@@ -1428,6 +1632,7 @@ class KibanaNdjsonBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin)
         self.indexsearch = set()
 
     def generate(self, sigmaparser):
+        self.resetFieldState()
         description = sigmaparser.parsedyaml.setdefault("description", "")
 
         columns = list()
@@ -1506,14 +1711,7 @@ class KibanaNdjsonBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin)
 
     def finalize(self):
         if self.output_type == "import":        # output format that can be imported via Kibana UI
-            for item in self.kibanaconf:    # JSONize kibanaSavedObjectMeta.searchSourceJSON
-                item['attributes']['kibanaSavedObjectMeta']['searchSourceJSON'] = json.dumps(item['attributes']['kibanaSavedObjectMeta']['searchSourceJSON'])
-            if self.kibanaconf:
-                ndjson = ""
-                for item in self.kibanaconf:
-                    ndjson += json.dumps(item)
-                    ndjson += "\n"
-                return ndjson
+            return "".join(self.iterFinalize()) or None
         elif self.output_type == "curl":
             for item in self.indexsearch:
                 return item
@@ -1533,5 +1731,27 @@ class KibanaNdjsonBackend(ElasticsearchQuerystringBackend, MultiRuleOutputMixin)
         else:
             raise NotImplementedError("Output type '%s' not supported" % self.output_type)
 
+    def iterFinalize(self):
+        if self.output_type == "import":
+            for item in self.kibanaconf:    # JSONize kibanaSavedObjectMeta.searchSourceJSON
+                item['attributes']['kibanaSavedObjectMeta']['searchSourceJSON'] = json.dumps(item['attributes']['kibanaSavedObjectMeta']['searchSourceJSON'])
+                yield json.dumps(item) + "\n"
+        else:
+            yield from super().iterFinalize()
+
+    def extractState(self):
+        state = (self.kibanaconf, self.indexsearch)
+        self.kibanaconf = list()
+        self.indexsearch = set()
+        self.rulenames = set()
+        return state
+
+    def mergeState(self, state):
+        kibanaconf, indexsearch = state
+        for item in kibanaconf:
+            item['id'] = self.addRuleName(item['id'])
+            self.kibanaconf.append(item)
+        self.indexsearch.update(indexsearch)
+
     def index_variable_name(self, index):
         return "index_" + index.replace("-", "__").replace("*", "X")
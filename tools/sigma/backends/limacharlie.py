@@ -18,6 +18,7 @@ import re
 import yaml
 from collections import namedtuple
 from .base import BaseBackend
+from sigma.tools import loadYAML
 from sigma.parser.modifiers.base import SigmaTypeModifier
 from sigma.parser.modifiers.type import SigmaRegularExpressionModifier
 
@@ -347,7 +348,7 @@ class LimaCharlieBackend(BaseBackend):
         # generating the yaml, but we try to use the parent
         # official class code as much as possible for future
         # compatibility.
-        detectComponent = yaml.safe_load(detectComponent)
+        detectComponent = loadYAML(detectComponent)
 
         # Check that we got a proper node and not just a string
         # which we don't really know what to do with.
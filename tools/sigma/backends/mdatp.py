@@ -38,6 +38,7 @@ class WindowsDefenderATPBackend(SingleTextQueryBackend):
     """Converts Sigma rule into Microsoft Defender ATP Hunting Queries."""
     identifier = "mdatp"
     active = True
+    independent_rules = False   # the OR token of a rule is kept for following rules
     config_required = False
 
     reEscape = re.compile('(?:\\\\)?(")')
@@ -0,0 +1,99 @@
+# MITRE ATT&CK tactics and techniques used by rule backends
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+
+# Directory with tactics.json and techniques.json generated by update_mitre.py
+default_path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config", "mitre"))
+
+class AttackCatalog(object):
+    """
+    MITRE ATT&CK tactics and techniques with indexes by tactic name, short name and ID and by technique ID.
+
+    If an index key appears multiple times, e.g. a tactic name that exists in the enterprise and mobile matrix,
+    the first entry is indexed like it was found by a linear search of the lists.
+    """
+    def __init__(self, tactics, techniques):
+        self.tactics = tactics
+        self.techniques = techniques
+        self.tactics_by_name = dict()
+        self.tactics_by_shortname = dict()
+        self.tactics_by_id = dict()
+        self.techniques_by_id = dict()
+        for tactic in tactics:
+            name = tactic.get("tactic", "")
+            self.tactics_by_name.setdefault(name, tactic)
+            self.tactics_by_shortname.setdefault(self.shortname(name), tactic)
+            self.tactics_by_id.setdefault(tactic.get("external_id", ""), tactic)
+        for technique in techniques:
+            self.techniques_by_id.setdefault(technique.get("technique_id", ""), technique)
+
+    @staticmethod
+    def shortname(name):
+        """Short name of tactic like used in ATT&CK kill chain phases and Sigma tags, e.g. initial_access"""
+        return name.lower().replace(" ", "_")
+
+    @classmethod
+    def load(cls, path=default_path):
+        """Load tactics.json and techniques.json from directory. Files that can't be read are reported and treated as empty."""
+        return cls(cls.load_file(path, "tactics"), cls.load_file(path, "techniques"))
+
+    @staticmethod
+    def load_file(path, mitre_type):
+        path = os.path.join(path, "{}.json".format(mitre_type))
+        try:
+            with open(path) as mitre_file:
+                return json.load(mitre_file)
+        except (IOError, OSError) as e:
+            print("Failed to open {} configuration file '{}': {}".format(mitre_type, path, str(e)), file=sys.stderr)
+            return []
+        except json.JSONDecodeError as e:
+            print("Failed to parse {} configuration file '{}' as valid JSON: {}".format(mitre_type, path, str(e)), file=sys.stderr)
+            return []
+
+    def find_tactic(self, name=None, external_id=None, shortname=None):
+        """Return tactic by name, ID (e.g. TA0001) or short name, None if there's no such tactic"""
+        if name:
+            return self.tactics_by_name.get(name)
+        if external_id:
+            return self.tactics_by_id.get(external_id)
+        if shortname:
+            return self.tactics_by_shortname.get(shortname)
+        return None
+
+    def find_technique(self, technique_id):
+        """Return technique by ID (e.g. T1059 or T1059.001), None if there's no such technique"""
+        if not technique_id:
+            return None
+        return self.techniques_by_id.get(technique_id)
+
+    def find_techniques(self, technique_ids):
+        """Yield techniques with given IDs, each ID is looked up once"""
+        for technique_id in set(technique_ids):
+            technique = self.find_technique(technique_id)
+            if technique is not None:
+                yield technique
+
+catalogs = dict()       # path -> AttackCatalog
+
+def get_attack_catalog(path=default_path):
+    """Return catalog of ATT&CK data from directory, loaded on first use and shared by all backends"""
+    try:
+        return catalogs[path]
+    except KeyError:
+        catalog = catalogs[path] = AttackCatalog.load(path)
+        return catalog
@@ -71,6 +71,13 @@ class MultiRuleOutputMixin:
             rulename = sigmaparser.parsedyaml["id"]
         except KeyError:
             rulename = sigmaparser.parsedyaml["title"].replace(" ", "-").replace("(", "").replace(")", "")
+        return self.addRuleName(rulename)
+
+    def addRuleName(self, rulename):
+        """
+        Track rule name and make it unique by addition of a counter if it was already used. Also used for renaming
+        of rules from merged conversion states.
+        """
         if rulename in self.rulenames:   # add counter if name collides
             cnt = 2
             while "%s-%d" % (rulename, cnt) in self.rulenames:
@@ -23,6 +23,7 @@ class PowerShellBackend(SingleTextQueryBackend):
     """Converts Sigma rule into PowerShell event log cmdlets."""
     identifier = "powershell"
     active = True
+    independent_rules = False   # the log name of a rule is kept for following rules
     config_required = False
     default_config = ["sysmon", "powershell"]
     options = (
@@ -0,0 +1,408 @@
+# Output backends for sigmac
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+from .base import BaseBackend
+from .mixins import MultiRuleOutputMixin
+from sigma.parser.modifiers.base import SigmaTypeModifier
+from sigma.parser.modifiers.type import SigmaRegularExpressionModifier
+
+### Runtime of generated matchers
+# Events are mappings from field names to values. Values are compared as strings, case insensitive except for regular
+# expressions of the re modifier. Missing fields and fields with value None are treated as null.
+
+def nestedValue(event, field):
+    """Value of dotted field name in nested mappings of event, None if there's no such value"""
+    value = event
+    for name in field.split("."):
+        try:
+            value = value[name]
+        except (KeyError, TypeError, IndexError):
+            return None
+    return value
+
+def rawFieldValue(event, field):
+    """Value of field in event as string, None if event doesn't contain the field"""
+    value = event.get(field)
+    if value is None:
+        if "." not in field:
+            return None
+        value = nestedValue(event, field)
+        if value is None:
+            return None
+    if value.__class__ is str:
+        return value
+    return str(value)
+
+def fieldValue(event, field):
+    """Lowercase value of field in event, None if event doesn't contain the field"""
+    value = event.get(field)
+    if value is None:
+        if "." not in field:
+            return None
+        value = nestedValue(event, field)
+        if value is None:
+            return None
+    if value.__class__ is str:
+        return value.lower()
+    return str(value).lower()
+
+def startsWith(value, prefixes):
+    return value is not None and value.startswith(prefixes)
+
+def endsWith(value, suffixes):
+    return value is not None and value.endswith(suffixes)
+
+def containsAny(value, substrings):
+    if value is not None:
+        for substring in substrings:
+            if substring in value:
+                return True
+    return False
+
+def fullMatch(value, pattern):
+    return value is not None and pattern.fullmatch(value) is not None
+
+def search(value, pattern):
+    return value is not None and pattern.search(value) is not None
+
+def matchesAny(value, exact, prefixes, suffixes, substrings, pattern):
+    """Check value against the different kinds of values of a value list, cheapest checks first"""
+    if value is None:
+        return False
+    if value in exact or value.startswith(prefixes) or value.endswith(suffixes):
+        return True
+    for substring in substrings:
+        if substring in value:
+            return True
+    return pattern is not None and pattern.fullmatch(value) is not None
+
+def eventValues(value):
+    """Yield lowercase strings of all values contained in event"""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from eventValues(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from eventValues(item)
+    elif value is not None:
+        yield value.lower() if value.__class__ is str else str(value).lower()
+
+def keywordSearch(event, substrings, pattern):
+    """Search keywords in all values of event, which are joined by NUL characters that are not matched by keywords"""
+    text = "\0".join(eventValues(event))
+    for substring in substrings:
+        if substring in text:
+            return True
+    return pattern is not None and pattern.search(text) is not None
+
+runtime = {
+        "re": re,
+        "rawFieldValue": rawFieldValue,
+        "fieldValue": fieldValue,
+        "startsWith": startsWith,
+        "endsWith": endsWith,
+        "containsAny": containsAny,
+        "fullMatch": fullMatch,
+        "search": search,
+        "matchesAny": matchesAny,
+        "keywordSearch": keywordSearch,
+        }
+
+### Backend
+class PythonBackend(MultiRuleOutputMixin, BaseBackend):
+    """
+    Compiles Sigma rules into Python functions that match events given as mappings from field names to values. Each
+    rule results in a function with the event as only argument that is defined in the namespace of the runtime of this
+    module. Literals are lowercased, wildcards are split into exact, prefix, suffix and contains checks or compiled into
+    regular expressions and regular expressions of the re modifier are compiled at generation time, they are bound to
+    default arguments of the function with the runtime functions that are used by it.
+    """
+    identifier = "python"
+    active = True
+    config_required = False
+
+    reWildcardToken = re.compile(r"\\\\(?=[*?])|\\[*?]|[*?]|[^*?\\]+|\\")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.constants = dict()         # Python expression of constant -> argument name
+        self.used = set()               # runtime functions used by the generated expression
+
+    def generate(self, sigmaparser):
+        """Generate source code of a function that matches the rule, the rule title is prefixed as comment."""
+        funcname = "rule_" + re.sub(r"\W", "_", self.getRuleName(sigmaparser))
+        return "# %s\n%s" % (sigmaparser.parsedyaml.get("title", ""), self.generateFunction(sigmaparser, funcname))
+
+    def generateMatcher(self, sigmaparser):
+        """Return a function that returns True for events that match the rule."""
+        namespace = dict(runtime)
+        exec(self.generateFunction(sigmaparser, "match"), namespace)
+        return namespace["match"]
+
+    def generateNodeMatcher(self, node):
+        """Return a function that returns True for events that match a node of the parse tree, e.g. a search with aggregation."""
+        self.constants = dict()
+        self.used = set()
+        namespace = dict(runtime)
+        exec(self.functionSource("match", self.generateNode(node)), namespace)
+        return namespace["match"]
+
+    def generateFunction(self, sigmaparser, funcname):
+        """Source code of a function that matches one of the conditions of the rule"""
+        self.constants = dict()
+        self.used = set()
+        return self.functionSource(funcname, self.combineOr([ self.generateQuery(parsed) for parsed in sigmaparser.condparsed ]))
+
+    def functionSource(self, funcname, expression):
+        """Source code of a function that returns the expression, used runtime functions and constants are bound to arguments"""
+        arguments = [ "event" ] + [ "%s=%s" % (name, name) for name in sorted(self.used) ] + \
+                [ "%s=%s" % (name, constant) for constant, name in self.constants.items() ]
+        return "def %s(%s):\n    return %s\n" % (funcname, ", ".join(arguments), expression)
+
+    def generateQuery(self, parsed):
+        if parsed.parsedAgg:
+            raise NotImplementedError("Aggregations are not supported by the python backend")
+        return self.generateNode(parsed.parsedSearch)
+
+    def use(self, name):
+        """Name of a runtime function used by the generated expression"""
+        self.used.add(name)
+        return name
+
+    def constant(self, expression):
+        """Name of the argument that is bound to the Python expression of a constant"""
+        try:
+            return self.constants[expression]
+        except KeyError:
+            name = "_c%d" % len(self.constants)
+            self.constants[expression] = name
+            return name
+
+    def compileOverrides(self):
+        """Overrides substitute text of queries, they don't apply to generated code."""
+        pass
+
+    def compilePattern(self, patterns, flags=""):
+        return self.constant("re.compile(%r%s)" % (patterns[0] if len(patterns) == 1 else "|".join("(?:%s)" % pattern for pattern in patterns), flags))
+
+    def splitWildcards(self, value):
+        """
+        Split value into a list of lowercased literal strings and the wildcards * and ? given as None and False.
+        Wildcards are escaped by a backslash, a double backslash before a wildcard is a literal backslash followed by
+        the wildcard (like the contains, startswith and endswith modifiers append wildcards to values that end with a
+        backslash), other backslashes are literal.
+        """
+        parts = list()
+        for token in self.reWildcardToken.findall(str(value)):
+            if token == "*":
+                parts.append(None)
+            elif token == "?":
+                parts.append(False)
+            else:
+                if token in ("\\\\", "\\*", "\\?"):
+                    token = token[1]
+                if parts and isinstance(parts[-1], str):
+                    parts[-1] += token.lower()
+                else:
+                    parts.append(token.lower())
+        return parts
+
+    def classifyValues(self, values):
+        """
+        Sort values into the kinds exact, prefix, suffix, contains, pattern (regular expression for full matches) and
+        exists (the value * matches all non-null values). Returns a dict from kind to list of values.
+        """
+        kinds = { "exact": [], "prefix": [], "suffix": [], "contains": [], "pattern": [], "exists": [] }
+        for value in values:
+            parts = self.splitWildcards(value)
+            literals = [ part for part in parts if isinstance(part, str) ]
+            if not parts:
+                kinds["exact"].append("")
+            elif all(part is None for part in parts):
+                kinds["exists"].append(value)
+            elif len(literals) == len(parts):
+                kinds["exact"].append(literals[0])
+            elif len(literals) == 1 and False not in parts:
+                if parts[0] is None and parts[-1] is None:
+                    kinds["contains"].append(literals[0])
+                elif parts[0] is None:
+                    kinds["suffix"].append(literals[0])
+                else:
+                    kinds["prefix"].append(literals[0])
+            else:
+                kinds["pattern"].append(self.wildcardPattern(parts))
+        return kinds
+
+    def wildcardPattern(self, parts, anychar="."):
+        return "".join(anychar + "*" if part is None else anychar if part is False else re.escape(part) for part in parts)
+
+    def generateValueCheck(self, fieldname, values):
+        """Python expression that checks if the field value matches one of the values"""
+        kinds = self.classifyValues(values)
+        value = "%s(event, %r)" % (self.use("fieldValue"), fieldname)
+        if kinds["exists"]:
+            return "%s is not None" % value
+        present = [ kind for kind, items in kinds.items() if items ]
+        if len(present) > 1:
+            return "%s(%s, %s, %s, %s, %s, %s)" % (
+                    self.use("matchesAny"), value,
+                    self.constant("frozenset(%r)" % (tuple(sorted(set(kinds["exact"]))),)),
+                    self.constant(repr(tuple(kinds["prefix"]))),
+                    self.constant(repr(tuple(kinds["suffix"]))),
+                    self.constant(repr(tuple(kinds["contains"]))),
+                    self.compilePattern(kinds["pattern"], ", re.S") if kinds["pattern"] else None,
+                    )
+        kind = present[0]
+        items = kinds[kind]
+        if kind == "exact":
+            if len(items) == 1:
+                return "%s == %r" % (value, items[0])
+            return "%s in %s" % (value, self.constant("frozenset(%r)" % (tuple(sorted(set(items))),)))
+        elif kind == "pattern":
+            return "%s(%s, %s)" % (self.use("fullMatch"), value, self.compilePattern(items, ", re.S"))
+        function = { "prefix": "startsWith", "suffix": "endsWith", "contains": "containsAny" }[kind]
+        return "%s(%s, %s)" % (self.use(function), value, self.constant(repr(tuple(items))))
+
+    def splitKeywords(self, values):
+        """Split keywords into substrings and regular expressions of keywords with wildcards"""
+        substrings = list()
+        patterns = list()
+        for value in values:
+            parts = self.splitWildcards(value)
+            while parts and parts[0] is None:           # keywords match anywhere in a value
+                parts.pop(0)
+            while parts and parts[-1] is None:
+                parts.pop()
+            if len(parts) == 1 and isinstance(parts[0], str) and "\0" not in parts[0]:
+                substrings.append(parts[0])
+            elif not parts:
+                substrings.append("")
+            else:
+                patterns.append(self.wildcardPattern(parts, "[^\\0]"))
+        return substrings, patterns
+
+    def generateKeywordCheck(self, values):
+        """Python expression that searches keywords in all values of the event"""
+        substrings, patterns = self.splitKeywords(values)
+        return "%s(event, %s, %s)" % (
+                self.use("keywordSearch"),
+                self.constant(repr(tuple(substrings))),
+                self.compilePattern(patterns, ", re.S") if patterns else None,
+                )
+
+    def combineAnd(self, checks):
+        return checks[0] if len(checks) == 1 else "(%s)" % " and ".join(checks)
+
+    def combineOr(self, checks):
+        if not checks:
+            return "False"
+        return checks[0] if len(checks) == 1 else "(%s)" % " or ".join(checks)
+
+    def negate(self, check):
+        return "(not %s)" % check
+
+    def generateANDNode(self, node):
+        return self.combineAnd([ self.generateNode(item) for item in node ])
+
+    def generateORNode(self, node):
+        """Keywords and plain values of the same field are merged into one check"""
+        keywords = list()
+        fieldvalues = dict()        # field name -> values
+        checks = list()             # "keywords", "values" with field name or "generated" with check in order of the items
+        for item in node:
+            if type(item) in (str, int):
+                if not keywords:
+                    checks.append(("keywords", None))
+                keywords.append(item)
+            elif type(item) == tuple and self.isPlainValue(item[1]):
+                fieldname, value = item
+                if fieldname not in fieldvalues:
+                    fieldvalues[fieldname] = list()
+                    checks.append(("values", fieldname))
+                fieldvalues[fieldname].extend(value if type(value) == list else [ value ])
+            else:
+                checks.append(("generated", self.generateNode(item)))
+
+        generated = list()
+        for kind, check in checks:
+            if kind == "keywords":
+                generated.append(self.generateKeywordCheck(keywords))
+            elif kind == "values":
+                generated.append(self.generateValueCheck(check, fieldvalues[check]))
+            else:
+                generated.append(check)
+        return self.combineOr(generated)
+
+    def isPlainValue(self, value):
+        return type(value) in (str, int) or type(value) == list and all(type(item) in (str, int) for item in value)
+
+    def generateNOTNode(self, node):
+        return self.negate(self.generateNode(node.item))
+
+    def generateSubexpressionNode(self, node):
+        return self.generateNode(node.items)
+
+    def generateListNode(self, node):
+        if not set([type(value) for value in node]).issubset({str, int}):
+            raise TypeError("List values must be strings or numbers")
+        return self.generateKeywordCheck(node)
+
+    def generateValueNode(self, node):
+        return self.generateKeywordCheck([ node ])
+
+    def generateMapItemNode(self, node):
+        fieldname, value = node
+        if value is None:
+            return self.generateNullCheck(fieldname, True)
+        elif type(value) in (str, int):
+            return self.generateValueCheck(fieldname, [ value ])
+        elif type(value) == list:
+            values = [ item for item in value if type(item) in (str, int) ]
+            typed = [ item for item in value if isinstance(item, SigmaTypeModifier) ]
+            if len(values) + len(typed) < len(value):
+                raise TypeError("List values must be strings, numbers or typed values")
+            checks = [ self.generateValueCheck(fieldname, values) ] if values else []
+            checks += [ self.generateTypedCheck(fieldname, item) for item in typed ]
+            return self.combineOr(checks)
+        elif isinstance(value, SigmaTypeModifier):
+            return self.generateTypedCheck(fieldname, value)
+        else:
+            raise TypeError("Backend does not support map values of type " + str(type(value)))
+
+    def regularExpression(self, value):
+        """Regular expression of a typed value, raises NotImplementedError for other types and invalid expressions"""
+        if type(value) != SigmaRegularExpressionModifier:
+            raise NotImplementedError("Type modifier '{}' is not supported by backend".format(value.identifier))
+        try:
+            re.compile(value.value)
+        except re.error as e:
+            raise NotImplementedError("Regular expression '{}' is not supported by backend: {}".format(value.value, str(e)))
+        return value.value
+
+    def generateTypedCheck(self, fieldname, value):
+        return "%s(%s(event, %r), %s)" % (self.use("search"), self.use("rawFieldValue"), fieldname, self.compilePattern([ self.regularExpression(value) ]))
+
+    def generateTypedValueNode(self, node):
+        raise NotImplementedError("Type modifier '{}' is not supported as keyword by backend".format(node.identifier))
+
+    def generateNullCheck(self, fieldname, null):
+        return "%s(event, %r) %s None" % (self.use("rawFieldValue"), fieldname, "is" if null else "is not")
+
+    def generateNULLValueNode(self, node):
+        return self.generateNullCheck(node.item, True)
+
+    def generateNotNULLValueNode(self, node):
+        return self.generateNullCheck(node.item, False)
@@ -22,6 +22,7 @@ class QualysBackend(SingleTextQueryBackend):
     """Converts Sigma rule into Qualys saved search. Contributed by SOC Prime. https://socprime.com"""
     identifier = "qualys"
     active = True
+    independent_rules = False   # the partial match flag of a rule is kept for following rules
     config_required = False
     default_config = ["sysmon", "qualys"]
     andToken = " and "
@@ -0,0 +1,346 @@
+# Matching of events against sets of Sigma rules with shared predicates
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+from collections import deque
+from .python import PythonBackend, rawFieldValue, fieldValue, fullMatch, search, eventValues
+
+class AhoCorasick:
+    """Aho-Corasick automaton that finds all occurrences of a set of words in one pass over a text"""
+    def __init__(self, words):
+        self.goto = [ dict() ]          # state -> character -> state
+        self.outputs = [ () ]           # state -> indices of words that end in this state
+        for index, word in enumerate(words):
+            state = 0
+            for char in word:
+                following = self.goto[state].get(char)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto[state][char] = following
+                    self.goto.append(dict())
+                    self.outputs.append(())
+                state = following
+            self.outputs[state] += (index,)
+
+        self.fail = [ 0 ] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[following] = self.goto[fail].get(char, 0)
+                self.outputs[following] += self.outputs[self.fail[following]]
+
+    def iter(self, text):
+        """Yield tuples (end position, word index) of all occurrences of the words in text"""
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        state = 0
+        for end, char in enumerate(text, 1):
+            following = goto[state].get(char)
+            while following is None and state:
+                state = fail[state]
+                following = goto[state].get(char)
+            state = following or 0
+            for index in outputs[state]:
+                yield end, index
+
+class FieldIndex:
+    """
+    Eager predicates of one field: exact values in a hash table, contains, prefix and suffix literals in one
+    Aho-Corasick automaton and regular expressions that are searched (only used for keywords).
+    """
+    def __init__(self):
+        self.exact = dict()         # value -> predicate ids
+        self.literals = dict()      # literal -> [ contains, prefix, suffix predicate ids ]
+        self.present = list()       # predicates that are true for all values, e.g. empty literals
+        self.patterns = list()      # (compiled regular expression, predicate id)
+        self.automaton = None
+
+    def add(self, kind, value, pid):
+        if kind == "exact":
+            self.exact.setdefault(value, list()).append(pid)
+        elif kind == "pattern":
+            self.patterns.append((re.compile(value, re.S), pid))
+        elif value == "":
+            self.present.append(pid)
+        else:
+            self.literals.setdefault(value, [ None, None, None ])[("contains", "prefix", "suffix").index(kind)] = pid
+            self.automaton = None
+
+    def fire(self, value, fired):
+        """Add ids of predicates that are true for the lowercase value to set fired"""
+        pids = self.exact.get(value)
+        if pids:
+            fired.update(pids)
+        if self.present:
+            fired.update(self.present)
+        for pattern, pid in self.patterns:
+            if pattern.search(value) is not None:
+                fired.add(pid)
+        if not self.literals:
+            return
+        if self.automaton is None:
+            self.words = list(self.literals.items())
+            self.automaton = AhoCorasick([ word for word, pids in self.words ])
+        length = len(value)
+        words = self.words
+        for end, index in self.automaton.iter(value):
+            word, (contains, prefix, suffix) = words[index]
+            if contains is not None:
+                fired.add(contains)
+            if prefix is not None and end == len(word):
+                fired.add(prefix)
+            if suffix is not None and end == length:
+                fired.add(suffix)
+
+class RuleSetBackend(PythonBackend):
+    """
+    Generates the conditions of the rules of a RuleSet as expressions over predicates of the rule set instead of
+    events. Exact values and contains, prefix and suffix literals are eager predicates that are evaluated for each
+    event by the field indices and are contained in the set fired if they are true. The others are evaluated by
+    lazy() when needed. Beside the expression, each check has a cover tree of eager predicates of which one must be
+    true for the check to be true: a set of predicates, tuples ("and", trees) and ("or", trees) or None if the check
+    can be true without any eager predicate. The rule set chooses the cover of the rule from the tree. Keywords are
+    eager predicates on the values of the event joined by NUL characters, including keywords with wildcards.
+    """
+    identifier = "python-ruleset"
+    active = False
+
+    def __init__(self, sigmaconfig, backend_options, ruleset):
+        super().__init__(sigmaconfig, backend_options)
+        self.ruleset = ruleset
+
+    def generateFunction(self, sigmaparser, funcname):
+        """Source code of a function of fired and lazy that matches the rule and the cover of the rule"""
+        self.constants = dict()
+        expression, cover = self.combineOr([ self.generateQuery(parsed) for parsed in sigmaparser.condparsed ])
+        arguments = [ "fired", "lazy" ] + [ "%s=%s" % (name, constant) for constant, name in self.constants.items() ]
+        return "def %s(%s):\n    return %s\n" % (funcname, ", ".join(arguments), expression), cover
+
+    def generatePredicateCheck(self, eager, lazy):
+        """Check that is true if one of the eager or lazy predicates is true"""
+        eager = sorted(set(eager))
+        checks = list()
+        if len(eager) == 1:
+            checks.append("%d in fired" % eager[0])
+        elif eager:
+            checks.append("not fired.isdisjoint(%s)" % self.constant("frozenset(%r)" % (tuple(eager),)))
+        checks += [ "lazy(%d)" % pid for pid in lazy ]
+        if not checks:
+            return "False", frozenset()
+        return checks[0] if len(checks) == 1 else "(%s)" % " or ".join(checks), None if lazy else frozenset(eager)
+
+    def generateValueCheck(self, fieldname, values):
+        kinds = self.classifyValues(values)
+        if kinds["exists"]:
+            return self.generatePredicateCheck([], [ self.ruleset.predicate(fieldname, "exists", None) ])
+        eager = [ self.ruleset.predicate(fieldname, kind, value) for kind in ("exact", "prefix", "suffix", "contains") for value in kinds[kind] ]
+        lazy = [ self.ruleset.predicate(fieldname, "pattern", pattern) for pattern in kinds["pattern"] ]
+        return self.generatePredicateCheck(eager, lazy)
+
+    def generateKeywordCheck(self, values):
+        substrings, patterns = self.splitKeywords(values)
+        eager = [ self.ruleset.predicate(None, "contains", substring) for substring in substrings ]
+        eager += [ self.ruleset.predicate(None, "pattern", pattern) for pattern in patterns ]
+        return self.generatePredicateCheck(eager, [])
+
+    def generateTypedCheck(self, fieldname, value):
+        return self.generatePredicateCheck([], [ self.ruleset.predicate(fieldname, "regex", self.regularExpression(value)) ])
+
+    def generateNullCheck(self, fieldname, null):
+        expression, cover = self.generatePredicateCheck([], [ self.ruleset.predicate(fieldname, "exists", None) ])
+        return self.negate((expression, cover)) if null else (expression, cover)
+
+    def combineAnd(self, checks):
+        """All checks must be true, so the cover of any of the checks covers the conjunction"""
+        if len(checks) == 1:
+            return checks[0]
+        covers = tuple(cover for expression, cover in checks if cover is not None)
+        return "(%s)" % " and ".join(expression for expression, cover in checks), ("and", covers) if len(covers) > 1 else covers[0] if covers else None
+
+    def combineOr(self, checks):
+        """One of the checks must be true, the covers of all checks cover the disjunction"""
+        if not checks:
+            return "False", frozenset()
+        if len(checks) == 1:
+            return checks[0]
+        covers = tuple(cover for expression, cover in checks)
+        return "(%s)" % " or ".join(expression for expression, cover in checks), None if None in covers else ("or", covers)
+
+    def negate(self, check):
+        return "(not %s)" % check[0], None
+
+class RuleSet:
+    """
+    Matches events against a set of Sigma rules. Identical predicates of the rules are evaluated once per event:
+    exact values are looked up in a hash table of each field and the contains, prefix and suffix literals of a field
+    are found by one pass of an Aho-Corasick automaton over the value. Only rules with a cover of which a predicate is
+    true (see RuleSetBackend) are evaluated further, rules without cover are evaluated for each event. The covers are
+    chosen when the first event is matched after rules were added, the estimated cost of a predicate grows with the
+    number of rules that use it, as predicates like the conditions of log sources are shared by many rules and true
+    for many events.
+
+    The configuration is used by the backend of the rule set, rules must be parsed with it after the rule set was
+    created.
+    """
+    eagerKinds = { "exact", "prefix", "suffix", "contains" }
+
+    def __init__(self, sigmaconfig, backend_options=dict()):
+        self.backend = RuleSetBackend(sigmaconfig, backend_options, self)
+        self.predicates = dict()        # (field, kind, value) -> predicate id
+        self.weights = list()           # predicate id -> estimated cost of the predicate as part of a cover
+        self.uses = list()              # predicate id -> number of rules using the predicate in their cover tree
+        self.lazy = dict()              # predicate id -> function that evaluates the predicate for an event
+        self.fields = dict()            # field -> FieldIndex of eager predicates
+        self.nested = list()            # (dotted field name, FieldIndex) for values in nested mappings
+        self.keywords = None            # FieldIndex of keywords, matched against all values joined by NUL characters
+        self.keys = list()
+        self.matchers = list()
+        self.covers = list()            # cover trees of the rules
+        self.triggers = None            # eager predicate id -> indices of rules covered by the predicate
+        self.unindexed = None           # indices of rules without cover
+
+    def __len__(self):
+        return len(self.matchers)
+
+    def predicate(self, field, kind, value):
+        """Return id of predicate, identical predicates of different rules have the same id"""
+        key = (field, kind, value)
+        try:
+            return self.predicates[key]
+        except KeyError:
+            pid = len(self.weights)
+            self.predicates[key] = pid
+            self.uses.append(0)
+            if kind in self.eagerKinds or field is None:
+                self.fieldIndex(field).add(kind, value, pid)
+                self.weights.append(4 if kind in ("exact", "pattern") else 2 if len(value) >= 4 else 8)
+            else:
+                self.lazy[pid] = self.lazyPredicate(field, kind, value)
+                self.weights.append(None)
+            return pid
+
+    def fieldIndex(self, field):
+        if field is None:
+            if self.keywords is None:
+                self.keywords = FieldIndex()
+            return self.keywords
+        try:
+            return self.fields[field]
+        except KeyError:
+            index = self.fields[field] = FieldIndex()
+            if "." in field:
+                self.nested.append((field, index))
+            return index
+
+    def lazyPredicate(self, field, kind, value):
+        if kind == "exists":
+            return lambda event: rawFieldValue(event, field) is not None
+        elif kind == "regex":
+            pattern = re.compile(value)
+            return lambda event: search(rawFieldValue(event, field), pattern)
+        pattern = re.compile(value, re.S)
+        return lambda event: fullMatch(fieldValue(event, field), pattern)
+
+    def resolveCover(self, tree):
+        """Return the cheapest set of predicates of cover tree and its cost"""
+        if isinstance(tree, frozenset):
+            return tree, sum(self.weights[pid] * self.uses[pid] for pid in tree)
+        operator, trees = tree
+        resolved = [ self.resolveCover(tree) for tree in trees ]
+        if operator == "and":
+            return min(resolved, key=lambda cover: cover[1])
+        return frozenset().union(*(cover for cover, cost in resolved)), sum(cost for cover, cost in resolved)
+
+    def coverPredicates(self, tree):
+        if isinstance(tree, frozenset):
+            return tree
+        return frozenset().union(*(self.coverPredicates(tree) for tree in tree[1]))
+
+    def buildIndex(self):
+        """Choose covers of the rules and index the rules by the predicates of their covers"""
+        self.triggers = dict()
+        self.unindexed = list()
+        for index, tree in enumerate(self.covers):
+            if tree is None:
+                self.unindexed.append(index)
+            else:
+                for pid in self.resolveCover(tree)[0]:
+                    self.triggers.setdefault(pid, list()).append(index)
+
+    def add(self, sigmaparser, key=None):
+        """
+        Add parsed rule, match() returns key for matching events (default: id of the rule or its title). Raises
+        NotImplementedError for rules the python backend doesn't support, e.g. with aggregations.
+        """
+        source, cover = self.backend.generateFunction(sigmaparser, "match")
+        namespace = dict()
+        exec(source, namespace)
+        index = len(self.matchers)
+        self.matchers.append(namespace["match"])
+        self.keys.append(key if key is not None else sigmaparser.parsedyaml.get("id", sigmaparser.parsedyaml.get("title")))
+        self.covers.append(cover)
+        if cover is not None:
+            for pid in self.coverPredicates(cover):
+                self.uses[pid] += 1
+        self.triggers = None
+        return index
+
+    def fired(self, event):
+        """Set of ids of eager predicates that are true for the event"""
+        fired = set()
+        fields = self.fields
+        for field, value in event.items():
+            index = fields.get(field)
+            if index is not None and value is not None:
+                index.fire(value.lower() if value.__class__ is str else str(value).lower(), fired)
+        for field, index in self.nested:
+            if field not in event:
+                value = fieldValue(event, field)
+                if value is not None:
+                    index.fire(value, fired)
+        if self.keywords is not None:
+            self.keywords.fire("\0".join(eventValues(event)), fired)
+        return fired
+
+    def match(self, event):
+        """Return list of keys of rules that match the event, in the order the rules were added"""
+        if self.triggers is None:
+            self.buildIndex()
+        fired = self.fired(event)
+        candidates = set(self.unindexed)
+        triggers = self.triggers
+        for pid in fired:
+            rules = triggers.get(pid)
+            if rules is not None:
+                candidates.update(rules)
+
+        results = dict()
+        functions = self.lazy
+        def lazy(pid):
+            try:
+                return results[pid]
+            except KeyError:
+                result = results[pid] = functions[pid](event)
+                return result
+
+        matchers = self.matchers
+        keys = self.keys
+        return [ keys[index] for index in sorted(candidates) if matchers[index](fired, lazy) ]
@@ -172,6 +172,14 @@ class SplunkXMLBackend(SingleTextQueryBackend, MultiRuleOutputMixin):
         self.queries += self.dash_suf
         return self.queries
 
+    def extractState(self):
+        state = self.queries[len(self.dash_pre):]
+        self.queries = self.dash_pre
+        return state
+
+    def mergeState(self, state):
+        self.queries += state
+
 class CrowdStrikeBackend(SplunkBackend):
     """Converts Sigma rule into CrowdStrike Search Processing Language (SPL)."""
     identifier = "crowdstrike"
@@ -20,6 +20,7 @@ import sys
 
 from sigma.backends.base import SingleTextQueryBackend
 from sigma.backends.exceptions import NotSupportedError
+from sigma.backends.mitre import get_attack_catalog
 from sigma.parser.condition import ConditionOR, SigmaAggregationParser
 
 # Sumo specifics
@@ -357,7 +358,8 @@ class SumoLogicCSERule(SumoLogicCSE):
     def __init__(self, *args, **kwargs):
         """Initialize field mappings"""
         super().__init__(*args, **kwargs)
-        self.techniques = self._load_mitre_file("techniques")
+        self.mitre = get_attack_catalog()
+        self.techniques = self.mitre.techniques
         self.allowedCategories = ["Threat Intelligence", "Initial Access", "Execution", "Persistence", "Privilege Escalation",
                                   "Defense Evasion", "Credential Access", "Discovery", "Lateral Movement", "Collection",
                                   "Command and Control", "Exfiltration", "Impact"]
@@ -365,26 +367,7 @@ class SumoLogicCSERule(SumoLogicCSE):
         self.results = []
 
     def find_technique(self, key_ids):
-        for key_id in set(key_ids):
-            if not key_id:
-                continue
-            for technique in self.techniques:
-                if key_id == technique.get("technique_id", ""):
-                    yield technique
-
-    def _load_mitre_file(self, mitre_type):
-        try:
-            backend_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config", "mitre"))
-            path = os.path.join(backend_dir, "{}.json".format(mitre_type))
-            with open(path) as config_file:
-                config = json.load(config_file)
-                return config
-        except (IOError, OSError) as e:
-            print("Failed to open {} configuration file '%s': %s".format(path, str(e)), file=sys.stderr)
-            return []
-        except json.JSONDecodeError as e:
-            print("Failed to parse {} configuration file '%s' as valid YAML: %s" % (path, str(e)), file=sys.stderr)
-            return []
+        return self.mitre.find_techniques(key_ids)
 
     def skip_tactics_or_techniques(self, src_technics, src_tactics):
         tactics = set()
@@ -478,5 +461,13 @@ class SumoLogicCSERule(SumoLogicCSE):
         elif len(self.results) > 1:
             return json.dumps(self.results, indent=4, sort_keys=False)
 
+    def extractState(self):
+        state = self.results
+        self.results = []
+        return state
+
+    def mergeState(self, state):
+        self.results.extend(state)
+
 
 
@@ -75,6 +75,14 @@ class FieldnameListBackend(BaseBackend):
     def finalize(self):
         return "\n".join(sorted(self.fields))
 
+    def extractState(self):
+        state = self.fields
+        self.fields = set()
+        return state
+
+    def mergeState(self, state):
+        self.fields.update(state)
+
 # Helpers
 def flatten(l):
   for i in l:
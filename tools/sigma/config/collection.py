@@ -14,20 +14,28 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from collections import Iterable
+from collections.abc import Iterable
 from pathlib import Path
+import os
 import sys
 import re
+import json
+import tempfile
+import yaml
 from sigma.configuration import SigmaConfiguration
 from sigma.config.exceptions import SigmaConfigParseError
+from sigma.tools import getCacheDirectory
 
 class SigmaConfigurationManager(object):
     """
     Locate Sigma configuration files in a directory and provide them as well as information
     about them.
+
+    Configurations are parsed on first access by get(). The titles and backends listed by list() are
+    stored in an index file and only parsed again if the configuration file was modified.
     """
     re_identifier = re.compile("^[\\w-]+$")
-    def __init__(self, paths=None):
+    def __init__(self, paths=None, index_path=None):
         """
         Initialize configuration collection. If paths is not given, some default locations are used:
 
@@ -38,6 +46,7 @@ class SigmaConfigurationManager(object):
 
         Parameters:
         * paths: list of strings with paths
+        * index_path: path of index file used by list(), default is configurations.json in the cache directory
         """
         if paths is None:
             self.paths = [
@@ -51,30 +60,56 @@ class SigmaConfigurationManager(object):
                         if path.exists()
                     ]
         elif isinstance(paths, Iterable) and all([type(path) is str for path in paths]):
-            self.paths = paths
+            self.paths = [ Path(path) for path in paths ]
         else:
             raise TypeError("None or iterable of strings expected as paths")
 
-        self.configs = dict()
+        if index_path is None:
+            index_path = getCacheDirectory() / "configurations.json"
+        self.index_path = Path(index_path)
+
+        self.configpaths = dict()       # identifier -> path of configuration file
+        self.configs = dict()           # identifier -> parsed configuration
         self.errors = list()
         self.update()
 
     def update(self):
-        """Update configurations"""
+        """Update list of configuration files"""
+        self.configpaths.clear()
         self.configs.clear()
         self.errors.clear()
         for path in reversed(self.paths):       # Configs from first paths override latter ones
             for conf_path in path.glob("**/*.yml"):
-                try:
-                    f = conf_path.open()
-                    self.configs[conf_path.stem] = SigmaConfiguration(f)
-                    f.close()
-                except (SigmaConfigParseError, OSError) as e:
-                    self.errors.append((conf_path, e))
+                self.configpaths[conf_path.stem] = conf_path
 
     def list(self):
-        """Returns a list of (identifier, title) tuples of found configurations."""
-        return [ (conf_id, config.config.setdefault("title", ""), config.config.setdefault("backends", list())) for conf_id, config in self.configs.items() ]
+        """Returns a list of (identifier, title, backends) tuples of found configurations. Failed configurations are in errors."""
+        self.errors.clear()
+        index = self._read_index()
+        updated = False
+        result = list()
+        for conf_id, conf_path in self.configpaths.items():
+            key = str(conf_path.absolute())
+            try:
+                stat = conf_path.stat()
+                entry = index.get(key)
+                if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                    config = self.get(conf_id)
+                    entry = index[key] = {
+                            "mtime": stat.st_mtime_ns,
+                            "size": stat.st_size,
+                            "title": config.config.get("title", ""),
+                            "backends": config.config.get("backends", list()),
+                            }
+                    updated = True
+            except (SigmaConfigParseError, OSError, yaml.YAMLError) as e:
+                self.errors.append((conf_path, e))
+                continue
+            result.append((conf_id, entry["title"], entry["backends"]))
+
+        if updated:
+            self._write_index(index)
+        return result
 
     def get(self, name):
         """
@@ -82,8 +117,46 @@ class SigmaConfigurationManager(object):
         discovered configurations (file name stem). If this fails, the parameter value is treated
         as file name.
         """
-        try:                # Lookup in discovered configurations
+        try:                # Lookup in already parsed configurations
             return self.configs[name]
+        except KeyError:
+            pass
+
+        try:                # Lookup in discovered configurations
+            conf_path = self.configpaths[name]
         except KeyError:    # identifier not found, try with filename
-            f = open(name)
+            return self._load(name)
+
+        config = self._load(conf_path)
+        self.configs[name] = config
+        return config
+
+    def _load(self, path):
+        with open(path) as f:
             return SigmaConfiguration(f)
+
+    def _read_index(self):
+        try:
+            with self.index_path.open() as f:
+                index = json.load(f)
+            if type(index) is dict:
+                return index
+        except (OSError, ValueError):
+            pass
+        return dict()
+
+    def _write_index(self, index):
+        """Write index without entries of removed files. Failures are ignored."""
+        index = { path: entry for path, entry in index.items() if os.path.exists(path) }
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmppath = tempfile.mkstemp(dir=str(self.index_path.parent), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmppath, str(self.index_path))
+            except BaseException:
+                os.unlink(tmppath)
+                raise
+        except (OSError, TypeError, ValueError):
+            pass
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from copy import copy
 from sigma.parser.condition import ConditionOR, NodeSubexpression, ConditionNULLValue
 from .exceptions import SigmaConfigParseError, FieldMappingError
 
@@ -177,17 +178,25 @@ class FieldMappingChain(object):
 
     def append(self, config):
         """Propagate current possible field mappings with field mapping from configuration"""
-        if ConditionalFieldMapping in { type(fieldmapping) for fieldmapping in self.fieldmappings }:   # conditional field mapping appeared before, abort.
+        self.append_fieldmappings(config.fieldmappings)
+
+    def append_fieldmappings(self, configmappings):
+        """Propagate current possible field mappings with field mapping table (field name -> mapping) of a configuration"""
+        if type(self.fieldmappings) == set:
+            current_fieldmappings = self.fieldmappings
+        else:
+            current_fieldmappings = {self.fieldmappings}
+
+        if ConditionalFieldMapping in { type(fieldmapping) for fieldmapping in current_fieldmappings }:   # conditional field mapping appeared before, abort.
             raise FieldMappingError("Conditional field mappings are only allowed in last configuration if configurations are chained.")
 
         fieldmappings = set()
-        if type(self.fieldmappings) == str:
-            current_fieldmappings = {self.fieldmappings}
-        else:
-            current_fieldmappings = self.fieldmappings
 
         for fieldname in current_fieldmappings:
-            mapping = config.get_fieldmapping(fieldname)
+            try:
+                mapping = configmappings[fieldname]
+            except KeyError:
+                mapping = FieldMapping(fieldname)
             if type(mapping) in (SimpleFieldMapping,  MultiFieldMapping):
                 resolved_mapping = mapping.resolve_fieldname(fieldname)
                 if type(resolved_mapping) is list:
@@ -209,12 +218,13 @@ class FieldMappingChain(object):
             return (self.fieldmappings, value)
         elif isinstance(self.fieldmappings, ConditionalFieldMapping):
             logsource = sigmaparser.parsedyaml.get("logsource")
-            condition = self.fieldmappings.conditions
+            mapping = self.fieldmappings
+            condition = mapping.conditions
             for source_type, logsource_item in logsource.items():
                 if condition.get(source_type) and condition.get(source_type, {}).get(logsource_item):
-                    new_field = condition.get(source_type, {}).get(logsource_item)
-                    self.fieldmappings.default = new_field
-            return self.fieldmappings.resolve(self.fieldmappings.source, value, sigmaparser)
+                    mapping = copy(self.fieldmappings)      # default of this rule, the mapping of the configuration is shared by all rules
+                    mapping.default = condition.get(source_type, {}).get(logsource_item)
+            return mapping.resolve(mapping.source, value, sigmaparser)
         elif isinstance(self.fieldmappings, SimpleFieldMapping):
             return self.fieldmappings.resolve(key, value, sigmaparser)
         elif type(self.fieldmappings) == set:
@@ -246,3 +256,33 @@ class FieldMappingChain(object):
 
     def __str__(self):  # pragma: no cover
         return "FieldMappingChain: {}".format(self.fieldmappings)
+
+class FieldMappingResolver:
+    """
+    Field mappings of a chain of configurations compiled into a lookup table. The field mapping tables of the
+    configurations are collected once and the field mapping chain of a field name is calculated on its first lookup.
+    Field mapping chains don't depend on the converted rule and are reused for all following lookups, only contained
+    conditional field mappings are evaluated per rule while resolving. Resolvers contain only configuration data and
+    can be pickled together with the memoized field mapping chains.
+
+    Changes of field mappings of configurations after the first lookup are not reflected by the resolver.
+    """
+    def __init__(self, configs=()):
+        self.configmappings = tuple(config.fieldmappings for config in configs)
+        self.fieldmappings = dict()     # field name -> resolved field mapping (chain)
+
+    def get_fieldmapping(self, fieldname):
+        """Return field mapping chain for field name like SigmaConfigurationChain.get_fieldmapping()"""
+        try:
+            return self.fieldmappings[fieldname]
+        except KeyError:
+            pass
+
+        if self.configmappings:
+            mapping = FieldMappingChain(fieldname)
+            for configmappings in self.configmappings:
+                mapping.append_fieldmappings(configmappings)
+        else:
+            mapping = FieldMapping(fieldname)
+        self.fieldmappings[fieldname] = mapping
+        return mapping
@@ -14,10 +14,10 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
 from sigma.parser.condition import ConditionAND, ConditionOR
 from sigma.config.exceptions import SigmaConfigParseError
-from sigma.config.mapping import FieldMapping, FieldMappingChain
+from sigma.config.mapping import FieldMapping, FieldMappingResolver
+from sigma.tools import loadYAML
 
 # Chain of multiple configurations
 class SigmaConfigurationChain(list):
@@ -33,6 +33,9 @@ class SigmaConfigurationChain(list):
         self.config = dict()
         self.fieldmappings = dict()
         self.logsources = dict()
+        self.fieldmapping_resolver = None
+        self.logsource_indices = None
+        self.merged_logsources = dict()
 
         for config in self:
             self.postprocess_config(config)
@@ -46,27 +49,48 @@ class SigmaConfigurationChain(list):
         self.config.update(config.config)
         self.fieldmappings.update(config.fieldmappings)
         self.logsources.update(config.logsources)
+        self.fieldmapping_resolver = None
 
     def get_fieldmapping(self, fieldname):
         """Return mapped fieldname by iterative application of each config stored in configuration chain."""
-        if self:
-            fieldmappings = FieldMappingChain(fieldname)
-            for config in self:
-                fieldmappings.append(config)
-            return fieldmappings
-        else:
-            return FieldMapping(fieldname)
+        return self.get_fieldmapping_resolver().get_fieldmapping(fieldname)
+
+    def get_fieldmapping_resolver(self):
+        """Return resolver of field mappings of all configurations in chain, compiled on first use."""
+        if self.fieldmapping_resolver is None:
+            self.fieldmapping_resolver = FieldMappingResolver(self)
+        return self.fieldmapping_resolver
 
     def get_logsource(self, category, product, service):
         """Return merged log source definition of all logosurces that match criteria across all Sigma conversion configurations in chain."""
+        indices = tuple(config.get_logsource_index() for config in self)
+        if indices != self.logsource_indices:       # configurations were changed, e.g. by setting the backend
+            self.logsource_indices = indices
+            self.merged_logsources = dict()
+        key = (category, product, service)
+        try:
+            return self.merged_logsources[key]
+        except (KeyError, TypeError):
+            pass
+
         matching = list()
-        for config in self:
-            for logsource in config.logsources:
-                if logsource.matches(category, product, service):
+        for index in indices:
+            start = 0
+            while start is not None:            # search is continued with rewritten criteria after a rewriting log source
+                found = index.find(category, product, service, start)
+                start = None
+                for position, logsource in found:
                     matching.append(logsource)
                     if logsource.rewrite is not None:
                         category, product, service = logsource.rewrite
-        return SigmaLogsourceConfiguration(matching, self.defaultindex)
+                        start = position + 1
+                        break
+        logsource = SigmaLogsourceConfiguration(matching, self.defaultindex)
+        try:
+            self.merged_logsources[key] = logsource
+        except TypeError:
+            pass
+        return logsource
 
     def get_logsourcemerging(self):
         value = ''
@@ -101,8 +125,9 @@ class SigmaConfiguration:
             self.logsources = dict()
             self.defaultindex = None
             self.backend = None
+            self.logsource_index = None
         else:
-            config = yaml.safe_load(configyaml)
+            config = loadYAML(configyaml)
             self.config = config
 
             self.fieldmappings = dict()
@@ -122,6 +147,7 @@ class SigmaConfiguration:
 
             self.logsources = list()
             self.backend = None
+            self.logsource_index = None
 
     def get_fieldmapping(self, fieldname):
         """Return mapped fieldname if mapping defined or field name given in parameter value"""
@@ -132,8 +158,27 @@ class SigmaConfiguration:
 
     def get_logsource(self, category, product, service):
         """Return merged log source definition of all logosurces that match criteria"""
-        matching = [logsource for logsource in self.logsources if logsource.matches(category, product, service)]
-        return SigmaLogsourceConfiguration(matching, self.defaultindex)
+        index = self.get_logsource_index()
+        key = (category, product, service)
+        try:
+            return index.merged[key]
+        except (KeyError, TypeError):
+            pass
+
+        matching = [logsource for position, logsource in index.find(category, product, service)]
+        logsource = SigmaLogsourceConfiguration(matching, self.defaultindex)
+        try:
+            index.merged[key] = logsource
+        except TypeError:
+            pass
+        return logsource
+
+    def get_logsource_index(self):
+        """Return index of log source definitions, rebuilt if these were changed"""
+        index = self.logsource_index
+        if index is None or index.logsources is not self.logsources or index.size != len(self.logsources):
+            index = self.logsource_index = SigmaLogsourceIndex(self.logsources)
+        return index
 
     def get_logsourcemerging(self):
         if self.config != None:
@@ -144,6 +189,7 @@ class SigmaConfiguration:
     def set_backend(self, backend):
         """Set backend. This is used by other code to determine target properties for index addressing"""
         self.backend = backend
+        self.logsources = list()
         if self.config != None:
             if 'logsources' in self.config:
                 logsources = self.config['logsources']
@@ -157,6 +203,34 @@ class SigmaConfiguration:
         if self.backend is not None:
             return self.backend.index_field
 
+class SigmaLogsourceIndex:
+    """
+    Index of the log source definitions of a configuration by their (category, product, service) criteria. A definition
+    matches if all its defined criteria equal the searched ones, therefore matching definitions are found in the entries
+    of all combinations of searched criteria and None. Merged log sources are memoized by the configuration in merged.
+    """
+    def __init__(self, logsources):
+        self.logsources = logsources
+        self.size = len(logsources)
+        self.entries = dict()       # (category, product, service) -> list of (position, log source definition)
+        self.merged = dict()
+        for position, logsource in enumerate(logsources):
+            self.entries.setdefault((logsource.category, logsource.product, logsource.service), list()).append((position, logsource))
+
+    def find(self, category, product, service, start=0):
+        """Return (position, definition) tuples of definitions matching criteria from position start on in order of definition"""
+        found = list()
+        try:
+            for c in (None,) if category is None else (category, None):
+                for p in (None,) if product is None else (product, None):
+                    for s in (None,) if service is None else (service, None):
+                        if c is not None or p is not None or s is not None:
+                            found.extend(self.entries.get((c, p, s), ()))
+        except TypeError:           # unhashable criteria from rule, fall back to matching of each definition
+            found = [ (position, logsource) for position, logsource in enumerate(self.logsources) if logsource.matches(category, product, service) ]
+        found.sort(key=lambda entry: entry[0])
+        return [ entry for entry in found if entry[0] >= start ]
+
 class SigmaLogsourceConfiguration:
     """Contains the definition of a log source"""
     def __init__(self, logsource=None, defaultindex=None):
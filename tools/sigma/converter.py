@@ -0,0 +1,259 @@
+# In-process conversion of Sigma rules
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import threading
+from collections import namedtuple
+import yaml
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.exceptions import SigmaCollectionParseError, SigmaParseError
+from sigma.configuration import SigmaConfigurationChain
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.config.exceptions import SigmaConfigParseError
+from sigma.filter import SigmaRuleFilter, SigmaRuleFilterParseException
+import sigma.backends.discovery as backends
+from sigma.backends.base import BackendOptions
+from sigma.backends.exceptions import BackendError, NotSupportedError, PartialMatchError, FullMatchError
+
+# Error codes, used as exit codes by sigmac
+
+ERR_OUTPUT              = 1
+ERR_INVALID_YAML        = 3
+ERR_SIGMA_PARSING       = 4
+ERR_OPEN_SIGMA_RULE     = 5
+ERR_OPEN_CONFIG_FILE    = 5
+ERR_CONFIG_INVALID_YAML = 6
+ERR_CONFIG_PARSING      = 6
+ERR_BACKEND             = 8
+ERR_NOT_SUPPORTED       = 9
+ERR_NO_TARGET           = 10
+ERR_RULE_FILTER_PARSING = 11
+ERR_CONFIG_REQUIRED     = 20
+ERR_CONFIG_ORDER        = 21
+ERR_CONFIG_BACKEND      = 22
+ERR_NOT_IMPLEMENTED     = 42
+ERR_PARTIAL_FIELD_MATCH = 80
+ERR_FULL_FIELD_MATCH    = 90
+
+ConversionFailure = namedtuple("ConversionFailure", ("message", "code", "errclass"))
+ConversionFailure.__doc__ = "Error of the conversion of a Sigma input with error message, error code and error class (see conversion_error())"
+
+ConversionResult = namedtuple("ConversionResult", ("results", "finalized", "error"))
+ConversionResult.__doc__ = """
+Outcome of the conversion of a Sigma input by a Converter: list of results of the rules, output of backends with
+multi-rule output or None and ConversionFailure or None. The results are empty if the conversion failed.
+"""
+
+def conversion_error(sigmafile, e):
+    """
+    Map exception raised while converting a Sigma input file to a ConversionFailure (error message, error code, error
+    class) or None if it's not a conversion error. Error classes are:
+
+    * open: the input could not be read
+    * parse: the input is no valid YAML or Sigma
+    * backend: the backend was not able to convert the input
+    """
+    if isinstance(e, OSError):
+        return ConversionFailure("Failed to open Sigma file %s: %s" % (sigmafile, str(e)), ERR_OPEN_SIGMA_RULE, "open")
+    elif isinstance(e, (yaml.parser.ParserError, yaml.scanner.ScannerError)):
+        return ConversionFailure("Error: Sigma file %s is no valid YAML: %s" % (sigmafile, str(e)), ERR_INVALID_YAML, "parse")
+    elif isinstance(e, (SigmaParseError, SigmaCollectionParseError)):
+        return ConversionFailure("Error: Sigma parse error in %s: %s" % (sigmafile, str(e)), ERR_SIGMA_PARSING, "parse")
+    elif isinstance(e, NotSupportedError):
+        return ConversionFailure("Error: The Sigma rule requires a feature that is not supported by the target system: " + str(e), ERR_NOT_SUPPORTED, "backend")
+    elif isinstance(e, BackendError):
+        return ConversionFailure("Error: Backend error in %s: %s" % (sigmafile, str(e)), ERR_BACKEND, "backend")
+    elif isinstance(e, (NotImplementedError, TypeError)):
+        return ConversionFailure("An unsupported feature is required for this Sigma rule (%s): " % (sigmafile) + str(e) + "\n" +
+            "Feel free to contribute for fun and fame, this is open source :) -> https://github.com/Neo23x0/sigma", ERR_NOT_IMPLEMENTED, "backend")
+    elif isinstance(e, PartialMatchError):
+        return ConversionFailure("Error: Partial field match error: %s" % str(e), ERR_PARTIAL_FIELD_MATCH, "backend")
+    elif isinstance(e, FullMatchError):
+        return ConversionFailure("Error: Full field match error", ERR_FULL_FIELD_MATCH, "backend")
+    return None
+
+def convert_input(sigmafile, f, sigmaconfigs, rulefilter, backend, cache=None):
+    """
+    Convert a Sigma input file with the given backend. The rules are parsed and converted one after another, only the
+    results are kept. Returns a tuple (results, error), where error is None if the conversion succeeded and otherwise a
+    ConversionFailure as returned by conversion_error(). Results of inputs that fail are
+    discarded.
+    """
+    try:
+        parser = SigmaCollectionParser(f, sigmaconfigs, rulefilter, cache, lazy=True)
+        return list(parser.generate(backend)), None
+    except Exception as e:
+        error = conversion_error(sigmafile, e)
+        if error is None:
+            raise
+        return [], error
+
+class ConverterError(Exception):
+    """A converter can't be built with the given target, configurations or rule filter. code is the exit code of sigmac."""
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+class ConfigurationError(ConverterError):
+    """Configurations of a target are missing, invalid or not applicable."""
+
+def configuration_names(backend_class, names, shoot_yourself_in_the_foot=False):
+    """
+    Return the names of the configurations that are used for the backend if the given names are None, which are the
+    default configurations of the backend. Raises ConfigurationError if the backend requires a configuration.
+    """
+    if names is None:
+        if backend_class.config_required and not shoot_yourself_in_the_foot:
+            raise ConfigurationError("The backend you want to use usually requires a configuration to generate valid results. Please provide one with --config/-c.", ERR_CONFIG_REQUIRED)
+        if backend_class.default_config is not None:
+            return backend_class.default_config
+    return names
+
+def load_configurations(target, names, scm, shoot_yourself_in_the_foot=False, copies=False):
+    """
+    Return configuration chain of the configurations with the given names for the target identifier. Raises
+    ConfigurationError if a configuration is invalid or the configurations are not applicable to the target. Copies of
+    the configurations are used if copies is set, because backends attach themselves to them.
+    """
+    sigmaconfigs = SigmaConfigurationChain()
+    order = 0
+    for conf_name in names or ():
+        try:
+            sigmaconfig = scm.get(conf_name)
+        except OSError as e:
+            raise ConfigurationError("Failed to open Sigma configuration file %s: %s" % (conf_name, str(e)), ERR_OPEN_CONFIG_FILE) from e
+        except (yaml.parser.ParserError, yaml.scanner.ScannerError) as e:
+            raise ConfigurationError("Sigma configuration file %s is no valid YAML: %s" % (conf_name, str(e)), ERR_CONFIG_INVALID_YAML) from e
+        except SigmaConfigParseError as e:
+            raise ConfigurationError("Sigma configuration parse error in %s: %s" % (conf_name, str(e)), ERR_CONFIG_PARSING) from e
+
+        if sigmaconfig.order is not None:
+            if sigmaconfig.order <= order and not shoot_yourself_in_the_foot:
+                raise ConfigurationError("The configurations were provided in the wrong order (order key check in config file)", ERR_CONFIG_ORDER)
+            order = sigmaconfig.order
+
+        try:
+            if target not in sigmaconfig.config["backends"]:
+                raise ConfigurationError("The configuration '{}' is not valid for backend '{}'. Valid choices are: {}".format(conf_name, target, ", ".join(sigmaconfig.config["backends"])), ERR_CONFIG_ORDER)
+        except KeyError:
+            pass
+
+        if copies:
+            sigmaconfig = copy.deepcopy(sigmaconfig)
+        sigmaconfigs.append(sigmaconfig)
+    return sigmaconfigs
+
+class Converter:
+    """
+    Converts Sigma rules for a target with configurations, backend options and rule filter like sigmac, for use of
+    sigma as library. A converter is built once and can be shared by threads, its conversion methods may be called
+    concurrently.
+
+    The configurations are loaded and checked when the converter is built. Configuration chains with their compiled
+    field mappings and log source indices are kept in a pool between conversions, a conversion uses an idle chain
+    exclusively and a new one is created if there's none. Backends keep the state of the conversion of rules in their
+    instances, therefore each input is converted by a fresh backend instance, which is cheap compared to loading the
+    configurations.
+    """
+    def __init__(self, target, config=None, options=None, rulefilter=None, scm=None, shoot_yourself_in_the_foot=False):
+        """
+        Build converter for a target with:
+
+        * config: list of configuration identifiers or paths, the default configurations of the backend if None
+        * options: backend options as dict or list of "key=value" strings like the -O option of sigmac
+        * rulefilter: SigmaRuleFilter or filter expression like the -f option of sigmac
+        * scm: SigmaConfigurationManager that loads the configurations, a new one if None
+        * shoot_yourself_in_the_foot: skip checks for required configurations and configuration order
+
+        Raises ConverterError if the target is unknown, the configurations can't be used or the rule filter is invalid.
+        """
+        try:
+            self.backend_class = backends.getBackend(target)
+        except (LookupError, TypeError) as e:
+            raise ConverterError("Unknown target '%s'" % (target,), ERR_NO_TARGET) from e
+        self.target = target
+        self.config = configuration_names(self.backend_class, config, shoot_yourself_in_the_foot)
+        self.sigmaconfigs = load_configurations(target, self.config, scm or SigmaConfigurationManager(), shoot_yourself_in_the_foot, copies=True)
+
+        if isinstance(options, dict):
+            self.options = dict(options)
+        else:
+            self.options = dict(BackendOptions(options, None))
+
+        if isinstance(rulefilter, str):
+            try:
+                rulefilter = SigmaRuleFilter(rulefilter)
+            except SigmaRuleFilterParseException as e:
+                raise ConverterError("Parse error in Sigma rule filter expression: %s" % str(e), ERR_RULE_FILTER_PARSING) from e
+        self.rulefilter = rulefilter
+
+        self.lock = threading.Lock()
+        self.idle = list()          # configuration chains not used by a conversion
+
+    def checkout(self):
+        """Return an idle configuration chain or a new one."""
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return SigmaConfigurationChain([ copy.deepcopy(sigmaconfig) for sigmaconfig in self.sigmaconfigs ])
+
+    def checkin(self, sigmaconfigs):
+        with self.lock:
+            self.idle.append(sigmaconfigs)
+
+    def backend(self, sigmaconfigs):
+        """Return fresh backend instance with own copy of the backend options, because backends modify them."""
+        options = BackendOptions(None, None)
+        options.update(copy.deepcopy(self.options))
+        return self.backend_class(sigmaconfigs, options)
+
+    def convert(self, content, name="<input>"):
+        """
+        Convert content of a Sigma input, which may contain multiple rules, and return a ConversionResult. name is used
+        in error messages, e.g. the path of the input.
+        """
+        sigmaconfigs = self.checkout()
+        try:
+            return self.convert_with(sigmaconfigs, content, name)
+        finally:
+            self.checkin(sigmaconfigs)
+
+    def convert_many(self, contents, names=None):
+        """
+        Convert each of the contents of Sigma inputs separately like convert() and return a list of ConversionResult in
+        order of the inputs. The inputs are converted one after another, use multiple threads for concurrent
+        conversions.
+        """
+        sigmaconfigs = self.checkout()
+        try:
+            if names is None:
+                return [ self.convert_with(sigmaconfigs, content) for content in contents ]
+            return [ self.convert_with(sigmaconfigs, content, name) for content, name in zip(contents, names) ]
+        finally:
+            self.checkin(sigmaconfigs)
+
+    def convert_with(self, sigmaconfigs, content, name="<input>"):
+        backend = self.backend(sigmaconfigs)
+        results, error = convert_input(name, content, sigmaconfigs, self.rulefilter, backend)
+        if error is not None:
+            return ConversionResult(list(), None, error)
+        try:
+            finalized = "".join(backend.iterFinalize()) or None
+        except Exception as e:
+            error = conversion_error(name, e)
+            if error is None:
+                raise
+            return ConversionResult(list(), None, error)
+        return ConversionResult(results, finalized, None)
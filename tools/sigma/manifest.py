@@ -0,0 +1,127 @@
+# Manifest of conversion results for incremental conversion
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pickle
+import hashlib
+import datetime
+import tempfile
+from pathlib import Path
+from sigma.tools import isPrivateDirectory
+
+class SigmaConversionManifest:
+    """
+    Results of the conversion of Sigma input files for one target, stored in a state directory between sigmac runs.
+    An entry contains the hash of the content of an input file, its conversion results, the state of the backend for
+    multi-rule output (see BaseBackend.extractState()) and the conversion error, if any. A following run reuses the
+    entries of unchanged inputs and only converts changed and added inputs, entries of inputs that are not converted
+    anymore are dropped.
+
+    The manifest is invalidated if its fingerprint changes. The fingerprint is a hash of:
+
+    * the source code of the sigma package (parser, modifiers, configuration and backends)
+    * the backend class
+    * the conversion configurations
+    * the backend options
+    * the rule filter
+
+    Manifests are unpickled, so the state directory is created accessible only by the current user and manifests are
+    neither loaded from nor stored in a directory that is owned by another user or writable by group or others.
+    """
+    suffix = ".manifest"
+
+    def __init__(self, path, name, fingerprint):
+        self.path = Path(path)
+        self.name = name
+        self.fingerprint = fingerprint
+        self.previous = self.load()
+        self.entries = dict()
+
+    @staticmethod
+    def fingerprint_of(backend_class, sigmaconfigs, backend_options, rulefilter=None):
+        """Calculate fingerprint of conversions with backend class, configuration chain, backend options and rule filter."""
+        h = hashlib.sha256()
+        sigmadir = Path(__file__).parent
+        for source in sorted(sigmadir.glob("**/*.py")):
+            h.update(str(source.relative_to(sigmadir)).encode("utf-8"))
+            h.update(source.read_bytes())
+        h.update("{}.{}".format(backend_class.__module__, backend_class.__qualname__).encode("utf-8"))
+        for conf in sigmaconfigs:
+            h.update(pickle.dumps(conf.config, protocol=4))
+        h.update(repr(sorted(backend_options.items())).encode("utf-8"))
+        if rulefilter is not None:
+            h.update(repr(sorted(vars(rulefilter).items())).encode("utf-8"))
+            if rulefilter.inlastday is not None:        # filter result depends on current date
+                h.update(datetime.date.today().isoformat().encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def digest(content):
+        """Hash of input file content"""
+        return hashlib.sha256(content).hexdigest()
+
+    def manifest_path(self):
+        return self.path / (self.name + self.suffix)
+
+    def load(self):
+        """Return entries of the stored manifest, an empty dict if there's none, it's damaged or has another fingerprint."""
+        try:
+            if not isPrivateDirectory(self.path):
+                return dict()
+            with self.manifest_path().open("rb") as f:
+                manifest = pickle.load(f)
+            if manifest["fingerprint"] != self.fingerprint:
+                return dict()
+            return manifest["entries"]
+        except Exception:
+            return dict()
+
+    def reuse(self, key, digest):
+        """
+        Return tuple (results, backend state, error) of input with given key from the previous run if its content
+        digest is unchanged and keep the entry, otherwise None.
+        """
+        try:
+            previous_digest, results, state, error = self.previous[key]
+        except KeyError:
+            return None
+        if previous_digest != digest:
+            return None
+        self.entries[key] = self.previous[key]
+        return list(results), pickle.loads(state), error
+
+    def record(self, key, digest, results, state, error=None):
+        """
+        Record results, backend state and error of converted input. The state is pickled at once, because the backend
+        may modify it later.
+        """
+        self.entries[key] = (digest, list(results), pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), error)
+
+    def store(self):
+        """Replace the stored manifest with the entries reused or recorded in this run. Raises OSError on failure."""
+        self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not isPrivateDirectory(self.path):
+            raise PermissionError("State directory %s is owned by another user or writable by group or others" % self.path)
+        fd, tmppath = tempfile.mkstemp(dir=str(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({ "fingerprint": self.fingerprint, "entries": self.entries }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, str(self.manifest_path()))
+        except:
+            try:
+                os.unlink(tmppath)
+            except OSError:
+                pass
+            raise
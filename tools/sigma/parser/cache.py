@@ -0,0 +1,271 @@
+# Sigma parser
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import pickle
+import hashlib
+import datetime
+import tempfile
+from pathlib import Path
+from sigma.tools import getCacheDirectory, isPrivateDirectory
+from .exceptions import SigmaParseCacheError
+
+class SigmaParseCache:
+    """
+    Content-addressed on-disk cache of parsed Sigma rules. An entry contains the SigmaParser objects of a Sigma file
+    (with tokenized and parsed conditions and aggregations) and is addressed by a hash of:
+
+    * the content of the Sigma file
+    * the conversion configurations
+    * the index field name of the backend (part of the log source conditions)
+    * the rule filter
+    * the source code of the parser and configuration modules
+
+    Entries are stored without the configuration, which is reattached on loading. Parsers are stored and loaded one by
+    one, so a Sigma file with many rules can be converted without keeping all of its parsers. Entries that were not used
+    for max_age seconds are evicted by prune(), which also removes least recently used entries until the cache is
+    smaller than max_size bytes and temporary files of entries that weren't completed within tmp_grace seconds.
+
+    Entries are unpickled, so the cache directory is created accessible only by the current user and isn't used if
+    it's owned by another user or writable by group or others (see check()).
+    """
+    suffix = ".pickle"
+    max_size_default = 256 * 1024 * 1024
+    max_age_default = 30 * 24 * 60 * 60
+    tmp_suffix = ".tmp"
+    tmp_grace = 60 * 60
+
+    def __init__(self, path=None, max_size=max_size_default, max_age=max_age_default):
+        if path is None:
+            path = getCacheDirectory() / "parsed"
+        self.path = Path(path)
+        self.max_size = max_size
+        self.max_age = max_age
+        self._code_digest = None
+        self._config_digests = dict()
+        self._usable = None
+
+    def __getstate__(self):
+        """Digests of configurations are keyed by object ids and not passed to other processes"""
+        state = self.__dict__.copy()
+        state["_config_digests"] = dict()
+        return state
+
+    def check(self):
+        """
+        Create the cache directory accessible only by the current user if it doesn't exist. Raises SigmaParseCacheError if
+        the directory is owned by another user or writable by group or others and OSError if it can't be created.
+        """
+        self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not isPrivateDirectory(self.path):
+            raise SigmaParseCacheError("Cache directory %s is owned by another user or writable by group or others" % self.path)
+
+    def usable(self):
+        """Return if entries can be loaded from and stored in the cache directory (see check())."""
+        if self._usable is None:
+            try:
+                self.check()
+                self._usable = True
+            except (OSError, SigmaParseCacheError):
+                self._usable = False
+        return self._usable
+
+    def code_digest(self):
+        """Hash of parser and configuration source code. Cache entries are invalidated by code changes."""
+        if self._code_digest is None:
+            sigmadir = Path(__file__).parent.parent
+            sources = sorted(sigmadir.glob("parser/**/*.py")) + sorted(sigmadir.glob("config/*.py")) + [ sigmadir / "configuration.py" ]
+            h = hashlib.sha256()
+            for source in sources:
+                h.update(source.read_bytes())
+            self._code_digest = h.digest()
+        return self._code_digest
+
+    def config_digest(self, conf):
+        """Hash of a configuration. It's calculated once per configuration object, configurations aren't changed after loading."""
+        try:
+            return self._config_digests[id(conf)][1]
+        except KeyError:
+            digest = hashlib.sha256(pickle.dumps(conf.config, protocol=4)).digest()
+            self._config_digests[id(conf)] = (conf, digest)       # reference keeps the id from being reused
+            return digest
+
+    def key(self, content, config, rulefilter=None):
+        """Calculate cache key of Sigma file content parsed with given configuration and rule filter."""
+        h = hashlib.sha256(self.code_digest())
+        h.update(content.encode("utf-8") if isinstance(content, str) else content)
+        for conf in (config if isinstance(config, list) else [ config ]):     # configuration chains are lists
+            h.update(self.config_digest(conf))
+        h.update(repr(config.get_indexfield()).encode("utf-8"))
+        if rulefilter is not None:
+            h.update(repr(sorted(vars(rulefilter).items())).encode("utf-8"))
+            if rulefilter.inlastday is not None:        # filter result depends on current date
+                h.update(datetime.date.today().isoformat().encode("utf-8"))
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return self.path / (key + self.suffix)
+
+    def load(self, key, config):
+        """Return list of SigmaParser objects stored for key with attached configuration or None if not cached."""
+        parsers = self.iterload(key, config)
+        if parsers is None:
+            return None
+        try:
+            return list(parsers)
+        except SigmaParseCacheError:
+            return None
+
+    def iterload(self, key, config):
+        """
+        Return iterator over SigmaParser objects stored for key with attached configuration or None if not cached. The
+        parsers are unpickled while iterating, SigmaParseCacheError is raised if the entry turns out to be damaged. Damaged
+        entries are removed.
+        """
+        if not self.usable():
+            return None
+        path = self.entry_path(key)
+        try:
+            f = path.open("rb")
+        except OSError:
+            return None
+        try:
+            os.utime(path)      # mark entry as recently used
+        except OSError:
+            pass
+        return self.iterentry(f, path, config)
+
+    def iterentry(self, f, path, config):
+        with f:
+            while True:
+                try:
+                    parser = pickle.load(f)
+                except Exception as e:      # damaged, truncated or incompatible entry
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                    raise SigmaParseCacheError("Damaged cache entry %s" % path) from e
+                if parser is None:          # end of entry
+                    return
+                parser.set_config(config)
+                yield parser
+
+    def store(self, key, parsers):
+        """Store list of SigmaParser objects. Failures are ignored, the cache is only an optimization."""
+        for parser in self.storing(key, parsers):
+            pass
+
+    def storing(self, key, parsers):
+        """
+        Yield SigmaParser objects from iterable and store them in the entry for key. Each parser is stored before it is
+        yielded, because generation of queries from a parser may modify it. The entry is written to a temporary file
+        that replaces the entry after the last parser. If the consumer stops iterating, e.g. because conversion of a rule
+        failed, the remaining parsers are stored without yielding them, so the entry is also used by following runs. If
+        parsing fails, nothing is stored. Entries are a sequence of pickled parsers terminated by None, so parsers can be
+        loaded one by one.
+        """
+        f = tmppath = None
+        try:
+            if self.usable():
+                fd, tmppath = tempfile.mkstemp(dir=str(self.path), suffix=self.tmp_suffix)
+                f = os.fdopen(fd, "wb")
+        except OSError:
+            pass
+
+        try:
+            stopped = False
+            for parser in parsers:
+                f = self.dump(f, tmppath, parser)
+                try:
+                    yield parser
+                except GeneratorExit:
+                    stopped = True
+                    break
+            if stopped and f is not None:
+                try:
+                    for parser in parsers:
+                        f = self.dump(f, tmppath, parser)
+                except Exception:       # parse errors are raised while converting, not when the consumer is closed
+                    f = self.discard(f, tmppath)
+            if f is not None:
+                try:
+                    pickle.dump(None, f)
+                    f.close()
+                    f = None
+                    os.replace(tmppath, str(self.entry_path(key)))     # atomic, concurrent writers of same entry are fine
+                except OSError:
+                    pass
+        finally:
+            if f is not None:
+                self.discard(f, tmppath)
+
+    def dump(self, f, tmppath, parser):
+        """Append parser to temporary file of entry. Returns the file or None if the entry is discarded."""
+        if f is not None:
+            try:
+                pickle.dump(parser, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError):
+                f = self.discard(f, tmppath)
+        return f
+
+    def discard(self, f, tmppath):
+        """Close and remove temporary file of entry that is not stored"""
+        try:
+            f.close()
+            os.unlink(tmppath)
+        except OSError:
+            pass
+        return None
+
+    def prune(self):
+        """
+        Evict entries not used within max_age and least recently used entries exceeding max_size. Temporary files older
+        than tmp_grace were left by interrupted runs and are removed.
+        """
+        now = time.time()
+        entries = list()
+        try:
+            for entry in os.scandir(str(self.path)):
+                if entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                elif entry.name.endswith(self.tmp_suffix) and entry.stat().st_mtime < now - self.tmp_grace:
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+        except OSError:
+            return
+
+        expiry = now - self.max_age
+        size = 0
+        for mtime, entrysize, path in sorted(entries, reverse=True):    # most recently used first
+            size += entrysize
+            if mtime < expiry or size > self.max_size:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Remove all entries"""
+        try:
+            for entry in os.scandir(str(self.path)):
+                if entry.name.endswith(self.suffix):
+                    os.unlink(entry.path)
+        except OSError:
+            pass
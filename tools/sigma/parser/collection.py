@@ -14,9 +14,11 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
-from .exceptions import SigmaCollectionParseError
+import copy
+import itertools
+from .exceptions import SigmaCollectionParseError, SigmaParseCacheError
 from .rule import SigmaParser
+from sigma.tools import loadAllYAML
 
 class SigmaCollectionParser:
     """
@@ -28,54 +30,164 @@ class SigmaCollectionParser:
     * reset: resets global attributes from previous set_global statements
     * repeat: takes attributes from this YAML document, merges into previous rule YAML and regenerates the rule
     """
-    def __init__(self, content, config=None, rulefilter=None):
+    def __init__(self, content, config=None, rulefilter=None, cache=None, lazy=False, rules=None):
+        """
+        Parse content with configuration. The SigmaParser objects of all rules are created and stored in self.parsers,
+        unless lazy is set. Then the YAML documents are parsed on demand while iterating over iterparsers() or generate()
+        and parsers that were iterated are not kept, parse errors are raised while iterating. If rules of the content
+        are given as SigmaCollectionRules, copies of them are parsed instead of loading the YAML documents again.
+        """
         if config is None:
             from sigma.configuration import SigmaConfiguration
             config = SigmaConfiguration()
-        self.yamls = yaml.safe_load_all(content)
-        globalyaml = dict()
-        self.parsers = list()
-        prevrule = None
-        for yamldoc in self.yamls:
-            action = None
-            try:
-                action = yamldoc['action']
-                del yamldoc['action']
-            except KeyError:
-                pass
-
-            if action == "global":
-                deep_update_dict(globalyaml, yamldoc)
-            elif action == "reset":
-                globalyaml = dict()
-            elif action == "repeat":
-                if prevrule is None:
-                    raise SigmaCollectionParseError("action 'repeat' is only applicable after first valid Sigma rule")
-                newrule = prevrule.copy()
-                deep_update_dict(newrule, yamldoc)
-                if rulefilter is None or rulefilter is not None and not rulefilter.match(newrule):
-                    self.parsers.append(SigmaParser(newrule, config))
-                    prevrule = newrule
-            else:
-                deep_update_dict(yamldoc, globalyaml)
-                if rulefilter is None or rulefilter is not None and rulefilter.match(yamldoc):
-                    self.parsers.append(SigmaParser(yamldoc, config))
-                    prevrule = yamldoc
         self.config = config
+        self.rules = rules
+
+        if cache is not None:       # SigmaParseCache
+            if hasattr(content, "read"):
+                content = content.read()
+            parsers = self.parse_cached(cache, cache.key(content, config, rulefilter), content, config, rulefilter)
+        else:
+            parsers = self.parse(content, config, rulefilter)
+
+        if lazy:
+            self._parsers = list()
+            self.pending = parsers
+        else:
+            self._parsers = list(parsers)
+            self.pending = None
+
+    @property
+    def parsers(self):
+        """List of SigmaParser objects. Rules that were not parsed yet by lazy iteration are parsed and added."""
+        if self.pending is not None:
+            self._parsers.extend(self.pending)
+            self.pending = None
+        return self._parsers
+
+    @parsers.setter
+    def parsers(self, parsers):
+        self._parsers = parsers
+        self.pending = None
+
+    def parse_cached(self, cache, key, content, config, rulefilter):
+        """
+        Yield SigmaParser objects from cache entry. If there's no entry, parse content and store the parsers in the
+        cache while yielding them. A damaged entry is replaced by parsing the content after the parsers yielded so far.
+        """
+        cached = cache.iterload(key, config)
+        if cached is None:
+            yield from cache.storing(key, self.parse(content, config, rulefilter))
+            return
+
+        count = 0
+        try:
+            for parser in cached:
+                yield parser
+                count += 1
+        except SigmaParseCacheError:
+            yield from itertools.islice(cache.storing(key, self.parse(content, config, rulefilter)), count, None)
+
+    def parse(self, content, config, rulefilter):
+        """Parse YAML documents of content and yield a SigmaParser object for each rule"""
+        if self.rules is not None:
+            for rule in self.rules:
+                yield SigmaParser(copy.deepcopy(rule), config)
+            return
+        self.yamls = loadAllYAML(content)
+        for rule in iterrules(self.yamls, rulefilter):
+            yield SigmaParser(rule, config)
+
+    def iterparsers(self):
+        """Iterate over SigmaParser objects, rules are parsed on demand if parsing is lazy"""
+        yield from self._parsers
+        if self.pending is not None:
+            yield from self.pending
+            self.pending = None
 
     def generate(self, backend):
-        """Calls backend for all parsed rules"""
-        return filter(
-                lambda x: bool(x),      # filter None's and empty strings
-                [ backend.generate(parser) for parser in self.parsers ]
-                )
+        """Calls backend for all parsed rules and yields the results, None's and empty strings are skipped"""
+        for parser in self.iterparsers():
+            result = backend.generate(parser)
+            if result:
+                yield result
 
     def __iter__(self):
         return iter([parser.parsedyaml for parser in self.parsers])
 
+class SigmaCollectionRules:
+    """
+    Rules of the content of a Sigma file that are loaded and filtered by iterrules() on demand and kept, so they can be
+    iterated multiple times, e.g. by SigmaCollectionParser objects with different configurations. An error of loading
+    is raised by each iteration that reaches it.
+    """
+    def __init__(self, content, rulefilter=None):
+        self.content = content
+        self.rulefilter = rulefilter
+        self.rules = list()
+        self.source = None
+        self.loaded = False     # all rules were loaded or loading failed
+        self.error = None
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self.rules):
+                yield self.rules[i]
+                i += 1
+            elif self.error is not None:
+                raise self.error
+            elif self.loaded:
+                return
+            else:
+                try:
+                    if self.source is None:
+                        self.source = iterrules(loadAllYAML(self.content), self.rulefilter)
+                    self.rules.append(next(self.source))
+                except StopIteration:
+                    self.loaded = True
+                except Exception as e:
+                    self.error = e
+                    self.loaded = True
+
+def iterrules(yamls, rulefilter=None):
+    """
+    Yield the rules of the YAML documents of a Sigma collection that match the rule filter. Rules are merged with the
+    global attributes and repeated rules with their previous rule according to the actions of the documents.
+    """
+    globalyaml = dict()
+    prevrule = None
+    for yamldoc in yamls:
+        action = None
+        try:
+            action = yamldoc['action']
+            del yamldoc['action']
+        except KeyError:
+            pass
+
+        if action == "global":
+            deep_update_dict(globalyaml, yamldoc)
+        elif action == "reset":
+            globalyaml = dict()
+        elif action == "repeat":
+            if prevrule is None:
+                raise SigmaCollectionParseError("action 'repeat' is only applicable after first valid Sigma rule")
+            newrule = prevrule.copy()
+            deep_update_dict(newrule, yamldoc)
+            if rulefilter is None or rulefilter is not None and not rulefilter.match(newrule):
+                yield newrule.copy()
+                prevrule = newrule
+        else:
+            deep_update_dict(yamldoc, globalyaml)
+            if rulefilter is None or rulefilter is not None and rulefilter.match(yamldoc):
+                yield yamldoc.copy()
+                prevrule = yamldoc
+
 def deep_update_dict(dest, src):
     for key, value in src.items():
         if isinstance(value, dict) and key in dest and isinstance(dest[key], dict):     # source is dict, destination key already exists and is dict: merge
                 deep_update_dict(dest[key], value)
+        elif isinstance(value, (dict, list)):   # copy, rules must not share objects that are modified while generating one of them
+            dest[key] = copy.deepcopy(value)
         else:
             dest[key] = value
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
+import sys
 from .base import SimpleParser
 from .exceptions import SigmaParseError
 
@@ -126,22 +127,29 @@ class SigmaConditionTokenizer:
             (SigmaConditionToken.TOKEN_RPAR,   re.compile("\\)")),
             ]
 
+    # All token definitions combined into one regular expression with one group per token definition. Alternatives
+    # are tried in order of definition, so the first matching token definition is used like in separate matching.
+    tokenRegex = re.compile("|".join(
+        "(%s)" % ("(?i:%s)" % regex.pattern if regex.flags & re.IGNORECASE else regex.pattern)
+        for tokenid, regex in tokendefs
+        ))
+
     def __init__(self, condition):
         if type(condition) == str:          # String that is parsed
             self.tokens = list()
-            pos = 1
-
-            while len(condition) > 0:
-                for tokendef in self.tokendefs:     # iterate over defined tokens and try to recognize the next one
-                    match = tokendef[1].match(condition)
-                    if match:
-                        if tokendef[0] != None:
-                            self.tokens.append(SigmaConditionToken(tokendef, match, pos + match.start()))
-                        pos += match.end()      # increase position and cut matched prefix from condition
-                        condition = condition[match.end():]
-                        break
-                else:   # no valid token identified
-                    raise SigmaParseError("Unexpected token in condition at position %s" % condition)
+            tokendefs = self.tokendefs
+            match = self.tokenRegex.match
+            pos = 0
+            end = len(condition)
+
+            while pos < end:
+                m = match(condition, pos)
+                if m is None:   # no valid token identified
+                    raise SigmaParseError("Unexpected token in condition at position %s" % condition[pos:])
+                tokendef = tokendefs[m.lastindex - 1]    # group i + 1 belongs to token definition i
+                if tokendef[0] != None:
+                    self.tokens.append(SigmaConditionToken(tokendef, m, pos + 1))
+                pos = m.end()
         elif type(condition) == list:       # List of tokens to be converted into SigmaConditionTokenizer class
             self.tokens = condition
         else:
@@ -177,19 +185,47 @@ class SigmaConditionTokenizer:
 
 
 ### Parse Tree Node Classes ###
+def _freezeItem(item):
+    """Hashable representation of an item of a parse tree node: list values of map items are frozen as tuples"""
+    if type(item) == tuple and len(item) == 2 and type(item[1]) == list:
+        return (item[0], tuple(item[1]))
+    return item
+
+
 class ParseTreeNode:
-    """Parse Tree Node Base Class"""
+    """
+    Parse Tree Node Base Class
+
+    Nodes are slotted and compare and hash by their type and items, map items with list values are compared by their
+    values. Nodes must not be changed while they are used as dictionary keys or set members. Optimized parse trees
+    consist of nodes with tuples as items that are not changed anymore.
+    """
+    __slots__ = ("items", "__weakref__")
+
     def __init__(self):
         raise NotImplementedError("ConditionBase is no usable class")
 
     def __str__(self):  # pragma: no cover
         return "[ %s: %s ]" % (self.__doc__, str([str(item) for item in self.items]))
 
+    def _frozen(self):
+        if isinstance(self.items, (list, tuple)):
+            return tuple(map(_freezeItem, self.items))
+        return _freezeItem(self.items)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self is other or self._frozen() == other._frozen()
+
+    def __hash__(self):
+        return hash((type(self), self._frozen()))
+
 
 class ConditionBase(ParseTreeNode):
     """Base class for conditional operations"""
+    __slots__ = ()
     op = COND_NONE
-    items = None
 
     def __init__(self):
         raise NotImplementedError("ConditionBase is no usable class")
@@ -206,6 +242,7 @@ class ConditionBase(ParseTreeNode):
 
 class ConditionAND(ConditionBase):
     """AND Condition"""
+    __slots__ = ()
     op = COND_AND
 
     def __init__(self, sigma=None, op=None, *args):
@@ -217,11 +254,13 @@ class ConditionAND(ConditionBase):
 
 class ConditionOR(ConditionAND):
     """OR Condition"""
+    __slots__ = ()
     op = COND_OR
 
 
 class ConditionNOT(ConditionBase):
     """NOT Condition"""
+    __slots__ = ()
     op = COND_NOT
 
     def __init__(self, sigma=None, op=None, val=None):
@@ -246,16 +285,18 @@ class ConditionNOT(ConditionBase):
 
 class ConditionNULLValue(ConditionNOT):
     """Condition: Field value is empty or doesn't exists"""
-    pass
+    __slots__ = ()
 
 
 class ConditionNotNULLValue(ConditionNULLValue):
     """Condition: Field value is not empty"""
-    pass
+    __slots__ = ()
 
 
 class NodeSubexpression(ParseTreeNode):
     """Subexpression"""
+    __slots__ = ()
+
     def __init__(self, subexpr):
         self.items = subexpr
 
@@ -306,139 +347,251 @@ def convertId(sigma, op):
 class SigmaConditionOptimizer:
     """
     Optimizer for the parsed AST.
+
+    The rewrite rules are applied in passes from the root until a pass doesn't change the tree anymore. In each pass,
+    the rules are applied to a node until none of them applies, then its items are visited. AND, OR and NOT nodes are
+    compared by identity and leaves by their values. Subtrees that weren't changed by a pass are skipped by the
+    following passes, they wouldn't change anymore. The traversals are iterative, long chains of conditions don't
+    exceed the recursion limit.
     """
-    def _stripSubexpressionNode(self, node):
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._leafkeys = dict()     # value of leaf -> key
+        self._stable = dict()       # id of node whose subtree wasn't changed by a pass -> node, keeps the id unique
+        self._changes = 0           # number of applied rewrite rules
+
+    def _key(self, item):
         """
-        Recursively strips all subexpressions (i.e. brackets) from the AST.
+        Hashable key of an item of the AST. Nodes are identified by their id. Other items are leaves that are
+        interned as negative numbers, map items with list values are compared by their values.
         """
-        if type(node) == NodeSubexpression:
-            assert(type(node.items) != list)
-            return self._stripSubexpressionNode(node.items)
-        if hasattr(node, 'items') and type(node) is not ConditionNOT:
-            node.items = list(map(self._stripSubexpressionNode, node.items))
-        return node
-
-    def _unstripSubexpressionNode(self, node):
+        if isinstance(item, ParseTreeNode):
+            return id(item)
+        elif type(item) == tuple and type(item[1]) == list:
+            value = (item[0], tuple(item[1]))
+        else:
+            value = item
+
+        try:
+            return self._leafkeys[value]
+        except KeyError:
+            key = self._leafkeys[value] = -len(self._leafkeys) - 1
+            return key
+        except TypeError:           # unhashable value, compared by identity
+            return (id(item),)
+
+    def _stripSubexpressionNode(self, tree):
         """
-        Recursively adds brackets around AND and OR operations in the AST.
+        Strips all subexpressions (i.e. brackets) from the AST. Items of the nodes become lists, they are changed by
+        the optimization.
         """
-        if type(node) in (ConditionAND, ConditionOR):
-            newnode = NodeSubexpression(node)
-            node.items = list(map(self._unstripSubexpressionNode, node.items))
-            return newnode
-        return node
+        def strip(node):
+            while type(node) == NodeSubexpression:
+                assert(type(node.items) != list)
+                node = node.items
+            return node
+
+        tree = strip(tree)
+        stack = [ tree ]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ParseTreeNode) and type(node) is not ConditionNOT:
+                node.items = [ strip(item) for item in node.items ]
+                stack.extend(node.items)
+        return tree
 
-    def _ordered_uniq(self, l):
+    def _unstripSubexpressionNode(self, tree):
         """
-        Remove duplicate entries in list *l* while preserving order.
-
-        Used to be fast before it needed to work around list instead of
-        tuple being used for lists within definitions in the AST.
+        Adds brackets around AND and OR operations in the AST. Optimized AND and OR nodes are rebuilt with tuples as
+        items. Strings are interned, parse trees of the same rules converted with different configurations share
+        them.
         """
-        seen = set()
-        #return [x for x in l if x not in seen and not seen.add(x)]
-        uniq = []
-        for x in l:
-            if type(x) == tuple and type(x[1]) == list:
-                x = (x[0], tuple(x[1]))
-            if x not in seen and not seen.add(x):
-                uniq.append(x)
-        out = []
-        for x in uniq:
-            if type(x) == tuple and type(x[1]) == tuple:
-                out.append((x[0], list(x[1])))
+        inner = (ConditionAND, ConditionOR)
+
+        def leaf(node):
+            nodetype = type(node)
+            if nodetype == tuple and len(node) == 2 and type(node[0]) == str:
+                value = node[1]
+                if type(value) == list:
+                    value = [ sys.intern(item) if type(item) == str else item for item in value ]
+                elif type(value) == str:
+                    value = sys.intern(value)
+                return (sys.intern(node[0]), value)
+            elif nodetype == str:
+                return sys.intern(node)
+            return node
+
+        if type(tree) not in inner:
+            return tree
+
+        rebuilt = dict()        # id of AND/OR node -> rebuilt node
+        stack = [ (tree, False) ]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                newnode = type(node)()
+                newnode.items = tuple(rebuilt.pop(id(item)) if type(item) in inner else leaf(item) for item in node.items)
+                rebuilt[id(node)] = NodeSubexpression(newnode)
             else:
-                out.append(x)
-        return out
+                stack.append((node, True))
+                stack.extend([ (item, False) for item in node.items if type(item) in inner ])
+        return rebuilt[id(tree)]
 
-    def _optimizeNode(self, node, changes=False):
+    def _rewrite(self, node):
         """
-        Recursively optimize the AST rooted at *node* once.  Returns the new
-        root node and a boolean indicating if the tree was changed in this
-        invocation or any of the recursive sub-invocations.
+        Apply the rewrite rules to *node* until none of them applies. Returns the new node and a boolean indicating
+        if a rule was applied. Items of the node are not visited.
+        """
+        changed = False
+        while True:
+            nodetype = type(node)
+            if nodetype in (ConditionOR, ConditionAND):
+                if id(node) in self._stable:
+                    break
+                items = node.items
+
+                # Remove empty OR(X), AND(X)
+                if len(items) == 0:
+                    node = None
+                    changed = True
+                    break
+                if None in items:
+                    node.items = [ item for item in items if item is not None ]
+                    changed = True
+                    continue
+
+                # OR(X), AND(X)                 =>  X
+                if len(items) == 1:
+                    node = items[0]
+                    changed = True
+                    continue
+
+                # OR(X, X, ...), AND(X, X, ...) =>  OR(X, ...), AND(X, ...)
+                seen = set()
+                uniqitems = [ item for item, key in zip(items, map(self._key, items)) if key not in seen and not seen.add(key) ]
+                if len(uniqitems) < len(items):
+                    node.items = uniqitems
+                    changed = True
+                    continue
+
+                # OR(X, OR(Y))                  =>  OR(X, Y)
+                # Applied again to the merged items as long as they are only leaves and nodes of the same type, removal
+                # of empty and duplicate items in between wouldn't change the result. Long chains are flattened in
+                # linear time this way.
+                itemtypes = set(map(type, items))
+                if nodetype in itemtypes and itemtypes <= { nodetype, tuple }:
+                    merged = set()      # ids of merged nodes
+                    level = [ item for item in items if type(item) == nodetype ]
+                    other = False       # a merged node contains items that are not leaves or nodes of the same type
+                    while level and not other:
+                        nextlevel = list()
+                        for item in level:
+                            merged.add(id(item))
+                            for subitem in item.items:
+                                if type(subitem) == nodetype:
+                                    nextlevel.append(subitem)
+                                elif type(subitem) != tuple and subitem is not None:
+                                    other = True
+                        level = nextlevel
+                    newitems = list()
+                    stack = items[::-1]
+                    while stack:
+                        item = stack.pop()
+                        if type(item) == nodetype and id(item) in merged:
+                            stack.extend(item.items[::-1])
+                        elif item is not None:
+                            newitems.append(item)
+                    node.items = newitems
+                    changed = True
+                    continue
+
+                # OR(AND(X, ...), AND(X, ...))  =>  AND(X, OR(AND(...), AND(...)))
+                if nodetype == ConditionOR:
+                    othertype = ConditionAND
+                else:
+                    othertype = ConditionOR
+                if itemtypes == { othertype }:
+                    keysets = [ set(map(self._key, item.items)) for item in items[1:] ]
+                    promoted = list()
+                    promotedkeys = list()
+                    for cand, key in zip(items[0].items, map(self._key, items[0].items)):
+                        if all(key in keyset for keyset in keysets):
+                            promoted.append(cand)
+                            promotedkeys.append(key)
+                    if len(promoted) > 0:
+                        for item in items:
+                            itemkeys = list(map(self._key, item.items))
+                            for key in promotedkeys:
+                                if key in itemkeys:
+                                    i = itemkeys.index(key)
+                                    del itemkeys[i]
+                                    del item.items[i]
+                            self._stable.pop(id(item), None)
+                        newnode = othertype()
+                        newnode.items = promoted
+                        # OR(AND(X), AND(X, ...))       =>  X
+                        if all(len(item.items) > 0 for item in items):
+                            newnode.add(node)
+                        node = newnode
+                        changed = True
+                        continue
+
+            elif nodetype == ConditionNOT:
+                assert(len(node.items) == 1)
+                item = node.items[0]
+                # NOT(NOT(X))                   =>  X
+                if type(item) == ConditionNOT:
+                    assert(len(item.items) == 1)
+                    node = item.items[0]
+                    changed = True
+                    continue
+
+                # NOT(ConditionNULLValue)       =>  ConditionNotNULLValue
+                if type(item) == ConditionNULLValue:
+                    node = ConditionNotNULLValue(val=item.items[0])
+                    changed = True
+                    continue
+
+                # NOT(ConditionNotNULLValue)    =>  ConditionNULLValue
+                if type(item) == ConditionNotNULLValue:
+                    node = ConditionNULLValue(val=item.items[0])
+                    changed = True
+                    continue
+
+            break
+
+        if changed:
+            self._changes += 1
+        return node, changed
+
+    def _optimizeNode(self, tree):
+        """
+        Optimize the AST rooted at *tree* once. Returns the new root node and a boolean indicating if the tree was
+        changed.
 
         You MUST remove all subexpression nodes from the AST before calling
         this function.  Subexpressions are implicit around AND/OR nodes.
         """
-        if type(node) in (ConditionOR, ConditionAND):
-            # Remove empty OR(X), AND(X)
-            if len(node.items) == 0:
-                return None, True
-            if None in node.items:
-                node.items = [item for item in node.items if item != None]
-                return self._optimizeNode(node, changes=True)
-
-            # OR(X), AND(X)                 =>  X
-            if len(node.items) == 1:
-                return self._optimizeNode(node.items[0], changes=True)
-
-            # OR(X, X, ...), AND(X, X, ...) =>  OR(X, ...), AND(X, ...)
-            uniq_items = self._ordered_uniq(node.items)
-            if len(uniq_items) < len(node.items):
-                node.items = uniq_items
-                return self._optimizeNode(node, changes=True)
-
-            # OR(X, OR(Y))                  =>  OR(X, Y)
-            if any(type(child) == type(node) for child in node.items) and \
-               all(type(child) in (type(node), tuple) for child in node.items):
-                newitems = []
-                for child in node.items:
-                    if hasattr(child, 'items'):
-                        newitems.extend(child.items)
-                    else:
-                        newitems.append(child)
-                node.items = newitems
-                return self._optimizeNode(node, changes=True)
-
-            # OR(AND(X, ...), AND(X, ...))  =>  AND(X, OR(AND(...), AND(...)))
-            if type(node) == ConditionOR:
-                othertype = ConditionAND
-            else:
-                othertype = ConditionOR
-            if all(type(child) == othertype for child in node.items):
-                promoted = []
-                for cand in node.items[0]:
-                    if all(cand in child for child in node.items[1:]):
-                        promoted.append(cand)
-                if len(promoted) > 0:
-                    for child in node.items:
-                        for cand in promoted:
-                            if cand in child.items:
-                                child.items.remove(cand)
-                    newnode = othertype()
-                    newnode.items = promoted
-                    newnode.add(node)
-                    return self._optimizeNode(newnode, changes=True)
-
-            # fallthrough
-
-        elif type(node) == ConditionNOT:
-            assert(len(node.items) == 1)
-            # NOT(NOT(X))                   =>  X
-            if type(node.items[0]) == ConditionNOT:
-                assert(len(node.items[0].items) == 1)
-                return self._optimizeNode(node.items[0].items[0], changes=True)
-
-            # NOT(ConditionNULLValue)       =>  ConditionNotNULLValue
-            if type(node.items[0]) == ConditionNULLValue:
-                newnode = ConditionNotNULLValue(val=node.items[0].items[0])
-                return self._optimizeNode(newnode, changes=True)
-
-            # NOT(ConditionNotNULLValue)    =>  ConditionNULLValue
-            if type(node.items[0]) == ConditionNotNULLValue:
-                newnode = ConditionNULLValue(val=node.items[0].items[0])
-                return self._optimizeNode(newnode, changes=True)
-
-            # fallthrough
-
-        else:
-            return node, changes
-
-        itemresults = [self._optimizeNode(item, changes) for item in node.items]
-        node.items = [res[0] for res in itemresults]
-        if any(res[1] for res in itemresults):
-            changes = True
-        return node, changes
+        changes = self._changes
+        tree, changed = self._rewrite(tree)
+        stack = [ (tree, changed, None) ]
+        while stack:
+            node, changed, start = stack.pop()
+            if start is not None:       # all items were visited
+                if self._changes == start:
+                    self._stable[id(node)] = node
+                continue
+            if type(node) not in (ConditionAND, ConditionOR, ConditionNOT) or id(node) in self._stable:
+                continue
+            if not changed:
+                stack.append((node, None, self._changes))
+            items = node.items
+            for i, item in enumerate(items):
+                items[i], changed = self._rewrite(item)
+                stack.append((items[i], changed, None))
+        return tree, self._changes != changes
 
     def optimizeTree(self, tree):
         """
@@ -460,6 +613,7 @@ class SigmaConditionOptimizer:
         -   OR(X, X, ...), AND(X, X, ...) =>  OR(X, ...), AND(X, ...)
         -   OR(X, OR(Y))                  =>  OR(X, Y)
         -   OR(AND(X, ...), AND(X, ...))  =>  AND(X, OR(AND(...), AND(...)))
+        -   OR(AND(X), AND(X, ...))       =>  X
         -   NOT(NOT(X))                   =>  X
         -   NOT(ConditionNULLValue)       =>  ConditionNotNULLValue
         -   NOT(ConditionNotNULLValue)    =>  ConditionNULLValue
@@ -471,12 +625,14 @@ class SigmaConditionOptimizer:
         OR(), or vice versa.  Nevertheless, it is safe to assume that this
         implementation performs poorly on very large expressions.
         """
-        tree = self._stripSubexpressionNode(tree)
-        changes = True
-        while changes:
-            tree, changes = self._optimizeNode(tree)
-        tree = self._unstripSubexpressionNode(tree)
-        return tree
+        try:
+            tree = self._stripSubexpressionNode(tree)
+            changes = True
+            while changes:
+                tree, changes = self._optimizeNode(tree)
+            return self._unstripSubexpressionNode(tree)
+        finally:
+            self._reset()
 
 # Condition parser
 class SigmaConditionParser:
@@ -489,6 +645,7 @@ class SigmaConditionParser:
             (SigmaConditionToken.TOKEN_AND, 2, ConditionAND),
             (SigmaConditionToken.TOKEN_OR,  2, ConditionOR),
             ]
+    searchOperatorDefs = { operator[0]: (precedence, operator) for precedence, operator in enumerate(searchOperators) }
 
     def __init__(self, sigmaParser, tokens):
         self.sigmaParser = sigmaParser
@@ -503,81 +660,105 @@ class SigmaConditionParser:
             self.parsedSearch = self.parseSearch(tokens)
             self.parsedAgg = None
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["config"]
+        del state["_optimizer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._optimizer = SigmaConditionOptimizer()
+
+    def set_config(self, config):
+        self.config = config
+        if self.parsedAgg is not None:
+            self.parsedAgg.config = config
+
     def parseSearch(self, tokens):
         """
-        Iterative parsing of search expression.
+        Parse search expression by precedence climbing in one pass over the tokens. The precedence of operators is
+        given by their order in searchOperators, binary operators are left-associative. Parenthesized subexpressions
+        are completed like separate search expressions, including the log source conditions.
         """
-        def find_close_token_index_in_pairs(tokens, start_index, open_token, close_token):
-            """
-                the function try to find close_token index for open_token in pairs
-                e.g
-                    open_token was '(' and
-                    tokens were ['(', '...', '(', '...', ')', ')']
-                    the first '(' should pair with the last ')' instead of the first ')'
-                
-                Parameters:
-                    tokens: the list of tokens
-                    start_index: the start index (included) of the input tokens for finding the close_token
-                    open_token: the token that considered as opening token
-                    close_token: the token that considered as closing token
-                Returns:
-                    the index of the close_token in pair with the open_token
-                    raise ValueError when there is no close_token in pairs
-            """
-            open_token_count = 0
-            for i in range(start_index, len(tokens)):
-                if tokens[i] == open_token:
-                    open_token_count += 1
-                elif tokens[i] == close_token:
-                    if open_token_count == 0:
-                        return i
-                    else:
-                        open_token_count -= 1
-            raise ValueError(f"matched close_token {close_token} is not found in tokens")
-        # 1. Identify subexpressions with parentheses around them and parse them like a separate search expression
-        while SigmaConditionToken.TOKEN_LPAR in tokens:
-            lPos = tokens.index(SigmaConditionToken.TOKEN_LPAR)
-            lTok = tokens[lPos]
+        tokens = list(tokens)
+        if len(tokens) == 0:
+            raise ValueError("Parse tree must have exactly one start node!")
+        ntokens = len(tokens)
+        idprecedence = [ operator[0] for operator in self.searchOperators ].index(SigmaConditionToken.TOKEN_ID)
+        pos = 0
+
+        # 1. Check parentheses before parsing, unmatched opening parentheses are reported first
+        depth = 0
+        for token in tokens:
+            if token.type == SigmaConditionToken.TOKEN_LPAR:
+                depth += 1
+            elif token.type == SigmaConditionToken.TOKEN_RPAR and depth > 0:
+                depth -= 1
+        if depth > 0:
+            raise SigmaParseError("Missing matching closing parentheses")
+
+        def nextToken():
+            nonlocal pos
+            try:
+                token = tokens[pos]
+            except IndexError:
+                raise SigmaParseError("Unexpected end of condition")
+            pos += 1
+            return token
+
+        def parseOperand(maxprecedence):
+            """Parse parenthesized subexpression, search identifier or unary operator with precedence up to maxprecedence"""
+            nonlocal pos
+            token = nextToken()
+            if token.type == SigmaConditionToken.TOKEN_LPAR:
+                if pos < ntokens and tokens[pos].type == SigmaConditionToken.TOKEN_RPAR:
+                    raise SigmaParseError("Empty subexpression at " + str(token.pos))
+                subexpression = parseExpression(len(self.searchOperators))
+                if pos >= ntokens or tokens[pos].type != SigmaConditionToken.TOKEN_RPAR:
+                    raise ValueError("Parse tree must have exactly one start node!")
+                pos += 1
+                return NodeSubexpression(self.completeSearch(subexpression))
+
             try:
-                rPos = find_close_token_index_in_pairs(tokens, lPos+1, SigmaConditionToken.TOKEN_LPAR, SigmaConditionToken.TOKEN_RPAR)
-                rTok = tokens[rPos]
-            except ValueError as e:
-                raise SigmaParseError("Missing matching closing parentheses") from e
-            if lPos + 1 == rPos:
-                raise SigmaParseError("Empty subexpression at " + str(lTok.pos))
-            if lPos > rPos:
-                raise SigmaParseError("Closing parentheses at position " + str(rTok.pos) + " precedes opening at position " + str(lTok.pos))
-
-            subparsed = self.parseSearch(tokens[lPos + 1:rPos])
-            tokens = tokens[:lPos] + NodeSubexpression(subparsed) + tokens[rPos + 1:]   # replace parentheses + expression with group node that contains parsed subexpression
-
-        # 2. Iterate over all known operators in given precedence
-        for operator in self.searchOperators:
-            # 3. reduce all occurrences into corresponding parse tree nodes
-            while operator[0] in tokens:
-                pos_op = tokens.index(operator[0])
-                tok_op = tokens[pos_op]
-                if operator[1] == 0:    # operator
-                    treenode = operator[2](self.sigmaParser, tok_op)
-                    tokens = tokens[:pos_op] + treenode + tokens[pos_op + 1:]
-                elif operator[1] == 1:    # operator value
-                    pos_val = pos_op + 1
-                    tok_val = tokens[pos_val]
-                    treenode = operator[2](self.sigmaParser, tok_op, tok_val)
-                    tokens = tokens[:pos_op] + treenode + tokens[pos_val + 1:]
-                elif operator[1] == 2:    # value1 operator value2
-                    pos_val1 = pos_op - 1
-                    pos_val2 = pos_op + 1
-                    tok_val1 = tokens[pos_val1]
-                    tok_val2 = tokens[pos_val2]
-                    treenode = operator[2](self.sigmaParser, tok_op, tok_val1, tok_val2)
-                    tokens = tokens[:pos_val1] + treenode + tokens[pos_val2 + 1:]
-
-        if len(tokens) != 1:     # parse tree must begin with exactly one node
+                precedence, (_, nargs, treeclass) = self.searchOperatorDefs[token.type]
+            except KeyError:
+                raise SigmaParseError("Unexpected token '%s' at position %d" % (token.matched, token.pos))
+            if precedence > maxprecedence:      # e.g. 'not not x': operator can't be reduced
+                raise ValueError("Parse tree must have exactly one start node!")
+            elif nargs == 0:        # operand
+                return treeclass(self.sigmaParser, token)
+            elif nargs == 1:        # operator value
+                if precedence < idprecedence:   # operators preceding search identifiers get the plain token
+                    return treeclass(self.sigmaParser, token, nextToken())
+                else:
+                    return treeclass(self.sigmaParser, token, parseOperand(precedence - 1))
+            else:
+                raise SigmaParseError("Unexpected token '%s' at position %d" % (token.matched, token.pos))
+
+        def parseExpression(maxprecedence):
+            """Parse expression with binary operators with precedence up to maxprecedence: value1 operator value2"""
+            nonlocal pos
+            node = parseOperand(maxprecedence)
+            while pos < ntokens:
+                token = tokens[pos]
+                try:
+                    precedence, (_, nargs, treeclass) = self.searchOperatorDefs[token.type]
+                except KeyError:
+                    break
+                if nargs != 2 or precedence > maxprecedence:
+                    break
+                pos += 1
+                node = treeclass(self.sigmaParser, token, node, parseExpression(precedence - 1))
+            return node
+
+        query_cond = parseExpression(len(self.searchOperators))
+        if pos != ntokens:      # parse tree must begin with exactly one node
             raise ValueError("Parse tree must have exactly one start node!")
-        query_cond = tokens[0]
+        return self.completeSearch(query_cond)
 
-        # 4. Integrate conditions from logsources in configurations
+    def completeSearch(self, query_cond):
+        """Integrate conditions from logsources in configurations and optimize parse tree"""
         ls_cond = self.sigmaParser.get_logsource_condition()
         if ls_cond is not None:
             cond = ConditionAND()
@@ -669,6 +850,11 @@ class SigmaAggregationParser(SimpleParser):
         self.groupfield = None
         super().__init__(tokens)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["config"]
+        return state
+
     def trans_aggfunc(self, name):
         """Translate aggregation function name into constant"""
         try:
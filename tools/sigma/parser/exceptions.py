@@ -19,3 +19,6 @@ class SigmaCollectionParseError(Exception):
 
 class SigmaParseError(Exception):
     pass
+
+class SigmaParseCacheError(Exception):
+    pass
@@ -14,14 +14,31 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import os
-from sigma.tools import getAllSubclasses, getClassDict
-from .base import SigmaModifier
+from sigma.tools import getClassDict
+from .transform import SigmaContainsModifier, SigmaStartswithModifier, SigmaEndswithModifier, SigmaAllValuesModifier, \
+        SigmaBase64Modifier, SigmaBase64OffsetModifier, SigmaEncodeUTF16Modifier, SigmaEncodeUTF16LEModifier, \
+        SigmaEncodeWideModifier, SigmaEncodeUTF16BEModifier
+from .type import SigmaRegularExpressionModifier
+
+# Modifier classes usable in Sigma rules. This list must be updated if a modifier is added or removed,
+# tests/test_discovery.py verifies it against the active modifier classes contained in this package.
+modifierClasses = (
+        SigmaContainsModifier,
+        SigmaStartswithModifier,
+        SigmaEndswithModifier,
+        SigmaAllValuesModifier,
+        SigmaBase64Modifier,
+        SigmaBase64OffsetModifier,
+        SigmaEncodeUTF16Modifier,
+        SigmaEncodeUTF16LEModifier,
+        SigmaEncodeWideModifier,
+        SigmaEncodeUTF16BEModifier,
+        SigmaRegularExpressionModifier,
+        )
 
 def getModifierList():
     """Return list of modifier classes"""
-    path = os.path.dirname(__file__)
-    return getAllSubclasses(path, "parser.modifiers", SigmaModifier)
+    return list(modifierClasses)
 
 modifiers = getClassDict(getModifierList())
 
@@ -26,6 +26,7 @@ class SigmaParser:
         self.values = dict()
         self.config = config
         self.parsedyaml = sigma
+        self.logsource_condition = None     # (log source, merging, index field, condition) of last built log source condition
         self.parse_sigma()
 
     def parse_sigma(self):
@@ -53,6 +54,20 @@ class SigmaParser:
             condparsed = SigmaConditionParser(self, tokens)
             self.condparsed.append(condparsed)
 
+    def __getstate__(self):
+        """The configuration is not pickled, it must be attached to the unpickled object with set_config()"""
+        state = self.__dict__.copy()
+        del state["config"]
+        state["logsource_condition"] = None
+        return state
+
+    def set_config(self, config):
+        """Attach configuration to rule and its parsed conditions"""
+        self.config = config
+        self.logsource_condition = None
+        for condparsed in self.condparsed:
+            condparsed.set_config(config)
+
     def parse_definition_byname(self, definitionName, condOverride=None):
         try:
             definition = self.definitions[definitionName]
@@ -146,18 +161,27 @@ class SigmaParser:
         return cond
 
     def get_logsource_condition(self):
+        """
+        Returns condition for log source of current rule. The condition is built once per rule and reused as long as
+        the configuration returns the same log source and settings. It must not be modified by the caller.
+        """
         logsource = self.get_logsource()
         if logsource is None:
             return None
         else:
+            merging = self.config.get_logsourcemerging()
+            index_field = self.config.get_indexfield()
+            cached = self.logsource_condition
+            if cached is not None and cached[0] is logsource and cached[1] == merging and cached[2] == index_field:
+                return cached[3]
+
             cond = ConditionAND()
-            if self.config.get_logsourcemerging() == 'or':
+            if merging == 'or':
                 cond.add(self.build_conditions(ConditionOR,  logsource.conditions))
             else:
                 cond.add(self.build_conditions(ConditionAND, logsource.conditions))
 
             # Add index condition if supported by backend and defined in log source
-            index_field = self.config.get_indexfield()
             indices = logsource.index
             if len(indices) > 0 and index_field is not None:        # at least one index given and backend knows about indices in conditions
                 if len(indices) > 1:      # More than one index, search in all by ORing them together
@@ -168,4 +192,5 @@ class SigmaParser:
                 else:           # only one index, add directly to AND from above
                     cond.add((index_field, indices[0]))
 
+            self.logsource_condition = (logsource, merging, index_field, cond)
             return cond
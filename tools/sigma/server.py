@@ -0,0 +1,213 @@
+# Conversion server of sigmac
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import stat
+import signal
+import json
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sigma.converter import Converter, ConverterError, ERR_OPEN_CONFIG_FILE
+
+logger = logging.getLogger(__name__)
+
+class ConversionRequestError(Exception):
+    """Invalid conversion request."""
+    code = None
+
+class SigmaConversionService:
+    """
+    Converts Sigma rules on request, like a sigmac run for one input and one target. A Converter is built for each
+    combination of target, configurations, backend options and rule filter of the requests and kept for following
+    requests with the same combination, the least recently built ones are dropped if there are more than
+    max_converters. The configuration manager is shared by all converters. Requests larger than max_request_size bytes
+    are rejected.
+    """
+    max_converters = 64
+    max_request_size_default = 1024 * 1024
+
+    def __init__(self, scm, shoot_yourself_in_the_foot=False, max_request_size=None):
+        self.scm = scm
+        self.shoot_yourself_in_the_foot = shoot_yourself_in_the_foot
+        self.max_request_size = self.max_request_size_default if max_request_size is None else max_request_size
+        self.lock = threading.Lock()
+        self.converters = dict()    # (target, configurations, options, filter) -> Converter
+
+    def parse_request(self, request):
+        """
+        Return tuple (target, configuration names, backend options, rule filter) from request. A request is a JSON
+        object with the following keys:
+
+        * rule: Sigma rule YAML, may contain multiple documents like a Sigma input file (required)
+        * target: backend identifier like -t/--target (required)
+        * config: list of configuration identifiers like -c/--config (default: backend default configurations)
+        * options: backend options like -O/--backend-option as list of "key=value" strings or object
+        * filter: rule filter like -f/--filter
+        * name: name of the rule in error messages, e.g. its file path
+        """
+        if not isinstance(request, dict):
+            raise ConversionRequestError("Request must be a JSON object")
+        if not isinstance(request.get("rule"), str):
+            raise ConversionRequestError("Request must contain the Sigma rule as string in 'rule'")
+        if not isinstance(request.get("target"), str):
+            raise ConversionRequestError("Request must contain the backend identifier as string in 'target'")
+
+        names = request.get("config")
+        if isinstance(names, str):
+            names = [ names ]
+        if names is not None and not (isinstance(names, list) and all(isinstance(name, str) for name in names)):
+            raise ConversionRequestError("Configurations in 'config' must be a list of configuration identifiers")
+        for name in names or ():
+            if name not in self.scm.configpaths:        # no file paths from requests
+                raise ConverterError("Unknown configuration '%s'" % name, ERR_OPEN_CONFIG_FILE)
+
+        options = request.get("options")
+        if not (options is None or isinstance(options, dict) or isinstance(options, list) and all(isinstance(option, str) for option in options)):
+            raise ConversionRequestError("Backend options in 'options' must be a list of strings or an object")
+        if not (request.get("filter") is None or isinstance(request["filter"], str)):
+            raise ConversionRequestError("Rule filter in 'filter' must be a string")
+        return request["target"], names, options, request.get("filter")
+
+    def converter(self, target, names, options, rulefilter):
+        """Return converter for the request parameters, raises ConverterError if it can't be built."""
+        key = (target, None if names is None else tuple(names), json.dumps(options, sort_keys=True), rulefilter)
+        with self.lock:         # configurations are loaded on first use by the shared configuration manager
+            try:
+                return self.converters[key]
+            except KeyError:
+                pass
+            converter = Converter(target, names, options, rulefilter, self.scm, self.shoot_yourself_in_the_foot)
+            if len(self.converters) >= self.max_converters:
+                del self.converters[next(iter(self.converters))]
+            self.converters[key] = converter
+            return converter
+
+    def convert(self, request):
+        """
+        Convert request and return tuple (HTTP status, response). The response of a successful conversion contains
+        the results of the rules in 'results' and the output of multi-rule backends in 'finalized' (null if there's
+        none). Responses of failed requests contain an object with 'message', 'code' (exit code of sigmac) and 'class'
+        in 'error'. The classes are the ones of conversion errors (see conversion_error()) and 'request' for invalid
+        requests.
+        """
+        try:
+            converter = self.converter(*self.parse_request(request))
+        except (ConversionRequestError, ConverterError) as e:
+            return 400, { "error": { "message": str(e), "code": e.code, "class": "request" } }
+
+        result = converter.convert(request["rule"], request.get("name", "<request>"))
+        if result.error is not None:
+            return 422, { "error": { "message": result.error.message, "code": result.error.code, "class": result.error.errclass } }
+        return 200, { "results": result.results, "finalized": result.finalized }
+
+class SigmaConversionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles POST requests to /convert with a JSON conversion request, see SigmaConversionService.parse_request().
+    Requests must have the content type application/json. Browsers don't send cross-origin requests with this content
+    type without a preflight request, which isn't answered, so web pages can't post rules to a local server.
+    """
+    server_version = "sigmac"
+    protocol_version = "HTTP/1.1"       # connections are kept alive between requests
+    wbufsize = -1                       # response is sent at once, not delayed by the Nagle algorithm
+
+    def do_POST(self):
+        if self.path != "/convert":
+            self.reject(404, "Unknown path %s, requests are posted to /convert" % self.path)
+            return
+        if self.headers.get_content_type() != "application/json":
+            self.reject(415, "Requests must have the content type application/json")
+            return
+        try:
+            length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError):
+            self.reject(411, "Requests must have a Content-Length")
+            return
+        if length < 0 or length > self.server.service.max_request_size:
+            self.reject(413, "Request is larger than %d bytes" % self.server.service.max_request_size)
+            return
+        try:
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+        except (ValueError, UnicodeDecodeError) as e:
+            self.respond(400, { "error": { "message": "Request is no valid JSON: %s" % str(e), "code": None, "class": "request" } })
+            return
+        try:
+            status, response = self.server.service.convert(request)
+        except Exception as e:
+            logger.exception("Conversion of request failed")
+            status, response = 500, { "error": { "message": "Internal error: %s" % str(e), "code": None, "class": "internal" } }
+        self.respond(status, response)
+
+    def reject(self, status, message):
+        """Respond with error to request whose body isn't read, the connection is closed afterwards"""
+        self.respond(status, { "error": { "message": message, "code": None, "class": "request" } }, close=True)
+
+    def respond(self, status, response, close=False):
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if close:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info(format, *args)
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(address, service):
+    """
+    Create server for the conversion service listening on address, which is a unix socket if it starts with unix:,
+    otherwise [HOST:]PORT of a local HTTP server. HOST defaults to 127.0.0.1. Each request is handled in an own thread.
+    """
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):      # left behind by a previous server
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        server = ThreadingUnixHTTPServer(path, SigmaConversionRequestHandler)
+    else:
+        host, sep, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), SigmaConversionRequestHandler)
+    server.service = service
+    return server
+
+def serve(address, service):
+    """Serve conversion requests until interrupted or terminated."""
+    server = create_server(address, service)
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        if address.startswith("unix:"):
+            print("Serving conversion requests on %s" % address, file=sys.stderr)
+        else:
+            print("Serving conversion requests on %s:%d" % server.server_address[:2], file=sys.stderr)
+        sys.stderr.flush()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if address.startswith("unix:"):
+            try:
+                os.unlink(address[len("unix:"):])
+            except OSError:
+                pass
@@ -6,6 +6,7 @@ from pathlib import Path
 from uuid import uuid4, UUID
 import yaml
 from sigma.output import SigmaYAMLDumper
+from sigma.tools import loadAllYAML
 
 argparser = ArgumentParser(description="Assign and verfify UUIDs of Sigma rules")
 argparser.add_argument("--verify", "-V", action="store_true", help="Verify existence and uniqueness of UUID assignments. Exits with error code if verification fails.")
@@ -35,7 +36,7 @@ passed = True
 for path in paths:
     print_verbose("Rule {}".format(str(path)))
     with path.open("r") as f:
-        rules = list(yaml.safe_load_all(f))
+        rules = list(loadAllYAML(f))
 
     if args.verify:
         i = 1
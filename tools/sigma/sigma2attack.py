@@ -8,6 +8,8 @@ import sys
 
 import yaml
 
+from sigma.tools import loadYAML
+
 def main():
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument("--rules-directory", "-d", dest="rules_dir", default="rules", help="Directory to read rules from")
@@ -21,7 +23,7 @@ def main():
     num_rules_used = 0
     for rule_file in rule_files:
         try:
-            rule = yaml.safe_load(open(rule_file, encoding="utf-8").read())
+            rule = loadYAML(open(rule_file, encoding="utf-8").read())
         except yaml.YAMLError:
             sys.stderr.write("Ignoring rule " + rule_file + " (parsing failed)\n")
             continue
@@ -6,6 +6,7 @@ import yaml
 import sys
 from pathlib import Path
 from sigma.output import SigmaYAMLDumper
+from sigma.tools import loadAllYAML
 
 class Output(object):
     """Output base class"""
@@ -175,7 +176,7 @@ for path in input_paths:
         sys.exit(1)
 
     try:
-        yamldocs = list(yaml.safe_load_all(f))
+        yamldocs = list(loadAllYAML(f))
     except yaml.YAMLError as e:
         print("YAML parse error while parsing Sigma rule {}: {}".format(path, str(e)), file=sys.stderr)
         sys.exit(2)
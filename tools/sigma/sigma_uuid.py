@@ -6,6 +6,7 @@ from pathlib import Path
 from uuid import uuid4, UUID
 import yaml
 from sigma.output import SigmaYAMLDumper
+from sigma.tools import loadAllYAML
 
 def print_verbose(*arg, **kwarg):
     print(*arg, **kwarg)
@@ -38,7 +39,7 @@ def main():
     for path in paths:
         print_verbose("Rule {}".format(str(path)))
         with path.open("r") as f:
-            rules = list(yaml.safe_load_all(f))
+            rules = list(loadAllYAML(f))
 
         if args.verify:
             i = 1
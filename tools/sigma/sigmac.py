@@ -22,40 +22,27 @@ import json
 import pathlib
 import itertools
 import logging
-from sigma.parser.collection import SigmaCollectionParser
-from sigma.parser.exceptions import SigmaCollectionParseError, SigmaParseError
-from sigma.configuration import SigmaConfiguration, SigmaConfigurationChain
+import multiprocessing
+import pickle
+import hashlib
+from sigma.parser.collection import SigmaCollectionParser, SigmaCollectionRules
+from sigma.parser.rule import SigmaParser
+from sigma.parser.cache import SigmaParseCache
+from sigma.parser.exceptions import SigmaParseCacheError
 from sigma.config.collection import SigmaConfigurationManager
-from sigma.config.exceptions import SigmaConfigParseError, SigmaRuleFilterParseException
-from sigma.filter import SigmaRuleFilter
+from sigma.filter import SigmaRuleFilter, SigmaRuleFilterParseException
+from sigma.manifest import SigmaConversionManifest
 import sigma.backends.discovery as backends
-from sigma.backends.base import BackendOptions
-from sigma.backends.exceptions import BackendError, NotSupportedError, PartialMatchError, FullMatchError
+from sigma.backends.base import BaseBackend, BackendOptions
 from sigma.parser.modifiers import modifiers
+from sigma.converter import (conversion_error, convert_input, ConfigurationError, configuration_names, load_configurations,
+        ERR_OUTPUT, ERR_INVALID_YAML, ERR_SIGMA_PARSING, ERR_OPEN_SIGMA_RULE, ERR_OPEN_CONFIG_FILE, ERR_CONFIG_INVALID_YAML,
+        ERR_CONFIG_PARSING, ERR_BACKEND, ERR_NOT_SUPPORTED, ERR_NO_TARGET, ERR_RULE_FILTER_PARSING, ERR_CONFIG_REQUIRED,
+        ERR_CONFIG_ORDER, ERR_CONFIG_BACKEND, ERR_NOT_IMPLEMENTED, ERR_PARTIAL_FIELD_MATCH, ERR_FULL_FIELD_MATCH)
 import codecs
 
 sys.stdout = codecs.getwriter('utf-8')(sys.stdout.detach())
 
-# Error codes
-
-ERR_OUTPUT              = 1
-ERR_INVALID_YAML        = 3
-ERR_SIGMA_PARSING       = 4
-ERR_OPEN_SIGMA_RULE     = 5
-ERR_OPEN_CONFIG_FILE    = 5
-ERR_CONFIG_INVALID_YAML = 6
-ERR_CONFIG_PARSING      = 6
-ERR_BACKEND             = 8
-ERR_NOT_SUPPORTED       = 9
-ERR_NO_TARGET           = 10
-ERR_RULE_FILTER_PARSING = 11
-ERR_CONFIG_REQUIRED     = 20
-ERR_CONFIG_ORDER        = 21
-ERR_CONFIG_BACKEND      = 22
-ERR_NOT_IMPLEMENTED     = 42
-ERR_PARTIAL_FIELD_MATCH = 80
-ERR_FULL_FIELD_MATCH    = 90
-
 def alliter(path):
     for sub in path.iterdir():
         if sub.name.startswith("."):
@@ -74,6 +61,150 @@ def get_inputs(paths, recursive):
     else:
         return [pathlib.Path(p) for p in paths]
 
+def convert_input_targets(sigmafile, f, targets, groups, rulefilter, cache=None):
+    """
+    Convert a Sigma input file or its content for multiple targets, each a tuple (configuration chain, backend). groups
+    is a list of lists with the indices of the targets whose configuration chains are identical. The YAML documents are
+    loaded and filtered once, the rules are parsed once per group and the parsed rules are copied for further targets
+    of a group. With a cache, the parsed rules of each group are loaded from or stored in its own cache entry, the YAML
+    documents are only loaded if an entry is missing. Returns a list of tuples (results, error) like convert_input() in
+    order of the targets. Remaining rules are not converted for a target after an error.
+    """
+    if len(targets) == 1:
+        sigmaconfigs, backend = targets[0]
+        return [ convert_input(sigmafile, f, sigmaconfigs, rulefilter, backend, cache) ]
+
+    results = [ list() for target in targets ]
+    errors = [ None for target in targets ]
+
+    def fail(indices, e):
+        error = conversion_error(sigmafile, e)
+        if error is None:
+            raise e
+        for i in indices:
+            if errors[i] is None:
+                errors[i] = error
+
+    try:
+        content = f.read() if hasattr(f, "read") else f
+        rules = SigmaCollectionRules(content, rulefilter)
+        sources = [ SigmaCollectionParser(content, targets[group[0]][0], rulefilter, cache, lazy=True, rules=rules).iterparsers() for group in groups ]
+    except Exception as e:
+        fail(range(len(targets)), e)
+        return [ (list(), error) for error in errors ]
+
+    while not all(errors):
+        parsed = False
+        for groupnum, group in enumerate(groups):
+            indices = [ i for i in group if errors[i] is None ]
+            if not indices:
+                continue
+            try:
+                parser = next(sources[groupnum])
+            except StopIteration:
+                continue
+            except Exception as e:
+                fail(indices, e)
+                continue
+            parsed = True
+
+            blob = pickle.dumps(parser, protocol=pickle.HIGHEST_PROTOCOL) if len(indices) > 1 else None    # before generation modifies it
+            for i in indices:
+                sigmaconfigs, backend = targets[i]
+                if parser is None:
+                    parser = pickle.loads(blob)
+                    parser.set_config(sigmaconfigs)
+                try:
+                    result = backend.generate(parser)
+                    if result:
+                        results[i].append(result)
+                except Exception as e:
+                    fail([ i ], e)
+                parser = None
+        if not parsed:
+            break
+
+    return [ (list() if error is not None else targetresults, error) for targetresults, error in zip(results, errors) ]
+
+def convert_incremental(sigmafile, content, targets, groups, manifests, rulefilter, cache=None):
+    """
+    Convert content of a Sigma input file incrementally like convert_input_targets(). The outcomes of targets whose
+    manifest contains an entry for the unchanged content are reused, the input is only converted for the remaining
+    targets and their outcomes are recorded in the manifests. Returns a list of (results, backend state, error) per
+    target like convert_worker(). The backends must not hold any state from previous inputs, the states are merged by
+    the caller.
+    """
+    key = str(sigmafile)
+    digest = SigmaConversionManifest.digest(content.encode("utf-8"))
+    outcomes = [ manifest.reuse(key, digest) for manifest in manifests ]
+    pending = [ i for i, outcome in enumerate(outcomes) if outcome is None ]
+    if pending:
+        pendinggroups = [ [ pending.index(i) for i in group if i in pending ] for group in groups ]
+        converted = convert_input_targets(sigmafile, content, [ targets[i] for i in pending ], [ group for group in pendinggroups if group ], rulefilter, cache)
+        for i, (results, error) in zip(pending, converted):
+            state = targets[i][1].extractState()
+            manifests[i].record(key, digest, results, state, error)
+            outcomes[i] = (results, state, error)
+    return outcomes
+
+def handle_error(error, cmdargs, target=None):
+    """
+    Print conversion error and determine resulting exit code according to --defer-abort and --ignore-backend-errors.
+    Returns None if the error is ignored. The message is prefixed with the target if given.
+    """
+    message, code, errclass = error
+    if target is not None:
+        message = "Target %s: %s" % (target, message)
+    print(message, file=sys.stderr)
+    if errclass == "backend" and cmdargs.ignore_backend_errors:
+        return None
+    if errclass != "open" and not cmdargs.defer_abort:
+        sys.exit(code)
+    return code
+
+# Parallel conversion
+worker = None
+
+def init_worker(targets, groups, rulefilter, cache):
+    global worker
+    worker = (targets, groups, rulefilter, cache)
+
+def fresh_instances(targets):
+    """Instantiate backends of targets given as (backend class, snapshot) with fresh copies of their configurations"""
+    instances = list()
+    for backend_class, snapshot in targets:
+        sigmaconfigs, backend_options = pickle.loads(snapshot)
+        instances.append((sigmaconfigs, backend_class(sigmaconfigs, backend_options)))
+    return instances
+
+def convert_worker(sigmafile):
+    """
+    Convert input file in worker process for all targets, each given as (backend class, snapshot). Returns a list of
+    (results, backend state, error) per target. Each input file is converted by fresh backend instances with fresh
+    copies of the configurations (snapshot), because backends and configurations keep state between conversions and the
+    results would depend on the files previously converted by the worker.
+    """
+    targets, groups, rulefilter, cache = worker
+    instances = fresh_instances(targets)
+    try:
+        f = sigmafile.open(encoding='utf-8')
+    except OSError as e:
+        return [ ([], None, conversion_error(sigmafile, e)) for instance in instances ]
+    with f:
+        outcomes = convert_input_targets(sigmafile, f, instances, groups, rulefilter, cache)
+    return [ (results, backend.extractState(), error) for (sigmaconfigs, backend), (results, error) in zip(instances, outcomes) ]
+
+def supports_parallel_conversion(backend_class):
+    """
+    Workers convert each input with fresh backends, so the results of the backend must not depend on previously
+    converted rules and backends with multi-rule output must be able to merge the states of the worker backends. This
+    is also required for incremental conversion, which converts each input with fresh backends and merges stored states
+    of unchanged inputs.
+    """
+    if not backend_class.independent_rules:
+        return False
+    return backend_class.finalize is BaseBackend.finalize or backend_class.extractState is not BaseBackend.extractState
+
 class ActionBackendHelp(argparse.Action):
     def __call__(self, parser, ns, vals, opt):
         backend = backends.getBackend(vals)
@@ -85,6 +216,29 @@ class ActionBackendHelp(argparse.Action):
         print(helptext)
         exit(0)
 
+class ActionTarget(argparse.Action):
+    """
+    Each -t/--target adds a target to the list of targets. The first target is also stored as target. Options defined
+    with ActionTargetOption that follow a target apply only to this target.
+    """
+    def __call__(self, parser, ns, vals, opt):
+        if ns.target is None:
+            ns.target = vals
+        ns.targets = ns.targets + [ argparse.Namespace(target=vals, config=None, backend_option=None, backend_config=None, output=None) ]
+
+class ActionTargetOption(argparse.Action):
+    """Option that applies to the last target given before it or to all targets if it's given before the first target."""
+    append = False
+
+    def __call__(self, parser, ns, vals, opt):
+        dest = ns.targets[-1] if ns.targets else ns
+        if self.append:
+            vals = (getattr(dest, self.dest) or []) + [ vals ]
+        setattr(dest, self.dest, vals)
+
+class ActionTargetAppend(ActionTargetOption):
+    append = True
+
 def set_argparser():
     """Sets up and parses the command line arguments for Sigmac.
     Returns the argparser"""
@@ -99,20 +253,27 @@ def set_argparser():
     t is a tag that must appear in the rules tag list, case-insensitive matching.
     Multiple log source specifications are AND linked.
             """)
-    argparser.add_argument("--target", "-t", choices=backends.getBackendDict().keys(), help="Output target format")
+    argparser.add_argument("--target", "-t", action=ActionTarget, choices=backends.getBackendIdentifiers(), help="Output target format. Can be given multiple times to convert the inputs for multiple targets at once, then the options -c, -O, -C and -o following a target apply only to this target and the ones given before the first target to all targets.")
     argparser.add_argument("--lists", "-l", action="store_true", help="List available output target formats and configurations")
-    argparser.add_argument("--config", "-c", action="append", help="Configurations with field name and index mapping for target environment. Multiple configurations are merged into one. Last config is authoritative in case of conflicts.")
-    argparser.add_argument("--output", "-o", default=None, help="Output file or filename prefix if multiple files are generated")
+    argparser.add_argument("--config", "-c", action=ActionTargetAppend, help="Configurations with field name and index mapping for target environment. Multiple configurations are merged into one. Last config is authoritative in case of conflicts.")
+    argparser.add_argument("--output", "-o", action=ActionTargetOption, default=None, help="Output file or filename prefix if multiple files are generated. Each of multiple targets needs its own output.")
     argparser.add_argument("--print0", action="store_true", help="Delimit results by NUL-character")
-    argparser.add_argument("--backend-option", "-O", action="append", help="Options and switches that are passed to the backend")
-    argparser.add_argument("--backend-config", "-C", help="Configuration file (YAML format) containing options to pass to the backend")
+    argparser.add_argument("--backend-option", "-O", action=ActionTargetAppend, help="Options and switches that are passed to the backend")
+    argparser.add_argument("--backend-config", "-C", action=ActionTargetOption, help="Configuration file (YAML format) containing options to pass to the backend")
     argparser.add_argument("--backend-help", action=ActionBackendHelp, help="Print backend options")
     argparser.add_argument("--defer-abort", "-d", action="store_true", help="Don't abort on parse or conversion errors, proceed with next rule. The exit code from the last error is returned")
     argparser.add_argument("--ignore-backend-errors", "-I", action="store_true", help="Only return error codes for parse errors and ignore errors for rules that cause backend errors. Useful, when you want to get as much queries as possible.")
+    argparser.add_argument("--jobs", "-j", type=int, default=1, help="Convert input files in parallel with given number of worker processes. Results are output in input order.")
+    argparser.add_argument("--incremental", metavar="STATE_DIR", default=None, help="Convert incrementally: the results of the input files are stored in the given directory and reused by following runs for unchanged input files. The stored results are discarded if configurations, backend options, rule filter or sigmac itself change.")
+    argparser.add_argument("--serve", nargs="?", const="7676", metavar="ADDRESS", default=None, help="Serve conversion requests on a local HTTP server on [HOST:]PORT (default host: 127.0.0.1, default port: 7676) or unix socket unix:PATH instead of converting inputs. Rules are posted as JSON to /convert with target, configurations and backend options, configurations are kept loaded between requests.")
+    argparser.add_argument("--serve-max-request-size", type=int, metavar="BYTES", default=None, help="Maximum size of conversion requests to the server (default: 1048576)")
+    argparser.add_argument("--no-cache", action="store_true", help="Don't use the cache of parsed Sigma rules")
+    argparser.add_argument("--cache-dir", default=None, help="Directory of the cache of parsed Sigma rules (default: $XDG_CACHE_HOME/sigma/parsed or ~/.cache/sigma/parsed)")
     argparser.add_argument("--shoot-yourself-in-the-foot", action="store_true", help=argparse.SUPPRESS)
     argparser.add_argument("--verbose", "-v", action="store_true", help="Be verbose")
     argparser.add_argument("--debug", "-D", action="store_true", help="Debugging output")
     argparser.add_argument("inputs", nargs="*", help="Sigma input files ('-' for stdin)")
+    argparser.set_defaults(targets=[])
     
     return argparser
 
@@ -132,6 +293,38 @@ def list_modifiers(modifiers):
     for modifier_id, modifier in modifiers.items():
         print("{:>10} : {}".format(modifier_id, modifier.__doc__))
 
+def target_arguments(cmdargs):
+    """
+    Return the arguments of all targets given with -t/--target. Configurations and backend options given before the
+    first target are prepended to the ones of each target, the backend configuration file and output apply to targets
+    that don't define an own one.
+    """
+    targets = list()
+    for target in cmdargs.targets:
+        targets.append(argparse.Namespace(
+            target=target.target,
+            config=((cmdargs.config or []) + (target.config or [])) or None,
+            backend_option=(cmdargs.backend_option or []) + (target.backend_option or []),
+            backend_config=target.backend_config or cmdargs.backend_config,
+            output=target.output or cmdargs.output,
+            ))
+    return targets
+
+def get_configurations(target, cmdargs, scm, copies=False):
+    """
+    Return configuration chain of target and exit if the configurations are missing, invalid or not applicable to the
+    target. Copies of the configurations are used if copies is set, because backends attach themselves to them.
+    """
+    try:
+        target.config = configuration_names(target.backend_class, target.config, cmdargs.shoot_yourself_in_the_foot)
+        return load_configurations(target.target, target.config, scm, cmdargs.shoot_yourself_in_the_foot, copies)
+    except ConfigurationError as e:
+        print(str(e), file=sys.stderr)
+        if e.code == ERR_CONFIG_REQUIRED:
+            print("Available choices for this backend (get complete list with --lists/-l):")
+            list_configurations(backend=target.target, scm=scm)
+        sys.exit(e.code)
+
 def main():
     argparser = set_argparser()
     cmdargs = argparser.parse_args()
@@ -154,6 +347,22 @@ def main():
         print("Modifiers:")
         list_modifiers(modifiers=modifiers)
         sys.exit(0)
+    elif cmdargs.serve is not None:
+        from sigma.server import SigmaConversionService, serve
+        if cmdargs.inputs:
+            argparser.error("the conversion server doesn't convert input files, the rules are sent with the requests")
+        if cmdargs.verbose:
+            logging.basicConfig(level=logging.INFO)
+        if cmdargs.serve_max_request_size is not None and cmdargs.serve_max_request_size <= 0:
+            argparser.error("the maximum request size must be positive")
+        try:
+            serve(cmdargs.serve, SigmaConversionService(scm, cmdargs.shoot_yourself_in_the_foot, cmdargs.serve_max_request_size))
+        except ValueError:
+            argparser.error("invalid address for --serve: %s" % cmdargs.serve)
+        except OSError as e:
+            print("Failed to serve conversion requests on %s: %s" % (cmdargs.serve, str(e)), file=sys.stderr)
+            sys.exit(ERR_OUTPUT)
+        sys.exit(0)
     elif len(cmdargs.inputs) == 0:
         print("Nothing to do!")
         argparser.print_usage()
@@ -164,6 +373,13 @@ def main():
         argparser.print_usage()
         sys.exit(ERR_NO_TARGET)
 
+    targets = target_arguments(cmdargs)
+    outputs = [ target.output for target in targets ]
+    if len(set(outputs)) < len(outputs):
+        argparser.error("multiple targets can't write to the same output, give each target its own -o/--output after its -t/--target")
+    if cmdargs.incremental is not None and cmdargs.inputs == ['-']:
+        argparser.error("incremental conversion requires input files")
+
     rulefilter = None
     if cmdargs.filter:
         try:
@@ -172,127 +388,129 @@ def main():
             print("Parse error in Sigma rule filter expression: %s" % str(e), file=sys.stderr)
             sys.exit(ERR_RULE_FILTER_PARSING)
 
-    sigmaconfigs = SigmaConfigurationChain()
-    backend_class = backends.getBackend(cmdargs.target)
-    if cmdargs.config is None:
-        if backend_class.config_required and not cmdargs.shoot_yourself_in_the_foot:
-            print("The backend you want to use usually requires a configuration to generate valid results. Please provide one with --config/-c.", file=sys.stderr)
-            print("Available choices for this backend (get complete list with --lists/-l):")
-            list_configurations(backend=cmdargs.target, scm=scm)
-            sys.exit(ERR_CONFIG_REQUIRED)
-        if backend_class.default_config is not None:
-            cmdargs.config = backend_class.default_config
-
-    if cmdargs.config:
-        order = 0
-        for conf_name in cmdargs.config:
+    groups = dict()     # (configurations, index field) -> indices of targets with identical parsing of rules
+    for i, target in enumerate(targets):
+        target.backend_class = backends.getBackend(target.target)
+        target.sigmaconfigs = get_configurations(target, cmdargs, scm, copies=len(targets) > 1)
+        target.backend_options = BackendOptions(target.backend_option, target.backend_config)
+        groups.setdefault((tuple(target.config or ()), target.backend_class.index_field), []).append(i)
+    groups = list(groups.values())
+
+    cache = None
+    if not cmdargs.no_cache:
+        cache = SigmaParseCache(cmdargs.cache_dir)
+        try:
+            cache.check()
+        except SigmaParseCacheError as e:
+            print("%s, parsed rules are not cached." % str(e), file=sys.stderr)
+            cache = None
+        except OSError as e:    # the cache is only an optimization
+            print("Cache directory %s can't be created (%s), parsed rules are not cached." % (cache.path, e.strerror or str(e)), file=sys.stderr)
+            cache = None
+
+    manifests = None
+    if cmdargs.incremental is not None:
+        unsupported = [ target.target for target in targets if not supports_parallel_conversion(target.backend_class) ]
+        if unsupported:
+            print("Backend '%s' doesn't support incremental conversion, converting all inputs." % ("', '".join(unsupported)), file=sys.stderr)
+        else:
+            manifests = list()
+            for target in targets:
+                name = "%s-%s" % (target.target, hashlib.sha256(repr((target.config, target.backend_option, target.backend_config, target.output)).encode("utf-8")).hexdigest()[:16])
+                fingerprint = SigmaConversionManifest.fingerprint_of(target.backend_class, target.sigmaconfigs, target.backend_options, rulefilter)     # before backend instantiation modifies the options
+                manifests.append(SigmaConversionManifest(cmdargs.incremental, name, fingerprint))
+
+    inputs = get_inputs(cmdargs.inputs, cmdargs.recurse)
+    pool = None
+    if manifests is None and cmdargs.jobs > 1 and cmdargs.inputs != ['-'] and len(inputs) > 1:
+        unsupported = [ target.target for target in targets if not supports_parallel_conversion(target.backend_class) ]
+        if not unsupported:
+            snapshots = [ (target.backend_class, pickle.dumps((target.sigmaconfigs, target.backend_options))) for target in targets ]   # before backend instantiation modifies them
+            pool = multiprocessing.Pool(cmdargs.jobs, init_worker, (snapshots, groups, rulefilter, cache))
+        else:
+            print("Backend '%s' doesn't support parallel conversion, converting serially." % ("', '".join(unsupported)), file=sys.stderr)
+    for target in targets:
+        target.backend = target.backend_class(target.sigmaconfigs, target.backend_options)
+        target.states = list()      # backend states of incremental conversion
+
+    for target in targets:
+        filename = target.output
+        if filename:
             try:
-                sigmaconfig = scm.get(conf_name)
-                if sigmaconfig.order is not None:
-                    if sigmaconfig.order <= order and not cmdargs.shoot_yourself_in_the_foot:
-                        print("The configurations were provided in the wrong order (order key check in config file)", file=sys.stderr)
-                        sys.exit(ERR_CONFIG_ORDER)
-                    order = sigmaconfig.order
+                target.out = open(filename, "w", encoding='utf-8')
+            except (IOError, OSError) as e:
+                print("Failed to open output file '%s': %s" % (filename, str(e)), file=sys.stderr)
+                exit(ERR_OUTPUT)
+        else:
+            target.out = sys.stdout
 
-                try:
-                    if cmdargs.target not in sigmaconfig.config["backends"]:
-                        print("The configuration '{}' is not valid for backend '{}'. Valid choices are: {}".format(conf_name, cmdargs.target, ", ".join(sigmaconfig.config["backends"])), file=sys.stderr)
-                        sys.exit(ERR_CONFIG_ORDER)
-                except KeyError:
-                    pass
+    newline_separator = '\0' if cmdargs.print0 else '\n'
+    error = 0
 
-                sigmaconfigs.append(sigmaconfig)
-            except OSError as e:
-                print("Failed to open Sigma configuration file %s: %s" % (conf_name, str(e)), file=sys.stderr)
-                exit(ERR_OPEN_CONFIG_FILE)
-            except (yaml.parser.ParserError, yaml.scanner.ScannerError) as e:
-                print("Sigma configuration file %s is no valid YAML: %s" % (conf_name, str(e)), file=sys.stderr)
-                exit(ERR_CONFIG_INVALID_YAML)
-            except SigmaConfigParseError as e:
-                print("Sigma configuration parse error in %s: %s" % (conf_name, str(e)), file=sys.stderr)
-                exit(ERR_CONFIG_PARSING)
-
-    backend_options = BackendOptions(cmdargs.backend_option, cmdargs.backend_config)
-    backend = backend_class(sigmaconfigs, backend_options)
-
-    filename = cmdargs.output
-    if filename:
-        try:
-            out = open(filename, "w", encoding='utf-8')
-        except (IOError, OSError) as e:
-            print("Failed to open output file '%s': %s" % (filename, str(e)), file=sys.stderr)
-            exit(ERR_OUTPUT)
+    def output(outcomes):
+        nonlocal error
+        for target, (results, conv_error) in zip(targets, outcomes):
+            for result in results:
+                print(result, file=target.out, end=newline_separator)
+            if conv_error is not None:
+                error = handle_error(conv_error, cmdargs, target.target if len(targets) > 1 else None) or error
+
+    if pool is not None:
+        with pool:
+            for outcomes in pool.imap(convert_worker, inputs):
+                for target, (results, state, conv_error) in zip(targets, outcomes):
+                    target.backend.mergeState(state)
+                output((results, conv_error) for results, state, conv_error in outcomes)
     else:
-        out = sys.stdout
-
-    error = 0
-    for sigmafile in get_inputs(cmdargs.inputs, cmdargs.recurse):
-        logger.debug("* Processing Sigma input %s" % (sigmafile))
+        instances = [ (target.sigmaconfigs, target.backend) for target in targets ]
+        for sigmafile in inputs:
+            logger.debug("* Processing Sigma input %s" % (sigmafile))
+            if manifests is not None:       # stored results must not depend on previously converted inputs
+                instances = [ (target.sigmaconfigs, target.backend_class(target.sigmaconfigs, target.backend_options)) for target in targets ]
+            f = None
+            try:
+                if cmdargs.inputs == ['-']:
+                    content = sigmafile
+                else:
+                    content = f = sigmafile.open(encoding='utf-8')
+                if manifests is not None:
+                    outcomes = list()
+                    for target, (results, state, conv_error) in zip(targets, convert_incremental(sigmafile, content.read(), instances, groups, manifests, rulefilter, cache)):
+                        target.states.append(state)
+                        outcomes.append((results, conv_error))
+                else:
+                    outcomes = convert_input_targets(sigmafile, content, instances, groups, rulefilter, cache)
+            except OSError as e:
+                outcomes = [ ([], conversion_error(sigmafile, e)) for target in targets ]
+            finally:
+                if f is not None:       # only files opened by sigmac are closed, not the standard input
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+            output(outcomes)
+
+    for target in targets:
+        for state in target.states:     # merged in input order after incremental conversion
+            target.backend.mergeState(state)
+        finalized = False
+        for part in target.backend.iterFinalize():
+            print(part, file=target.out, end="")
+            finalized = finalized or bool(part)
+        if finalized:
+            print(file=target.out)
+        if target.out is not sys.stdout:
+            target.out.close()
+
+    if cache is not None:
+        cache.prune()
+
+    for manifest in manifests or ():
         try:
-            if cmdargs.inputs == ['-']:
-                f = sigmafile
-            else:
-                f = sigmafile.open(encoding='utf-8')
-            parser = SigmaCollectionParser(f, sigmaconfigs, rulefilter)
-            results = parser.generate(backend)
-
-            newline_separator = '\0' if cmdargs.print0 else '\n'
-            for result in results:
-                print(result, file=out, end=newline_separator)
+            manifest.store()
         except OSError as e:
-            print("Failed to open Sigma file %s: %s" % (sigmafile, str(e)), file=sys.stderr)
-            error = ERR_OPEN_SIGMA_RULE
-        except (yaml.parser.ParserError, yaml.scanner.ScannerError) as e:
-            print("Error: Sigma file %s is no valid YAML: %s" % (sigmafile, str(e)), file=sys.stderr)
-            error = ERR_INVALID_YAML
-            if not cmdargs.defer_abort:
-                sys.exit(error)
-        except (SigmaParseError, SigmaCollectionParseError) as e:
-            print("Error: Sigma parse error in %s: %s" % (sigmafile, str(e)), file=sys.stderr)
-            error = ERR_SIGMA_PARSING
-            if not cmdargs.defer_abort:
-                sys.exit(error)
-        except NotSupportedError as e:
-            print("Error: The Sigma rule requires a feature that is not supported by the target system: " + str(e), file=sys.stderr)
-            if not cmdargs.ignore_backend_errors:
-                error = ERR_NOT_SUPPORTED
-                if not cmdargs.defer_abort:
-                    sys.exit(error)
-        except BackendError as e:
-            print("Error: Backend error in %s: %s" % (sigmafile, str(e)), file=sys.stderr)
-            if not cmdargs.ignore_backend_errors:
-                error = ERR_BACKEND
-                if not cmdargs.defer_abort:
-                    sys.exit(error)
-        except (NotImplementedError, TypeError) as e:
-            print("An unsupported feature is required for this Sigma rule (%s): " % (sigmafile) + str(e), file=sys.stderr)
-            print("Feel free to contribute for fun and fame, this is open source :) -> https://github.com/Neo23x0/sigma", file=sys.stderr)
-            if not cmdargs.ignore_backend_errors:
-                error = ERR_NOT_IMPLEMENTED
-                if not cmdargs.defer_abort:
-                    sys.exit(error)
-        except PartialMatchError as e:
-            print("Error: Partial field match error: %s" % str(e), file=sys.stderr)
-            if not cmdargs.ignore_backend_errors:
-                error = ERR_PARTIAL_FIELD_MATCH
-                if not cmdargs.defer_abort:
-                    sys.exit(error)
-        except FullMatchError as e:
-            print("Error: Full field match error", file=sys.stderr)
-            if not cmdargs.ignore_backend_errors:
-                error = ERR_FULL_FIELD_MATCH
-                if not cmdargs.defer_abort:
-                    sys.exit(error)                
-        finally:
-            try:
-                f.close()
-            except:
-                pass
-
-    result = backend.finalize()
-    if result:
-        print(result, file=out)
-    out.close()
+            print("Failed to store state of incremental conversion in '%s': %s" % (cmdargs.incremental, str(e)), file=sys.stderr)
+            error = error or ERR_OUTPUT
 
     sys.exit(error)
 
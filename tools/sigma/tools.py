@@ -14,8 +14,27 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import stat
 import pkgutil
 import importlib
+from pathlib import Path
+import yaml
+
+# YAML loading: libyaml-based loader is much faster and used if PyYAML was built with it.
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:     # pragma: no cover
+    from yaml import SafeLoader as YAMLLoader
+PureYAMLLoader = yaml.SafeLoader
+
+def loadYAML(stream, loader=YAMLLoader):
+    """Load single YAML document from string or file like yaml.safe_load()"""
+    return yaml.load(stream, Loader=loader)
+
+def loadAllYAML(stream, loader=YAMLLoader):
+    """Load all YAML documents from string or file like yaml.safe_load_all()"""
+    return yaml.load_all(stream, Loader=loader)
 
 def getAllSubclasses(path, import_base, base_class):
     """Return list of all classes derived from a superclass contained in a module."""
@@ -30,3 +49,28 @@ def getAllSubclasses(path, import_base, base_class):
 def getClassDict(clss):
     """Return a dictionary: class.identifier -> class"""
     return {cls.identifier: cls for cls in clss }
+
+def getCacheDirectory():
+    """Return directory for cached data of Sigma tools"""
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "sigma"
+
+def isPrivateDirectory(path):
+    """
+    Return if path is a directory owned by the current user that isn't writable by group or others. Files that are
+    unpickled must only be loaded from such directories, because unpickling can run arbitrary code. Platforms without
+    user ids only require a directory.
+    """
+    if not hasattr(os, "getuid"):
+        return os.path.isdir(str(path))
+    st = os.stat(str(path))
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def strtobool(value):
+    """Convert string representation of truth value to 1 or 0 like distutils.util.strtobool"""
+    value = value.lower()
+    if value in ("y", "yes", "t", "true", "on", "1"):
+        return 1
+    elif value in ("n", "no", "f", "false", "off", "0"):
+        return 0
+    else:
+        raise ValueError("invalid truth value %r" % (value,))
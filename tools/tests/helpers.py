@@ -0,0 +1,29 @@
+# Shared fixtures of the tests of backends that match events
+
+import unittest
+from pathlib import Path
+
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.rule import SigmaParser
+
+rules = Path(__file__).parent.parent.parent / "rules"
+
+events = [
+        { "EventID": 1, "Image": "C:\\Windows\\System32\\cmd.exe", "CommandLine": "cmd.exe /c whoami", "ParentImage": "C:\\Windows\\explorer.exe" },
+        { "EventID": 1, "Image": "C:\\Windows\\System32\\rundll32.exe", "CommandLine": "rundll32.exe javascript:\"\\..\\mshtml,RunHTMLApplication\"" },
+        { "EventID": 1, "Image": "C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe", "CommandLine": "powershell -nop -w hidden -enc SQBFAFgA", "ParentImage": "C:\\Program Files\\Microsoft Office\\root\\Office16\\WINWORD.EXE" },
+        { "EventID": 13, "TargetObject": "HKLM\\SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Run\\x", "Details": "C:\\Users\\Public\\x.exe" },
+        { "EventID": 4688, "NewProcessName": "C:\\Windows\\System32\\vssadmin.exe", "CommandLine": "vssadmin delete shadows /all /quiet" },
+        { "c-uri": "/owa/auth/current/themes/resources/x.aspx", "cs-method": "POST", "c-useragent": "Mozilla/5.0" },
+        { "message": "sekurlsa::logonpasswords by mimikatz", "process": { "name": "lsass.exe" } },
+        {},
+        ]
+
+class RuleTestCase(unittest.TestCase):
+    """Test case that parses rules with an empty configuration"""
+    def setUp(self):
+        self.config = SigmaConfiguration()
+
+    def rule(self, detection, title="Test"):
+        """Parse rule with detection and title that applies to the log source product windows"""
+        return SigmaParser({ "title": title, "logsource": { "product": "windows" }, "detection": detection }, self.config)
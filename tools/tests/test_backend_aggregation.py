@@ -0,0 +1,175 @@
+# Test streaming evaluation of aggregations over sliding windows
+
+import random
+from datetime import datetime, timezone
+
+from sigma.backends.aggregation import AggregationAlert, AggregationEvaluator, parseTimeframe
+from sigma.parser.exceptions import SigmaParseError
+from tests.helpers import RuleTestCase
+
+def logon(timestamp, host="ws1", user="alice", **fields):
+    return dict(timestamp=timestamp, EventID=4625, ComputerName=host, TargetUserName=user, **fields)
+
+class TestAggregationEvaluator(RuleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.evaluator = AggregationEvaluator(self.config)
+
+    def rule(self, condition, timeframe="1m", title="Test"):
+        detection = { "selection": { "EventID": 4625 }, "condition": condition }
+        if timeframe is not None:
+            detection["timeframe"] = timeframe
+        return super().rule(detection, title)
+
+    def process(self, events):
+        return [ alert for event in events for alert in self.evaluator.process(event) ]
+
+    def test_timeframe(self):
+        self.assertEqual(parseTimeframe("30s"), 30)
+        self.assertEqual(parseTimeframe("5m"), 300)
+        self.assertEqual(parseTimeframe("2d"), 172800)
+        with self.assertRaises(SigmaParseError):
+            parseTimeframe("5x")
+        with self.assertRaises(SigmaParseError):
+            parseTimeframe("0s")
+
+    def test_count(self):
+        self.evaluator.add(self.rule("selection | count() by ComputerName > 2"))
+        alerts = self.process([ logon(0), logon(10, "ws2"), logon(20), { "timestamp": 25, "EventID": 1 }, logon(30), logon(35), logon(200), logon(210), logon(220) ])
+        self.assertEqual(alerts, [ AggregationAlert("Test", "ws1", 3, 30), AggregationAlert("Test", "ws1", 3, 220) ])
+
+    def test_sliding_window(self):
+        self.evaluator.add(self.rule("selection | count() > 2"))
+        self.assertEqual(self.process([ logon(0), logon(30), logon(65), logon(100) ]), [])
+        self.assertEqual(self.process([ logon(110) ]), [ AggregationAlert("Test", None, 3, 110) ])
+
+    def test_window_boundary(self):
+        """The window of an event at ts contains the events in (ts - timeframe, ts]"""
+        for events, alerts in (([ 9.9, 100.0 ], [ AggregationAlert("Test", "ws1", 2, 100.0) ]), ([ 9.9, 109.0 ], [ AggregationAlert("Test", "ws1", 2, 109.0) ]),
+                ([ 9.9, 109.9 ], []), ([ 10, 110 ], []), ([ 109.0, 9.9 ], [ AggregationAlert("Test", "ws1", 2, 9.9) ]), ([ 109.9, 9.9 ], [])):
+            with self.subTest(events=events):
+                self.evaluator = AggregationEvaluator(self.config, lateness=100)
+                self.evaluator.add(self.rule("selection | count() by ComputerName > 1", "100s"))
+                self.assertEqual(self.process([ logon(timestamp) for timestamp in events ]), alerts)
+
+    def test_functions(self):
+        self.evaluator.add(self.rule("selection | count(TargetUserName) by ComputerName > 2"), "distinct")
+        self.evaluator.add(self.rule("selection | sum(Size) by ComputerName > 100"), "sum")
+        self.evaluator.add(self.rule("selection | avg(Size) < 5"), "avg")
+        self.evaluator.add(self.rule("selection | min(Size) == 1", None), "min")
+        self.evaluator.add(self.rule("selection | max(Size) by TargetUserName > 60"), "max")
+        alerts = self.process([ logon(0, user="alice", Size=10), logon(1, user="alice", Size=1), logon(2, user="bob", Size="x"), logon(3, user="carol", Size=70), logon(4, user="dave", Size=50) ])
+        self.assertEqual(alerts, [
+            AggregationAlert("min", None, 1.0, 1),
+            AggregationAlert("distinct", "ws1", 3, 3),
+            AggregationAlert("max", "carol", 70.0, 3),
+            AggregationAlert("sum", "ws1", 131.0, 4),
+            ])
+        self.assertEqual(self.evaluator.process(logon(5, Size=0)), [])
+        self.assertEqual(self.evaluator.process(logon(6, Size=-200)), [ AggregationAlert("avg", None, -11.5, 6) ])
+
+    def test_lateness(self):
+        self.evaluator = AggregationEvaluator(self.config, lateness=30)
+        self.evaluator.add(self.rule("selection | count() by ComputerName > 2"))
+        self.assertEqual(self.process([ logon(100), logon(60), logon(80), logon(90), logon(75) ]), [ AggregationAlert("Test", "ws1", 3, 90) ])
+        self.assertEqual(self.evaluator.dropped, 1)
+        self.assertEqual(self.process([ logon(datetime.fromtimestamp(95, timezone.utc)) ]), [])
+        with self.assertRaises(ValueError):
+            self.evaluator.process({ "EventID": 4625 })
+
+    def test_late_windows(self):
+        """Late events are aggregated in the windows of the following events as well"""
+        for events in ([ 41, 50, 90, 95, 40 ], [ 40, 41, 50, 90, 95 ]):
+            with self.subTest(events=events):
+                self.evaluator = AggregationEvaluator(self.config, lateness=60)
+                self.evaluator.add(self.rule("selection | count() by ComputerName > 4", "100s"))
+                self.assertEqual(self.process([ logon(timestamp) for timestamp in events ]), [ AggregationAlert("Test", "ws1", 5, events[-1]) ])
+        self.evaluator = AggregationEvaluator(self.config, lateness=100)
+        self.evaluator.add(self.rule("selection | count() by ComputerName > 2", "100s"))
+        self.assertEqual(self.process([ logon(5), logon(95), logon(150), logon(50) ]), [ AggregationAlert("Test", "ws1", 3, 50) ])
+        self.assertEqual(self.process([ logon(155) ]), [])
+
+    def test_expiry(self):
+        self.evaluator = AggregationEvaluator(self.config, lateness=10)
+        self.evaluator.add(self.rule("selection | count() by ComputerName > 5"))
+        self.process([ logon(timestamp, "ws%d" % timestamp) for timestamp in range(100) ])
+        aggregation = self.evaluator.aggregations[0]
+        self.assertEqual(self.evaluator.groups(), 70)
+        self.assertEqual(aggregation.expired, 30)
+        self.process([ logon(1000) ])
+        self.assertEqual(self.evaluator.groups(), 1)
+
+        self.evaluator = AggregationEvaluator(self.config, maxgroups=10)
+        self.evaluator.add(self.rule("selection | count() by ComputerName > 5", None))
+        self.process([ logon(timestamp, "ws%d" % timestamp) for timestamp in range(100) ])
+        self.assertEqual(self.evaluator.groups(), 10)
+        self.assertEqual(self.evaluator.aggregations[0].evicted, 90)
+        self.assertEqual(list(self.evaluator.aggregations[0].groups), [ "ws%d" % number for number in range(90, 100) ])
+
+    def test_distinct(self):
+        self.evaluator.add(self.rule("selection | count(TargetUserName) > 200"))
+        alerts = self.process([ logon(timestamp / 10, user="user%d" % (timestamp % 300)) for timestamp in range(900) ])
+        self.assertEqual(alerts, [ AggregationAlert("Test", None, 201, 20.0) ])
+        self.assertEqual(self.evaluator.aggregations[0].groups[None].state, { "user%d" % number: 2 for number in range(300) })
+
+    def test_random_streams(self):
+        """Alerts are the same as of an evaluation of all windows from scratch"""
+        conditions = [ "count() by ComputerName > 3", "count(TargetUserName) by ComputerName > 2", "sum(Size) by ComputerName > 150",
+                "avg(Size) by ComputerName < 20", "min(Size) by ComputerName < 4", "max(Size) by ComputerName > 95" ]
+        functions = [ len, lambda events: len({ event["TargetUserName"] for event in events }), lambda events: sum(event["Size"] for event in events),
+                lambda events: sum(event["Size"] for event in events) / len(events), lambda events: min(event["Size"] for event in events),
+                lambda events: max(event["Size"] for event in events) ]
+        checks = [ lambda value: value > 3, lambda value: value > 2, lambda value: value > 150, lambda value: value < 20, lambda value: value < 4, lambda value: value > 95 ]
+        rnd = random.Random(0)
+        for seed in range(30):
+            events = list()
+            for number in range(200):
+                timestamp = number + rnd.choice([ 0, 0, 0, 0.5, -5, -12.5 ])
+                events.append(logon(timestamp, rnd.choice([ "ws1", "ws2" ]), rnd.choice([ "alice", "bob", "carol", "dave" ]), Size=rnd.randrange(100)))
+            for number, condition in enumerate(conditions):
+                with self.subTest(seed=seed, condition=condition):
+                    self.evaluator = AggregationEvaluator(self.config, lateness=10)
+                    self.evaluator.add(self.rule("selection | " + condition, "20s"))
+                    expected = list()
+                    fired = dict()              # group -> condition holds for the window of the newest event
+                    seen = list()
+                    watermark = None
+                    for event in events:
+                        timestamp = event["timestamp"]
+                        if watermark is not None and timestamp < watermark - 10:
+                            continue
+                        watermark = timestamp if watermark is None else max(watermark, timestamp)
+                        group = [ other for other in seen if other["ComputerName"] == event["ComputerName"] ]
+                        seen.append(event)
+                        late = any(other["timestamp"] > timestamp for other in group)
+                        group.append(event)
+                        newest = max(other["timestamp"] for other in group)
+                        alert = None
+                        if late:                # windows that contain the event and became true by it
+                            for end in sorted({ other["timestamp"] for other in group if timestamp <= other["timestamp"] < timestamp + 20 }):
+                                window = [ other for other in group if end - 20 < other["timestamp"] <= end ]
+                                value = functions[number](window)
+                                before = [ other for other in window if other is not event ]
+                                if checks[number](value) and not (before and checks[number](functions[number](before))):
+                                    alert = alert or AggregationAlert("Test", event["ComputerName"], value, timestamp)
+                        elif checks[number](functions[number]([ other for other in group if timestamp - 20 < other["timestamp"] ])):
+                            alert = AggregationAlert("Test", event["ComputerName"], functions[number]([ other for other in group if timestamp - 20 < other["timestamp"] ]), timestamp)
+                        if fired.get(event["ComputerName"]):
+                            alert = None
+                        fired[event["ComputerName"]] = alert is not None or checks[number](functions[number]([ other for other in group if newest - 20 < other["timestamp"] ]))
+                        if alert is not None:
+                            expected.append(alert)
+                    alerts = self.process(events)
+                    self.assertEqual(len(alerts), len(expected))
+                    for alert, other in zip(alerts, expected):
+                        self.assertEqual(alert[:2] + alert[3:], other[:2] + other[3:])
+                        self.assertAlmostEqual(alert.value, other.value)
+
+    def test_unsupported(self):
+        with self.assertRaises(NotImplementedError):
+            self.evaluator.add(self.rule("selection"))
+        with self.assertRaises(NotImplementedError):
+            self.evaluator.add(self.rule("selection | near selection"))
+        with self.assertRaises(SigmaParseError):
+            self.evaluator.add(self.rule("selection | count() > 5", "5 minutes"))
+        self.assertEqual(len(self.evaluator), 0)
@@ -0,0 +1,102 @@
+# Test generic backend functionality: node dispatch and overrides
+
+import re
+import unittest
+from pathlib import Path
+
+from sigma.backends.base import SingleTextQueryBackend
+from sigma.backends.elasticsearch import ElasticsearchQuerystringBackend
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.collection import SigmaCollectionParser
+
+rulesdir = Path(__file__).parent.parent.parent / "rules"
+configdir = Path(__file__).parent.parent / "config"
+
+def legacyApplyOverrides(backend, query):
+    """Reference implementation: overrides are read from the configuration and applied one after another"""
+    try:
+        if 'overrides' in backend.sigmaconfig.config and isinstance(query, str):
+            for expression in backend.sigmaconfig.config['overrides']:
+                for x in expression.get('regexes', []):
+                    query = re.sub(x, backend.mapExpression % (expression['field'], expression['value']), query)
+                for x in expression.get('literals', []):
+                    query = query.replace(x, backend.mapExpression % (expression['field'], expression['value']))
+    except Exception:
+        pass
+    return query
+
+class CustomNode:
+    def __init__(self, value):
+        self.value = value
+
+class CustomBackend(SingleTextQueryBackend):
+    identifier = "test-custom"
+    config_required = False
+    nodeGenerators = { **SingleTextQueryBackend.nodeGenerators, CustomNode: "generateCustomNode" }
+    mapExpression = "%s=%s"
+    valueExpression = "%s"
+
+    def generateCustomNode(self, node):
+        return "custom(%s)" % node.value
+
+class TestBackendBase(unittest.TestCase):
+    def backend(self, configyaml):
+        return ElasticsearchQuerystringBackend(SigmaConfiguration(configyaml))
+
+    def test_dispatch(self):
+        backend = CustomBackend(SigmaConfiguration())
+        self.assertEqual(backend.generateNode(CustomNode("x")), "custom(x)")
+        self.assertEqual(backend.generateNode(("field", "value")), "field=value")
+        with self.assertRaises(TypeError):
+            backend.generateNode(1.5)
+
+    def test_overrides(self):
+        backend = self.backend("""
+overrides:
+  - field: outcome
+    value: failure
+    regexes:
+      - 'error:\\S+'
+      - '(?i)FAILED'
+  - field: outcome
+    value: success
+    literals:
+      - 'NOT outcome:failure'
+""")
+        self.assertEqual([ type(x) for x, field, value in backend.overrides ], [ re.Pattern, re.Pattern, str ])
+        for query in ("error:x AND NOT error:y", "failed", "NOT Failed", "unrelated", None):
+            self.assertEqual(backend.applyOverrides(query), legacyApplyOverrides(backend, query), query)
+        self.assertEqual(backend.applyOverrides("NOT error:x"), "outcome:success")
+
+    def test_invalid_overrides(self):
+        backend = self.backend("""
+overrides:
+  - field: f
+    value: v
+    literals:
+      - a
+  - value: missing-field
+    literals:
+      - b
+  - field: f
+    value: v
+    literals:
+      - c
+""")
+        self.assertEqual(len(backend.overrides), 1)
+        self.assertEqual(backend.applyOverrides("a b c"), legacyApplyOverrides(backend, "a b c"))
+        self.assertEqual(self.backend("title: no overrides").overrides, [])
+
+    def test_config_overrides(self):
+        config = SigmaConfiguration((configdir / "ecs-cloudtrail.yml").open())
+        backend = ElasticsearchQuerystringBackend(config)
+        self.assertGreater(len(backend.overrides), 0)
+        for path in sorted((rulesdir / "cloud").glob("*.yml")):
+            for parser in SigmaCollectionParser(path.read_text(), config).parsers:
+                if parser.condparsed[0].parsedAgg is None:
+                    with self.subTest(rule=str(path)):
+                        query = backend.generateNode(parser.condparsed[0].parsedSearch)
+                        backend.overrides, backend.overrideMatchers = [], ()
+                        unoverridden = backend.generateNode(parser.condparsed[0].parsedSearch)
+                        backend.compileOverrides()
+                        self.assertEqual(query, legacyApplyOverrides(backend, unoverridden))
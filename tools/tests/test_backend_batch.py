@@ -0,0 +1,103 @@
+# Test evaluation of rules over columnar batches of events
+
+import unittest
+
+from sigma.backends.batch import np, BatchRuleSet, ColumnBatch, rowsToColumns
+from sigma.backends.python import PythonBackend
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.collection import SigmaCollectionParser
+from tests.helpers import RuleTestCase, events, rules
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestBatchRuleSet(RuleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruleset = BatchRuleSet(self.config)
+
+    def test_columns(self):
+        columns = rowsToColumns([ { "a": 1, "b": { "c": "x" } }, { "a": None }, { "d": 2.5 } ])
+        self.assertEqual(sorted(columns), [ "a", "b.c", "d" ])
+        self.assertEqual(list(columns["b.c"]), [ "x", None, None ])
+        self.assertEqual(list(columns["d"]), [ None, None, 2.5 ])
+        with self.assertRaises(ValueError):
+            ColumnBatch({ "a": [ 1 ], "b": [ 1, 2 ] })
+
+    def test_match(self):
+        self.ruleset.add(self.rule({ "selection": { "EventID": 1, "Image|endswith": [ "\\cmd.exe", "\\powershell.exe" ] }, "condition": "selection" }), "shell")
+        self.ruleset.add(self.rule({ "selection": { "CommandLine|contains": "-enc" }, "filter": { "ParentImage|startswith": "C:\\Windows\\\\" }, "condition": "selection and not filter" }), "encoded")
+        self.ruleset.add(self.rule({ "keywords": [ "mimikatz", "sekurlsa::*pass" ], "condition": "keywords" }), "keywords")
+        self.ruleset.add(self.rule({ "selection": { "process.name": "lsass.exe", "user": None }, "condition": "selection" }), "nested")
+        self.ruleset.add(self.rule({ "selection": { "CommandLine|re": "^vssadmin.*shadows" }, "condition": "selection" }), "regex")
+        masks = self.ruleset.match(rowsToColumns(events))
+        self.assertEqual(list(masks), [ "shell", "encoded", "keywords", "nested", "regex" ])
+        self.assertEqual({ key: list(np.flatnonzero(mask)) for key, mask in masks.items() }, { "shell": [ 0, 2 ], "encoded": [ 2 ], "keywords": [ 6 ], "nested": [ 6 ], "regex": [ 4 ] })
+
+    def test_list_values(self):
+        """Lists are checked as strings and their items are searched by keywords like by the python backend"""
+        events = [ { "Tags": [ "a", "evil" ] }, { "Tags": [ "b", "good" ] }, { "Tags": "evil" }, { "Tags": ( "x", "y" ) } ]
+        detections = {
+                "contains": { "selection": { "Tags|contains": "evil" }, "condition": "selection" },
+                "exact": { "selection": { "Tags": "evil" }, "condition": "selection" },
+                "string": { "selection": { "Tags": "['a', 'evil']" }, "condition": "selection" },
+                "keyword": { "keywords": [ "a*evil", "y" ], "condition": "keywords" },
+                }
+        backend = PythonBackend(self.config)
+        for key, detection in detections.items():
+            self.ruleset.add(self.rule(detection), key)
+        columns = rowsToColumns(events)
+        self.assertEqual(columns["Tags"].shape, (4,))
+        masks = self.ruleset.match(columns)
+        for key, detection in detections.items():
+            match = backend.generateMatcher(self.rule(detection))
+            self.assertEqual(list(masks[key]), [ bool(match(event)) for event in events ])
+        self.assertEqual(list(masks["contains"]), [ True, False, True, False ])
+        self.assertEqual(list(masks["keyword"]), [ False, False, False, True ])
+        self.assertEqual(list(ColumnBatch({ "Tags": [ [ "a" ], [ "b" ] ] }).encode("Tags")[2]), [ "['a']", "['b']" ])
+
+    def test_duplicate_keys(self):
+        self.ruleset.add(self.rule({ "selection": { "EventID": 1 }, "condition": "selection" }), "rule")
+        self.ruleset.add(self.rule({ "selection": { "EventID": 13 }, "condition": "selection" }), "rule")
+        masks = self.ruleset.match({ "EventID": np.array([ 1, 4688, 13 ]) })
+        self.assertEqual(list(masks["rule"]), [ True, False, True ])
+
+    def test_column_types(self):
+        self.ruleset.add(self.rule({ "selection": { "EventID": [ 1, 13 ] }, "condition": "selection" }), "eventid")
+        self.ruleset.add(self.rule({ "selection": { "Image|endswith": "\\cmd.exe" }, "condition": "selection" }), "image")
+        self.ruleset.add(self.rule({ "condition": "not selection", "selection": { "Score": None } }), "score")
+        masks = self.ruleset.match({
+            "EventID": np.array([ 1, 4688, 13 ]),
+            "Image": np.array([ "C:\\Windows\\CMD.EXE", "", "cmd.exe" ]),
+            "Score": np.array([ 1.5, np.nan, 0 ]),
+            })
+        self.assertEqual(list(masks["eventid"]), [ True, False, True ])
+        self.assertEqual(list(masks["image"]), [ True, False, False ])
+        self.assertEqual(list(masks["score"]), [ True, False, True ])
+
+    def test_shared_masks(self):
+        for number in range(3):
+            self.ruleset.add(self.rule({ "selection": { "EventID": 1, "Image|endswith": "\\tool%d.exe" % number }, "condition": "selection" }))
+        batch = ColumnBatch(rowsToColumns(events))
+        self.ruleset.match(batch)
+        self.assertEqual(len(batch.masks), 4)
+        self.assertEqual(sorted(batch.encoded), [ "EventID", "Image" ])
+
+    def test_aggregation(self):
+        with self.assertRaises(NotImplementedError):
+            self.ruleset.add(self.rule({ "selection": { "EventID": 1 }, "condition": "selection | count() > 5" }))
+        self.assertEqual(len(self.ruleset), 0)
+
+    def test_rules(self):
+        """Batch evaluation matches the same events as the matchers of the python backend"""
+        matcherconfig = SigmaConfiguration()
+        backend = PythonBackend(matcherconfig)
+        matchers = list()
+        for path in sorted(rules.glob("**/*.yml")):
+            content = path.read_text(encoding="utf-8")
+            for parser, matcherparser in zip(SigmaCollectionParser(content, self.config).parsers, SigmaCollectionParser(content, matcherconfig).parsers):
+                if not any(parsed.parsedAgg for parsed in parser.condparsed):
+                    self.ruleset.add(parser, len(matchers))
+                    matchers.append(backend.generateMatcher(matcherparser))
+        masks = self.ruleset.match(rowsToColumns(events))
+        for key, match in enumerate(matchers):
+            self.assertEqual(list(masks[key]), [ bool(match(event)) for event in events ])
+        self.assertTrue(any(mask.any() for mask in masks.values()))
@@ -0,0 +1,130 @@
+# Test temporal correlation of near aggregations
+
+import random
+
+from sigma.backends.aggregation import AggregationAlert
+from sigma.backends.correlation import CorrelationAlert, Correlator
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.exceptions import SigmaParseError
+from tests.helpers import RuleTestCase, rules
+
+def command(timestamp, commandline, host="ws1"):
+    return { "timestamp": timestamp, "EventID": 1, "ComputerName": host, "CommandLine": commandline }
+
+class TestCorrelator(RuleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.correlator = Correlator(self.config, entityfield="ComputerName")
+
+    def rule(self, condition="recon | near user and group and not admin", timeframe="1m", title="Test"):
+        detection = {
+                "recon": { "CommandLine|contains": "whoami" },
+                "user": { "CommandLine|contains": "net user" },
+                "group": { "CommandLine|contains": "net group" },
+                "admin": { "CommandLine|contains": "admin" },
+                "condition": condition,
+                }
+        if timeframe is not None:
+            detection["timeframe"] = timeframe
+        return super().rule(detection, title)
+
+    def process(self, events):
+        return [ alert for event in events for alert in self.correlator.process(event) ]
+
+    def test_near(self):
+        self.correlator.add(self.rule())
+        self.assertEqual(self.process([ command(0, "whoami"), command(10, "net user"), command(20, "net group x") ]), [ CorrelationAlert("Test", "ws1", 20) ])
+        self.assertEqual(self.process([ command(30, "net user"), command(40, "net group") ]), [])
+        self.assertEqual(self.process([ command(200, "whoami /all") ]), [])
+        self.assertEqual(self.process([ command(230, "net user"), command(270, "net group") ]), [])
+        self.assertEqual(self.process([ command(280, "whoami") ]), [ CorrelationAlert("Test", "ws1", 280) ])
+
+    def test_interleaved(self):
+        """Streams of hosts are interleaved, the correlation completes only on hosts with all commands within the timeframe and no exclusion before"""
+        self.correlator.add(self.rule())
+        rnd = random.Random(0)
+        streams = {
+                "ws1": [ "whoami", "notepad", "net user", "net group" ],
+                "ws2": [ "net group", "net user", "whoami" ],
+                "ws3": [ "net localgroup admins", "whoami", "net user", "net group" ],
+                "ws4": [ "whoami", "net user" ],
+                }
+        for start in range(0, 300, 100):
+            remaining = { host: list(commands) for host, commands in streams.items() }
+            events = list()
+            while remaining:
+                host = rnd.choice(sorted(remaining))
+                events.append(command(start + len(events), remaining[host].pop(0), host))
+                if not remaining[host]:
+                    del remaining[host]
+            last = { event["ComputerName"]: event["timestamp"] for event in events }
+            self.assertEqual(sorted(self.process(events)), [ CorrelationAlert("Test", host, last[host]) for host in ("ws1", "ws2") ])
+
+    def test_exclusion(self):
+        self.correlator.add(self.rule())
+        self.assertEqual(self.process([ command(0, "whoami"), command(5, "net user admin"), command(10, "net group") ]), [])
+        self.assertEqual(self.process([ command(70, "net group"), command(71, "whoami") ]), [])
+        self.assertEqual(self.process([ command(72, "net user") ]), [ CorrelationAlert("Test", "ws1", 72) ])
+
+    def test_lateness(self):
+        self.correlator = Correlator(self.config, entityfield="ComputerName", lateness=30)
+        self.correlator.add(self.rule())
+        self.assertEqual(self.process([ command(100, "net group"), command(90, "net user"), command(60, "whoami") ]), [])
+        self.assertEqual(self.correlator.dropped, 1)
+        self.assertEqual(self.process([ command(80, "whoami") ]), [ CorrelationAlert("Test", "ws1", 100) ])
+
+    def test_late_pairs(self):
+        """Late events are correlated with earlier matches than the latest ones"""
+        self.correlator = Correlator(self.config, entityfield="ComputerName", lateness=100)
+        self.correlator.add(self.rule("recon | near user"))
+        self.assertEqual(self.process([ command(0, "whoami"), command(100, "whoami"), command(30, "net user") ]), [ CorrelationAlert("Test", "ws1", 30) ])
+        self.correlator = Correlator(self.config, entityfield="ComputerName", lateness=100)
+        self.correlator.add(self.rule())
+        self.assertEqual(self.process([ command(0, "whoami"), command(5, "net group"), command(50, "net localgroup admin"),
+            command(70, "net group"), command(110, "whoami"), command(40, "net user") ]), [ CorrelationAlert("Test", "ws1", 40) ])
+        self.assertEqual(self.process([ command(120, "net user") ]), [])
+
+    def test_expiry(self):
+        self.correlator.add(self.rule())
+        self.process([ command(timestamp, "whoami", "ws%d" % timestamp) for timestamp in range(200) ])
+        correlation = self.correlator.aggregations[0]
+        self.assertLessEqual(self.correlator.groups(), 70)
+        self.assertGreaterEqual(self.correlator.groups(), 60)
+        self.assertLessEqual(len(correlation.buckets), 12)
+        self.process([ command(1000, "net user", "ws1") ])
+        self.assertEqual(list(correlation.groups), [ "ws1" ])
+        self.assertEqual(correlation.expired, 200)
+
+    def test_aggregations(self):
+        self.correlator.add(self.rule("recon | count() by ComputerName > 1"), "count")
+        self.correlator.add(self.rule("recon | near user"), "near")
+        self.correlator = Correlator(self.config)
+        self.correlator.add(self.rule("recon | count() by ComputerName > 1"), "count")
+        self.correlator.add(self.rule("recon | near user"), "near")
+        self.assertEqual(self.process([ command(0, "whoami", "ws1"), command(1, "net user", "ws2"), command(2, "whoami", "ws1") ]), [
+            CorrelationAlert("near", None, 1),
+            AggregationAlert("count", "ws1", 2, 2),
+            ])
+
+    def test_unsupported(self):
+        with self.assertRaises(SigmaParseError):
+            self.correlator.add(self.rule(timeframe=None))
+        with self.assertRaises(SigmaParseError):
+            self.correlator.add(self.rule("recon | near unknown"))
+        with self.assertRaises(NotImplementedError):
+            self.correlator.add(self.rule("recon"))
+        self.assertEqual(len(self.correlator), 0)
+
+    def test_rules(self):
+        """Rules of the corpus with near aggregations are correlated"""
+        self.correlator = Correlator(self.config, timeframe="30m")
+        count = 0
+        for path in sorted(rules.glob("**/*.yml")):
+            content = path.read_text(encoding="utf-8")
+            if "near" in content:
+                for parser in SigmaCollectionParser(content, self.config).parsers:
+                    if any(parsed.parsedAgg and parsed.parsedAgg.aggfunc_notrans == "near" for parsed in parser.condparsed):
+                        self.correlator.add(parser)
+                        count += 1
+        self.assertEqual(len(self.correlator), count)
+        self.assertGreaterEqual(count, 3)
@@ -1,6 +1,13 @@
-from sigma.backends.elasticsearch import ElasticsearchDSLBackend
+import re
+import random
+from fnmatch import fnmatch
+
+import pytest
+
+from sigma.backends.elasticsearch import ElasticsearchDSLBackend, ElasticsearchQuerystringBackend, ElasticsearchWildcardHandlingMixin, ElastalertBackendDsl
 from sigma.configuration import SigmaConfiguration
 from sigma.parser.condition import SigmaAggregationParser
+from sigma.parser.rule import SigmaParser
 
 
 def test_backend_elastic():
@@ -31,7 +38,7 @@ def test_backend_elastic():
     assert ("GroupField_count" in backend.queries[0]["aggs"]), "GroupField_count is the top aggregation key"
     assert ("aggfield_distinct" in backend.queries[0]["aggs"]["GroupField_count"]["aggs"]), "aggfield_distinct is the nested aggregation key"
     assert ("GroupField_count" in backend.queries[0]["aggs"]), "GroupField_count is the top aggregation key"
-    assert "{}.keyword".format(agg.aggfield) == inner_agg["aggfield_distinct"]["cardinality"]["field"], "inner agg field must have suffix .keyword"
+    assert agg.aggfield == inner_agg["aggfield_distinct"]["cardinality"]["field"], "inner agg field is the aggregation field like the terms field"
     assert ("params.count < 3" in bucket_selector["script"]), "bucket selector script must be 'params.count < 3'"
     assert "count" in bucket_selector["buckets_path"], "buckets_path must be 'count'"
 
@@ -63,3 +70,138 @@ def test_backend_elastic_count_nofield_agg():
     assert ("GroupedField_count" in backend.queries[0]["aggs"]), "GroupedField_count is the top aggregation key"
     assert ("params.count < 3" in bucket_selector["script"]), "bucket selector script must be 'params.count < 3'"
     assert "count" in bucket_selector["buckets_path"], "buckets_path must be 'count'"
+
+
+def test_backend_elastic_field_pattern_matcher():
+    """
+    Test compiled field name patterns against fnmatch
+    """
+    patternlists = [ [], [ "" ], [ "Image" ], [ "*" ], [ "process.*", "Image", "*Command?ine" ], [ "[ab]*", "x[!y]z", "a.b" ] ]
+    fieldnames = [ "", "Image", "image", "ImageLoaded", "process.name", "process", "CommandLine", "ParentCommandLine", "CommandLines", "abc", "xaz", "xyz", "a.b", "aXb" ]
+    for patterns in patternlists:
+        matcher = ElasticsearchWildcardHandlingMixin.fieldPatternMatcher(patterns)
+        for fieldname in fieldnames:
+            assert matcher(fieldname) == any(fnmatch(fieldname, pattern) for pattern in patterns), (patterns, fieldname)
+
+
+def test_backend_elastic_field_name_mapping():
+    """
+    Test field name decisions made with compiled field name pattern options
+    """
+    backend = ElasticsearchQuerystringBackend(SigmaConfiguration(), {
+        "keyword_base_fields": "process.*",
+        "keyword_blacklist": "User, *Name",
+        "keyword_whitelist": "UserName",
+        "case_insensitive_whitelist": "*",
+        "case_insensitive_blacklist": "Hash??",
+        })
+    assert backend.fieldNameMapping("process.name", "x") == "process.name"
+    assert backend.CaseInSensitiveField
+    assert backend.fieldNameMapping("CommandLine", "x") == "CommandLine.keyword"
+    assert backend.CaseInSensitiveField
+    assert backend.fieldNameMapping("Hashes", "x") == "Hashes"
+    assert backend.fieldNameMapping("Hashes", "x*") == "Hashes.keyword"
+    assert not backend.CaseInSensitiveField
+    assert backend.fieldNameMapping("UserName", "x*") == "UserName"
+    assert not backend.CaseInSensitiveField
+    assert backend.fieldNameMapping("User", "x*") == "User"
+    assert backend.fieldNameMapping("CommandLine", "x") == "CommandLine.keyword"
+    assert backend.CaseInSensitiveField
+    assert set(backend.fieldDecisions) == { "process.name", "CommandLine", "Hashes", "UserName", "User" }
+
+
+def legacy_case_insensitive_value(backend, value):
+    """Previous conversion into case insensitive regular expression by multiple substitutions"""
+    if value and not value == 'null' and not re.match(r'^/.*/$', value) and (re.search('[a-zA-Z]', value) and not re.match(backend.uuid_regex, value) or backend.containsWildcard(value)):
+        value = re.sub( r"[A-Za-z]", lambda x: "[" + x.group( 0 ).upper() + x.group( 0 ).lower() + "]", value )
+        value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))\.", r"\g<1>\.", value )
+        value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))\*", r"\g<1>.*", value )
+        value = re.sub( r"(((?<!\\)(\\\\)+)|(?<!\\))([@?&~<>])", r"\g<1>\\\g<4>", value )
+        try:
+            re.compile(value)
+            return {'is_regex': True, 'value': value}
+        except re.error:
+            raise TypeError( "Regular expression validation error for: '%s')" %str(value) )
+    else:
+        return { 'is_regex': False, 'value': value }
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")     # random values contain nested sets
+def test_backend_elastic_case_insensitive_value():
+    """
+    Test case insensitive regular expressions against previous implementation with random values
+    """
+    backend = ElasticsearchQuerystringBackend(SigmaConfiguration())
+    rand = random.Random(42)
+    alphabet = "aBz09.*\\\\@?&~<>/-_: []()"
+    values = [ "", "null", "/regex/", "0a1b2c3d-0a1b-0a1b-0a1b-0a1b2c3d4e5f", "\\\\*.exe", "C:\\\\Windows\\\\*" ]
+    values += [ "".join(rand.choice(alphabet) for i in range(rand.randrange(12))) for i in range(3000) ]
+    for value in values:
+        try:
+            expected = legacy_case_insensitive_value(backend, value)
+        except TypeError:
+            with pytest.raises(TypeError):
+                backend.makeCaseInSensitiveValue(value)
+            continue
+        assert backend.makeCaseInSensitiveValue(value) == expected, value
+    assert backend.caseInsensitiveRegex.cache_info().hits > 0
+
+
+def test_backend_elastic_merged_regexes():
+    """
+    Test that merged case insensitive regular expressions match the same strings as any of the merged ones
+    """
+    backend = ElasticsearchQuerystringBackend(SigmaConfiguration())
+    rand = random.Random(42)
+    alphabet = "abAB0.*\\?-/ "
+    mergedcount = 0
+    for i in range(300):
+        values = [ "".join(rand.choice(alphabet) for j in range(rand.randrange(1, 8))) for k in range(rand.randrange(2, 6)) ]
+        regexes = [ backend.makeCaseInSensitiveValue(backend.reEscape.sub("\\\\\\g<1>", value))['value'] for value in values ]
+        merged = backend.mergeRegexes(regexes)
+        if merged is None:      # contains escaped character class
+            assert any("\\[" in regex for regex in regexes), regexes
+            continue
+        mergedcount += 1
+        probes = [ "".join(rand.choice("abAB0.-/ \\x") for j in range(rand.randrange(8))) for k in range(50) ]
+        probes += [ value.replace("*", rand.choice(("", "x", "a0"))).swapcase() for value in values ]
+        for probe in probes:
+            assert bool(re.fullmatch(merged, probe)) == any(re.fullmatch(regex, probe) for regex in regexes), (regexes, merged, probe)
+    assert mergedcount > 200
+
+
+def test_backend_elastic_merge_lists():
+    """
+    Test merging of case insensitive regular expressions of value lists
+    """
+    detection = { "selection": { "Image": [ "*\\cmd.exe", "*\\cmdkey.exe", "*\\calc.exe", "1234", "/raw/" ] }, "condition": "selection" }
+    rule = { "title": "Test", "logsource": { "product": "windows" }, "detection": detection }
+    config = SigmaConfiguration()
+    parser = SigmaParser(rule, config)
+    options = { "case_insensitive_whitelist": "*", "case_insensitive_merge_lists": "true" }
+    assert ElasticsearchQuerystringBackend(config, dict(options)).generate(parser) == \
+        r'Image.keyword:(/(.*\\[Cc]([Mm][Dd](\.[Ee][Xx][Ee]|[Kk][Ee][Yy]\.[Ee][Xx][Ee])|[Aa][Ll][Cc]\.[Ee][Xx][Ee])|\/[Rr][Aa][Ww]\/)/ OR 1234)'
+    assert ElasticsearchQuerystringBackend(config, { "case_insensitive_whitelist": "*" }).generate(parser) == \
+        r'Image.keyword:(/.*\\[Cc][Mm][Dd]\.[Ee][Xx][Ee]/ OR /.*\\[Cc][Mm][Dd][Kk][Ee][Yy]\.[Ee][Xx][Ee]/ OR /.*\\[Cc][Aa][Ll][Cc]\.[Ee][Xx][Ee]/ OR 1234 OR /\/[Rr][Aa][Ww]\//)'
+    backend = ElasticsearchDSLBackend(config, dict(options))
+    backend.generate(parser)
+    assert backend.queries[-1]["query"]["constant_score"]["filter"]["bool"]["should"] == [
+        { "regexp": { "Image.keyword": r"(.*\\[Cc]([Mm][Dd](\.[Ee][Xx][Ee]|[Kk][Ee][Yy]\.[Ee][Xx][Ee])|[Aa][Ll][Cc]\.[Ee][Xx][Ee])|\/[Rr][Aa][Ww]\/)" } },
+        { "wildcard": { "Image.keyword": "1234" } },
+        ]
+
+
+def test_backend_elastalert_dsl_failed_rule():
+    """
+    Test that queries of a rule that failed to convert are not output with the following rule
+    """
+    config = SigmaConfiguration()
+    backend = ElastalertBackendDsl(config)
+    near = { "selection": { "Image": "*\\cmd.exe" }, "other": { "Image": "*\\calc.exe" }, "condition": "selection | near other" }
+    with pytest.raises(NotImplementedError):
+        backend.generate(SigmaParser({ "title": "Near", "logsource": { "product": "windows" }, "detection": near }, config))
+    detection = { "selection": { "Image": "*\\net.exe" }, "condition": "selection" }
+    backend.generate(SigmaParser({ "title": "Test", "logsource": { "product": "windows" }, "detection": detection }, config))
+    result = backend.finalize()
+    assert "calc.exe" not in result and "cmd.exe" not in result
+    assert "net.exe" in result
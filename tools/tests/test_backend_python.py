@@ -0,0 +1,98 @@
+# Test matchers of the python backend
+
+from sigma.backends.python import PythonBackend, runtime
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.rule import SigmaParser
+from tests.helpers import RuleTestCase, rules
+
+class TestPythonBackend(RuleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = PythonBackend(self.config)
+
+    def matcher(self, detection):
+        return self.backend.generateMatcher(self.rule(detection))
+
+    def assertMatches(self, detection, matching, nonmatching):
+        match = self.matcher(detection)
+        for event in matching:
+            self.assertTrue(match(event), event)
+        for event in nonmatching:
+            self.assertFalse(match(event), event)
+
+    def test_values(self):
+        self.assertMatches({ "selection": { "Image": "C:\\Windows\\cmd.exe" }, "condition": "selection" },
+                [ { "Image": "c:\\windows\\CMD.EXE" } ],
+                [ { "Image": "C:\\Windows\\cmd.exe.bak" }, { "CommandLine": "C:\\Windows\\cmd.exe" }, {} ])
+        self.assertMatches({ "selection": { "EventID": [ 1, 4688 ] }, "condition": "selection" },
+                [ { "EventID": 1 }, { "EventID": "4688" } ],
+                [ { "EventID": 4689 }, { "EventID": None } ])
+
+    def test_wildcards(self):
+        detection = { "selection": { "Image": [ "*\\cmd.exe", "C:\\Temp\\\\*", "*mimikatz*", "*\\ps?.exe", "*\\a*b.exe", "explorer.exe" ] }, "condition": "selection" }
+        self.assertMatches(detection,
+                [ { "Image": "D:\\CMD.exe" }, { "Image": "c:\\temp\\x.dll" }, { "Image": "x\\MiMiKaTz.bin" }, { "Image": "\\psx.exe" }, { "Image": "\\a\nb.exe" }, { "Image": "Explorer.exe" } ],
+                [ { "Image": "cmd.exe" }, { "Image": "D:\\Temp\\x" }, { "Image": "\\psxx.exe" }, { "Image": "c:\\explorer.exe" } ])
+        self.assertMatches({ "selection": { "Image|endswith": "\\cmd.exe" }, "condition": "selection" }, [ { "Image": "C:\\cmd.exe" } ], [ { "Image": "C:\\cmd.exe " } ])
+        self.assertMatches({ "selection": { "CommandLine|contains|all": [ "-enc", "bypass" ] }, "condition": "selection" },
+                [ { "CommandLine": "powershell -ep Bypass -enc AAA" } ], [ { "CommandLine": "powershell -enc AAA" } ])
+        self.assertMatches({ "selection": { "Image": "*" }, "condition": "selection" }, [ { "Image": "" }, { "Image": 0 } ], [ {}, { "Image": None } ])
+
+    def test_escapes(self):
+        self.assertMatches({ "selection": { "CommandLine": "what\\?\\*" }, "condition": "selection" }, [ { "CommandLine": "what?*" } ], [ { "CommandLine": "whats!" } ])
+        self.assertMatches({ "selection": { "path": "\\\\*\\IPC$" }, "condition": "selection" }, [ { "path": "\\\\server\\IPC$" } ], [ { "path": "server\\IPC$" } ])
+        self.assertMatches({ "selection": { "CommandLine|startswith": "x\\" }, "condition": "selection" }, [ { "CommandLine": "x\\a" } ], [ { "CommandLine": "xa" }, { "CommandLine": "x*" } ])
+
+    def test_null(self):
+        self.assertMatches({ "selection": { "Image": "*\\cmd.exe", "ParentImage": None }, "condition": "selection" },
+                [ { "Image": "C:\\cmd.exe" }, { "Image": "C:\\cmd.exe", "ParentImage": None } ], [ { "Image": "C:\\cmd.exe", "ParentImage": "" } ])
+        self.assertMatches({ "selection": { "Image": "*\\cmd.exe" }, "filter": { "ParentImage": None }, "condition": "selection and not filter" },
+                [ { "Image": "C:\\cmd.exe", "ParentImage": "x" } ], [ { "Image": "C:\\cmd.exe" } ])
+
+    def test_nested_fields(self):
+        self.assertMatches({ "selection": { "process.name": "cmd.exe", "user.name": None }, "condition": "selection" },
+                [ { "process": { "name": "CMD.EXE" } }, { "process.name": "cmd.exe" } ], [ { "process": { "name": "cmd.exe" }, "user": { "name": "x" } }, { "process": "cmd.exe" } ])
+
+    def test_keywords(self):
+        self.assertMatches({ "keywords": [ "mimikatz", "sekurlsa::*pass" ], "condition": "keywords" },
+                [ { "a": "Running MIMIKATZ now" }, { "a": { "b": [ "x", "sekurlsa::logonpasswords" ] } } ],
+                [ { "a": "sekurlsa::logon" }, {} ])
+
+    def test_regular_expressions(self):
+        self.assertMatches({ "selection": { "CommandLine|re": "^cmd /c [A-Z]+$" }, "condition": "selection" },
+                [ { "CommandLine": "cmd /c DIR" } ], [ { "CommandLine": "cmd /c dir" }, {} ])
+        with self.assertRaises(NotImplementedError):
+            self.matcher({ "selection": { "CommandLine|re": "(" }, "condition": "selection" })
+
+    def test_conditions(self):
+        self.assertMatches({ "a": { "x": 1 }, "b": { "y": 2 }, "c": { "z": 3 }, "condition": "(a or b) and not c" },
+                [ { "x": 1 }, { "y": 2, "z": 4 } ], [ { "x": 1, "z": 3 }, { "z": 1 } ])
+        self.assertMatches({ "a": { "x": 1 }, "b": { "y": 2 }, "condition": [ "a", "b" ] }, [ { "x": 1 }, { "y": 2 } ], [ { "x": 2 } ])
+        self.assertMatches({ "a": { "x": 1 }, "b": { "y": 2 }, "condition": "1 of them" }, [ { "y": 2 } ], [ {} ])
+        self.assertMatches({ "a": { "x": "a*" }, "b": { "x": [ "*b", "c" ] }, "c": [ "key*word" ], "d": { "y": None }, "condition": "a or b or c or d" },
+                [ { "x": "ax", "y": 1 }, { "x": "xb", "y": 1 }, { "z": "Key Word", "y": 1 }, { "x": "x" } ], [ { "x": "x", "y": 1 }, { "x": "key", "z": "word", "y": 1 } ])
+        with self.assertRaises(NotImplementedError):
+            self.matcher({ "a": { "x": 1 }, "condition": "a | count() > 5" })
+
+    def test_generate(self):
+        rule = { "title": "Test", "id": "11111111-2222-3333-4444-555555555555", "logsource": { "product": "windows" },
+                "detection": { "selection": { "Image|endswith": [ "\\cmd.exe", "\\powershell.exe" ] }, "condition": "selection" } }
+        source = self.backend.generate(SigmaParser(rule, self.config))
+        self.assertTrue(source.startswith("# Test\ndef rule_11111111_2222_3333_4444_555555555555(event"))
+        namespace = dict(runtime)
+        exec(source, namespace)
+        match = namespace["rule_11111111_2222_3333_4444_555555555555"]
+        self.assertTrue(match({ "Image": "C:\\PowerShell.exe" }))
+        self.assertFalse(match({ "Image": "C:\\pwsh.exe" }))
+        self.assertTrue(self.backend.generate(SigmaParser(rule, self.config)).startswith("# Test\ndef rule_11111111_2222_3333_4444_555555555555_2(event"))
+
+    def test_rules(self):
+        event = { "EventID": 1, "Image": "C:\\Windows\\System32\\cmd.exe", "CommandLine": "cmd.exe /c whoami" }
+        matched = 0
+        for path in sorted(rules.glob("**/*.yml")):
+            for parser in SigmaCollectionParser(path.read_text(encoding="utf-8"), self.config).parsers:
+                if any(parsed.parsedAgg for parsed in parser.condparsed):
+                    continue
+                with self.subTest(path=str(path)):
+                    matched += self.backend.generateMatcher(parser)(event)
+        self.assertGreater(matched, 0)
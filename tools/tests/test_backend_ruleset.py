@@ -0,0 +1,59 @@
+# Test matching of events by rule sets with shared predicates
+
+from sigma.backends.python import PythonBackend
+from sigma.backends.ruleset import AhoCorasick, RuleSet
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.collection import SigmaCollectionParser
+from tests.helpers import RuleTestCase, events, rules
+
+class TestRuleSet(RuleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruleset = RuleSet(self.config)
+
+    def test_aho_corasick(self):
+        automaton = AhoCorasick([ "he", "she", "his", "hers" ])
+        self.assertEqual(sorted(automaton.iter("ushers")), [ (4, 0), (4, 1), (6, 3) ])
+        self.assertEqual(list(AhoCorasick([ "aa" ]).iter("aaa")), [ (2, 0), (3, 0) ])
+        self.assertEqual(list(automaton.iter("xyz")), [])
+
+    def test_match(self):
+        self.ruleset.add(self.rule({ "selection": { "EventID": 1, "Image|endswith": [ "\\cmd.exe", "\\powershell.exe" ] }, "condition": "selection" }), "shell")
+        self.ruleset.add(self.rule({ "selection": { "CommandLine|contains": "-enc" }, "filter": { "ParentImage|startswith": "C:\\Windows\\\\" }, "condition": "selection and not filter" }), "encoded")
+        self.ruleset.add(self.rule({ "keywords": [ "mimikatz", "sekurlsa::*pass" ], "condition": "keywords" }), "keywords")
+        self.ruleset.add(self.rule({ "selection": { "process.name": "lsass.exe", "user": None }, "condition": "selection" }), "nested")
+        self.assertEqual([ self.ruleset.match(event) for event in events ], [ [ "shell" ], [], [ "shell", "encoded" ], [], [], [], [ "keywords", "nested" ], [] ])
+        self.ruleset.add(self.rule({ "selection": { "CommandLine|re": "^vssadmin.*shadows" }, "condition": "selection" }))
+        self.assertEqual(self.ruleset.match(events[4]), [ "Test" ])
+
+    def test_shared_predicates(self):
+        for number in range(10):
+            self.ruleset.add(self.rule({ "selection": { "EventID": 1, "Image|endswith": "\\tool%d.exe" % number }, "condition": "selection" }))
+        self.ruleset.add(self.rule({ "selection": { "EventID": 1 }, "filter": { "Image|endswith": "\\cmd.exe" }, "condition": "selection and not filter" }))
+        self.ruleset.add(self.rule({ "filter": { "Image|endswith": "\\cmd.exe" }, "condition": "not filter" }))
+        self.assertEqual(len(self.ruleset.predicates), 12)
+        self.ruleset.buildIndex()
+        self.assertEqual(self.ruleset.unindexed, [ 11 ])
+        self.assertEqual(self.ruleset.triggers[self.ruleset.predicates[("EventID", "exact", "1")]], [ 10 ])
+        self.assertEqual(self.ruleset.triggers[self.ruleset.predicates[("Image", "suffix", "\\tool3.exe")]], [ 3 ])
+
+    def test_aggregation(self):
+        with self.assertRaises(NotImplementedError):
+            self.ruleset.add(self.rule({ "selection": { "EventID": 1 }, "condition": "selection | count() > 5" }))
+        self.assertEqual(len(self.ruleset), 0)
+
+    def test_rules(self):
+        """Rule set matches the same rules as the matchers of the python backend"""
+        matcherconfig = SigmaConfiguration()
+        backend = PythonBackend(matcherconfig)
+        matchers = list()
+        for path in sorted(rules.glob("**/*.yml")):
+            content = path.read_text(encoding="utf-8")
+            for parser, matcherparser in zip(SigmaCollectionParser(content, self.config).parsers, SigmaCollectionParser(content, matcherconfig).parsers):
+                if not any(parsed.parsedAgg for parsed in parser.condparsed):
+                    self.ruleset.add(parser, len(matchers))
+                    matchers.append(backend.generateMatcher(matcherparser))
+        for event in events:
+            with self.subTest(event=event):
+                self.assertEqual(self.ruleset.match(event), [ key for key, match in enumerate(matchers) if match(event) ])
+        self.assertTrue(any(self.ruleset.match(event) for event in events))
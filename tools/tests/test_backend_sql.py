@@ -283,7 +283,7 @@ class TestGenerateQuery(unittest.TestCase):
 
         self.basic_rule["detection"] = detection
 
-        with patch("yaml.safe_load_all", return_value=[self.basic_rule]):
+        with patch("sigma.parser.collection.loadAllYAML", return_value=[self.basic_rule]):
             parser = SigmaCollectionParser("any sigma io", config, None)
             backend = SQLBackend(config, self.table)
 
@@ -317,7 +317,7 @@ class TestGenerateQuery(unittest.TestCase):
 
         self.basic_rule["detection"] = detection
 
-        with patch("yaml.safe_load_all", return_value=[self.basic_rule]):
+        with patch("sigma.parser.collection.loadAllYAML", return_value=[self.basic_rule]):
             parser = SigmaCollectionParser("any sigma io", config, None)
             backend = SQLBackend(config, self.table)
 
@@ -132,7 +132,7 @@ class TestFullTextSearch(unittest.TestCase):
 
         self.basic_rule["detection"] = detection
 
-        with patch("yaml.safe_load_all", return_value=[self.basic_rule]):
+        with patch("sigma.parser.collection.loadAllYAML", return_value=[self.basic_rule]):
             parser = SigmaCollectionParser("any sigma io", config, None)
             backend = SQLiteBackend(config, self.table)
 
@@ -0,0 +1,155 @@
+# Test lazy parsing of Sigma collections and incremental output of multi-rule backends
+
+import json
+import unittest
+import yaml
+from unittest.mock import patch
+
+from sigma.backends.base import BaseBackend
+from sigma.backends.discovery import getBackend
+from sigma.backends.elasticsearch import ElasticsearchQuerystringBackend
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.collection import SigmaCollectionParser, SigmaCollectionRules
+from sigma.parser.exceptions import SigmaParseError
+from sigma.parser.rule import SigmaParser
+from sigma.tools import loadAllYAML
+
+collection = """
+action: global
+title: Test
+logsource:
+    product: windows
+detection:
+    condition: selection
+---
+id: 11111111-1111-1111-1111-111111111111
+detection:
+    selection:
+        Image: first.exe
+---
+id: 22222222-2222-2222-2222-222222222222
+logsource:
+    service: sysmon
+detection:
+    selection:
+        Image: second.exe
+---
+id: 33333333-3333-3333-3333-333333333333
+detection:
+    selection:
+        Image: third.exe
+"""
+
+config = """
+logsources:
+    windows:
+        product: windows
+        index: winlogbeat-*
+"""
+
+class TestLazyCollection(unittest.TestCase):
+    def setUp(self):
+        self.config = SigmaConfiguration(config)
+        self.backend = ElasticsearchQuerystringBackend(self.config)
+
+    def test_lazy(self):
+        eager = list(SigmaCollectionParser(collection, self.config).generate(self.backend))
+        with patch("sigma.parser.collection.SigmaParser", wraps=SigmaParser) as parser:
+            collectionparser = SigmaCollectionParser(collection, self.config, lazy=True)
+            parser.assert_not_called()
+            results = collectionparser.generate(self.backend)
+            self.assertEqual(next(results), eager[0])
+            self.assertEqual(parser.call_count, 1)
+            self.assertEqual([ eager[0] ] + list(results), eager)
+        self.assertEqual(collectionparser.parsers, [])      # iterated parsers are not kept
+
+    def test_lazy_parsers(self):
+        collectionparser = SigmaCollectionParser(collection, self.config, lazy=True)
+        self.assertEqual([ parser.parsedyaml["id"][0] for parser in collectionparser.parsers ], [ "1", "2", "3" ])
+        self.assertEqual(len(list(collectionparser.generate(self.backend))), 3)
+
+    def test_lazy_error(self):
+        collectionparser = SigmaCollectionParser(collection + "---\ndetection:\n    condition: undefined\n", self.config, lazy=True)
+        results = collectionparser.generate(self.backend)
+        self.assertEqual(len([ next(results) for i in range(3) ]), 3)
+        with self.assertRaises(SigmaParseError):
+            next(results)
+        with self.assertRaises(SigmaParseError):
+            SigmaCollectionParser(collection + "---\ndetection:\n    condition: undefined\n", self.config)
+
+    def test_global_not_shared(self):
+        collectionparser = SigmaCollectionParser(collection, self.config, lazy=True)
+        first, second, third = collectionparser.iterparsers()
+        self.assertEqual(second.parsedyaml["logsource"], { "product": "windows", "service": "sysmon" })
+        self.assertIsNot(first.parsedyaml["logsource"], third.parsedyaml["logsource"])
+
+    def test_generation_modifies_rule(self):
+        """Modification of a rule while generating a query doesn't affect following rules merged with the global part"""
+        class ModifyingBackend(ElasticsearchQuerystringBackend):
+            def generate(self, sigmaparser):
+                sigmaparser.parsedyaml["logsource"]["service"] = "security"
+                sigmaparser.parsedyaml["title"] = "Modified"
+                return super().generate(sigmaparser)
+        backend = ModifyingBackend(self.config)
+        titles = list()
+        for parser in SigmaCollectionParser(collection, self.config, lazy=True).iterparsers():
+            titles.append((parser.parsedyaml["title"], parser.parsedyaml["logsource"].get("service")))
+            backend.generate(parser)
+        self.assertEqual(titles, [ ("Test", None), ("Test", "sysmon"), ("Test", None) ])
+
+    def test_shared_rules(self):
+        """Rules loaded once are parsed with different configurations, loading errors are raised by each iteration"""
+        other = SigmaConfiguration()
+        with patch("sigma.parser.collection.loadAllYAML", wraps=loadAllYAML) as load:
+            rules = SigmaCollectionRules(collection + "---\ntitle: [ invalid\n")
+            parsers = [ SigmaCollectionParser(collection, sigmaconfig, lazy=True, rules=rules).iterparsers() for sigmaconfig in (self.config, other) ]
+            for i in range(3):
+                first, second = [ next(iterator) for iterator in parsers ]
+                self.assertEqual(first.parsedyaml, second.parsedyaml)
+                self.assertIsNot(first.parsedyaml, second.parsedyaml)
+                self.assertIs(second.config, other)
+            for iterator in parsers:
+                with self.assertRaises(yaml.YAMLError):
+                    next(iterator)
+            self.assertEqual(load.call_count, 1)
+
+class TestIterFinalize(unittest.TestCase):
+    """iterFinalize() yields the output of finalize() in parts"""
+    cases = (
+            ("kibana", {}),
+            ("kibana", { "output": "curl" }),
+            ("kibana-ndjson", {}),
+            ("xpack-watcher", { "output": "plain" }),
+            ("xpack-watcher", { "output": "json" }),
+            ("elastalert", {}),
+            ("fieldlist", {}),
+            ("es-qs", {}),
+            )
+
+    def convert(self, target, options, content=collection):
+        sigmaconfig = SigmaConfiguration(config)
+        backend = getBackend(target)(sigmaconfig, dict(options))
+        for query in SigmaCollectionParser(content, sigmaconfig).generate(backend):
+            pass
+        return backend
+
+    def test_parts(self):
+        for target, options in self.cases:
+            for content in (collection, ""):
+                with self.subTest(target=target, options=options, empty=not content):
+                    expected = self.convert(target, options, content).finalize()
+                    parts = list(self.convert(target, options, content).iterFinalize())
+                    self.assertEqual("".join(parts), expected or "")
+                    self.assertTrue(all(parts))
+
+    def test_kibana_json(self):
+        parts = list(self.convert("kibana", {}).iterFinalize())
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(len(json.loads("".join(parts))), 3)
+
+    def test_default(self):
+        class Backend(BaseBackend):
+            def finalize(self):
+                return "output"
+        self.assertEqual(list(Backend(SigmaConfiguration()).iterFinalize()), [ "output" ])
+        self.assertEqual(list(BaseBackend(SigmaConfiguration()).iterFinalize()), [])
@@ -0,0 +1,188 @@
+# Test parsing of Sigma search conditions
+
+import pickle
+import random
+import weakref
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from sigma.backends.elasticsearch import ElasticsearchQuerystringBackend
+from sigma.configuration import SigmaConfiguration
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.condition import SigmaConditionParser, SigmaConditionToken, ParseTreeNode, NodeSubexpression, ConditionAND, ConditionOR, ConditionNOT, ConditionNULLValue, ConditionNotNULLValue
+from sigma.parser.exceptions import SigmaParseError
+
+rulesdir = Path(__file__).parent.parent.parent / "rules"
+configdir = Path(__file__).parent.parent / "config"
+
+def legacyParseSearch(self, tokens):
+    """Reference implementation: repeated reduction of the token list by operators in order of their precedence"""
+    while SigmaConditionToken.TOKEN_LPAR in tokens:
+        lPos = tokens.index(SigmaConditionToken.TOKEN_LPAR)
+        depth = 0
+        for rPos in range(lPos + 1, len(tokens)):
+            if tokens[rPos] == SigmaConditionToken.TOKEN_LPAR:
+                depth += 1
+            elif tokens[rPos] == SigmaConditionToken.TOKEN_RPAR:
+                if depth == 0:
+                    break
+                depth -= 1
+        else:
+            raise SigmaParseError("Missing matching closing parentheses")
+        if lPos + 1 == rPos:
+            raise SigmaParseError("Empty subexpression at " + str(tokens[lPos].pos))
+        tokens = tokens[:lPos] + NodeSubexpression(legacyParseSearch(self, tokens[lPos + 1:rPos])) + tokens[rPos + 1:]
+
+    for operator in self.searchOperators:
+        while operator[0] in tokens:
+            pos = tokens.index(operator[0])
+            if operator[1] == 0:
+                tokens = tokens[:pos] + operator[2](self.sigmaParser, tokens[pos]) + tokens[pos + 1:]
+            elif operator[1] == 1:
+                tokens = tokens[:pos] + operator[2](self.sigmaParser, tokens[pos], tokens[pos + 1]) + tokens[pos + 2:]
+            elif operator[1] == 2:
+                tokens = tokens[:pos - 1] + operator[2](self.sigmaParser, tokens[pos], tokens[pos - 1], tokens[pos + 1]) + tokens[pos + 2:]
+
+    if len(tokens) != 1:
+        raise ValueError("Parse tree must have exactly one start node!")
+    return self.completeSearch(tokens[0])
+
+def dumpTree(node):
+    """Comparable representation of parse tree"""
+    if isinstance(node, ParseTreeNode):
+        if isinstance(node.items, (list, tuple)):
+            return (type(node).__name__, type(node.items).__name__, [ dumpTree(item) for item in node.items ])
+        else:
+            return (type(node).__name__, dumpTree(node.items))
+    elif isinstance(node, (list, tuple)):
+        return (type(node).__name__, [ dumpTree(item) for item in node ])
+    else:
+        return (type(node).__name__, str(node))
+
+definitions = "\n".join("    selection%d:\n        Field%d: value%d" % (i, i, i) for i in range(8))
+ruletemplate = """
+title: Test
+logsource:
+    product: windows
+    service: security
+detection:
+%s
+    condition: %s
+"""
+
+class TestConditionParser(unittest.TestCase):
+    def setUp(self):
+        self.config = SigmaConfiguration((configdir / "winlogbeat.yml").open())
+        ElasticsearchQuerystringBackend(self.config)
+
+    def parse(self, content, legacy=False):
+        if legacy:
+            with patch.object(SigmaConditionParser, "parseSearch", legacyParseSearch):
+                return self.parse(content)
+        try:
+            return [ [ dumpTree(condparsed.parsedSearch) for condparsed in parser.condparsed ] for parser in SigmaCollectionParser(content, self.config).parsers ]
+        except (SigmaParseError, ValueError) as e:
+            return (type(e), str(e))
+
+    def parseCondition(self, condition, legacy=False):
+        return self.parse(ruletemplate % (definitions, condition), legacy)
+
+    def assertEquivalent(self, content):
+        self.assertEqual(self.parse(content), self.parse(content, legacy=True))
+
+    def assertConditionEquivalent(self, condition):
+        self.assertEqual(self.parseCondition(condition), self.parseCondition(condition, legacy=True), condition)
+
+    def assertParseError(self, condition, exception, message):
+        with self.assertRaises(exception) as cm:
+            SigmaCollectionParser(ruletemplate % (definitions, condition), self.config)
+        self.assertEqual(str(cm.exception), message)
+
+    def test_rule_corpus(self):
+        paths = sorted(rulesdir.glob("**/*.yml"))
+        self.assertGreater(len(paths), 0)
+        for path in paths:
+            with self.subTest(rule=str(path)):
+                self.assertEquivalent(path.read_text())
+
+    def test_conditions(self):
+        for condition in (
+                "selection1",
+                "selection1 and selection2 or selection3",
+                "selection1 or selection2 and selection3",
+                "not selection1 and not (selection2 or selection3)",
+                "1 of selection* and not all of them",
+                "all of selection1 or 1 of them",
+                "((selection1) and ((selection2 or selection3)))",
+                "selection1 and (selection2 or not (selection3 and selection4)) or selection5",
+                "selection1 | count() > 5",
+                ):
+            self.assertConditionEquivalent(condition)
+
+    def test_random_conditions(self):
+        rand = random.Random(42)
+        def generate(depth=0):
+            r = rand.random()
+            if depth > 5 or r < 0.3:
+                return rand.choice([ "selection%d" % rand.randrange(8), "1 of selection*", "all of them", "all of selection1" ])
+            elif r < 0.45:
+                return "not " + generate(depth + 1)
+            elif r < 0.6:
+                return "(" + generate(depth + 1) + ")"
+            else:
+                return generate(depth + 1) + rand.choice([ " and ", " or " ]) + generate(depth + 1)
+
+        for i in range(500):
+            self.assertConditionEquivalent(generate())
+
+    def test_large_condition(self):
+        condition = " or ".join("(selection%d and not selection%d)" % (i % 8, (i + 1) % 8) for i in range(150))
+        self.assertConditionEquivalent(condition)
+        condition = " and ".join([ "not selection%d" % (i % 8) for i in range(150) ] + [ "1 of selection*" ])
+        self.assertConditionEquivalent(condition)
+        self.assertConditionEquivalent("(" * 50 + "selection1" + ")" * 50)
+
+    def test_errors(self):
+        self.assertParseError("(selection1 and selection2", SigmaParseError, "Missing matching closing parentheses")
+        self.assertParseError("selection1 and ()", SigmaParseError, "Empty subexpression at 16")
+        self.assertParseError("selection1 selection2", ValueError, "Parse tree must have exactly one start node!")
+        self.assertParseError("selection1)", ValueError, "Parse tree must have exactly one start node!")
+        self.assertParseError("not not selection1", ValueError, "Parse tree must have exactly one start node!")
+        self.assertParseError("selection1 and", SigmaParseError, "Unexpected end of condition")
+        self.assertParseError("and selection1", SigmaParseError, "Unexpected token 'and' at position 1")
+
+class TestParseTreeNodes(unittest.TestCase):
+    def node(self, nodetype, *items):
+        node = nodetype()
+        node.items = list(items)
+        return node
+
+    def test_slots(self):
+        for nodetype in (ConditionAND, ConditionOR, ConditionNOT, ConditionNULLValue, ConditionNotNULLValue):
+            self.assertFalse(hasattr(nodetype(), "__dict__"), nodetype.__name__)
+        self.assertFalse(hasattr(NodeSubexpression(None), "__dict__"))
+
+    def test_equality(self):
+        tree = lambda: NodeSubexpression(self.node(ConditionAND, ("a", [ "x", "y" ]), ConditionNOT(None, None, ("b", 1)), "keyword"))
+        self.assertEqual(tree(), tree())
+        self.assertEqual(hash(tree()), hash(tree()))
+        self.assertEqual(len({ tree(), tree() }), 1)
+        self.assertEqual(self.node(ConditionAND, ("a", [ 1 ])), ConditionAND(None, None, ("a", [ 1 ])))
+        self.assertNotEqual(self.node(ConditionAND, ("a", 1)), self.node(ConditionOR, ("a", 1)))
+        self.assertNotEqual(self.node(ConditionAND, ("a", [ 1, 2 ])), self.node(ConditionAND, ("a", [ 2, 1 ])))
+        self.assertNotEqual(ConditionNULLValue(val="a"), ConditionNotNULLValue(val="a"))
+        self.assertNotEqual(self.node(ConditionAND, ("a", 1)), ("a", 1))
+        self.assertNotEqual(self.node(ConditionAND), None)
+
+    def test_parsed_tree(self):
+        config = SigmaConfiguration((configdir / "winlogbeat.yml").open())
+        ElasticsearchQuerystringBackend(config)
+        tree = SigmaCollectionParser(ruletemplate % (definitions, "1 of selection* and not selection1"), config).parsers[0].condparsed[0].parsedSearch
+        stack = [ tree.items ]
+        while stack:
+            node = stack.pop()
+            self.assertEqual(type(node.items), tuple)
+            stack.extend(item.items for item in node.items if type(item) == NodeSubexpression)
+        self.assertIs(weakref.ref(tree)(), tree)
+        self.assertEqual(pickle.loads(pickle.dumps(tree)), tree)
@@ -0,0 +1,56 @@
+# Test tokenization of Sigma conditions
+
+import unittest
+
+from sigma.parser.condition import SigmaConditionTokenizer, SigmaConditionToken as T
+from sigma.parser.exceptions import SigmaParseError
+
+class TestConditionTokenizer(unittest.TestCase):
+    def assertTokens(self, condition, expected):
+        self.assertEqual([ (token.type, token.matched, token.pos) for token in SigmaConditionTokenizer(condition) ], expected)
+
+    def test_tokens(self):
+        self.assertTokens("1 of selection* and not (filter OR keywords)", [
+            (T.TOKEN_ONE, "1 of", 1),
+            (T.TOKEN_ID, "selection*", 6),
+            (T.TOKEN_AND, "and", 17),
+            (T.TOKEN_NOT, "not", 21),
+            (T.TOKEN_LPAR, "(", 25),
+            (T.TOKEN_ID, "filter", 26),
+            (T.TOKEN_OR, "OR", 33),
+            (T.TOKEN_ID, "keywords", 36),
+            (T.TOKEN_RPAR, ")", 44),
+            ])
+
+    def test_aggregation(self):
+        self.assertTokens("All of them |\ncount(User) by Host < 3", [
+            (T.TOKEN_ALL, "All of", 1),
+            (T.TOKEN_ID, "them", 8),
+            (T.TOKEN_PIPE, "|", 13),
+            (T.TOKEN_AGG, "count", 15),
+            (T.TOKEN_LPAR, "(", 20),
+            (T.TOKEN_ID, "User", 21),
+            (T.TOKEN_RPAR, ")", 25),
+            (T.TOKEN_BY, "by", 27),
+            (T.TOKEN_ID, "Host", 30),
+            (T.TOKEN_LT, "<", 35),
+            (T.TOKEN_ID, "3", 37),
+            ])
+
+    def test_definition_order(self):
+        """The first matching token definition wins, even if a later one matches a longer prefix."""
+        self.assertTokens("android", [ (T.TOKEN_AND, "and", 1), (T.TOKEN_ID, "roid", 4) ])
+        self.assertTokens("sel | near a", [ (T.TOKEN_ID, "sel", 1), (T.TOKEN_PIPE, "|", 5), (T.TOKEN_NEAR, "near", 7), (T.TOKEN_ID, "a", 12) ])
+
+    def test_error(self):
+        with self.assertRaisesRegex(SigmaParseError, "at position #x"):
+            SigmaConditionTokenizer("selection and #x")
+        with self.assertRaisesRegex(SigmaParseError, "at position = 3"):
+            SigmaConditionTokenizer("count() by x >= 3")
+
+    def test_long_condition(self):
+        condition = " or ".join("filter%d" % i for i in range(5000))
+        tokens = SigmaConditionTokenizer(condition)
+        self.assertEqual(len(tokens), 9999)
+        self.assertEqual(tokens[-1].matched, "filter4999")
+        self.assertEqual(tokens[-1].pos, len(condition) - len("filter4999") + 1)
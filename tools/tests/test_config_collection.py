@@ -0,0 +1,74 @@
+# Test Sigma configuration discovery
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.config.exceptions import SigmaConfigParseError
+
+class TestConfigurationManager(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.confdir = Path(self.tmpdir.name) / "config"
+        self.confdir.mkdir()
+        self.index_path = Path(self.tmpdir.name) / "index.json"
+        self.write("first", "title: First\nbackends:\n    - es-qs\nfieldmappings:\n    EventID: event_id\n")
+        self.write("second", "title: Second\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, content):
+        (self.confdir / (name + ".yml")).write_text(content)
+
+    def manager(self):
+        return SigmaConfigurationManager([ str(self.confdir) ], self.index_path)
+
+    def test_lazy_get(self):
+        with patch.object(SigmaConfigurationManager, "_load", wraps=self.manager()._load) as load:
+            scm = self.manager()
+            load.assert_not_called()
+            config = scm.get("first")
+            self.assertEqual(config.fieldmappings["EventID"].target, "event_id")
+            self.assertIs(scm.get("first"), config)
+            self.assertEqual(load.call_count, 1)
+
+    def test_get_file(self):
+        config = self.manager().get(str(self.confdir / "second.yml"))
+        self.assertEqual(config.config["title"], "Second")
+        with self.assertRaises(OSError):
+            self.manager().get("not_existing")
+
+    def test_list(self):
+        expected = [ ("first", "First", [ "es-qs" ]), ("second", "Second", []) ]
+        self.assertEqual(sorted(self.manager().list()), expected)
+        self.assertTrue(self.index_path.exists())
+        with patch.object(SigmaConfigurationManager, "_load") as load:
+            self.assertEqual(sorted(self.manager().list()), expected)
+            load.assert_not_called()
+
+    def test_list_modified(self):
+        self.manager().list()
+        self.write("second", "title: Changed title\n")
+        stat = os.stat(self.confdir / "second.yml")
+        os.utime(self.confdir / "second.yml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.write("third", "title: Third\n")
+        self.assertEqual(sorted(self.manager().list()), [ ("first", "First", [ "es-qs" ]), ("second", "Changed title", []), ("third", "Third", []) ])
+
+    def test_list_errors(self):
+        self.write("broken", "- no map\n")
+        scm = self.manager()
+        self.assertEqual(sorted(conf_id for conf_id, _, _ in scm.list()), [ "first", "second" ])
+        self.assertEqual(len(scm.errors), 1)
+        self.assertEqual(scm.errors[0][0].stem, "broken")
+        scm.list()
+        self.assertEqual(len(scm.errors), 1)
+        with self.assertRaises(SigmaConfigParseError):
+            scm.get("broken")
+
+    def test_damaged_index(self):
+        self.index_path.write_text("{")
+        self.assertEqual(len(self.manager().list()), 2)
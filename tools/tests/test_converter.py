@@ -0,0 +1,79 @@
+# Test in-process conversion API
+
+import io
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from sigma.backends.discovery import getBackend
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.configuration import SigmaConfigurationChain
+from sigma.converter import Converter, ConverterError, ConfigurationError, ConversionResult, convert_input
+from tests.test_sigmac import tools, collection, invalid, unsupported
+
+scm = SigmaConfigurationManager([ str(tools / "config") ])
+
+class TestConverter(unittest.TestCase):
+    def convert_once(self, target, configs, content, options=None):
+        """Conversion with own configurations and backend like a sigmac run"""
+        sigmaconfigs = SigmaConfigurationChain([ SigmaConfigurationManager([ str(tools / "config") ]).get(config) for config in configs ])
+        backend = getBackend(target)(sigmaconfigs, options or {})
+        results, error = convert_input("<input>", io.StringIO(content), sigmaconfigs, None, backend)
+        return ConversionResult(results, "".join(backend.iterFinalize()) or None, error)
+
+    def test_convert(self):
+        for target, configs in (("es-qs", [ "winlogbeat" ]), ("splunk", [ "sysmon", "splunk-windows" ]), ("kibana", [ "winlogbeat" ]), ("es-rule", [ "winlogbeat" ])):
+            with self.subTest(target=target):
+                converter = Converter(target, configs, scm=scm)
+                result = converter.convert(collection)
+                self.assertEqual(result, self.convert_once(target, configs, collection))
+                self.assertTrue(result.results or result.finalized)
+                self.assertIsNone(result.error)
+                self.assertEqual(converter.convert(collection), result)        # no state from previous conversions
+
+    def test_options(self):
+        converter = Converter("es-qs", [ "winlogbeat" ], [ "rulecomment", "keyword_field=" ], "level>=high", scm=scm)
+        self.assertEqual(converter.convert(collection).results, [])
+        converter = Converter("es-qs", [ "winlogbeat" ], { "rulecomment": True, "keyword_field": "" }, scm=scm)
+        result = converter.convert(collection)
+        self.assertEqual(result, self.convert_once("es-qs", [ "winlogbeat" ], collection, { "rulecomment": True, "keyword_field": "" }))
+        self.assertTrue(result.results[0].startswith("# Test"))
+        self.assertEqual(converter.convert(collection), result)
+
+    def test_errors(self):
+        converter = Converter("es-qs", [ "winlogbeat" ], scm=scm)
+        for content, code, errclass in ((invalid, 4, "parse"), ("title: [", 3, "parse"), (unsupported, 42, "backend")):
+            with self.subTest(content=content):
+                result = converter.convert(content, "rule.yml")
+                self.assertEqual((result.results, result.finalized, result.error.code, result.error.errclass), ([], None, code, errclass))
+        self.assertIn("rule.yml", converter.convert(invalid, "rule.yml").error.message)
+
+    def test_converter_errors(self):
+        for args, code in (
+                (("unknown", [ "winlogbeat" ]), 10),
+                (("es-qs", None), 20),
+                (("es-qs", [ "unknown" ]), 5),
+                (("es-qs", [ "splunk-windows" ]), 21),
+                (("es-qs", [ "winlogbeat" ], None, "level>=unknown"), 11),
+                ):
+            with self.subTest(args=args):
+                with self.assertRaises(ConverterError) as cm:
+                    Converter(*args, scm=scm)
+                self.assertEqual(cm.exception.code, code)
+        self.assertRaises(ConfigurationError, Converter, "es-qs", None, scm=scm)
+        self.assertEqual(Converter("es-qs", None, scm=scm, shoot_yourself_in_the_foot=True).convert(collection).error, None)
+
+    def test_convert_many(self):
+        converter = Converter("splunk", [ "sysmon", "splunk-windows" ], scm=scm)
+        contents = [ collection, invalid, collection.replace("4444", "5555") ]
+        results = converter.convert_many(contents, [ "first.yml", "invalid.yml", "second.yml" ])
+        self.assertEqual(results, [ converter.convert(content, name) for content, name in zip(contents, [ "first.yml", "invalid.yml", "second.yml" ]) ])
+        self.assertIn("5555", results[2].results[1])
+        self.assertEqual(results[1].error.code, 4)
+
+    def test_threads(self):
+        converter = Converter("es-rule", [ "winlogbeat" ], scm=scm)
+        contents = [ collection.replace("4444", str(port)) for port in range(4000, 4040) ]
+        with ThreadPoolExecutor(8) as executor:
+            concurrent = list(executor.map(converter.convert, contents))
+        self.assertEqual(concurrent, [ converter.convert(content) for content in contents ])
+        self.assertLessEqual(len(converter.idle), 8)
@@ -0,0 +1,53 @@
+# Test backend and modifier registries
+
+import os
+import sys
+import subprocess
+import unittest
+from unittest.mock import patch
+
+import sigma.backends
+import sigma.backends.discovery as backends
+import sigma.parser.modifiers
+from sigma.backends.base import BaseBackend
+from sigma.backends.misc import GrepBackend
+from sigma.parser.modifiers import modifiers
+from sigma.parser.modifiers.base import SigmaModifier
+from sigma.tools import getAllSubclasses, getClassDict
+
+def discover(package, import_base, base_class):
+    classes = getAllSubclasses(list(package.__path__)[0], import_base, base_class)
+    return { cls.identifier: "{}:{}".format(cls.__module__, cls.__qualname__) for cls in classes }
+
+class TestRegistry(unittest.TestCase):
+    def test_backend_registry(self):
+        self.assertEqual(backends.builtinBackends, discover(sigma.backends, "backends", BaseBackend))
+
+    def test_modifier_registry(self):
+        registered = { identifier: "{}:{}".format(cls.__module__, cls.__qualname__) for identifier, cls in modifiers.items() }
+        self.assertEqual(registered, discover(sigma.parser.modifiers, "parser.modifiers", SigmaModifier))
+
+    def test_get_backend(self):
+        backend = backends.getBackend("grep")
+        self.assertIs(backend, GrepBackend)
+        self.assertEqual(backend.identifier, "grep")
+        with self.assertRaises(LookupError):
+            backends.getBackend("not-existing")
+
+    def test_lazy_import(self):
+        code = "import sys, sigma.backends.discovery as d; d.getBackend('splunk'); print(' '.join(sorted(m for m in sys.modules if m.startswith('sigma.backends.'))))"
+        imported = subprocess.run([ sys.executable, "-c", code ], stdout=subprocess.PIPE, universal_newlines=True,
+                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))).stdout.split()
+        self.assertIn("sigma.backends.splunk", imported)
+        self.assertNotIn("sigma.backends.carbonblack", imported)
+        self.assertNotIn("sigma.backends.elasticsearch", imported)
+
+    def test_plugin_backends(self):
+        with patch.object(backends, "pluginBackends", { "test-plugin": "sigma.backends.misc:GrepBackend", "grep": "sigma.backends.splunk:SplunkBackend" }):
+            self.assertIn("test-plugin", backends.getBackendIdentifiers())
+            self.assertIs(backends.getBackend("test-plugin"), GrepBackend)
+            self.assertIs(backends.getBackend("grep"), GrepBackend)     # built-in backends have precedence
+
+    def test_entry_points(self):
+        with patch.object(backends, "pluginBackends", None):
+            self.assertIsInstance(backends.getPluginBackends(), dict)
@@ -0,0 +1,86 @@
+# Test field mappings of configuration chains
+
+import pickle
+import unittest
+from types import SimpleNamespace
+
+from sigma.configuration import SigmaConfiguration, SigmaConfigurationChain
+from sigma.config.exceptions import FieldMappingError
+from sigma.config.mapping import FieldMappingChain, FieldMappingResolver, ConditionalFieldMapping
+
+first = """
+fieldmappings:
+    EventID: event_id
+    Image: [ process.executable, process.name ]
+    User: user
+"""
+
+second = """
+fieldmappings:
+    event_id: winlog.event_id
+    process.name: process.title
+    CommandLine:
+        product=windows: process.command_line
+        default: command_line
+"""
+
+def dumpMapping(mapped):
+    """Comparable representation of resolved field mapping"""
+    if isinstance(mapped, tuple):
+        return mapped
+    return (type(mapped).__name__, sorted(map(dumpMapping, mapped.items.items), key=repr))
+
+class TestFieldMappingResolver(unittest.TestCase):
+    def setUp(self):
+        self.configs = [ SigmaConfiguration(first), SigmaConfiguration(second) ]
+        self.chain = SigmaConfigurationChain(self.configs)
+        self.parser = SimpleNamespace(values={ "product": { "windows" } }, parsedyaml={ "logsource": { "product": "windows" } })
+
+    def uncompiled(self, fieldname):
+        chain = FieldMappingChain(fieldname)
+        for config in self.configs:
+            chain.append(config)
+        return chain
+
+    def test_chain(self):
+        for fieldname in ("EventID", "Image", "User", "CommandLine", "Unmapped"):
+            with self.subTest(fieldname=fieldname):
+                mapping = self.chain.get_fieldmapping(fieldname)
+                expected = self.uncompiled(fieldname)
+                self.assertEqual(dumpMapping(mapping.resolve(fieldname, "x", self.parser)), dumpMapping(expected.resolve(fieldname, "x", self.parser)))
+                self.assertEqual(sorted(mapping.resolve_fieldname(fieldname)), sorted(expected.resolve_fieldname(fieldname)))
+        self.assertEqual(self.chain.get_fieldmapping("EventID").resolve("EventID", 1, self.parser), ("winlog.event_id", 1))
+        self.assertEqual(self.chain.get_fieldmapping("CommandLine").resolve("CommandLine", "x", self.parser), ("process.command_line", "x"))
+
+    def test_logsource_condition(self):
+        """Conditions on the log source of a rule don't change the mapping for following rules"""
+        mapping = self.chain.get_fieldmapping("CommandLine")
+        linux = SimpleNamespace(values=dict(), parsedyaml={ "logsource": { "product": "linux" } })
+        windows = SimpleNamespace(values=dict(), parsedyaml={ "logsource": { "product": "windows" } })
+        self.assertEqual(mapping.resolve("CommandLine", "x", windows), ("process.command_line", "x"))
+        self.assertEqual(mapping.resolve("CommandLine", "x", linux), ("command_line", "x"))
+
+    def test_memoized(self):
+        self.assertIs(self.chain.get_fieldmapping("Image"), self.chain.get_fieldmapping("Image"))
+        resolver = self.chain.get_fieldmapping_resolver()
+        self.chain.append(SigmaConfiguration("fieldmappings:\n    winlog.event_id: event.code\n"))
+        self.assertIsNot(self.chain.get_fieldmapping_resolver(), resolver)
+        self.assertEqual(self.chain.get_fieldmapping("EventID").resolve_fieldname("EventID"), "event.code")
+
+    def test_empty(self):
+        chain = SigmaConfigurationChain()
+        self.assertEqual(chain.get_fieldmapping("EventID").resolve("EventID", 1, None), ("EventID", 1))
+
+    def test_conditional_not_last(self):
+        self.chain.append(SigmaConfiguration(first))
+        for i in range(2):
+            with self.assertRaises(FieldMappingError):
+                self.chain.get_fieldmapping("CommandLine")
+
+    def test_pickle(self):
+        resolver = self.chain.get_fieldmapping_resolver()
+        self.chain.get_fieldmapping("CommandLine")
+        restored = pickle.loads(pickle.dumps(resolver))
+        self.assertIsInstance(restored, FieldMappingResolver)
+        self.assertIsInstance(restored.fieldmappings["CommandLine"].fieldmappings, ConditionalFieldMapping)
+        self.assertEqual(restored.get_fieldmapping("EventID").resolve("EventID", 1, self.parser), ("winlog.event_id", 1))
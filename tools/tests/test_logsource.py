@@ -0,0 +1,127 @@
+# Test log source lookup of configurations
+
+import pickle
+import unittest
+from itertools import product as combinations
+
+from sigma.backends.elasticsearch import ElasticsearchQuerystringBackend
+from sigma.configuration import SigmaConfiguration, SigmaConfigurationChain, SigmaLogsourceConfiguration
+from sigma.parser.collection import SigmaCollectionParser
+
+first = """
+logsources:
+    process_creation:
+        category: process_creation
+        product: windows
+        conditions:
+            EventID: 1
+        rewrite:
+            product: windows
+            service: sysmon
+    windows:
+        product: windows
+        index: windows-*
+    security:
+        product: windows
+        service: security
+        conditions:
+            EventID: 4688
+    linux:
+        product: linux
+        index: linux-*
+    dns:
+        category: dns
+        index: dns-*
+"""
+
+second = """
+logsources:
+    sysmon:
+        product: windows
+        service: sysmon
+        index: sysmon-*
+    dns:
+        category: dns
+        conditions:
+            event.dataset: dns
+"""
+
+rule = """
+title: Test
+logsource:
+    category: process_creation
+    product: windows
+detection:
+    selection:
+        Image: evil.exe
+    condition:
+        - selection
+        - not selection
+"""
+
+def linearLogsources(configs, category, product, service):
+    """Previous lookup of matching log source definitions by matching each definition"""
+    matching = list()
+    for config in configs:
+        for logsource in config.logsources:
+            if logsource.matches(category, product, service):
+                matching.append(logsource)
+                if logsource.rewrite is not None:
+                    category, product, service = logsource.rewrite
+    return matching
+
+class TestLogsourceIndex(unittest.TestCase):
+    def setUp(self):
+        self.chain = SigmaConfigurationChain([ SigmaConfiguration(first), SigmaConfiguration(second) ])
+        self.backend = ElasticsearchQuerystringBackend(self.chain)
+
+    def test_find(self):
+        values = ( None, "windows", "linux", "process_creation", "dns", "sysmon", "security" )
+        for category, product, service in combinations(values, repeat=3):
+            with self.subTest(criteria=(category, product, service)):
+                self.assertEqual(
+                        [ logsource for position, logsource in self.chain[0].get_logsource_index().find(category, product, service) ],
+                        [ logsource for logsource in self.chain[0].logsources if logsource.matches(category, product, service) ]
+                        )
+                try:
+                    expected = SigmaLogsourceConfiguration(linearLogsources(self.chain, category, product, service), self.chain.defaultindex)
+                except ValueError:
+                    with self.assertRaises(ValueError):
+                        self.chain.get_logsource(category, product, service)
+                    continue
+                logsource = self.chain.get_logsource(category, product, service)
+                self.assertEqual((logsource.conditions, sorted(logsource.index)), (expected.conditions, sorted(expected.index)))
+
+    def test_rewrite(self):
+        logsource = self.chain.get_logsource("process_creation", "windows", None)
+        self.assertEqual(sorted(logsource.index), [ "sysmon-*", "windows-*" ])
+        self.assertEqual(logsource.conditions, [ [ ("EventID", 1) ] ])
+
+    def test_unhashable(self):
+        self.assertEqual(self.chain.get_logsource([ "dns" ], None, None).index, [])
+        self.assertEqual(self.chain.get_logsource(None, "windows", None).index, [ "windows-*" ])
+
+    def test_memoized(self):
+        logsource = self.chain.get_logsource("dns", None, None)
+        self.assertIs(self.chain.get_logsource("dns", None, None), logsource)
+        self.chain.set_backend(self.backend)
+        self.assertIsNot(self.chain.get_logsource("dns", None, None), logsource)
+        self.assertEqual(self.chain.get_logsource("dns", None, None).index, logsource.index)
+
+    def test_config_changed(self):
+        config = SigmaConfiguration(first)
+        self.assertEqual(config.get_logsource("dns", None, None).index, [])     # log sources are parsed when backend is set
+        ElasticsearchQuerystringBackend(config)
+        self.assertEqual(config.get_logsource("dns", None, None).index, [ "dns-*" ])
+
+    def test_rule_condition(self):
+        parser = SigmaCollectionParser(rule, self.chain).parsers[0]
+        condition = parser.get_logsource_condition()
+        self.assertIs(parser.get_logsource_condition(), condition)
+        queries = [ self.backend.generateNode(condparsed.parsedSearch) for condparsed in parser.condparsed ]
+        self.assertEqual(queries, [ '(EventID:"1" AND Image:"evil.exe")', '(EventID:"1" AND (NOT (Image:"evil.exe")))' ])
+        restored = pickle.loads(pickle.dumps(parser))
+        self.assertIsNone(restored.logsource_condition)
+        restored.set_config(self.chain)
+        self.assertIsNot(restored.get_logsource_condition(), condition)
+        self.assertEqual([ self.backend.generateNode(condparsed.parsedSearch) for condparsed in restored.condparsed ], queries)
@@ -0,0 +1,82 @@
+# Test manifest of conversion results for incremental conversion
+
+import os
+import tempfile
+import unittest
+
+from sigma.backends.elasticsearch import ElasticsearchQuerystringBackend, KibanaBackend
+from sigma.configuration import SigmaConfiguration, SigmaConfigurationChain
+from sigma.filter import SigmaRuleFilter
+from sigma.manifest import SigmaConversionManifest
+
+class TestConversionManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.configs = SigmaConfigurationChain([ SigmaConfiguration("fieldmappings:\n    EventID: event_id\n") ])
+        self.fingerprint = SigmaConversionManifest.fingerprint_of(ElasticsearchQuerystringBackend, self.configs, {})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def manifest(self, fingerprint=None, name="es-qs"):
+        return SigmaConversionManifest(self.tmpdir.name, name, fingerprint or self.fingerprint)
+
+    def test_reuse(self):
+        manifest = self.manifest()
+        digest = SigmaConversionManifest.digest(b"title: Test")
+        self.assertIsNone(manifest.reuse("rule.yml", digest))
+        state = [ { "query": "first" } ]
+        manifest.record("rule.yml", digest, [ "first" ], state)
+        state[0]["query"] = "modified"
+        manifest.record("other.yml", digest, [], None, ("Error", 4, "parse"))
+        manifest.store()
+
+        manifest = self.manifest()
+        self.assertEqual(manifest.reuse("rule.yml", digest), ([ "first" ], [ { "query": "first" } ], None))
+        self.assertIsNone(manifest.reuse("rule.yml", SigmaConversionManifest.digest(b"title: Changed")))
+        self.assertEqual(manifest.reuse("other.yml", digest), ([], None, ("Error", 4, "parse")))
+
+        manifest = self.manifest()
+        self.assertIsNotNone(manifest.reuse("rule.yml", digest))
+        manifest.store()
+        manifest = self.manifest()     # entries that were not reused or recorded are dropped
+        self.assertIsNotNone(manifest.reuse("rule.yml", digest))
+        self.assertIsNone(manifest.reuse("other.yml", digest))
+
+    def test_invalidation(self):
+        manifest = self.manifest()
+        digest = SigmaConversionManifest.digest(b"title: Test")
+        manifest.record("rule.yml", digest, [ "result" ], None)
+        manifest.store()
+        fingerprints = (
+                SigmaConversionManifest.fingerprint_of(KibanaBackend, self.configs, {}),
+                SigmaConversionManifest.fingerprint_of(ElasticsearchQuerystringBackend, SigmaConfigurationChain([ SigmaConfiguration("fieldmappings:\n    EventID: EventCode\n") ]), {}),
+                SigmaConversionManifest.fingerprint_of(ElasticsearchQuerystringBackend, self.configs, { "keyword_field": "" }),
+                SigmaConversionManifest.fingerprint_of(ElasticsearchQuerystringBackend, self.configs, {}, SigmaRuleFilter("level>=high")),
+                )
+        self.assertEqual(len(set(fingerprints + (self.fingerprint,))), len(fingerprints) + 1)
+        for fingerprint in fingerprints:
+            self.assertIsNone(self.manifest(fingerprint).reuse("rule.yml", digest))
+        self.assertIsNone(self.manifest(name="splunk").reuse("rule.yml", digest))
+        self.assertIsNotNone(self.manifest().reuse("rule.yml", digest))
+
+    def test_damaged(self):
+        manifest = self.manifest()
+        manifest.record("rule.yml", SigmaConversionManifest.digest(b""), [ "result" ], None)
+        manifest.store()
+        path = manifest.manifest_path()
+        path.write_bytes(path.read_bytes()[:20])
+        self.assertEqual(self.manifest().previous, {})
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "No user ids on this platform")
+    def test_private_directory(self):
+        manifest = SigmaConversionManifest(os.path.join(self.tmpdir.name, "state"), "es-qs", self.fingerprint)
+        digest = SigmaConversionManifest.digest(b"title: Test")
+        manifest.record("rule.yml", digest, [ "result" ], None)
+        manifest.store()
+        self.assertEqual(os.stat(manifest.path).st_mode & 0o777, 0o700)
+        os.chmod(str(manifest.path), 0o777)
+        manifest = SigmaConversionManifest(manifest.path, "es-qs", self.fingerprint)
+        self.assertIsNone(manifest.reuse("rule.yml", digest))
+        with self.assertRaises(PermissionError):
+            manifest.store()
@@ -0,0 +1,84 @@
+# Test MITRE ATT&CK catalog of rule backends
+
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from pathlib import Path
+
+from sigma.backends.ala import AzureAPIBackend
+from sigma.backends.elasticsearch import ElasticSearchRuleBackend
+from sigma.backends.mitre import AttackCatalog, get_attack_catalog
+from sigma.backends.sumologic import SumoLogicCSERule
+from sigma.configuration import SigmaConfiguration
+
+tactics = [
+        { "external_id": "TA0001", "url": "https://attack.mitre.org/tactics/TA0001", "tactic": "Initial Access" },
+        { "external_id": "TA0002", "url": "https://attack.mitre.org/tactics/TA0002", "tactic": "Execution" },
+        { "external_id": "TA0027", "url": "https://attack.mitre.org/tactics/TA0027", "tactic": "Initial Access" },
+        ]
+
+techniques = [
+        { "technique_id": "T1059", "technique": "Command and Scripting Interpreter", "url": "https://attack.mitre.org/techniques/T1059", "tactic": [ "Execution" ] },
+        { "technique_id": "T1059.001", "technique": "Command and Scripting Interpreter : PowerShell", "url": "https://attack.mitre.org/techniques/T1059/001" },
+        { "technique_id": "T1566", "technique": "Phishing", "url": "https://attack.mitre.org/techniques/T1566", "tactic": [ "Initial Access" ] },
+        ]
+
+def linearTactic(tactics, key_name=None, key_id=None):
+    """Previous lookup of tactics by scanning the list"""
+    for tactic in tactics:
+        if key_name and key_name == tactic.get("tactic", ""):
+            return tactic
+        if key_id and key_id == tactic.get("external_id", ""):
+            return tactic
+
+class TestAttackCatalog(unittest.TestCase):
+    def setUp(self):
+        self.catalog = AttackCatalog(tactics, techniques)
+
+    def test_find_tactic(self):
+        self.assertIs(self.catalog.find_tactic(name="Initial Access"), tactics[0])
+        self.assertIs(self.catalog.find_tactic(external_id="TA0027"), tactics[2])
+        self.assertIs(self.catalog.find_tactic(shortname="initial_access"), tactics[0])
+        self.assertIsNone(self.catalog.find_tactic(name="Impact"))
+        self.assertIsNone(self.catalog.find_tactic())
+
+    def test_find_technique(self):
+        self.assertIs(self.catalog.find_technique("T1059.001"), techniques[1])
+        self.assertIsNone(self.catalog.find_technique("T9999"))
+        self.assertIsNone(self.catalog.find_technique(""))
+        self.assertEqual(sorted(t["technique_id"] for t in self.catalog.find_techniques([ "T1566", "T1059", "T1566", "", "T9999" ])), [ "T1059", "T1566" ])
+
+    def test_shipped_data(self):
+        catalog = get_attack_catalog()
+        self.assertIs(get_attack_catalog(), catalog)
+        names = { tactic["tactic"] for tactic in catalog.tactics } | { "Unknown", "" }
+        ids = { tactic["external_id"] for tactic in catalog.tactics } | { "TA9999" }
+        for name in names:
+            self.assertIs(catalog.find_tactic(name=name), linearTactic(catalog.tactics, key_name=name))
+        for external_id in ids:
+            self.assertIs(catalog.find_tactic(external_id=external_id), linearTactic(catalog.tactics, key_id=external_id))
+        for technique in catalog.techniques:
+            self.assertIs(catalog.find_technique(technique["technique_id"]), technique)
+
+    def test_missing_files(self):
+        with tempfile.TemporaryDirectory() as path:
+            (Path(path) / "tactics.json").write_text(json.dumps(tactics))
+            (Path(path) / "techniques.json").write_text("[")
+            stderr = io.StringIO()
+            with redirect_stderr(stderr):
+                catalog = AttackCatalog.load(path)
+            self.assertEqual(len(catalog.tactics), 3)
+            self.assertEqual(catalog.techniques, [])
+            self.assertIn("techniques", stderr.getvalue())
+
+    def test_backends_share_catalog(self):
+        backends = [ backend(SigmaConfiguration("{}")) for backend in (ElasticSearchRuleBackend, AzureAPIBackend, SumoLogicCSERule) ]
+        self.assertIs(backends[0].mitre, get_attack_catalog())
+        for backend in backends[1:]:
+            self.assertIs(backend.mitre, backends[0].mitre)
+            self.assertIs(backend.techniques, backends[0].techniques)
+        self.assertEqual(backends[0].find_tactics(key_name="Execution")["external_id"], "TA0002")
+        self.assertEqual(backends[0].find_technique("T1059")["technique"], "Command and Scripting Interpreter")
+        self.assertEqual(backends[1].skip_tactics_or_techniques([ "T1059", "T1566" ], [ "Execution" ]), ([ "Execution" ], [ "T1059" ]))
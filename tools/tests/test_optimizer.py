@@ -0,0 +1,165 @@
+# Test optimization of Sigma condition parse trees
+
+import random
+import unittest
+
+from sigma.parser.condition import SigmaConditionOptimizer, ConditionAND, ConditionOR, ConditionNOT, ConditionNULLValue, ConditionNotNULLValue, NodeSubexpression
+
+def AND(*items):
+    node = ConditionAND()
+    node.items = list(items)
+    return NodeSubexpression(node)
+
+def OR(*items):
+    node = ConditionOR()
+    node.items = list(items)
+    return NodeSubexpression(node)
+
+def NOT(item):
+    return ConditionNOT(None, None, item)
+
+def dumpTree(node):
+    """Comparable representation of (optimized) parse tree"""
+    if type(node) == NodeSubexpression:
+        return dumpTree(node.items)
+    elif type(node) in (ConditionAND, ConditionOR, ConditionNOT):
+        return (type(node).__name__, [ dumpTree(item) for item in node.items ])
+    elif type(node) in (ConditionNULLValue, ConditionNotNULLValue):
+        return (type(node).__name__, node.items[0])
+    elif type(node) == tuple and type(node[1]) == list:
+        return (node[0], tuple(node[1]))
+    return node
+
+def evaluate(node, assignment):
+    """Evaluate parse tree with truth values of leaves given by assignment"""
+    if node is None:
+        return True
+    elif type(node) == NodeSubexpression:
+        return evaluate(node.items, assignment)
+    elif type(node) == ConditionAND:
+        return all(evaluate(item, assignment) for item in node.items)
+    elif type(node) == ConditionOR:
+        return any(evaluate(item, assignment) for item in node.items)
+    elif type(node) == ConditionNOT:
+        return not evaluate(node.items[0], assignment)
+    return assignment[dumpTree(node)]
+
+def nodes(node):
+    """All AND/OR/NOT nodes of parse tree"""
+    result = list()
+    stack = [ node ]
+    while stack:
+        node = stack.pop()
+        if type(node) == NodeSubexpression:
+            stack.append(node.items)
+        elif type(node) in (ConditionAND, ConditionOR, ConditionNOT):
+            result.append(node)
+            stack.extend(node.items)
+    return result
+
+class TestConditionOptimizer(unittest.TestCase):
+    def optimize(self, tree):
+        return dumpTree(SigmaConditionOptimizer().optimizeTree(tree))
+
+    def test_empty(self):
+        self.assertEqual(self.optimize(AND(OR(), ("a", 1))), ("a", 1))
+        self.assertIsNone(self.optimize(OR(AND(), AND())))
+
+    def test_single(self):
+        self.assertEqual(self.optimize(AND(OR(("a", 1)))), ("a", 1))
+
+    def test_duplicates(self):
+        self.assertEqual(self.optimize(OR(("a", 1), ("b", 2), ("a", 1))), ("ConditionOR", [ ("a", 1), ("b", 2) ]))
+        self.assertEqual(self.optimize(OR(("a", [ 1, 2 ]), ("a", [ 1, 2 ]))), ("a", (1, 2)))
+        self.assertEqual(self.optimize(AND(OR(("a", 1), ("b", 2)), OR(("a", 1), ("b", 2)))), ("ConditionOR", [ ("a", 1), ("b", 2) ]))
+
+    def test_flatten(self):
+        self.assertEqual(self.optimize(OR(("a", 1), OR(("b", 2), ("c", 3)))), ("ConditionOR", [ ("a", 1), ("b", 2), ("c", 3) ]))
+        self.assertEqual(self.optimize(OR(OR(("a", 1), ("b", 2)), ("b", 2))), ("ConditionOR", [ ("a", 1), ("b", 2) ]))
+        # not flattened if other node types are contained
+        self.assertEqual(
+                self.optimize(OR(("a", 1), OR(("b", 2), ("c", 3)), NOT(("d", 4)))),
+                ("ConditionOR", [ ("a", 1), ("ConditionOR", [ ("b", 2), ("c", 3) ]), ("ConditionNOT", [ ("d", 4) ]) ])
+                )
+
+    def test_nested_alternatives(self):
+        """Rules are applied from the root, OR items of an OR node are merged before their own items are optimized"""
+        self.assertEqual(
+                self.optimize(OR(OR(OR(OR(("a", 1)), AND(("b", 2), ("c", 3))), OR(AND(("d", 4), ("e", 5)))), OR(AND(("f", 6), ("g", 7))))),
+                ("ConditionOR", [
+                    ("ConditionOR", [ ("a", 1), ("ConditionAND", [ ("b", 2), ("c", 3) ]) ]),
+                    ("ConditionAND", [ ("d", 4), ("e", 5) ]),
+                    ("ConditionAND", [ ("f", 6), ("g", 7) ]),
+                    ])
+                )
+
+    def test_promotion(self):
+        self.assertEqual(
+                self.optimize(OR(AND(("EventID", 1), ("a", 1)), AND(("EventID", 1), ("b", 2)))),
+                ("ConditionAND", [ ("EventID", 1), ("ConditionOR", [ ("a", 1), ("b", 2) ]) ])
+                )
+        self.assertEqual(
+                self.optimize(AND(OR(("a", 1), ("b", 2), ("c", 3)), OR(("d", 4), ("b", 2), ("a", 1)))),
+                ("ConditionOR", [ ("a", 1), ("b", 2), ("ConditionAND", [ ("c", 3), ("d", 4) ]) ])
+                )
+
+    def test_absorption(self):
+        self.assertEqual(
+                self.optimize(OR(AND(("a", 1), ("b", 2)), AND(("a", 1), ("b", 2), ("c", 3)))),
+                ("ConditionAND", [ ("a", 1), ("b", 2) ])
+                )
+
+    def test_not(self):
+        # the operand of NOT(NOT(X)) is left as parsed
+        self.assertEqual(self.optimize(NOT(NOT(AND(("a", 1), ("a", 1))))), ("ConditionAND", [ ("a", 1), ("a", 1) ]))
+        self.assertEqual(self.optimize(NOT(ConditionNULLValue(val="a"))), ("ConditionNotNULLValue", "a"))
+        self.assertEqual(self.optimize(NOT(ConditionNotNULLValue(val="a"))), ("ConditionNULLValue", "a"))
+        # subtrees of NOT nodes are left as parsed
+        self.assertEqual(
+                self.optimize(AND(("a", 1), NOT(OR(("b", 2), ("b", 2))))),
+                ("ConditionAND", [ ("a", 1), ("ConditionNOT", [ ("ConditionOR", [ ("b", 2), ("b", 2) ]) ]) ])
+                )
+
+    def test_subexpressions(self):
+        result = SigmaConditionOptimizer().optimizeTree(NodeSubexpression(NodeSubexpression(AND(("a", 1), ("b", 2)))))
+        self.assertEqual(type(result), NodeSubexpression)
+        self.assertEqual(type(result.items), ConditionAND)
+        for node in nodes(result):
+            for item in node.items:
+                self.assertNotIn(type(item), (ConditionAND, ConditionOR))
+
+    def test_unshared(self):
+        common = lambda: OR(("a", 1), AND(("b", 2), ("c", [ 3, 4 ])))
+        result = SigmaConditionOptimizer().optimizeTree(AND(OR(("d", 5), common()), OR(("e", 6), common()), NOT(("f", 7))))
+        found = nodes(result)
+        self.assertEqual(len(found), len(set(map(id, found))))
+        lists = [ item[1] for node in found for item in node.items if type(item) == tuple and type(item[1]) == list ]
+        self.assertEqual(len(lists), 2)
+        self.assertEqual(len(lists), len(set(map(id, lists))))
+
+    def test_long_chain(self):
+        tree = AND(("a", 0))
+        for i in range(1, 5000):
+            tree = OR(tree, AND(("a", i)))
+        self.assertEqual(self.optimize(tree), ("ConditionOR", [ ("a", i) for i in range(5000) ]))
+
+    def randomTree(self, rand, depth=0):
+        r = rand.random()
+        if depth > 6 or r < 0.3:
+            return (rand.choice("abcd"), rand.randrange(3))
+        elif r < 0.35:
+            return NOT(self.randomTree(rand, depth + 1))
+        nodetype = AND if r < 0.7 else OR
+        return nodetype(*[ self.randomTree(rand, depth + 1) for i in range(rand.randrange(1, 5)) ])
+
+    def test_random_trees(self):
+        rand = random.Random(42)
+        leaves = [ (field, value) for field in "abcd" for value in range(3) ]
+        assignments = [ { leaf: rand.random() < 0.5 for leaf in leaves } for i in range(32) ]
+        for i in range(300):
+            tree = self.randomTree(rand)
+            expected = [ evaluate(tree, assignment) for assignment in assignments ]
+            optimized = SigmaConditionOptimizer().optimizeTree(tree)
+            with self.subTest(tree=dumpTree(tree)):
+                self.assertEqual([ evaluate(optimized, assignment) for assignment in assignments ], expected)
+                self.assertEqual(self.optimize(optimized), dumpTree(optimized))
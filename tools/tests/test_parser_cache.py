@@ -0,0 +1,203 @@
+# Test cache of parsed Sigma rules
+
+import os
+import time
+import pickle
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sigma.backends.elasticsearch import ElasticsearchQuerystringBackend
+from sigma.parser.cache import SigmaParseCache
+from sigma.parser.collection import SigmaCollectionParser
+from sigma.parser.exceptions import SigmaParseCacheError
+from sigma.configuration import SigmaConfiguration
+from sigma.filter import SigmaRuleFilter
+
+rule = """
+title: Test
+level: high
+logsource:
+    product: windows
+    service: security
+detection:
+    selection:
+        EventID: 4624
+        TargetUserName|contains: admin
+    keywords:
+        - evil
+    condition: selection and not keywords
+"""
+
+aggregation_rule = rule.replace("condition: selection and not keywords", "condition: selection | count(TargetUserName) by ComputerName > 3")
+
+config = """
+fieldmappings:
+    EventID: winlog.event_id
+    TargetUserName: winlog.event_data.TargetUserName
+logsources:
+    security:
+        service: security
+        index: winlogbeat-*
+"""
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = SigmaParseCache(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def convert(self, content=rule, configyaml=config, rulefilter=None):
+        sigmaconfig = SigmaConfiguration(configyaml)
+        backend = ElasticsearchQuerystringBackend(sigmaconfig)
+        parser = SigmaCollectionParser(content, sigmaconfig, rulefilter, self.cache)
+        return list(parser.generate(backend))
+
+    def entries(self):
+        return sorted(os.listdir(self.tmpdir.name))
+
+    def test_cached_result(self):
+        uncached = list(SigmaCollectionParser(rule, SigmaConfiguration(config)).generate(ElasticsearchQuerystringBackend(SigmaConfiguration(config))))
+        self.assertEqual(self.convert(), uncached)
+        self.assertEqual(len(self.entries()), 1)
+        with patch.object(SigmaCollectionParser, "parse") as parse:
+            self.assertEqual(self.convert(), uncached)
+            parse.assert_not_called()
+
+    def test_config_attached(self):
+        SigmaCollectionParser(aggregation_rule, SigmaConfiguration(config), cache=self.cache)
+        sigmaconfig = SigmaConfiguration(config)
+        parser = SigmaCollectionParser(aggregation_rule, sigmaconfig, cache=self.cache)
+        sigmaparser = parser.parsers[0]
+        self.assertIs(sigmaparser.config, sigmaconfig)
+        self.assertIs(sigmaparser.condparsed[0].config, sigmaconfig)
+        self.assertIs(sigmaparser.condparsed[0].parsedAgg.config, sigmaconfig)
+        self.assertEqual(sigmaparser.condparsed[0].parsedAgg.groupfield, "ComputerName")
+
+    def test_key(self):
+        self.convert()
+        self.convert()
+        self.convert(content=rule.replace("evil", "bad"))
+        self.convert(configyaml=config.replace("winlogbeat-*", "logs-*"))
+        self.convert(rulefilter=SigmaRuleFilter("level>=high"))
+        self.assertEqual(len(self.entries()), 4)
+
+    def test_filtered(self):
+        self.assertEqual(self.convert(rulefilter=SigmaRuleFilter("level=low")), [])
+        self.assertEqual(self.convert(rulefilter=SigmaRuleFilter("level=low")), [])
+        self.assertNotEqual(self.convert(), [])
+
+    def test_damaged_entry(self):
+        expected = self.convert()
+        entry = os.path.join(self.tmpdir.name, self.entries()[0])
+        with open(entry, "wb") as f:
+            f.write(b"damaged")
+        self.assertEqual(self.convert(), expected)
+        self.assertEqual(self.convert(), expected)
+
+    def test_damaged_tail(self):
+        content = rule + "---\n" + rule.replace("evil", "bad")
+        expected = self.convert(content)
+        entry = os.path.join(self.tmpdir.name, self.entries()[0])
+        with open(entry, "rb") as f:
+            data = f.read()
+        with open(entry, "wb") as f:
+            f.write(data[:-10])
+        self.assertEqual(self.convert(content), expected)
+        self.assertEqual(self.entries(), [ os.path.basename(entry) ])
+        with patch.object(SigmaCollectionParser, "parse") as parse:
+            self.assertEqual(self.convert(content), expected)
+            parse.assert_not_called()
+
+    def test_lazy(self):
+        content = rule + "---\n" + rule.replace("evil", "bad")
+        sigmaconfig = SigmaConfiguration(config)
+        parsers = SigmaCollectionParser(content, sigmaconfig, cache=self.cache, lazy=True).iterparsers()
+        next(parsers)
+        parsers.close()
+        self.assertEqual(len(self.entries()), 1)    # remaining rules are stored if the consumer stops
+        with patch.object(SigmaCollectionParser, "parse") as parse:
+            self.assertEqual(len(SigmaCollectionParser(content, sigmaconfig, cache=self.cache).parsers), 2)
+            parse.assert_not_called()
+        expected = self.convert(content)
+        cached = SigmaCollectionParser(content, sigmaconfig, cache=self.cache, lazy=True)
+        self.assertEqual(len(cached.parsers), 2)
+        self.assertEqual(list(cached.generate(ElasticsearchQuerystringBackend(sigmaconfig))), expected)
+
+    def test_aborted_parse(self):
+        content = rule + "---\n" + rule.replace("condition: selection and not keywords", "condition: selection and")
+        parsers = SigmaCollectionParser(content, SigmaConfiguration(config), cache=self.cache, lazy=True).iterparsers()
+        next(parsers)
+        parsers.close()
+        self.assertEqual(self.entries(), [])        # nothing is stored if parsing of remaining rules fails
+
+    def test_config_digest(self):
+        sigmaconfig = SigmaConfiguration(config)
+        key = self.cache.key(rule, sigmaconfig)
+        self.assertEqual(self.cache.key(rule, sigmaconfig), key)
+        self.assertEqual(self.cache.key(rule, SigmaConfiguration(config)), key)
+        self.assertNotEqual(self.cache.key(rule, SigmaConfiguration(config.replace("winlogbeat-*", "logs-*"))), key)
+        self.assertEqual(pickle.loads(pickle.dumps(self.cache)).key(rule, sigmaconfig), key)
+
+    def test_prune_age(self):
+        self.convert()
+        self.convert(content=rule.replace("evil", "bad"))
+        old = self.entries()[0]
+        past = time.time() - self.cache.max_age - 60
+        os.utime(os.path.join(self.tmpdir.name, old), (past, past))
+        self.cache.prune()
+        self.assertNotIn(old, self.entries())
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_prune_size(self):
+        for i in range(3):
+            self.convert(content=rule.replace("evil", "evil%d" % i))
+            mtime = time.time() - 10 + i
+            os.utime(self.cache.entry_path(self.cache.key(rule.replace("evil", "evil%d" % i), SigmaConfiguration(config))), (mtime, mtime))
+        size = os.path.getsize(self.cache.entry_path(self.cache.key(rule.replace("evil", "evil2"), SigmaConfiguration(config))))
+        self.cache.max_size = size
+        self.cache.prune()
+        self.assertEqual(len(self.entries()), 1)
+        self.assertEqual(self.entries()[0], self.cache.key(rule.replace("evil", "evil2"), SigmaConfiguration(config)) + self.cache.suffix)
+
+    def test_prune_temporary(self):
+        for name in ("old.tmp", "new.tmp"):
+            open(os.path.join(self.tmpdir.name, name), "w").close()
+        past = time.time() - self.cache.tmp_grace - 60
+        os.utime(os.path.join(self.tmpdir.name, "old.tmp"), (past, past))
+        self.cache.prune()
+        self.assertEqual(self.entries(), [ "new.tmp" ])     # may be written by a concurrent run
+
+    def test_private_directory(self):
+        path = os.path.join(self.tmpdir.name, "new", "cache")
+        cache = SigmaParseCache(path)
+        cache.check()
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "No user ids on this platform")
+    def test_writable_directory(self):
+        os.chmod(self.tmpdir.name, 0o777)
+        with self.assertRaises(SigmaParseCacheError):
+            self.cache.check()
+        self.assertNotEqual(self.convert(), [])
+        self.assertEqual(self.entries(), [])
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "No user ids on this platform")
+    def test_foreign_directory(self):
+        self.convert()
+        key = self.cache.key(rule, SigmaConfiguration(config))
+        self.assertIsNotNone(SigmaParseCache(self.tmpdir.name).load(key, SigmaConfiguration(config)))
+        with patch("os.getuid", return_value=os.getuid() + 1):
+            cache = SigmaParseCache(self.tmpdir.name)
+            with self.assertRaises(SigmaParseCacheError):
+                cache.check()
+            self.assertIsNone(cache.load(key, SigmaConfiguration(config)))
+
+    def test_unwritable(self):
+        cache = SigmaParseCache(os.path.join(self.tmpdir.name, "file", "cache"))
+        open(os.path.join(self.tmpdir.name, "file"), "w").close()
+        sigmaconfig = SigmaConfiguration(config)
+        parser = SigmaCollectionParser(rule, sigmaconfig, cache=cache)
+        self.assertEqual(len(parser.parsers), 1)
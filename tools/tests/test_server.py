@@ -0,0 +1,149 @@
+# Test conversion server of sigmac
+
+import os
+import sys
+import json
+import socket
+import tempfile
+import subprocess
+import unittest
+import http.client
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.test_sigmac import tools, collection, invalid, unsupported, targets
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+def config_names(options):
+    return [ value for option, value in zip(options[::2], options[1::2]) if option == "-c" ]
+
+def sigmac_output(response):
+    """Output of sigmac for the response of a conversion"""
+    output = "".join(result + "\n" for result in response["results"])
+    if response["finalized"] is not None:
+        output += response["finalized"] + "\n"
+    return output
+
+class TestConversionServer(unittest.TestCase):
+    address = "127.0.0.1:0"
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name)
+        env = dict(os.environ, PYTHONPATH=str(tools))
+        self.server = subprocess.Popen([ sys.executable, str(tools / "sigmac"), "--serve", self.address.format(path=self.path) ], env=env, stderr=subprocess.PIPE, universal_newlines=True)
+        self.listening = self.server.stderr.readline().split()[-1]
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+        self.server.stderr.close()
+        self.tmpdir.cleanup()
+
+    def connect(self):
+        if self.listening.startswith("unix:"):
+            return UnixHTTPConnection(self.listening[len("unix:"):])
+        host, port = self.listening.rsplit(":", 1)
+        return http.client.HTTPConnection(host, int(port))
+
+    def post(self, request, connection=None, path="/convert"):
+        connection = connection or self.connect()
+        body = request if isinstance(request, bytes) else json.dumps(request).encode("utf-8")
+        connection.request("POST", path, body, { "Content-Type": "application/json" })
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+
+    def sigmac(self, *args):
+        rule = self.path / "rule.yml"
+        rule.write_text(collection)
+        env = dict(os.environ, PYTHONPATH=str(tools))
+        return subprocess.run([ sys.executable, str(tools / "sigmac"), "--no-cache" ] + list(args) + [ str(rule) ], env=env, stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+    def test_same_as_sigmac(self):
+        for target, options in targets:
+            with self.subTest(target=target):
+                status, response = self.post({ "rule": collection, "target": target, "config": config_names(options) })
+                self.assertEqual(status, 200)
+                self.assertEqual(sigmac_output(response), self.sigmac(*([ "-t", target ] + options)))
+
+    def test_options(self):
+        request = { "rule": collection, "target": "es-qs", "config": [ "sysmon", "winlogbeat" ], "options": [ "rulecomment" ], "filter": "level>=high" }
+        status, response = self.post(request)
+        self.assertEqual((status, response["results"]), (200, []))
+        del request["filter"]
+        status, response = self.post(request)
+        self.assertEqual(sigmac_output(response), self.sigmac("-t", "es-qs", "-c", "sysmon", "-c", "winlogbeat", "-O", "rulecomment"))
+        self.assertIn("# Test", response["results"][0])
+        request["options"] = { "rulecomment": True }
+        self.assertEqual(self.post(request)[1], response)
+
+    def test_errors(self):
+        cases = (
+                ({ "rule": invalid, "target": "es-qs", "config": "winlogbeat", "name": "invalid.yml" }, 422, 4, "parse"),
+                ({ "rule": "title: [", "target": "es-qs", "config": "winlogbeat" }, 422, 3, "parse"),
+                ({ "rule": unsupported, "target": "es-qs", "config": "winlogbeat" }, 422, 42, "backend"),
+                ({ "rule": collection, "target": "unknown" }, 400, 10, "request"),
+                ({ "rule": collection, "target": "es-qs" }, 400, 20, "request"),
+                ({ "rule": collection, "target": "es-qs", "config": [ "sysmon", "unknown" ] }, 400, 5, "request"),
+                ({ "rule": collection, "target": "es-qs", "config": [ str(tools / "config" / "winlogbeat.yml") ] }, 400, 5, "request"),
+                ({ "rule": collection, "target": "es-qs", "config": [ "splunk-windows" ] }, 400, 21, "request"),
+                ({ "rule": collection, "target": "es-qs", "config": "winlogbeat", "filter": "level>=unknown" }, 400, 11, "request"),
+                ({ "target": "es-qs", "config": "winlogbeat" }, 400, None, "request"),
+                (b"{", 400, None, "request"),
+                )
+        connection = self.connect()
+        for request, status, code, errclass in cases:
+            with self.subTest(request=request):
+                response = self.post(request, connection)
+                self.assertEqual((response[0], response[1]["error"]["code"], response[1]["error"]["class"]), (status, code, errclass))
+        self.assertIn("invalid.yml", self.post(cases[0][0])[1]["error"]["message"])
+        self.assertEqual(self.post(cases[0][0], path="/unknown")[0], 404)
+
+    def test_content_type(self):
+        body = json.dumps({ "rule": collection, "target": "es-qs", "config": "winlogbeat" }).encode("utf-8")
+        for headers, status in (({ "Content-Type": "application/json; charset=utf-8" }, 200), ({ "Content-Type": "text/plain" }, 415), ({}, 415)):
+            with self.subTest(headers=headers):
+                connection = self.connect()
+                connection.request("POST", "/convert", body, headers)
+                response = connection.getresponse()
+                self.assertEqual(response.status, status)
+                self.assertIn("results" if status == 200 else "error", json.loads(response.read().decode("utf-8")))
+
+    def test_request_size(self):
+        connection = self.connect()
+        connection.putrequest("POST", "/convert")
+        connection.putheader("Content-Type", "application/json")
+        connection.putheader("Content-Length", "2000000")
+        connection.endheaders()         # body isn't sent, the request is rejected by its length
+        response = connection.getresponse()
+        self.assertEqual(response.status, 413)
+        self.assertEqual(response.getheader("Connection"), "close")
+        self.assertIn("1048576 bytes", json.loads(response.read().decode("utf-8"))["error"]["message"])
+
+    def test_concurrent(self):
+        requests = [ { "rule": collection.replace("4444", str(port)), "target": target, "config": config_names(options) } for port in range(4000, 4010) for target, options in targets ]
+        with ThreadPoolExecutor(8) as executor:
+            concurrent = list(executor.map(self.post, requests))
+        connection = self.connect()
+        serial = [ self.post(request, connection) for request in requests ]
+        self.assertEqual(concurrent, serial)
+        self.assertTrue(all(status == 200 for status, response in serial))
+        self.assertIn("4009", json.dumps(serial[-5]))
+
+class TestConversionServerUnixSocket(TestConversionServer):
+    address = "unix:{path}/sigmac.sock"
+
+    def test_socket_removed(self):
+        path = Path(self.listening[len("unix:"):])
+        self.assertTrue(path.exists())
+        self.server.terminate()
+        self.server.wait()
+        self.assertFalse(path.exists())
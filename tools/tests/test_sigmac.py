@@ -0,0 +1,299 @@
+# Test conversion for multiple targets in one sigmac run
+
+import os
+import pickle
+import sys
+import tempfile
+import subprocess
+import unittest
+from pathlib import Path
+
+tools = Path(__file__).parent.parent
+
+collection = """
+action: global
+title: Test
+logsource:
+    product: windows
+    service: sysmon
+detection:
+    condition: selection
+---
+id: 11111111-1111-1111-1111-111111111111
+detection:
+    selection:
+        EventID: 1
+        Image|endswith: '\\\\evil.exe'
+---
+id: 22222222-2222-2222-2222-222222222222
+detection:
+    selection:
+        EventID: 3
+        DestinationPort:
+            - 4444
+            - 1337
+---
+id: 33333333-3333-3333-3333-333333333333
+detection:
+    selection:
+        EventID: 1
+        CommandLine|contains: ' -enc '
+    timeframe: 1h
+    condition: selection | count() by Computer > 5
+"""
+
+invalid = """
+title: Invalid
+logsource:
+    product: windows
+detection:
+    selection:
+        EventID: 1
+    condition: undefined
+"""
+
+unsupported = """
+title: Unsupported
+logsource:
+    product: windows
+detection:
+    selection:
+        EventID: 1
+    condition: selection | near selection
+"""
+
+keywords = """
+title: Keywords
+logsource:
+    product: windows
+detection:
+    keywords:
+        - mimikatz
+        - lsadump
+    condition: keywords
+"""
+
+webserver = """
+title: Webserver
+logsource:
+    category: webserver
+detection:
+    selection:
+        c-uri|contains: '/manager/'
+    condition: selection
+"""
+
+targets = (
+        ("es-qs", [ "-c", "winlogbeat" ]),
+        ("splunk", [ "-c", "sysmon", "-c", "splunk-windows" ]),
+        ("kibana", [ "-c", "winlogbeat" ]),
+        ("es-rule", [ "-c", "winlogbeat" ]),
+        ("sqlite", [ "-c", "sysmon" ]),
+        )
+
+class TestMultipleTargets(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name)
+        self.rules = self.path / "rules"
+        self.rules.mkdir()
+        (self.rules / "collection.yml").write_text(collection)
+        (self.rules / "invalid.yml").write_text(invalid)
+        (self.rules / "unsupported.yml").write_text(unsupported)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def sigmac(self, *args):
+        env = dict(os.environ, PYTHONPATH=str(tools))
+        return subprocess.run([ sys.executable, str(tools / "sigmac"), "--no-cache" ] + list(args), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    def convert_targets(self, *extra):
+        """Convert rules for all targets in one run and return outputs per target and the finished process"""
+        args = list(extra)
+        for target, options in targets:
+            args += [ "-t", target ] + options + [ "-o", str(self.path / target) ]
+        process = self.sigmac(*(args + [ "-rdI", str(self.rules) ]))
+        return { target: (self.path / target).read_text() for target, options in targets }, process
+
+    def test_same_as_single_target(self):
+        outputs, process = self.convert_targets()
+        for target, options in targets:
+            with self.subTest(target=target):
+                single = self.sigmac(*([ "-t", target ] + options + [ "-rdI", str(self.rules) ]))
+                self.assertEqual(outputs[target], single.stdout)
+                self.assertTrue(outputs[target])
+                self.assertEqual(process.returncode, single.returncode)
+
+    def test_parallel(self):
+        second = collection.replace("evil.exe", "bad.exe")
+        for digit in "123":     # es-rule replaces IDs that are used multiple times by random ones
+            second = second.replace(digit * 8 + "-", str(int(digit) + 3) * 8 + "-")
+        (self.rules / "second.yml").write_text(second)
+        serial, process = self.convert_targets()
+        parallel, process = self.convert_targets("-j", "2")
+        self.assertEqual(parallel, serial)
+
+    def test_parallel_isolation(self):
+        """Parallel conversion gives the serial output, backends whose results depend on previous rules convert serially"""
+        (self.rules / "keywords.yml").write_text(keywords)
+        (self.rules / "webserver.yml").write_text(webserver)
+        for target, options in (("ala", []), ("es-dsl", [ "-c", "winlogbeat" ])):
+            with self.subTest(target=target):
+                args = [ "-t", target ] + options + [ "-rdI", str(self.rules) ]
+                serial = self.sigmac(*args)
+                self.assertTrue(serial.stdout)
+                parallel = self.sigmac(*([ "-j", "2" ] + args))
+                self.assertEqual(parallel.stdout, serial.stdout)
+                self.assertEqual("converting serially" in parallel.stderr, target == "ala")
+
+    def test_errors(self):
+        outputs, process = self.convert_targets()
+        self.assertEqual(process.stderr.count("Target es-qs: Error: Sigma parse error in"), 1)
+        self.assertEqual(process.stderr.count("Error: Sigma parse error in"), len(targets))
+        process = self.sigmac("-t", "es-qs", "-c", "winlogbeat", "-o", str(self.path / "es-qs"), "-t", "sqlite", "-c", "sysmon", "-o", str(self.path / "sqlite"), str(self.rules / "invalid.yml"))
+        self.assertEqual(process.returncode, 4)
+
+    def test_shared_options(self):
+        """Options before the first target apply to all targets"""
+        process = self.sigmac("-c", "sysmon", "-O", "rulecomment", "-t", "es-qs", "-c", "winlogbeat", "-o", str(self.path / "es-qs"), "-t", "splunk", "-c", "splunk-windows", "-o", str(self.path / "splunk"), str(self.rules / "collection.yml"))
+        self.assertEqual(process.returncode, 0)
+        for target, configs in (("es-qs", [ "sysmon", "winlogbeat" ]), ("splunk", [ "sysmon", "splunk-windows" ])):
+            with self.subTest(target=target):
+                args = [ "-t", target, "-O", "rulecomment" ]
+                for config in configs:
+                    args += [ "-c", config ]
+                single = self.sigmac(*(args + [ str(self.rules / "collection.yml") ]))
+                self.assertEqual((self.path / target).read_text(), single.stdout)
+                self.assertIn("# Test", single.stdout)
+
+    def test_stdout_not_closed(self):
+        """Only output files opened by sigmac are closed, not the standard output of a program that calls main()"""
+        script = "import sys\nfrom sigma import sigmac\nsys.argv = sys.argv[1:]\ntry:\n    sigmac.main()\nexcept SystemExit:\n    pass\nprint('still open')\n"
+        env = dict(os.environ, PYTHONPATH=str(tools))
+        process = subprocess.run([ sys.executable, "-c", script, "sigmac", "--no-cache", "-t", "es-qs", "-c", "winlogbeat", "-I", str(self.rules / "collection.yml") ],
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertTrue(process.stdout.endswith("still open\n"))
+
+    def test_documents_loaded_once(self):
+        """The YAML documents of an input are loaded once for all configuration groups and not at all from a warm cache"""
+        script = """
+import sys
+from pathlib import Path
+from unittest.mock import patch
+from sigma.backends.discovery import getBackend
+from sigma.config.collection import SigmaConfigurationManager
+from sigma.parser.cache import SigmaParseCache
+from sigma.sigmac import convert_input_targets
+from sigma.tools import loadAllYAML
+
+scm = SigmaConfigurationManager()
+cache = SigmaParseCache(sys.argv[2])
+outputs = list()
+for run in range(2):
+    targets = [ (scm.get(config), target) for target, config in (("es-qs", "winlogbeat"), ("splunk", "splunk-windows"), ("sqlite", "sysmon")) ]
+    targets = [ (sigmaconfig, getBackend(target)(sigmaconfig, dict())) for sigmaconfig, target in targets ]
+    with patch("sigma.parser.collection.loadAllYAML", wraps=loadAllYAML) as load:
+        outputs.append(convert_input_targets(Path(sys.argv[1]), Path(sys.argv[1]).read_text(), targets, [ [ 0 ], [ 1 ], [ 2 ] ], None, cache))
+    print(load.call_count, all(results and error is None for results, error in outputs[-1]))
+print(outputs[0] == outputs[1])
+"""
+        env = dict(os.environ, PYTHONPATH=str(tools))
+        process = subprocess.run([ sys.executable, "-c", script, str(self.rules / "collection.yml"), str(self.path / "cache") ],
+                cwd=str(tools), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)     # configurations are found in config/
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.split(), [ "1", "True", "0", "True", "True" ])
+
+    def test_same_output(self):
+        for args in ((), ("-o", str(self.path / "out"))):
+            with self.subTest(args=args):
+                process = self.sigmac(*(args + ("-t", "es-qs", "-c", "winlogbeat", "-t", "splunk", "-c", "splunk-windows", str(self.rules / "collection.yml"))))
+                self.assertEqual(process.returncode, 2)
+                self.assertIn("same output", process.stderr)
+
+    def test_unusable_cache_directory(self):
+        (self.path / "file").write_text("")
+        env = dict(os.environ, PYTHONPATH=str(tools))
+        process = subprocess.run([ sys.executable, str(tools / "sigmac"), "--cache-dir", str(self.path / "file" / "cache"), "-t", "es-qs", "-c", "winlogbeat", str(self.rules / "collection.yml") ], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(process.returncode, 0)
+        self.assertIn("parsed rules are not cached", process.stderr)
+        self.assertEqual(process.stdout, self.sigmac("-t", "es-qs", "-c", "winlogbeat", str(self.rules / "collection.yml")).stdout)
+
+    def test_invalid_filter(self):
+        process = self.sigmac("-t", "es-qs", "-c", "winlogbeat", "-f", "level>=unknown", str(self.rules / "collection.yml"))
+        self.assertEqual(process.returncode, 11)
+        self.assertIn("Parse error in Sigma rule filter expression: Unknown level 'unknown'", process.stderr)
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name)
+        self.rules = self.path / "rules"
+        self.rules.mkdir()
+        self.state = self.path / "state"
+        (self.rules / "collection.yml").write_text(collection)
+        (self.rules / "second.yml").write_text(collection.replace("evil.exe", "bad.exe").replace("action: global", "action: global\nlevel: high"))
+        (self.rules / "invalid.yml").write_text(invalid)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def sigmac(self, *args, incremental=True):
+        args = list(args) + [ "-t", "es-qs", "-c", "winlogbeat", "-o", str(self.path / "es-qs"), "-t", "kibana", "-c", "winlogbeat", "-o", str(self.path / "kibana"), "-rdI", str(self.rules) ]
+        if incremental:
+            args = [ "--incremental", str(self.state) ] + args
+        process = TestMultipleTargets.sigmac(self, *args)
+        return (self.path / "es-qs").read_text(), (self.path / "kibana").read_text(), process.returncode
+
+    def tamper(self):
+        """Replace stored results of the es-qs target to recognize reused results"""
+        manifest = pickle.loads(next(self.state.glob("es-qs-*.manifest")).read_bytes())
+        for key, (digest, results, state, error) in manifest["entries"].items():
+            manifest["entries"][key] = (digest, [ "stored" ] if results else results, state, error)
+        next(self.state.glob("es-qs-*.manifest")).write_bytes(pickle.dumps(manifest))
+
+    def test_incremental(self):
+        full = self.sigmac(incremental=False)
+        self.assertEqual(self.sigmac(), full)
+        self.assertEqual(self.sigmac(), full)
+        self.assertEqual(len(list(self.state.glob("*.manifest"))), 2)
+
+        self.tamper()
+        self.assertEqual(self.sigmac()[0], "stored\nstored\n")
+        (self.rules / "collection.yml").write_text(collection.replace("4444", "5555"))
+        esqs = self.sigmac()[0]
+        self.assertEqual(esqs.count("stored"), 1)
+        self.assertIn("5555", esqs)
+        self.assertEqual(self.sigmac(incremental=False)[1], self.sigmac()[1])
+
+        (self.rules / "second.yml").unlink()
+        self.assertEqual(self.sigmac(), self.sigmac(incremental=False))
+        manifest = pickle.loads(next(self.state.glob("es-qs-*.manifest")).read_bytes())
+        self.assertEqual(sorted(Path(key).name for key in manifest["entries"]), [ "collection.yml", "invalid.yml" ])
+
+    def test_edit(self):
+        """Output after an edit equals a full conversion, also if previous rules had a timeframe or mapped fields"""
+        (self.rules / "keywords.yml").write_text(keywords)
+        targets = ("es-dsl", "es-qs", "kibana")
+        args = list()
+        for target in targets:
+            args += [ "-t", target, "-c", "winlogbeat", "-o", str(self.path / target) ]
+        args += [ "-rdI", str(self.rules) ]
+        TestMultipleTargets.sigmac(self, *([ "--incremental", str(self.state) ] + args))
+        (self.rules / "keywords.yml").write_text(keywords.replace("mimikatz", "sekurlsa"))
+        TestMultipleTargets.sigmac(self, *([ "--incremental", str(self.state) ] + args))
+        warm = { target: (self.path / target).read_text() for target in targets }
+        TestMultipleTargets.sigmac(self, *args)
+        for target in targets:
+            with self.subTest(target=target):
+                self.assertIn("sekurlsa", warm[target])
+                self.assertEqual(warm[target], (self.path / target).read_text())
+
+    def test_invalidation(self):
+        self.sigmac()
+        self.tamper()
+        self.assertNotIn("stored", self.sigmac("-f", "level>=high")[0])
+        self.sigmac()
+        self.tamper()
+        self.assertNotIn("stored", self.sigmac("-O", "keyword_field=")[0])
@@ -0,0 +1,10 @@
+import unittest
+
+from sigma.tools import strtobool
+
+class TestStrToBool(unittest.TestCase):
+    def test_strtobool(self):
+        self.assertEqual(strtobool("Yes"), 1)
+        self.assertEqual(strtobool("off"), 0)
+        with self.assertRaises(ValueError):
+            strtobool("maybe")
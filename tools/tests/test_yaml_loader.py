@@ -0,0 +1,42 @@
+# Test YAML loading with libyaml and pure Python loader
+
+import unittest
+from pathlib import Path
+
+import yaml
+
+from sigma.tools import loadAllYAML, YAMLLoader, PureYAMLLoader
+
+basedir = Path(__file__).parent.parent.parent
+
+class TestYAMLLoaders(unittest.TestCase):
+    def assertEqualLoaded(self, paths):
+        self.assertNotEqual(paths, [])
+        for path in paths:
+            with self.subTest(path=str(path)):
+                content = path.read_text(encoding="utf-8")
+                self.assertEqual(list(loadAllYAML(content)), list(loadAllYAML(content, PureYAMLLoader)))
+
+    @unittest.skipIf(YAMLLoader is PureYAMLLoader, "PyYAML without libyaml support")
+    def test_rules(self):
+        self.assertEqualLoaded(sorted((basedir / "rules").glob("**/*.yml")))
+
+    @unittest.skipIf(YAMLLoader is PureYAMLLoader, "PyYAML without libyaml support")
+    def test_configurations(self):
+        self.assertEqualLoaded(sorted((basedir / "tools" / "config").glob("**/*.yml")))
+
+    def test_file_object(self):
+        path = basedir / "tests" / "collection_repeat.yml"
+        with path.open(encoding="utf-8") as f:
+            self.assertEqual(list(loadAllYAML(f)), list(loadAllYAML(path.read_text(encoding="utf-8"), PureYAMLLoader)))
+
+    def test_invalid(self):
+        content = (basedir / "tests" / "invalid_yaml.yml").read_text(encoding="utf-8")
+        for loader in (YAMLLoader, PureYAMLLoader):
+            with self.assertRaises(yaml.YAMLError):
+                list(loadAllYAML(content, loader))
+
+    def test_safe(self):
+        for loader in (YAMLLoader, PureYAMLLoader):
+            with self.assertRaises(yaml.constructor.ConstructorError):
+                list(loadAllYAML("!!python/object/apply:os.system ['true']", loader))